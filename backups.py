@@ -0,0 +1,269 @@
+import base64
+import glob
+import json
+import logging
+import lzma
+import os
+import re
+import struct
+import time
+import zlib
+from itertools import islice
+
+import msgpack
+
+from entry import Entry
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger('remote_proxies')
+
+_WHITESPACE = re.compile(r'[ \t\n\r]*')
+
+BACKUP_FORMATS = {"msgpack": "kvs", "json": "json"}
+
+SNAPSHOT_MAGIC = b"KVVS"
+SNAPSHOT_VERSION = 1
+SNAPSHOT_BLOCK_ENTRIES = 4096
+_PREAMBLE = struct.Struct(">4sBI")  # magic, format version, header length
+_FOOTER = struct.Struct(">Q4s")  # index offset, magic
+
+_READ_ERRORS = (OSError, ValueError, struct.error, zlib.error, lzma.LZMAError)
+
+COMPRESSORS = {
+    None: (lambda data: data, lambda data: data),
+    "zlib": (zlib.compress, zlib.decompress),
+    "lzma": (lzma.compress, lzma.decompress),
+}
+
+
+def json_default(obj):
+    """``json.dump`` hook writing bytes as base64 so JSON output can round-trip them."""
+    if isinstance(obj, bytes):
+        return {"__bytes__": base64.b64encode(obj).decode('ascii')}
+    if isinstance(obj, Entry):
+        return obj.to_dict()
+    raise TypeError(f"Object of type {type(obj).__name__} is not serializable")
+
+
+def json_object_hook(obj):
+    if len(obj) == 1 and "__bytes__" in obj:
+        return base64.b64decode(obj["__bytes__"])
+    return obj
+
+
+_decoder = json.JSONDecoder(object_hook=json_object_hook)
+
+
+def backup_path(backup_dir, store_name, generation, backup_format="json"):
+    return os.path.join(backup_dir, f"{store_name}.backup.{generation}.{BACKUP_FORMATS[backup_format]}")
+
+
+def list_backed_up_stores(backup_dir):
+    """Returns the names of the stores that have at least one backup generation."""
+    names = set()
+    for extension in BACKUP_FORMATS.values():
+        for path in glob.glob(os.path.join(backup_dir, f"*.backup.*.{extension}")):
+            names.add(os.path.basename(path).rsplit('.backup.', 1)[0])
+    return sorted(names)
+
+
+def rotate_generations(backup_dir, store_name, max_backups):
+    """Shifts every generation of a store up by one, whatever its format, dropping the oldest."""
+    for backup_format in BACKUP_FORMATS:
+        for i in range(max_backups, 0, -1):
+            src = backup_path(backup_dir, store_name, i, backup_format)
+            if os.path.exists(src):
+                if i == max_backups:
+                    os.remove(src)
+                else:
+                    os.rename(src, backup_path(backup_dir, store_name, i + 1, backup_format))
+
+
+def msgpack_default(obj):
+    if isinstance(obj, Entry):
+        return obj.to_dict()
+    raise TypeError(f"Object of type {type(obj).__name__} is not serializable")
+
+
+def write_json_backup(path, entries):
+    with open(path, 'w') as f:
+        json.dump(entries, f, ensure_ascii=False, indent=4, default=json_default)
+
+
+def write_snapshot(path, store_name, entries, compression=None, block_entries=SNAPSHOT_BLOCK_ENTRIES):
+    """Writes a store as a binary snapshot.
+
+    Layout: a preamble and msgpack header describing the store, the entries
+    as msgpack-encoded ``[key, entry]`` blocks (each optionally compressed),
+    then a block index and a fixed-size footer pointing at it. A file cut
+    short by a crash has no valid footer and is rejected before any block is
+    decoded; every block also carries a CRC32.
+    """
+    if compression not in COMPRESSORS:
+        raise ValueError(f"Unknown compression {compression}")
+    compress = COMPRESSORS[compression][0]
+    header = msgpack.packb({"store": store_name, "created": time.time(), "count": len(entries),
+                            "compression": compression})
+    with open(path, 'wb') as f:
+        f.write(_PREAMBLE.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION, len(header)))
+        f.write(header)
+        blocks = []
+        items = iter(entries.items())
+        while True:
+            chunk = list(islice(items, block_entries))
+            if not chunk:
+                break
+            data = compress(msgpack.packb(chunk, use_bin_type=True, default=msgpack_default))
+            blocks.append([f.tell(), len(data), len(chunk), zlib.crc32(data)])
+            f.write(data)
+        index_offset = f.tell()
+        f.write(msgpack.packb(blocks))
+        f.write(_FOOTER.pack(index_offset, SNAPSHOT_MAGIC))
+
+
+def read_snapshot_header(f):
+    """Returns the header of an open snapshot, with its block index under ``blocks``."""
+    magic, version, header_length = _PREAMBLE.unpack(f.read(_PREAMBLE.size))
+    if magic != SNAPSHOT_MAGIC:
+        raise ValueError("Not a snapshot file")
+    if version > SNAPSHOT_VERSION:
+        raise ValueError(f"Unsupported snapshot version {version}")
+    header = msgpack.unpackb(f.read(header_length))
+    f.seek(-_FOOTER.size, os.SEEK_END)
+    footer_end = f.tell()
+    index_offset, footer_magic = _FOOTER.unpack(f.read(_FOOTER.size))
+    if footer_magic != SNAPSHOT_MAGIC or index_offset > footer_end:
+        raise ValueError("Snapshot is truncated")
+    f.seek(index_offset)
+    header["blocks"] = msgpack.unpackb(f.read(footer_end - index_offset))
+    return header
+
+
+def iter_snapshot(path):
+    """Yields the ``(key, entry)`` pairs of a binary snapshot one block at a time."""
+    with open(path, 'rb') as f:
+        header = read_snapshot_header(f)
+        decompress = COMPRESSORS[header["compression"]][1]
+        for offset, length, _, crc in header["blocks"]:
+            f.seek(offset)
+            data = f.read(length)
+            if zlib.crc32(data) != crc:
+                raise ValueError(f"Corrupt block at offset {offset} in {path}")
+            for key, entry in msgpack.unpackb(decompress(data), raw=False, strict_map_key=False):
+                yield key, entry
+
+
+class _Reader:
+    """Chunked text buffer the streaming parser pulls from."""
+
+    def __init__(self, f, chunk_size):
+        self._f = f
+        self._chunk_size = chunk_size
+        self.buffer = ''
+        self.pos = 0
+        self.eof = False
+
+    def fill(self):
+        chunk = self._f.read(self._chunk_size)
+        if not chunk:
+            self.eof = True
+        self.buffer = self.buffer[self.pos:] + chunk
+        self.pos = 0
+
+    def skip_whitespace(self):
+        while True:
+            self.pos = _WHITESPACE.match(self.buffer, self.pos).end()
+            if self.pos < len(self.buffer) or self.eof:
+                return
+            self.fill()
+
+    def expect(self, char):
+        self.skip_whitespace()
+        if self.buffer[self.pos:self.pos + 1] != char:
+            raise ValueError(f"Expected {char!r} at offset {self.pos}")
+        self.pos += 1
+
+    def peek(self):
+        self.skip_whitespace()
+        return self.buffer[self.pos:self.pos + 1]
+
+    def decode(self):
+        self.skip_whitespace()
+        while True:
+            try:
+                obj, end = _decoder.raw_decode(self.buffer, self.pos)
+                # A value running up to the end of the buffer may be cut short
+                if end < len(self.buffer) or self.eof:
+                    self.pos = end
+                    return obj
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            self.fill()
+
+
+def iter_json_backup(path, chunk_size=1 << 20):
+    """Yields the ``(key, entry)`` pairs of a JSON backup without reading the file whole.
+
+    Raises ValueError if the file is not a complete JSON object, which is how
+    a backup truncated by a crash mid-write shows up.
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        reader = _Reader(f, chunk_size)
+        reader.expect('{')
+        if reader.peek() == '}':
+            reader.pos += 1
+        else:
+            while True:
+                key = reader.decode()
+                if not isinstance(key, str):
+                    raise ValueError(f"Expected a string key in {path}")
+                reader.expect(':')
+                yield key, reader.decode()
+                if reader.peek() == ',':
+                    reader.pos += 1
+                    continue
+                reader.expect('}')
+                break
+        reader.skip_whitespace()
+        if reader.pos < len(reader.buffer):
+            raise ValueError(f"Trailing data after the backup object in {path}")
+
+
+def load_store_backup(backup_dir, store_name, max_backups, now):
+    """Loads the newest readable generation of a store, dropping entries expired before ``now``.
+
+    Returns ``(entries, generation, dropped)``; ``entries`` is None when no
+    generation could be read.
+    """
+    for generation in range(1, max_backups + 1):
+        for backup_format in BACKUP_FORMATS:
+            path = backup_path(backup_dir, store_name, generation, backup_format)
+            if not os.path.exists(path):
+                continue
+            entries, dropped = _read_backup(path, backup_format, now)
+            if entries is not None:
+                return entries, generation, dropped
+    return None, None, 0
+
+
+def iter_backup(path, backup_format):
+    return iter_snapshot(path) if backup_format == "msgpack" else iter_json_backup(path)
+
+
+def _read_backup(path, backup_format, now):
+    entries, dropped = {}, 0
+    try:
+        for key, entry in iter_backup(path, backup_format):
+            if not isinstance(entry, dict):
+                raise ValueError(f"Entry {key} is not an object")
+            # No expiry time never expires, as in Entry.is_expired
+            exp_time = entry.get('exp_time')
+            if exp_time is not None and now > exp_time:
+                dropped += 1
+                continue
+            entries[key] = entry
+    except _READ_ERRORS as e:
+        logger.error(f"Skipping unreadable backup {path}: {e}")
+        return None, 0
+    return entries, dropped
@@ -0,0 +1,51 @@
+import logging
+import shutil
+import sys
+import threading
+import time
+
+from store import AbstractKVStore
+
+logging.getLogger('remote_proxies').setLevel(logging.WARNING)
+
+STORE = "bench"
+THREADS = 4
+
+
+def read_then_write(kv_store, key):
+    kv_store._edit_key(STORE, key, value=kv_store._get_key(STORE, key) + 1)
+
+
+def atomic(kv_store, key):
+    kv_store.incr(STORE, key)
+
+
+def run(op, ops):
+    kv_store = AbstractKVStore(backup_dir="bench_backups")
+    kv_store.create_store(STORE)
+    kv_store._add_key(STORE, "counter", value=0)
+
+    def worker():
+        for _ in range(ops):
+            op(kv_store, "counter")
+
+    threads = [threading.Thread(target=worker) for _ in range(THREADS)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    final = kv_store._get_key(STORE, "counter")
+    kv_store.shutdown()
+    shutil.rmtree("bench_backups", ignore_errors=True)
+    return THREADS * ops / elapsed, THREADS * ops - final
+
+
+if __name__ == "__main__":
+    ops = int(sys.argv[1]) if len(sys.argv) > 1 else 50_000
+    sys.setswitchinterval(0.0005)  # Switch threads often enough for read-then-write races to show
+    print(f"{THREADS} threads x {ops} increments of one key")
+    for label, op in (("get then edit", read_then_write), ("incr", atomic)):
+        rate, lost = run(op, ops)
+        print(f"{label:<16} ops/sec {rate:10.0f}  lost updates {lost:8d}")
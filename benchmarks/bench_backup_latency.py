@@ -0,0 +1,78 @@
+import logging
+import shutil
+import sys
+import threading
+import time
+
+from store import AbstractKVStore
+
+logging.getLogger('remote_proxies').setLevel(logging.WARNING)
+
+STORE = "pipelines"
+DURATION = 5.0
+
+
+class LockedBackupKVStore(AbstractKVStore):
+    """Serializes backups while holding every stripe of the store, as before."""
+
+    def _backup_if_dirty(self, store_name):
+        with self._whole_store_lock(store_name):
+            self.rotate_and_backup(store_name, self._stores[store_name])
+        return True
+
+
+def backup_loop(kv_store, stop):
+    while not stop.is_set():
+        kv_store._mutations[STORE] += 1  # Force a new generation every pass
+        kv_store._backup_if_dirty(STORE)
+        if kv_store.backup_mode == "background":
+            kv_store.wait_for_backups()
+
+
+def percentile(samples, fraction):
+    return samples[min(len(samples) - 1, int(len(samples) * fraction))] * 1e6
+
+
+def run(store_cls, keys, backup_mode="inline"):
+    kv_store = store_cls(backup_dir="bench_backups", max_backups=2, backup_mode=backup_mode)
+    kv_store.create_store(STORE)
+    for i in range(keys):
+        kv_store._add_key(STORE, f"pipeline{i}", value={"status": "Running", "stages": list(range(10))})
+    if backup_mode == "background":
+        kv_store.start_tasks("cleanup")
+
+    stop = threading.Event()
+    backup = threading.Thread(target=backup_loop, args=(kv_store, stop))
+    backup.start()
+    reads, writes = [], []
+    deadline = time.perf_counter() + DURATION
+    i = 0
+    while time.perf_counter() < deadline:
+        key = f"pipeline{i % keys}"
+        start = time.perf_counter()
+        kv_store._get_key(STORE, key)
+        reads.append(time.perf_counter() - start)
+        start = time.perf_counter()
+        kv_store._add_key(STORE, key, value={"status": "Done"})
+        writes.append(time.perf_counter() - start)
+        i += 1
+        time.sleep(0.0005)
+    stop.set()
+    backup.join()
+    kv_store.shutdown()
+    shutil.rmtree("bench_backups", ignore_errors=True)
+    reads.sort()
+    writes.sort()
+    return reads, writes
+
+
+if __name__ == "__main__":
+    keys = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    print(f"{keys} keys, backups looping for {DURATION:.0f} s, latency in us")
+    print(f"{'':<28}{'get p50':>10}{'get p99':>10}{'set p50':>10}{'set p99':>10}{'set max':>12}")
+    for label, store_cls, mode in (("lock held during backup", LockedBackupKVStore, "inline"),
+                                   ("copy then write inline", AbstractKVStore, "inline"),
+                                   ("copy then write background", AbstractKVStore, "background")):
+        reads, writes = run(store_cls, keys, mode)
+        print(f"{label:<28}{percentile(reads, 0.5):>10.1f}{percentile(reads, 0.99):>10.1f}"
+              f"{percentile(writes, 0.5):>10.1f}{percentile(writes, 0.99):>10.1f}{writes[-1] * 1e6:>12.0f}")
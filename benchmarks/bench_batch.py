@@ -0,0 +1,42 @@
+import logging
+import shutil
+import threading
+import time
+
+import Pyro4
+
+from store import AbstractKVStore
+
+logging.getLogger('remote_proxies').setLevel(logging.WARNING)
+
+STORE = "bench"
+KEYS = 10_000
+
+
+def serve():
+    kv_store = AbstractKVStore(backup_dir="bench_backups")
+    kv_store.create_store(STORE)
+    daemon = Pyro4.Daemon(host="localhost")
+    uri = daemon.register(kv_store, objectId="key_value_store")
+    threading.Thread(target=daemon.requestLoop, daemon=True).start()
+    return daemon, uri
+
+
+def timed(label, fn):
+    start = time.perf_counter()
+    fn()
+    print(f"{label:<28} {time.perf_counter() - start:7.3f} s")
+
+
+if __name__ == "__main__":
+    daemon, uri = serve()
+    keys = [f"key{i}" for i in range(KEYS)]
+    with Pyro4.Proxy(uri) as proxy:
+        print(f"{KEYS} keys over Pyro4")
+        timed("mset one call per key", lambda: [proxy.mset(STORE, {key: {"value": 1}}) for key in keys])
+        timed("mset", lambda: proxy.mset(STORE, {key: {"value": 1} for key in keys}))
+        timed("mget one call per key", lambda: [proxy.mget(STORE, [key]) for key in keys])
+        timed("mget", lambda: proxy.mget(STORE, keys))
+        timed("mdelete", lambda: proxy.mdelete(STORE, keys))
+    daemon.shutdown()
+    shutil.rmtree("bench_backups", ignore_errors=True)
@@ -0,0 +1,91 @@
+import io
+import logging
+import multiprocessing
+import shutil
+import socket
+import sys
+import time
+
+import Pyro4
+
+import bulk
+from store import AbstractKVStore
+
+logging.getLogger('remote_proxies').setLevel(logging.WARNING)
+
+STORE = "bench"
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("localhost", 0))
+        return sock.getsockname()[1]
+
+
+def serve(port, backup_dir):
+    logging.getLogger('remote_proxies').setLevel(logging.WARNING)
+    kv_store = AbstractKVStore(backup_dir=backup_dir)
+    daemon = Pyro4.Daemon(host="localhost", port=port)
+    daemon.register(kv_store, objectId="key_value_store")
+    daemon.requestLoop()
+
+
+def connect(port):
+    proxy = Pyro4.Proxy(f"PYRO:key_value_store@localhost:{port}")
+    while True:
+        try:
+            proxy._pyroBind()
+            return proxy
+        except Pyro4.errors.CommunicationError:
+            time.sleep(0.05)
+
+
+def rate(keys, started):
+    return f"{keys / (time.perf_counter() - started):10,.0f} keys/s"
+
+
+def main(keys=200_000):
+    shutil.rmtree("bench_backups", ignore_errors=True)
+    port = free_port()
+    process = multiprocessing.Process(target=serve, args=(port, "bench_backups"), daemon=True)
+    process.start()
+    proxy = connect(port)
+    proxy.create_store(STORE)
+    inputs = {}
+    for file_format in bulk.FORMATS:
+        inputs[file_format] = io.BytesIO()
+        bulk.write_records(inputs[file_format], file_format, STORE,
+                           ((f"key{i:08d}", {"value": {"status": "running", "n": i}}) for i in range(keys)))
+
+    # What a script could do before: pages of scan and put_entries, every entry serialized by serpent
+    started = time.perf_counter()
+    for start in range(0, keys, bulk.CHUNK_SIZE):
+        proxy.put_entries(STORE, {f"key{i:08d}": {"value": {"status": "running", "n": i}}
+                                  for i in range(start, min(start + bulk.CHUNK_SIZE, keys))})
+    print(f"put_entries              {rate(keys, started)}")
+    started, cursor = time.perf_counter(), None
+    while True:
+        cursor = proxy.scan(STORE, cursor, None, bulk.CHUNK_SIZE)["cursor"]
+        if cursor is None:
+            break
+    print(f"scan                     {rate(keys, started)}")
+    proxy.delete_store(STORE)
+
+    for file_format in bulk.FORMATS:
+        inputs[file_format].seek(0)
+        started = time.perf_counter()
+        bulk.import_stores(proxy, inputs[file_format], file_format)
+        print(f"import {file_format:8}          {rate(keys, started)}")
+        out = io.BytesIO()
+        started = time.perf_counter()
+        bulk.export_stores(proxy, [STORE], out, file_format)
+        print(f"export {file_format:8}          {rate(keys, started)}  {len(out.getvalue()) / keys:5.1f} bytes/key")
+        proxy.delete_store(STORE)
+    proxy._pyroRelease()
+    process.terminate()
+    process.join()
+    shutil.rmtree("bench_backups", ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
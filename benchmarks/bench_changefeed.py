@@ -0,0 +1,76 @@
+import logging
+import shutil
+import statistics
+import sys
+import threading
+import time
+
+from store import AbstractKVStore
+
+logging.getLogger('remote_proxies').setLevel(logging.WARNING)
+
+STORE = "bench"
+POLL_INTERVAL = 0.5
+
+
+def write_rate(change_feed_size, ops):
+    kv_store = AbstractKVStore(backup_dir="bench_backups", change_feed_size=change_feed_size)
+    kv_store.create_store(STORE)
+    start = time.perf_counter()
+    for i in range(ops):
+        kv_store._add_key(STORE, f"key{i % 10_000}", value=i)
+    elapsed = time.perf_counter() - start
+    kv_store.shutdown()
+    return ops / elapsed
+
+
+def notification_delays(watch, changes=50):
+    """Seconds from each write to the watcher seeing it."""
+    kv_store = AbstractKVStore(backup_dir="bench_backups")
+    kv_store.create_store(STORE)
+    written, seen = {}, {}
+    done = threading.Event()
+    watcher = threading.Thread(target=watch, args=(kv_store, seen, changes, done))
+    watcher.start()
+    time.sleep(0.1)
+    for i in range(changes):
+        written[i] = time.perf_counter()
+        kv_store._add_key(STORE, "status", value=i)
+        time.sleep(0.05)
+    done.wait(10)
+    watcher.join()
+    kv_store.shutdown()
+    return [seen[i] - written[i] for i in seen]
+
+
+def poll(kv_store, seen, changes, done):
+    last = None
+    while len(seen) < changes:
+        value = kv_store._get_key(STORE, "status")
+        if value is not None and value != last:
+            for i in range(0 if last is None else last + 1, value + 1):
+                seen[i] = time.perf_counter()
+            last = value
+        time.sleep(POLL_INTERVAL)
+    done.set()
+
+
+def long_poll(kv_store, seen, changes, done):
+    cursor = None
+    while len(seen) < changes:
+        result = kv_store.get_changes(STORE, "status", cursor, 100, 5)
+        for event in result["events"]:
+            seen[event["entry"]["value"]] = time.perf_counter()
+        cursor = result["cursor"]
+    done.set()
+
+
+if __name__ == "__main__":
+    ops = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    for size in (0, 100_000):
+        print(f"change_feed_size {size:>7}  _add_key ops/sec {write_rate(size, ops):10.0f}")
+    for label, watch in ((f"poll every {POLL_INTERVAL}s", poll), ("get_changes", long_poll)):
+        delays = notification_delays(watch)
+        print(f"{label:<18} notification delay ms  median {statistics.median(delays) * 1000:7.2f}"
+              f"  max {max(delays) * 1000:7.2f}")
+    shutil.rmtree("bench_backups", ignore_errors=True)
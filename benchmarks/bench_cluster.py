@@ -0,0 +1,97 @@
+import logging
+import multiprocessing
+import shutil
+import socket
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import Pyro4
+
+from cluster import ClusterProxy
+from store import AbstractKVStore
+
+logging.getLogger('remote_proxies').setLevel(logging.WARNING)
+
+STORE = "bench"
+CLIENTS = 4
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("localhost", 0))
+        return sock.getsockname()[1]
+
+
+def serve(port):
+    logging.getLogger('remote_proxies').setLevel(logging.WARNING)
+    kv_store = AbstractKVStore(backup_dir=f"bench_backups/{port}", operation_stats=False)
+    daemon = Pyro4.Daemon(host="localhost", port=port)
+    daemon.register(kv_store, objectId="key_value_store")
+    daemon.requestLoop()
+
+
+def start_nodes(count):
+    ports = [free_port() for _ in range(count)]
+    processes = [multiprocessing.Process(target=serve, args=(port,), daemon=True) for port in ports]
+    for process in processes:
+        process.start()
+    for port in ports:
+        with Pyro4.Proxy(f"PYRO:key_value_store@localhost:{port}") as proxy:
+            while True:
+                try:
+                    proxy._pyroBind()
+                    break
+                except Pyro4.errors.CommunicationError:
+                    time.sleep(0.05)
+    return [f"localhost:{port}" for port in ports], processes
+
+
+def client_writes(nodes, client, keys, batch):
+    with ClusterProxy(nodes) as proxy:
+        for start in range(0, keys, batch):
+            proxy.mset(STORE, {f"c{client}-{i}": {"value": {"n": i, "status": "running"}}
+                               for i in range(start, start + batch)})
+
+
+def client_incrs(nodes, client, ops):
+    with ClusterProxy(nodes) as proxy:
+        for i in range(ops):
+            proxy.incr(STORE, f"n{client}-{i}")
+
+
+def timed_clients(work, *args):
+    started = time.perf_counter()
+    with ThreadPoolExecutor(CLIENTS) as executor:
+        for future in [executor.submit(work, *args[:1], client, *args[1:]) for client in range(CLIENTS)]:
+            future.result()
+    return time.perf_counter() - started
+
+
+def main(keys=20_000, ops=2_000, batch=500):
+    for count in (1, 3):
+        shutil.rmtree("bench_backups", ignore_errors=True)
+        nodes, processes = start_nodes(count)
+        with ClusterProxy(nodes) as proxy:
+            proxy.create_store(STORE)
+            writes = timed_clients(client_writes, nodes, keys, batch)
+            incrs = timed_clients(client_incrs, nodes, ops)
+            started = time.perf_counter()
+            cursor, seen = None, 0
+            while True:
+                page = proxy.scan(STORE, cursor, None, 1000)
+                seen += len(page["entries"])
+                cursor = page["cursor"]
+                if cursor is None:
+                    break
+            scan = time.perf_counter() - started
+        print(f"{count} node(s), {CLIENTS} clients:  mset {CLIENTS * keys / writes:9.0f} keys/s"
+              f"  incr {CLIENTS * ops / incrs:7.0f} ops/s  full scan of {seen} keys {scan * 1e3:7.1f} ms")
+        for process in processes:
+            process.terminate()
+            process.join()
+    shutil.rmtree("bench_backups", ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
@@ -0,0 +1,62 @@
+import gc
+import logging
+import random
+import shutil
+import sys
+import timeit
+import tracemalloc
+
+from plugins.workflows import WorkflowsPlugin
+from store import AbstractKVStore
+
+logging.getLogger('remote_proxies').setLevel(logging.WARNING)
+
+ROUNDS = 7
+CONFIGURATIONS = (("memory", {}),
+                  ("zlib", {"store_engines": {"pipelines": "compressed"}}),
+                  ("lzma", {"store_engines": {"pipelines": "compressed"}, "compression": "lzma"}))
+
+
+class PipelineKVStore(AbstractKVStore, WorkflowsPlugin):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        WorkflowsPlugin.__init__(self)
+
+
+def add_pipeline(kv_store, i):
+    cfg = {f"stage{n}": {"image": f"registry.local/team/stage{n}:1.{i % 7}", "retries": n % 3,
+                         "env": {"LOG_LEVEL": "info", "SHARD": str(i)}} for n in range(60)}
+    metadata = {"owner": f"team{i % 5}", "tags": ["nightly", "gpu" if i % 2 else "cpu"], "notes": "rerun on failure"}
+    kv_store.add_pipeline(f"p{i}", "tester", description=f"pipeline {i}", metadata=metadata, cfg=cfg)
+
+
+def best_us(stmt, number):
+    return min(timeit.repeat(stmt, number=number, repeat=ROUNDS)) / number * 1e6
+
+
+def main(pipelines=1000, ops=2000):
+    names = [f"p{i}" for i in range(pipelines)]
+    for label, options in CONFIGURATIONS:
+        shutil.rmtree("bench_backups", ignore_errors=True)
+        gc.collect()
+        tracemalloc.start()
+        kv_store = PipelineKVStore(backup_dir="bench_backups", change_feed_size=0, **options)
+        for i in range(pipelines):
+            add_pipeline(kv_store, i)
+        gc.collect()
+        held = tracemalloc.get_traced_memory()[0] / 1e6
+        tracemalloc.stop()
+        hot = names[:10]
+        hot_read = best_us(lambda: kv_store.get_pipeline(random.choice(hot)), ops)
+        random_read = best_us(lambda: kv_store.get_pipeline(random.choice(names)), ops)
+        write = best_us(lambda: add_pipeline(kv_store, random.randrange(pipelines)), ops // 10)
+        stats = kv_store.get_storage_stats("pipelines")["pipelines"]
+        ratio = f"ratio {stats['ratio']:.1f}" if stats.get('ratio') else ""
+        print(f"{label:7} held {held:7.1f} MB  hot read {hot_read:6.1f} us  random read {random_read:6.1f} us"
+              f"  add_pipeline {write:7.1f} us  {ratio}")
+        kv_store.close()
+    shutil.rmtree("bench_backups", ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
@@ -0,0 +1,85 @@
+import logging
+import os
+import sys
+import time
+
+import psutil
+
+from entry import Entry
+from store import AbstractKVStore
+
+logging.getLogger('remote_proxies').setLevel(logging.WARNING)
+
+STORE = "bench"
+OPS = 200_000
+
+
+def rss():
+    return psutil.Process().memory_info().rss
+
+
+def fill(count, make_entry):
+    exp_time = time.time() + 3600
+    return {f"key{i}": make_entry(i, exp_time + i) for i in range(count)}
+
+
+def memory_per_key(count, make_entry):
+    """Forks so each layout is measured against the same clean baseline."""
+    read_end, write_end = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        before = rss()
+        store = fill(count, make_entry)
+        os.write(write_end, str((rss() - before) / len(store)).encode())
+        os._exit(0)
+    os.close(write_end)
+    result = float(os.read(read_end, 64))
+    os.waitpid(pid, 0)
+    os.close(read_end)
+    return result
+
+
+def read_path_ops(store, is_expired):
+    keys = [f"key{i}" for i in range(0, len(store), max(1, len(store) // OPS))][:OPS]
+    now = time.time()
+    start = time.perf_counter()
+    for key in keys:
+        is_expired(store[key], now)
+    return len(keys) / (time.perf_counter() - start)
+
+
+def store_ops(count):
+    kv_store = AbstractKVStore(backup_dir="bench_backups")
+    kv_store.create_store(STORE)
+    exp_time = time.time() + 3600
+    kv_store._stores[STORE] = {f"key{i}": Entry(i, exp_time) for i in range(count)}
+    step = max(1, count // OPS)
+    keys = [f"key{i}" for i in range(0, count, step)][:OPS]
+    results = {}
+    for name, op in (("_get_key", lambda key: kv_store._get_key(STORE, key)),
+                     ("_add_key", lambda key: kv_store._add_key(STORE, key, value=1)),
+                     ("_edit_key", lambda key: kv_store._edit_key(STORE, key, value=2))):
+        start = time.perf_counter()
+        for key in keys:
+            op(key)
+        results[name] = len(keys) / (time.perf_counter() - start)
+    return results
+
+
+if __name__ == "__main__":
+    counts = [int(arg) for arg in sys.argv[1:]] or [1_000_000, 10_000_000]
+    for count in counts:
+        as_dict = memory_per_key(count, lambda i, exp_time: {'value': i, 'exp_time': exp_time})
+        as_entry = memory_per_key(count, lambda i, exp_time: Entry(i, exp_time))
+        print(f"{count:>10} keys  bytes/key: dict {as_dict:6.0f}  Entry {as_entry:6.0f}")
+
+    count = counts[0]
+    dict_store = fill(count, lambda i, exp_time: {'value': i, 'exp_time': exp_time})
+    dict_ops = read_path_ops(dict_store, lambda entry, now: 'exp_time' in entry and now > entry['exp_time'])
+    del dict_store
+    entry_store = fill(count, lambda i, exp_time: Entry(i, exp_time))
+    entry_ops = read_path_ops(entry_store, Entry.is_expired)
+    del entry_store
+    print(f"{count:>10} keys  lookup + expiry check ops/sec: dict {dict_ops:10.0f}  Entry {entry_ops:10.0f}")
+    for name, ops in store_ops(count).items():
+        print(f"{count:>10} keys  {name:<10} ops/sec {ops:10.0f}")
@@ -0,0 +1,50 @@
+import logging
+import shutil
+import sys
+import time
+
+from entry import Entry
+from eviction import EVICTION_POLICIES, entry_size
+from store import AbstractKVStore
+
+logging.getLogger('remote_proxies').setLevel(logging.WARNING)
+
+STORE = "bench"
+WRITES = 200_000
+
+
+def percentile(samples, fraction):
+    return samples[min(len(samples) - 1, int(len(samples) * fraction))] * 1e6
+
+
+def run(keys, policy, limited):
+    limit = keys * entry_size(f"key{keys:08d}", Entry(0, 0.0)) if limited else None
+    kv_store = AbstractKVStore(backup_dir="bench_backups", eviction_policy=policy,
+                               store_max_memory={STORE: limit} if limited else None)
+    kv_store.create_store(STORE)
+    for i in range(keys):
+        kv_store._add_key(STORE, f"key{i:08d}", value=i)
+    samples = []
+    # Every write adds a new key, so a limited store evicts once per write
+    for i in range(keys, keys + WRITES):
+        start = time.perf_counter()
+        kv_store._add_key(STORE, f"key{i:08d}", value=i)
+        samples.append(time.perf_counter() - start)
+        if i % 4 == 0:
+            kv_store._get_key(STORE, f"key{i - 1000:08d}")
+    stats = kv_store.get_memory_stats()["stores"][STORE]
+    kv_store.shutdown()
+    shutil.rmtree("bench_backups", ignore_errors=True)
+    samples.sort()
+    return samples, stats
+
+
+if __name__ == "__main__":
+    keys = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    print(f"{keys} keys, {WRITES} writes of new keys, _add_key latency in us")
+    samples, _ = run(keys, "noeviction", limited=False)
+    print(f"{'no limit':<24}{percentile(samples, 0.5):>8.2f}{percentile(samples, 0.99):>8.2f}")
+    for policy in EVICTION_POLICIES[1:]:
+        samples, stats = run(keys, policy, limited=True)
+        print(f"{'limit, ' + policy:<24}{percentile(samples, 0.5):>8.2f}{percentile(samples, 0.99):>8.2f}"
+              f"   evictions {stats['evictions']}")
@@ -0,0 +1,53 @@
+import logging
+import shutil
+import time
+
+from store import AbstractKVStore
+
+logging.getLogger('remote_proxies').setLevel(logging.WARNING)
+
+EXPIRED_PER_RUN = 100
+
+
+def full_scan_cleanup(kv_store):
+    """The cleanup loop body as it was before the expiration index."""
+    for store in kv_store._stores.values():
+        current_time = time.time()
+        expired_keys = [key for key, value_details in store.items() if current_time > value_details['exp_time']]
+        for key in expired_keys:
+            del store[key]
+
+
+def fill(kv_store, size):
+    kv_store.create_store("bench")
+    for i in range(size):
+        kv_store._add_key("bench", f"key{i}", value=i)
+
+
+def expire_some(kv_store):
+    for i in range(EXPIRED_PER_RUN):
+        kv_store._add_key("bench", f"expiring{i}", value=i, ttl=-1)
+
+
+def run(size):
+    kv_store = AbstractKVStore(backup_dir="bench_backups")
+    fill(kv_store, size)
+
+    expire_some(kv_store)
+    start = time.perf_counter()
+    full_scan_cleanup(kv_store)
+    scan_time = time.perf_counter() - start
+
+    expire_some(kv_store)
+    start = time.perf_counter()
+    kv_store._expire_due_keys()
+    index_time = time.perf_counter() - start
+
+    print(f"{size:>10} keys  full scan {scan_time * 1000:9.2f} ms  index {index_time * 1000:7.3f} ms")
+
+
+if __name__ == "__main__":
+    print(f"Cleanup cost with {EXPIRED_PER_RUN} expired keys per pass")
+    for size in (10_000, 100_000, 1_000_000):
+        run(size)
+    shutil.rmtree("bench_backups", ignore_errors=True)
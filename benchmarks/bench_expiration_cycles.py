@@ -0,0 +1,49 @@
+import logging
+import shutil
+import sys
+import time
+
+from entry import Entry
+from store import AbstractKVStore
+
+logging.getLogger('remote_proxies').setLevel(logging.WARNING)
+
+STORE = "bench"
+
+
+def build(mode, keys, expired):
+    kv_store = AbstractKVStore(backup_dir="bench_backups", expiration_mode=mode)
+    now = time.time()
+    entries = {f"key{i:08d}": Entry(i, now - 1 if i < expired else now + 3600) for i in range(keys)}
+    kv_store._install_store(STORE, entries)
+    return kv_store
+
+
+def run(mode, keys, expired, budget_ms):
+    kv_store = build(mode, keys, expired)
+    cycles = []
+    removed = 0
+    while True:
+        start = time.perf_counter()
+        count = kv_store._expire_due_keys(budget_ms=budget_ms)
+        cycles.append(time.perf_counter() - start)
+        removed += count
+        if count == 0 or len(cycles) >= 10_000:
+            break
+    left = sum(1 for entry in kv_store._stores[STORE].values() if entry.is_expired(time.time()))
+    kv_store.shutdown()
+    shutil.rmtree("bench_backups", ignore_errors=True)
+    return cycles, removed, left
+
+
+if __name__ == "__main__":
+    keys = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    for fraction in (0.25, 0.75):
+        expired = int(keys * fraction)
+        print(f"{keys} keys, {expired} expired at once; cycles run back to back")
+        for label, mode, budget_ms in (("indexed, unbounded", "indexed", float('inf')),
+                                       ("indexed, 25 ms budget", "indexed", 25),
+                                       ("sampled, 25 ms budget", "sampled", 25)):
+            cycles, removed, left = run(mode, keys, expired, budget_ms)
+            print(f"  {label:<24} cycles {len(cycles):>5}  longest {max(cycles) * 1000:8.1f} ms  "
+                  f"total {sum(cycles):6.2f} s  removed {removed:>7}  still stored {left:>7}")
@@ -0,0 +1,46 @@
+import logging
+import shutil
+import sys
+import time
+
+from store import AbstractKVStore
+
+logging.getLogger('remote_proxies').setLevel(logging.WARNING)
+
+STORE = "pipelines"
+STATUSES = ("Running", "Done", "Not Started")
+
+
+def fill(kv_store, count):
+    kv_store.mset(STORE, {f"pipeline{i}": {"creator": f"user{i % 50}", "stages": [],
+                                           "status": "Failed" if i % 1000 == 0 else STATUSES[i % 3]}
+                          for i in range(count)})
+
+
+def timed(fn, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = fn()
+    return (time.perf_counter() - start) / repeat * 1000, result
+
+
+if __name__ == "__main__":
+    counts = [int(arg) for arg in sys.argv[1:]] or [10_000, 100_000]
+    for count in counts:
+        for indexes in (None, {STORE: ["status", "creator"]}):
+            kv_store = AbstractKVStore(backup_dir="bench_backups", indexes=indexes)
+            kv_store.create_store(STORE)
+            start = time.perf_counter()
+            fill(kv_store, count)
+            write_rate = count / (time.perf_counter() - start)
+            if indexes is None:
+                ms, result = timed(lambda: [key for key, pipeline in kv_store._get_all_keys(STORE).items()
+                                            if pipeline["status"] == "Failed"], 3)
+                label = "list + filter"
+            else:
+                ms, result = timed(lambda: kv_store.query(STORE, "status", "Failed", objects=True), 20)
+                label = "indexed query"
+            print(f"{count:>8} pipelines  {label:<14} status=Failed ({len(result)} hits) {ms:9.3f} ms"
+                  f"  mset keys/sec {write_rate:9.0f}")
+            kv_store.shutdown()
+    shutil.rmtree("bench_backups", ignore_errors=True)
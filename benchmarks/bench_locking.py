@@ -0,0 +1,72 @@
+import logging
+import shutil
+import threading
+import time
+
+from locks import StripedLock
+from store import AbstractKVStore
+
+logging.getLogger('remote_proxies').setLevel(logging.WARNING)
+
+STORES = ("metrics", "secrets", "pipelines")
+THREADS = 8
+DURATION = 3.0
+
+
+class GlobalLockKVStore(AbstractKVStore):
+    """Every store shares one single-stripe lock, as before lock striping."""
+
+    def _new_store_lock(self):
+        if not hasattr(self, '_global_lock'):
+            self._global_lock = StripedLock(1)
+        return self._global_lock
+
+
+def worker(kv_store, store_name, stop, counts, slot):
+    ops = 0
+    i = 0
+    while not stop.is_set():
+        key = f"key{i % 1000}"
+        kv_store._add_key(store_name, key, value=i)
+        kv_store._get_key(store_name, key)
+        ops += 2
+        i += 1
+    counts[slot] = ops
+
+
+def backup_loop(kv_store, stop):
+    while not stop.is_set():
+        with kv_store._whole_store_lock("pipelines"):
+            kv_store.rotate_and_backup("pipelines", kv_store._stores["pipelines"])
+
+
+def run(store_cls, with_backup):
+    kv_store = store_cls(backup_dir="bench_backups", max_backups=2)
+    for store_name in STORES:
+        kv_store.create_store(store_name)
+    for i in range(20_000):
+        kv_store._add_key("pipelines", f"pipeline{i}", value={"status": "Running", "stages": list(range(10))})
+
+    stop = threading.Event()
+    counts = [0] * THREADS
+    threads = [threading.Thread(target=worker, args=(kv_store, STORES[n % 2], stop, counts, n))
+               for n in range(THREADS)]
+    if with_backup:
+        threads.append(threading.Thread(target=backup_loop, args=(kv_store, stop)))
+    for thread in threads:
+        thread.start()
+    time.sleep(DURATION)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    return sum(counts) / DURATION
+
+
+if __name__ == "__main__":
+    print(f"{THREADS} threads on metrics/secrets, ops/sec")
+    for with_backup in (False, True):
+        label = "with pipelines backup running" if with_backup else "no background backup"
+        before = run(GlobalLockKVStore, with_backup)
+        after = run(AbstractKVStore, with_backup)
+        print(f"{label:<32} global lock {before:>10.0f}  striped {after:>10.0f}")
+    shutil.rmtree("bench_backups", ignore_errors=True)
@@ -0,0 +1,75 @@
+import logging
+import shutil
+import sys
+import threading
+import timeit
+
+import Pyro4
+
+from store import AbstractKVStore
+
+logging.getLogger('remote_proxies').setLevel(logging.WARNING)
+
+STORE = "bench"
+ROUNDS = 15
+CONFIGURATIONS = (("no stats", {"operation_stats": False}),
+                  ("operation stats", {}),
+                  ("operation + lock stats", {"lock_stats": True}))
+
+
+def new_store(**options):
+    kv_store = AbstractKVStore(backup_dir="bench_backups", **options)
+    kv_store.create_store(STORE)
+    for i in range(1000):
+        kv_store._add_key(STORE, f"key{i}", value=1)
+    return kv_store
+
+
+def best_ns(samples, number):
+    """Rounds of every configuration are interleaved so machine noise hits them alike."""
+    return {label: min(times) / number * 1e9 for label, times in samples.items()}
+
+
+def in_process(ops):
+    stores = {label: new_store(**options) for label, options in CONFIGURATIONS}
+    results = {}
+    for name, number, op in (("_get_key", ops, lambda kv_store: kv_store._get_key(STORE, "key5")),
+                             ("_add_key", ops // 5, lambda kv_store: kv_store._add_key(STORE, "key5", value=2))):
+        samples = {label: [] for label in stores}
+        for _ in range(ROUNDS):
+            for label, kv_store in stores.items():
+                samples[label].append(timeit.timeit(lambda: op(kv_store), number=number))
+        results[name] = best_ns(samples, number)
+    for kv_store in stores.values():
+        kv_store.shutdown()
+    return results
+
+
+def over_pyro(ops):
+    daemon = Pyro4.Daemon()
+    stores = {label: new_store(**options) for label, options in CONFIGURATIONS}
+    uris = {label: daemon.register(kv_store) for label, kv_store in stores.items()}
+    threading.Thread(target=daemon.requestLoop, daemon=True).start()
+    proxies = {label: Pyro4.Proxy(uri) for label, uri in uris.items()}
+    samples = {label: [] for label in proxies}
+    for _ in range(ROUNDS):
+        for label, proxy in proxies.items():
+            samples[label].append(timeit.timeit(lambda: proxy._pyroInvoke("mget", (STORE, ["key5"]), {}),
+                                                number=ops))
+    for proxy in proxies.values():
+        proxy._pyroRelease()
+    daemon.shutdown()
+    for kv_store in stores.values():
+        kv_store.shutdown()
+    return {"mget over Pyro": best_ns(samples, ops)}
+
+
+if __name__ == "__main__":
+    ops = int(sys.argv[1]) if len(sys.argv) > 1 else 50_000
+    results = {**in_process(ops), **over_pyro(ops // 50)}
+    print(f"best of {ROUNDS} interleaved rounds, ns per call")
+    print(f"{'':<24}" + "".join(f"{name:>24}" for name in results))
+    for label, _ in CONFIGURATIONS:
+        cells = [f"{ns[label]:9.0f} ({ns[label] / ns['no stats'] - 1:+6.1%})" for ns in results.values()]
+        print(f"{label:<24}" + "".join(f"{cell:>24}" for cell in cells))
+    shutil.rmtree("bench_backups", ignore_errors=True)
@@ -0,0 +1,37 @@
+import logging
+import shutil
+import threading
+import time
+
+from store import AbstractKVStore
+
+logging.getLogger('remote_proxies').setLevel(logging.WARNING)
+
+THREADS = 4
+WRITES_PER_THREAD = 5_000
+
+
+def writer(kv_store, thread_id):
+    for i in range(WRITES_PER_THREAD):
+        kv_store._add_key("bench", f"key{thread_id}-{i}", value={"n": i, "payload": "x" * 64})
+
+
+def run(fsync):
+    kv_store = AbstractKVStore(backup_dir="bench_backups", oplog_fsync=fsync)
+    kv_store.create_store("bench")
+    threads = [threading.Thread(target=writer, args=(kv_store, n)) for n in range(THREADS)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    kv_store.close()
+    shutil.rmtree("bench_backups", ignore_errors=True)
+    return THREADS * WRITES_PER_THREAD / elapsed
+
+
+if __name__ == "__main__":
+    print(f"{THREADS} writer threads, writes/sec")
+    for fsync in (None, "os", "interval", "always"):
+        print(f"{str(fsync):<10} {run(fsync):>10.0f}")
@@ -0,0 +1,95 @@
+import logging
+import multiprocessing
+import shutil
+import socket
+import statistics
+import sys
+import time
+
+import Pyro4
+
+from store import AbstractKVStore
+
+logging.getLogger('remote_proxies').setLevel(logging.WARNING)
+
+STORE = "bench"
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("localhost", 0))
+        return sock.getsockname()[1]
+
+
+def serve(port, backup_dir, replica_of=None):
+    logging.getLogger('remote_proxies').setLevel(logging.WARNING)
+    kv_store = AbstractKVStore(backup_dir=backup_dir, replica_of=replica_of)
+    kv_store.create_store(STORE)
+    kv_store.start_tasks()
+    daemon = Pyro4.Daemon(host="localhost", port=port)
+    daemon.register(kv_store, objectId="key_value_store")
+    daemon.requestLoop()
+
+
+def connect(port):
+    proxy = Pyro4.Proxy(f"PYRO:key_value_store@localhost:{port}")
+    while True:
+        try:
+            proxy._pyroBind()
+            return proxy
+        except Pyro4.errors.CommunicationError:
+            time.sleep(0.05)
+
+
+def wait_until(condition):
+    while not condition():
+        pass
+
+
+def main(keys=10_000, samples=200):
+    shutil.rmtree("bench_backups", ignore_errors=True)
+    primary_port, replica_port = free_port(), free_port()
+    processes = [multiprocessing.Process(target=serve, args=(primary_port, "bench_backups/primary"), daemon=True)]
+    processes[0].start()
+    primary = connect(primary_port)
+    for start in range(0, keys, 1000):
+        primary.mset(STORE, {f"key{i}": {"value": {"status": "running", "n": i}} for i in range(start, start + 1000)})
+
+    started = time.perf_counter()
+    processes.append(multiprocessing.Process(
+        target=serve, args=(replica_port, "bench_backups/replica", f"PYRO:key_value_store@localhost:{primary_port}"),
+        daemon=True))
+    processes[1].start()
+    replica = connect(replica_port)
+    wait_until(lambda: replica.replication_status()["state"] == "streaming")
+    bootstrap = time.perf_counter() - started
+
+    visible = []
+    for i in range(samples):
+        started = time.perf_counter()
+        primary.mset(STORE, {"probe": {"value": i}})
+        wait_until(lambda: replica.mget(STORE, ["probe"])["probe"] == i)
+        visible.append((time.perf_counter() - started) * 1e3)
+
+    started = time.perf_counter()
+    for start in range(0, keys, 1000):
+        primary.mset(STORE, {f"key{i}": {"value": i} for i in range(start, start + 1000)})
+    wait_until(lambda: replica.mget(STORE, [f"key{keys - 1}"])[f"key{keys - 1}"] == keys - 1)
+    burst = time.perf_counter() - started
+    status = replica.replication_status()
+
+    print(f"bootstrap of {keys} keys {bootstrap * 1e3:8.1f} ms")
+    print(f"write visible on replica  median {statistics.median(visible):6.2f} ms  "
+          f"p99 {sorted(visible)[int(samples * 0.99) - 1]:6.2f} ms")
+    print(f"{keys} writes replicated in {burst * 1e3:8.1f} ms  applied {status['applied']}  "
+          f"lag {status['lag_seconds']}")
+    for proxy in (primary, replica):
+        proxy._pyroRelease()
+    for process in reversed(processes):
+        process.terminate()
+        process.join()
+    shutil.rmtree("bench_backups", ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
@@ -0,0 +1,66 @@
+import json
+import logging
+import os
+import resource
+import shutil
+import sys
+import time
+
+import backups
+from store import AbstractKVStore
+
+logging.getLogger('remote_proxies').setLevel(logging.WARNING)
+
+BACKUP_DIR = "bench_backups"
+STORES = 4
+
+
+def write_backups(keys_per_store):
+    os.makedirs(BACKUP_DIR, exist_ok=True)
+    exp_time = time.time() + 3600
+    for s in range(STORES):
+        content = {f"pipeline{i}": {"creator": "bench", "description": "x" * 64, "status": "Running",
+                                    "stages": [{"name": f"stage{n}", "status": "Done"} for n in range(3)],
+                                    "exp_time": exp_time} for i in range(keys_per_store)}
+        with open(backups.backup_path(BACKUP_DIR, f"store{s}", 1), 'w') as f:
+            json.dump(content, f, ensure_ascii=False, indent=4)
+
+
+def sequential_json_load():
+    stores = {}
+    for s in range(STORES):
+        with open(backups.backup_path(BACKUP_DIR, f"store{s}", 1)) as f:
+            stores[f"store{s}"] = json.load(f)
+    return stores
+
+
+def restore():
+    AbstractKVStore(backup_dir=BACKUP_DIR, use_backup=True)
+
+
+def measure(label, fn):
+    """Runs ``fn`` in a child process so each variant reports its own peak RSS."""
+    pid = os.fork()
+    if pid == 0:
+        start = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - start
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+        print(f"{label:<24} {elapsed:7.2f} s  peak RSS {peak:7.0f} MiB", flush=True)
+        os._exit(0)
+    os.waitpid(pid, 0)
+
+
+if __name__ == "__main__":
+    keys_per_store = int(sys.argv[1]) if len(sys.argv) > 1 else 250_000
+    # Written from a child so the parent, and the children measured below, start small
+    pid = os.fork()
+    if pid == 0:
+        write_backups(keys_per_store)
+        os._exit(0)
+    os.waitpid(pid, 0)
+    size = sum(os.path.getsize(os.path.join(BACKUP_DIR, name)) for name in os.listdir(BACKUP_DIR))
+    print(f"{STORES} stores x {keys_per_store} keys, {size / 1024 ** 3:.2f} GiB of backups", flush=True)
+    measure("sequential json.load", sequential_json_load)
+    measure("load_from_backup", restore)
+    shutil.rmtree(BACKUP_DIR, ignore_errors=True)
@@ -0,0 +1,47 @@
+import logging
+import shutil
+import sys
+import time
+
+from entry import Entry
+from keyindex import SortedKeyIndex
+from store import AbstractKVStore
+
+logging.getLogger('remote_proxies').setLevel(logging.WARNING)
+
+STORE = "bench"
+QUERIES = 1000
+
+
+def timed(label, fn, repeat=1):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    elapsed = (time.perf_counter() - start) / repeat
+    print(f"{label:<40} {elapsed * 1e6:12.1f} us")
+
+
+if __name__ == "__main__":
+    keys = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    kv_store = AbstractKVStore(backup_dir="bench_backups")
+    exp_time = time.time() + 3600
+    entries = {f"tenant{i % 1000:04d}:job{i:08d}": Entry(i, exp_time) for i in range(keys)}
+    kv_store._install_store(STORE, entries)
+    print(f"{keys} keys, 1000 tenants")
+
+    timed("prefix page of 100, linear filter", lambda: [key for key in kv_store._stores[STORE]
+                                                       if key.startswith("tenant0500:")][:100], 5)
+    timed("prefix page of 100, scan", lambda: kv_store.scan(STORE, match="tenant0500:", count=100), QUERIES)
+    timed("glob page of 100, scan", lambda: kv_store.scan(STORE, match="tenant0500:job*7", count=100), QUERIES)
+
+    index = SortedKeyIndex()
+    new_keys = [f"new{i:08d}" for i in range(100_000)]
+    start = time.perf_counter()
+    for key in new_keys:
+        index.add(key)
+    print(f"{'index add':<40} {(time.perf_counter() - start) / len(new_keys) * 1e6:12.2f} us")
+    start = time.perf_counter()
+    for i in range(100_000):
+        kv_store._add_key(STORE, f"added{i:08d}", value=i)
+    print(f"{'_add_key of a new key':<40} {(time.perf_counter() - start) / 100_000 * 1e6:12.2f} us")
+    shutil.rmtree("bench_backups", ignore_errors=True)
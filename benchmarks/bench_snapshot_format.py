@@ -0,0 +1,47 @@
+import os
+import shutil
+import sys
+import time
+
+import backups
+
+BACKUP_DIR = "bench_backups"
+
+
+def make_entries(count):
+    exp_time = time.time() + 3600
+    return {f"pipeline{i}": {"creator": "bench", "description": "nightly load " * 4, "status": "Running",
+                             "metadata": {"team": f"team{i % 10}"}, "cfg": {"retries": 3, "token": os.urandom(16)},
+                             "stages": [{"name": f"stage{n}", "status": "Done"} for n in range(3)],
+                             "exp_time": exp_time} for i in range(count)}
+
+
+def run(label, backup_format, compression, entries):
+    path = backups.backup_path(BACKUP_DIR, "bench", 1, backup_format)
+    start = time.perf_counter()
+    if backup_format == "msgpack":
+        backups.write_snapshot(path, "bench", entries, compression=compression)
+    else:
+        backups.write_json_backup(path, entries)
+    write_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    loaded, _, _ = backups.load_store_backup(BACKUP_DIR, "bench", 1, time.time())
+    read_time = time.perf_counter() - start
+    assert len(loaded) == len(entries)
+
+    size = os.path.getsize(path) / 1024 ** 2
+    print(f"{label:<16} write {write_time:6.2f} s  read {read_time:6.2f} s  size {size:8.1f} MiB")
+    os.remove(path)
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    os.makedirs(BACKUP_DIR, exist_ok=True)
+    entries = make_entries(count)
+    print(f"{count} pipeline entries")
+    run("json indent=4", "json", None, entries)
+    run("msgpack", "msgpack", None, entries)
+    run("msgpack + zlib", "msgpack", "zlib", entries)
+    run("msgpack + lzma", "msgpack", "lzma", entries)
+    shutil.rmtree(BACKUP_DIR, ignore_errors=True)
@@ -0,0 +1,46 @@
+import logging
+import shutil
+import sys
+import timeit
+
+from store import AbstractKVStore
+
+logging.getLogger('remote_proxies').setLevel(logging.WARNING)
+
+STORE = "bench"
+ROUNDS = 25
+SAMPLE_EVERY = (16, 64, 256, 1024)
+
+
+def new_store(**options):
+    kv_store = AbstractKVStore(backup_dir="bench_backups", **options)
+    kv_store.create_store(STORE)
+    for i in range(1000):
+        kv_store._add_key(STORE, f"key{i}", value=1)
+    return kv_store
+
+
+def main(ops=50_000):
+    """Overhead of operation stats on in-process calls by sampling rate; rounds are interleaved."""
+    stores = {"off": new_store(operation_stats=False)}
+    stores.update((f"1 in {n}", new_store(stats_sample_every=n)) for n in SAMPLE_EVERY)
+    print(f"best of {ROUNDS} interleaved rounds, ns per call")
+    print(f"{'':<12}{'_get_key':>20}{'_add_key':>20}")
+    results = {}
+    for name, number, op in (("_get_key", ops, lambda kv_store: kv_store._get_key(STORE, "key5")),
+                             ("_add_key", ops // 5, lambda kv_store: kv_store._add_key(STORE, "key5", value=2))):
+        samples = {label: [] for label in stores}
+        for _ in range(ROUNDS):
+            for label, kv_store in stores.items():
+                samples[label].append(timeit.timeit(lambda: op(kv_store), number=number))
+        results[name] = {label: min(times) / number * 1e9 for label, times in samples.items()}
+    for label in stores:
+        cells = [f"{ns[label]:7.0f} ({ns[label] / ns['off'] - 1:+6.1%})" for ns in results.values()]
+        print(f"{label:<12}" + "".join(f"{cell:>20}" for cell in cells))
+    for kv_store in stores.values():
+        kv_store.shutdown()
+    shutil.rmtree("bench_backups", ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:]))
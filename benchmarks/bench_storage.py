@@ -0,0 +1,64 @@
+import logging
+import random
+import shutil
+import sys
+import time
+import timeit
+
+from store import AbstractKVStore
+
+logging.getLogger('remote_proxies').setLevel(logging.WARNING)
+
+STORE = "bench"
+ROUNDS = 7
+
+
+def new_store(engine, cache_size=10_000):
+    return AbstractKVStore(backup_dir="bench_backups", storage_engine=engine, storage_cache_size=cache_size)
+
+
+def fill(kv_store, keys):
+    kv_store.create_store(STORE)
+    kv_store.mset(STORE, {f"key{i}": {"value": {"status": "running", "stages": list(range(20))}}
+                          for i in range(keys)})
+
+
+def best_us(stmt, number):
+    return min(timeit.repeat(stmt, number=number, repeat=ROUNDS)) / number * 1e6
+
+
+def main(keys=20_000, ops=20_000):
+    shutil.rmtree("bench_backups", ignore_errors=True)
+    names = [f"key{i}" for i in range(keys)]
+    results = {}
+    for engine, cache_size in (("memory", None), ("sqlite", 10_000)):
+        kv_store = new_store(engine, cache_size or 10_000)
+        fill(kv_store, keys)
+        hot = names[:100]
+        for key in hot:
+            kv_store._get_key(STORE, key)
+        results[engine, "hot _get_key"] = best_us(lambda: kv_store._get_key(STORE, random.choice(hot)), ops)
+        results[engine, "random _get_key"] = best_us(lambda: kv_store._get_key(STORE, random.choice(names)), ops)
+        results[engine, "missing _get_key"] = best_us(lambda: kv_store._get_key(STORE, "nope"), ops)
+        results[engine, "_add_key"] = best_us(
+            lambda: kv_store._add_key(STORE, random.choice(names), value={"status": "done"}), ops // 10)
+        if engine == "memory":
+            kv_store.rotate_and_backup(STORE, kv_store._snapshot(STORE))
+        kv_store.close()
+
+        start = time.perf_counter()
+        reopened = new_store(engine)
+        if engine == "memory":
+            reopened.load_from_backup()
+        results[engine, "restart (ms)"] = (time.perf_counter() - start) * 1e3
+        assert len(reopened._stores[STORE]) == keys
+        reopened.close()
+        shutil.rmtree("bench_backups", ignore_errors=True)
+
+    print(f"{keys} keys, sqlite cache of 10000 entries (best of {ROUNDS}, us per op)")
+    for name in ("hot _get_key", "random _get_key", "missing _get_key", "_add_key", "restart (ms)"):
+        print(f"{name:18} memory {results['memory', name]:10.2f}  sqlite {results['sqlite', name]:10.2f}")
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
@@ -0,0 +1,68 @@
+import gc
+import logging
+import random
+import shutil
+import sys
+import timeit
+import tracemalloc
+
+from store import AbstractKVStore
+
+logging.getLogger('remote_proxies').setLevel(logging.WARNING)
+
+STORE = "pipelines"
+ROUNDS = 7
+
+
+def pipeline(i):
+    return {"value": None, "status": "running", "cfg": {f"option{n}": f"{i}-{n}" * 20 for n in range(100)},
+            "errors": [f"stage {n} failed" * 5 for n in range(20)]}
+
+
+def held_bytes(build):
+    gc.collect()
+    tracemalloc.start()
+    kv_store = build()
+    gc.collect()
+    held = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return kv_store, held
+
+
+def best_us(stmt, number):
+    return min(timeit.repeat(stmt, number=number, repeat=ROUNDS)) / number * 1e6
+
+
+def main(keys=2000, ops=2000):
+    shutil.rmtree("bench_backups", ignore_errors=True)
+    names = [f"p{i}" for i in range(keys)]
+    results = {}
+    for engine in ("memory", "tiered"):
+        def build():
+            kv_store = AbstractKVStore(backup_dir="bench_backups", storage_engine=engine, spill_size=16 * 1024,
+                                       change_feed_size=0)
+            kv_store.create_store(STORE)
+            for name in names:
+                kv_store._add_key(STORE, name, **pipeline(0))
+            kv_store._add_key(STORE, "small", value=1)
+            return kv_store
+
+        kv_store, results[engine, "held MB"] = held_bytes(build)
+        results[engine, "held MB"] /= 1e6
+        hot = names[:10]
+        results[engine, "small _get_key"] = best_us(lambda: kv_store._get_key(STORE, "small"), ops * 10)
+        results[engine, "hot _get_object"] = best_us(lambda: kv_store._get_object(STORE, random.choice(hot)), ops)
+        results[engine, "random _get_object"] = best_us(
+            lambda: kv_store._get_object(STORE, random.choice(names)), ops)
+        results[engine, "_add_key"] = best_us(lambda: kv_store._add_key(STORE, random.choice(names), **pipeline(1)),
+                                              ops // 10)
+        kv_store.close()
+        shutil.rmtree("bench_backups", ignore_errors=True)
+
+    print(f"{keys} pipelines of about 30 KB, spill_size 16 KB (best of {ROUNDS}, us per op)")
+    for name in ("held MB", "small _get_key", "hot _get_object", "random _get_object", "_add_key"):
+        print(f"{name:20} memory {results['memory', name]:10.2f}  tiered {results['tiered', name]:10.2f}")
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
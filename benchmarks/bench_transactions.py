@@ -0,0 +1,52 @@
+import logging
+import shutil
+import sys
+import threading
+import time
+
+import Pyro4
+
+from plugins.workflows import WorkflowsPlugin
+from store import AbstractKVStore
+
+logging.getLogger('remote_proxies').setLevel(logging.WARNING)
+
+
+class PipelineKVStore(AbstractKVStore, WorkflowsPlugin):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        WorkflowsPlugin.__init__(self)
+
+
+def separate_calls(proxy, pipeline_id):
+    proxy.add_pipeline(pipeline_id, "bench")
+    for stage in ("build", "test", "deploy"):
+        proxy.add_stage_to_pipeline(pipeline_id, stage)
+    proxy.edit_pipeline(pipeline_id, new_description="running")
+
+
+def one_transaction(proxy, pipeline_id):
+    operations = [{"op": "add_pipeline", "key": pipeline_id, "creator": "bench"}]
+    operations += [{"op": "add_stage_to_pipeline", "key": pipeline_id, "stage_name": stage}
+                   for stage in ("build", "test", "deploy")]
+    operations.append({"op": "edit_pipeline", "key": pipeline_id, "new_description": "running"})
+    proxy.transaction(operations)
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    kv_store = PipelineKVStore(backup_dir="bench_backups")
+    daemon = Pyro4.Daemon()
+    uri = daemon.register(kv_store)
+    threading.Thread(target=daemon.requestLoop, daemon=True).start()
+    print(f"{count} pipelines created with 3 stages and a description edit, over Pyro on loopback")
+    with Pyro4.Proxy(uri) as proxy:
+        for label, create in (("5 separate calls", separate_calls), ("1 transaction", one_transaction)):
+            start = time.perf_counter()
+            for i in range(count):
+                create(proxy, f"{label}-{i}")
+            elapsed = time.perf_counter() - start
+            print(f"{label:<18} pipelines/sec {count / elapsed:8.0f}  ms each {elapsed / count * 1000:6.3f}")
+    daemon.shutdown()
+    kv_store.shutdown()
+    shutil.rmtree("bench_backups", ignore_errors=True)
@@ -0,0 +1,63 @@
+import logging
+import random
+import shutil
+import sys
+import threading
+import timeit
+
+from store import AbstractKVStore
+
+logging.getLogger('remote_proxies').setLevel(logging.WARNING)
+
+STORE = "bench"
+ROUNDS = 7
+
+
+def best_us(stmt, number):
+    return min(timeit.repeat(stmt, number=number, repeat=ROUNDS)) / number * 1e6
+
+
+def main(keys=10_000, ops=20_000):
+    names = [f"key{i}" for i in range(keys)]
+    results = {}
+    for label, versions in (("off", 0), ("mvcc 8", 8)):
+        shutil.rmtree("bench_backups", ignore_errors=True)
+        kv_store = AbstractKVStore(backup_dir="bench_backups", mvcc_versions=versions, change_feed_size=0,
+                                   operation_stats=False)
+        kv_store.create_store(STORE)
+        kv_store.mset(STORE, {name: {"value": 0} for name in names})
+        results[label, "incr"] = best_us(lambda: kv_store.incr(STORE, random.choice(names)), ops)
+        results[label, "mset of 10"] = best_us(
+            lambda: kv_store.mset(STORE, {name: {"value": 1} for name in random.sample(names, 10)}), ops // 10)
+        results[label, "mget_objects of 100"] = best_us(lambda: kv_store.mget_objects(STORE, random.sample(names, 100)), ops // 10)
+        if versions:
+            results[label, "mget_as_of 100"] = best_us(
+                lambda: kv_store.mget_as_of(STORE, random.sample(names, 100)), ops // 10)
+            old = kv_store.current_version() - 1000
+            results[label, "mget_as_of 100 old"] = best_us(
+                lambda: kv_store.mget_as_of(STORE, random.sample(names, 100), old), ops // 10)
+
+            # A reader looping over snapshots next to a writer: the writer is never held up
+            stop = threading.Event()
+
+            def read():
+                while not stop.is_set():
+                    kv_store.mget_as_of(STORE, names[:1000])
+            reader = threading.Thread(target=read)
+            reader.start()
+            results[label, "incr, reader running"] = best_us(lambda: kv_store.incr(STORE, random.choice(names)),
+                                                             ops // 10)
+            stop.set()
+            reader.join()
+        kv_store.shutdown()
+    shutil.rmtree("bench_backups", ignore_errors=True)
+
+    print(f"{keys} keys (best of {ROUNDS}, us per call)")
+    for name in ("incr", "mset of 10", "mget_objects of 100"):
+        print(f"{name:22} off {results['off', name]:8.2f}  mvcc 8 {results['mvcc 8', name]:8.2f}")
+    for name in ("mget_as_of 100", "mget_as_of 100 old", "incr, reader running"):
+        print(f"{name:22}              mvcc 8 {results['mvcc 8', name]:8.2f}")
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
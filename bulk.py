@@ -0,0 +1,127 @@
+import json
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+import msgpack
+import serpent
+
+import backups
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger('remote_proxies')
+
+FORMATS = ("ndjson", "msgpack")
+# Entries per export page or import call; about a megabyte of small entries
+CHUNK_SIZE = 5000
+
+
+def pack(obj):
+    """Packs ``obj`` into one msgpack blob, to travel over Pyro as a single bytes value.
+
+    Serpent would carry the bytes nested in entries as base64 dicts, which
+    the receiving end cannot tell from dict values.
+    """
+    return msgpack.packb(obj, use_bin_type=True, default=backups.msgpack_default)
+
+
+def unpack(data):
+    """Returns what ``pack`` packed; accepts the blob as serpent delivers bytes across Pyro, too."""
+    return msgpack.unpackb(serpent.tobytes(data), raw=False, strict_map_key=False)
+
+
+def pack_entries(pairs):
+    """Packs ``(key, entry dict)`` pairs, as ``export_entries`` and ``import_entries`` move them."""
+    return pack(list(pairs))
+
+
+def unpack_entries(data):
+    """Returns the ``[key, entry dict]`` pairs of ``pack_entries``."""
+    return unpack(data)
+
+
+def write_records(f, file_format, store_name, pairs):
+    """Writes entries to a binary file, one ``{"store", "key", "entry"}`` record each."""
+    if file_format == "ndjson":
+        dumps = json.JSONEncoder(ensure_ascii=False, default=backups.json_default).encode
+        f.write("".join(dumps({"store": store_name, "key": key, "entry": entry}) + "\n"
+                        for key, entry in pairs).encode())
+    else:
+        packer = msgpack.Packer(use_bin_type=True, default=backups.msgpack_default)
+        f.write(b"".join(packer.pack({"store": store_name, "key": key, "entry": entry}) for key, entry in pairs))
+
+
+def iter_records(f, file_format):
+    """Yields the ``(store, key, entry)`` records of a binary file written by ``write_records``."""
+    if file_format == "ndjson":
+        decode = backups._decoder.decode
+        records = (decode(line.decode()) for line in f if line.strip())
+    else:
+        records = msgpack.Unpacker(f, raw=False, strict_map_key=False)
+    for number, record in enumerate(records, 1):
+        try:
+            yield record["store"], record["key"], record["entry"]
+        except (KeyError, TypeError):
+            raise ValueError(f"Record {number} is not a {{store, key, entry}} object")
+
+
+def export_stores(proxy, store_names, f, file_format="ndjson", chunk_size=CHUNK_SIZE):
+    """Writes every entry of the stores to ``f``, returning ``{store: entries written}``.
+
+    Pages come from ``export_entries``; the next one is fetched while the
+    current one is written, so only two pages are ever held.
+    """
+    counts = {}
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        for store_name in store_names:
+            pending = executor.submit(proxy.export_entries, store_name, None, chunk_size)
+            counts[store_name] = 0
+            while pending is not None:
+                page = pending.result()
+                if page is None:
+                    logger.error(f"Store {store_name} does not exist.")
+                    break
+                cursor = page["cursor"]
+                pending = None if cursor is None else executor.submit(proxy.export_entries, store_name, cursor,
+                                                                      chunk_size)
+                pairs = unpack_entries(page["data"])
+                write_records(f, file_format, store_name, pairs)
+                counts[store_name] += len(pairs)
+    return counts
+
+
+def import_stores(proxy, f, file_format="ndjson", chunk_size=CHUNK_SIZE, replace=True):
+    """Writes the records of ``f`` to the server, creating missing stores; returns ``{store: entries written}``.
+
+    Records are sent ``chunk_size`` at a time with ``import_entries`` while
+    the next chunk is read, so at most two chunks are held. Entries keep
+    their expiry time and version.
+    """
+    counts = {}
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        pending = None
+
+        def send(store_name, pairs):
+            nonlocal pending
+            if pending is not None:
+                _count(counts, *pending)
+            pending = (store_name, executor.submit(proxy.import_entries, store_name, pack_entries(pairs), replace))
+
+        store_name, pairs = None, []
+        for record_store, key, entry in iter_records(f, file_format):
+            if record_store != store_name or len(pairs) >= chunk_size:
+                if pairs:
+                    send(store_name, pairs)
+                if record_store not in counts:
+                    proxy.create_store(record_store)
+                    counts[record_store] = 0
+                store_name, pairs = record_store, []
+            pairs.append((key, entry))
+        if pairs:
+            send(store_name, pairs)
+        if pending is not None:
+            _count(counts, *pending)
+    return counts
+
+
+def _count(counts, store_name, future):
+    counts[store_name] += future.result()
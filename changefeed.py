@@ -0,0 +1,81 @@
+import threading
+import time
+
+
+class ChangeFeed:
+    """The last ``capacity`` store mutations, numbered by a global sequence.
+
+    Records are ``(seq, time, op, store, key, entry)`` tuples in a fixed
+    ring, so reading from any retained sequence number is a direct index. Readers asking for records that were
+    already overwritten are told they ``missed`` some and should resync.
+    Records keep the replaced entries alive until the ring wraps around.
+    """
+
+    def __init__(self, capacity=100_000):
+        if capacity < 1:
+            raise ValueError("capacity must be a positive integer")
+        self.capacity = capacity
+        self._ring = [None] * capacity
+        self._seq = 0
+        self._lock = threading.Lock()
+        self._cond = threading.Condition(self._lock)
+        self._waiting = 0
+
+    @property
+    def last_seq(self):
+        return self._seq
+
+    def publish(self, op, store_name, key=None, entry=None):
+        now = time.time()
+        with self._lock:
+            self._seq += 1
+            self._ring[self._seq % self.capacity] = (self._seq, now, op, store_name, key, entry)
+            # Waking is costly next to the append, only pay for it when a reader is waiting
+            if self._waiting:
+                self._cond.notify_all()
+            return self._seq
+
+    def read(self, after=0, store_name=None, prefix="", limit=100, timeout=0):
+        """Returns ``(records, cursor, missed)`` for records after sequence ``after``.
+
+        Only records of ``store_name`` (any store when None) whose key starts
+        with ``prefix`` are returned; store creation and deletion always
+        match their store. Waits up to ``timeout`` seconds for a matching
+        record. At most ``10 * limit`` records are examined per call, so the
+        returned ``cursor`` may advance with nothing returned.
+        """
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            if after > self._seq:
+                # A cursor from before a restart, when the sequence began again
+                return [], self._seq, True
+            while True:
+                oldest = max(1, self._seq - self.capacity + 1)
+                missed = after + 1 < oldest
+                seq = max(after + 1, oldest)
+                last = min(self._seq, seq + 10 * limit - 1)
+                records = []
+                while seq <= last and len(records) < limit:
+                    record = self._ring[seq % self.capacity]
+                    if self._matches(record, store_name, prefix):
+                        records.append(record)
+                    seq += 1
+                after = max(after, seq - 1)
+                if records or missed or after < self._seq:
+                    return records, after, missed
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return records, after, missed
+                self._waiting += 1
+                try:
+                    self._cond.wait(remaining)
+                finally:
+                    self._waiting -= 1
+
+    @staticmethod
+    def _matches(record, store_name, prefix):
+        if store_name is not None and record[3] != store_name:
+            return False
+        key = record[4]
+        # Only strings match a non-empty prefix, as in StoreKeyIndex.page
+        return key is None or not prefix or (type(key) is str and key.startswith(prefix))
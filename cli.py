@@ -1,13 +1,21 @@
 import click
+import functools
+import json
 import logging
 import signal
 
 import Pyro4
 
+import backups
+import bulk
+from cluster import ClusterProxy
+from eviction import EVICTION_POLICIES
+
 from plugins.metrics import MetricsPlugin
 from plugins.nas import PathManagementMixin
 from plugins.sensitive import SecretsPlugin
 from plugins.workflows import WorkflowsPlugin
+from storage import COMPRESSION_CODECS, MEMORY, STORAGE_ENGINES
 from store import AbstractKVStore
 
 logging.basicConfig(level=logging.INFO)
@@ -23,23 +31,101 @@ class EnhancedKVStore(AbstractKVStore, MetricsPlugin, SecretsPlugin, WorkflowsPl
         PathManagementMixin.__init__(self, *args, **kwargs)
 
 
+def _scan_pages(scan_page, match, page_size):
+    """Yields every ``(key, entry)`` of a scan, fetching one small page per call."""
+    cursor = None
+    while True:
+        page = scan_page(cursor, match, page_size)
+        yield from page["entries"].items()
+        cursor = page["cursor"]
+        if cursor is None:
+            return
+
+
+def _connect(host, port):
+    """Returns a proxy of the server at host:port, or a router over the nodes given with --cluster."""
+    nodes = (click.get_current_context().obj or {}).get("cluster")
+    if nodes:
+        return ClusterProxy(nodes)
+    return Pyro4.Proxy(f"PYRO:key_value_store@{host}:{port}")
+
+
+def _per_node(proxy, method, *args):
+    """Yields the result of a call about one server, once per node when talking to a cluster."""
+    if not isinstance(proxy, ClusterProxy):
+        yield getattr(proxy, method)(*args)
+        return
+    for node, result in proxy.each(method, *args).items():
+        click.echo(f"[{node}]")
+        yield result
+
+
+def _store_engines(ctx, param, values):
+    engines = {}
+    for value in values:
+        store_name, _, engine = value.partition('=')
+        if not store_name or engine not in STORAGE_ENGINES:
+            raise click.BadParameter(f"expected STORE=ENGINE with ENGINE one of {', '.join(STORAGE_ENGINES)}")
+        engines[store_name] = engine
+    return engines
+
+
+def _json_argument(text, name):
+    try:
+        return json.loads(text)
+    except ValueError as e:
+        raise click.BadParameter(f"not valid JSON: {e}", param_hint=name)
+
+
 @click.group()
-def cli():
+@click.option('--cluster', envvar='KVV_CLUSTER', default=None, metavar='HOST:PORT,...',
+              help='Talk to a cluster of servers sharing the keys instead of to --host/--port.')
+@click.pass_context
+def cli(ctx, cluster):
     """Command line interface for managing the KV Store."""
-    pass
+    ctx.obj = {"cluster": cluster.split(',') if cluster else None}
 
 
 @cli.command()  # Marks the function as a command within the CLI group
 @click.option('--host', default="localhost", help='Host for the KV Store server.')
 @click.option('--port', default=6666, type=int, help='Port for the KV Store server.')
 @click.option('--use-backup', is_flag=True, help='Load the key-value store from the most recent backup on startup.')
-def start_server(host, port, use_backup):
+@click.option('--storage-engine', default=MEMORY, type=click.Choice(STORAGE_ENGINES),
+              help='Where stores keep their entries.')
+@click.option('--store-engine', 'store_engines', multiple=True, callback=_store_engines, metavar='STORE=ENGINE',
+              help='Storage engine of one store, e.g. pipelines=sqlite. Repeatable.')
+@click.option('--spill-size', default=64 * 1024, type=int, help='Tiered stores spill values of this many bytes.')
+@click.option('--spill-after', default=None, type=float,
+              help='Tiered stores spill values unread for this many seconds.')
+@click.option('--compression', default="zlib", type=click.Choice(COMPRESSION_CODECS),
+              help='Codec of compressed stores.')
+@click.option('--compression-min-size', default=1024, type=int,
+              help='Compressed stores compress values of this many bytes.')
+@click.option('--mvcc-versions', default=0, type=int,
+              help='Old versions kept per key for reads as of a commit version.')
+@click.option('--replica-of', default=None, metavar='URI',
+              help='Run as a read-only replica of the primary at this Pyro URI.')
+@click.option('--operation-stats/--no-operation-stats', default=True,
+              help='Sample call counts and latencies for operation-stats.')
+def start_server(host, port, use_backup, storage_engine, store_engines, spill_size, spill_after, compression,
+                 compression_min_size, replica_of, mvcc_versions, operation_stats):
     """Starts the KV Store server."""
     storage = EnhancedKVStore(
-        collect_metrics=True,
+        # Replicas take their metrics store from the primary
+        collect_metrics=replica_of is None,
         backup_dir="test_backups",
+        backup_mode="background",
         metrics_interval=5,
-        use_backup=use_backup
+        use_backup=use_backup,
+        storage_engine=storage_engine,
+        store_engines=store_engines,
+        spill_size=spill_size,
+        spill_after=spill_after,
+        compression=compression,
+        compression_min_size=compression_min_size,
+        replica_of=replica_of,
+        mvcc_versions=mvcc_versions,
+        operation_stats=operation_stats
     )
     storage.start_tasks()
 
@@ -49,7 +135,7 @@ def start_server(host, port, use_backup):
 
     def signal_handler(sig, frame):
         logger.info('Signal received, shutting down...')
-        storage.shutdown()
+        storage.close()
         daemon.shutdown()
         logger.info("Server has been shut down.")
 
@@ -71,7 +157,7 @@ def start_server(host, port, use_backup):
 @click.option('--cleanup-frequency', type=int, help="New cleanup frequency in seconds.")
 def update_config(host, port, backup_dir, metrics_interval, status_ttl, cleanup_frequency):
     """Updates the KV Store server's configuration."""
-    with Pyro4.Proxy(f"PYRO:key_value_store@{host}:{port}") as proxy:
+    with _connect(host, port) as proxy:
         proxy.update_configuration(
             backup_dir=backup_dir,
             metrics_interval=metrics_interval,
@@ -86,10 +172,154 @@ def update_config(host, port, backup_dir, metrics_interval, status_ttl, cleanup_
 @click.option('--port', default=6666, type=int, help='Port for the KV Store server.')
 def show_config(host, port):
     """Displays the current KV Store server's configuration."""
-    with Pyro4.Proxy(f"PYRO:key_value_store@{host}:{port}") as proxy:
-        config = proxy.get_configuration()
-        for key, value in config.items():
-            click.echo(f"{key}: {value}")
+    with _connect(host, port) as proxy:
+        for config in _per_node(proxy, "get_configuration"):
+            for key, value in config.items():
+                click.echo(f"{key}: {value}")
+
+
+@cli.command(name="backup-stats")
+@click.option('--host', default="localhost", help='Host for the KV Store server.')
+@click.option('--port', default=6666, type=int, help='Port for the KV Store server.')
+def backup_stats(host, port):
+    """Displays per-store backup statistics."""
+    with _connect(host, port) as proxy:
+        for stats in _per_node(proxy, "get_backup_stats"):
+            for store_name, store_stats in stats.items():
+                click.echo(f"{store_name}:")
+                for key, value in store_stats.items():
+                    click.echo(f"  {key}: {value}")
+
+
+@cli.command(name="memory-stats")
+@click.option('--host', default="localhost", help='Host for the KV Store server.')
+@click.option('--port', default=6666, type=int, help='Port for the KV Store server.')
+def memory_stats(host, port):
+    """Displays memory usage, limits and eviction counters."""
+    with _connect(host, port) as proxy:
+        for stats in _per_node(proxy, "get_memory_stats"):
+            click.echo(f"used_memory: {stats['used_memory']}")
+            click.echo(f"max_memory: {stats['max_memory']}")
+            click.echo(f"eviction_policy: {stats['eviction_policy']}")
+            for store_name, store_stats in stats['stores'].items():
+                click.echo(f"{store_name}:")
+                for key, value in store_stats.items():
+                    click.echo(f"  {key}: {value}")
+
+
+@cli.command(name="operation-stats")
+@click.option('--store', 'store_name', default=None, help='Only this store.')
+@click.option('--reset', is_flag=True, help='Start the counts over once read.')
+@click.option('--host', default="localhost", help='Host for the KV Store server.')
+@click.option('--port', default=6666, type=int, help='Port for the KV Store server.')
+def operation_stats(store_name, reset, host, port):
+    """Displays call counts, latency percentiles (us) and hit ratios per store and operation."""
+    with _connect(host, port) as proxy:
+        for stats in _per_node(proxy, "get_operation_stats", store_name, reset):
+            if stats['sample_every'] is None:
+                click.echo("operation stats are off, the server was started with --no-operation-stats")
+            else:
+                click.echo(f"sampling 1 in {stats['sample_every']} calls")
+            for name, operations in stats['operations'].items():
+                click.echo(f"{name}:")
+                for op, op_stats in operations.items():
+                    latency = op_stats['latency']
+                    line = (f"  {op}: calls {op_stats['calls']}  p50 {latency['p50_us']:.1f}"
+                            f"  p99 {latency['p99_us']:.1f}  p99.9 {latency['p99.9_us']:.1f}"
+                            f"  max {latency['max_us']:.1f}")
+                    if 'hit_ratio' in op_stats:
+                        line += f"  hit ratio {op_stats['hit_ratio']:.3f}"
+                    click.echo(line)
+            for name, locks in stats['locks'].items():
+                click.echo(f"{name} locks: wait p99 {locks['wait']['p99_us']:.1f}"
+                           f"  hold p99 {locks['hold']['p99_us']:.1f}")
+
+
+@cli.command(name="storage-stats")
+@click.option('--store', 'store_name', default=None, help='Only this store.')
+@click.option('--host', default="localhost", help='Host for the KV Store server.')
+@click.option('--port', default=6666, type=int, help='Port for the KV Store server.')
+def storage_stats(store_name, host, port):
+    """Displays the storage engine of each store with its key count, cache, disk, spill or compression counters."""
+    with _connect(host, port) as proxy:
+        for store_stats in _per_node(proxy, "get_storage_stats", store_name):
+            for name, stats in store_stats.items():
+                line = f"{name}: {stats['engine']}  keys {stats['keys']}"
+                if 'cached' in stats:
+                    lookups = stats['cache_hits'] + stats['cache_misses']
+                    hit_ratio = stats['cache_hits'] / lookups if lookups else 0.0
+                    line += (f"  cached {stats['cached']}  cache hit ratio {hit_ratio:.3f}"
+                             f"  disk {stats['disk_bytes']} bytes")
+                if 'spilled_keys' in stats:
+                    line += (f"  spilled {stats['spilled_keys']} ({stats['blob_bytes']} bytes)"
+                             f"  spills {stats['spilled']}+{stats['spilled_cold']} cold  promoted {stats['promoted']}"
+                             f"  blob reads {stats['blob_reads']}  cache hits {stats['cache_hits']}")
+                if 'compressed_keys' in stats:
+                    line += (f"  {stats['codec']} {stats['compressed_keys']} keys  ratio {stats['ratio'] or 0:.2f}"
+                             f"  compress {stats['compress_us']:.1f} us  decompress {stats['decompress_us']:.1f} us")
+                click.echo(line)
+
+
+@cli.command(name="replication-status")
+@click.option('--host', default="localhost", help='Host for the KV Store server.')
+@click.option('--port', default=6666, type=int, help='Port for the KV Store server.')
+def replication_status(host, port):
+    """Displays the primary, state and lag of a replica."""
+    with _connect(host, port) as proxy:
+        for status in _per_node(proxy, "replication_status"):
+            if status is None:
+                click.echo("Not a replica.")
+                continue
+            lag = "unknown" if status['lag_seconds'] is None else f"{status['lag_seconds']:.3f} s"
+            click.echo(f"Replica of {status['primary']}: {status['state']}  cursor {status['cursor']}"
+                       f"  applied {status['applied']}  bootstraps {status['bootstraps']}  lag {lag}")
+            if status['last_error']:
+                click.echo(f"Last error: {status['last_error']}")
+
+
+@cli.command(name="add-node")
+@click.argument('node', metavar='HOST:PORT')
+def add_node(node):
+    """Adds a running server to the --cluster and moves to it the keys it now owns."""
+    nodes = click.get_current_context().obj["cluster"]
+    if not nodes:
+        raise click.ClickException("Give the current nodes with --cluster or KVV_CLUSTER.")
+    with ClusterProxy(nodes) as proxy:
+        moved = proxy.add_node(node)
+        click.echo(f"Moved {moved} keys to {node}.")
+        click.echo(f"Clients must now use --cluster {','.join(proxy.nodes)}")
+
+
+@cli.command(name="set-memory-limit")
+@click.argument('max_memory', type=int)
+@click.option('--policy', default=None, type=click.Choice(EVICTION_POLICIES), help='Eviction policy.')
+@click.option('--store', 'store_name', default=None, help='Store to limit; the global limit if omitted.')
+@click.option('--host', default="localhost", help='Host for the KV Store server.')
+@click.option('--port', default=6666, type=int, help='Port for the KV Store server.')
+def set_memory_limit(max_memory, policy, store_name, host, port):
+    """Sets a memory limit in bytes; 0 removes it."""
+    with _connect(host, port) as proxy:
+        if proxy.set_memory_limit(max_memory or None, policy, store_name):
+            click.echo("Memory limit updated.")
+        else:
+            click.echo(f"Store '{store_name}' does not exist.")
+
+
+@cli.command(name="inspect-backup")
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--entries', is_flag=True, help='Also print every entry of the backup.')
+def inspect_backup(path, entries):
+    """Prints a binary backup as JSON for human inspection."""
+    with open(path, 'rb') as f:
+        header = backups.read_snapshot_header(f)
+    click.echo(f"store: {header['store']}")
+    click.echo(f"created: {header['created']}")
+    click.echo(f"count: {header['count']}")
+    click.echo(f"compression: {header['compression']}")
+    click.echo(f"blocks: {len(header['blocks'])}")
+    if entries:
+        for key, entry in backups.iter_snapshot(path):
+            click.echo(json.dumps({key: entry}, ensure_ascii=False, default=backups.json_default))
 
 
 @cli.command(name="shutdown")
@@ -99,7 +329,7 @@ def show_config(host, port):
               help='Name of the task to shut down. Leave empty to shut down all tasks.')
 def shutdown_task(host, port, task_name):
     """Shuts down a specific task or all tasks in the KV Store server."""
-    with Pyro4.Proxy(f"PYRO:key_value_store@{host}:{port}") as proxy:
+    with _connect(host, port) as proxy:
         if task_name:
             proxy.shutdown(task_name=task_name)
             logger.info(f"Shutdown signal sent to task: {task_name}")
@@ -114,7 +344,7 @@ def shutdown_task(host, port, task_name):
 @click.option('--task-name', default=None, type=str, help='Name of the task to start. Leave empty to start all tasks.')
 def start_task(host, port, task_name):
     """Starts a specific task or all tasks in the KV Store server."""
-    with Pyro4.Proxy(f"PYRO:key_value_store@{host}:{port}") as proxy:
+    with _connect(host, port) as proxy:
         if task_name:
             proxy.start_tasks(task_name=task_name)
             logger.info(f"Start signal sent to task: {task_name}")
@@ -129,7 +359,7 @@ def start_task(host, port, task_name):
 @click.argument('store_name')
 def create_store(host, port, store_name):
     """Creates a new store."""
-    with Pyro4.Proxy(f"PYRO:key_value_store@{host}:{port}") as proxy:
+    with _connect(host, port) as proxy:
         result = proxy.create_store(store_name)
         if result:
             click.echo(f"Store '{store_name}' created successfully.")
@@ -143,7 +373,7 @@ def create_store(host, port, store_name):
 @click.argument('store_name')
 def delete_store(host, port, store_name):
     """Deletes a store."""
-    with Pyro4.Proxy(f"PYRO:key_value_store@{host}:{port}") as proxy:
+    with _connect(host, port) as proxy:
         result = proxy.delete_store(store_name)
         if result:
             click.echo(f"Store '{store_name}' deleted successfully.")
@@ -156,13 +386,301 @@ def delete_store(host, port, store_name):
 @click.option('--port', default=6666, help='Port for the KV Store server.')
 def list_stores(host, port):
     """Lists all stores."""
-    with Pyro4.Proxy(f"PYRO:key_value_store@{host}:{port}") as proxy:
+    with _connect(host, port) as proxy:
         stores = proxy.list_stores()
         click.echo("Stores:")
         for store in stores:
             click.echo(f"- {store}")
 
 
+@cli.command(name="scan")
+@click.argument('store_name')
+@click.option('--match', default=None, help='Key prefix, or a glob such as "job-*-done".')
+@click.option('--page-size', default=100, type=int, help='Entries fetched per call.')
+@click.option('--host', default="localhost", help='Host for the KV Store server.')
+@click.option('--port', default=6666, type=int, help='Port for the KV Store server.')
+def scan(store_name, match, page_size, host, port):
+    """Lists the keys of a store in order, one page at a time."""
+    with _connect(host, port) as proxy:
+        for key, entry in _scan_pages(functools.partial(proxy.scan, store_name), match, page_size):
+            click.echo(f"{key}: {entry['value']}")
+
+
+@cli.command(name="export")
+@click.argument('store_names', nargs=-1, metavar='[STORE]...')
+@click.option('--output', default='-', type=click.File('wb'), help='File to write to; - for stdout.')
+@click.option('--format', 'file_format', default="ndjson", type=click.Choice(bulk.FORMATS),
+              help='One JSON object per line, or a stream of msgpack maps.')
+@click.option('--chunk-size', default=bulk.CHUNK_SIZE, type=int, help='Entries fetched per call.')
+@click.option('--host', default="localhost", help='Host for the KV Store server.')
+@click.option('--port', default=6666, type=int, help='Port for the KV Store server.')
+def export_stores(store_names, output, file_format, chunk_size, host, port):
+    """Streams stores, all of them if none are given, as one {store, key, entry} record per entry."""
+    with _connect(host, port) as proxy:
+        stores = proxy.list_stores()
+        for store_name in store_names:
+            if store_name not in stores:
+                raise click.ClickException(f"Store '{store_name}' does not exist.")
+        counts = bulk.export_stores(proxy, store_names or stores, output, file_format, chunk_size)
+    for store_name, count in counts.items():
+        click.echo(f"Exported {count} entries of store '{store_name}'.", err=True)
+
+
+@cli.command(name="import")
+@click.option('--input', 'input_file', default='-', type=click.File('rb'), help='File to read from; - for stdin.')
+@click.option('--format', 'file_format', default="ndjson", type=click.Choice(bulk.FORMATS),
+              help='Format the records were exported in.')
+@click.option('--chunk-size', default=bulk.CHUNK_SIZE, type=int, help='Entries sent per call.')
+@click.option('--replace/--no-replace', default=True, help='Overwrite keys the stores already hold.')
+@click.option('--host', default="localhost", help='Host for the KV Store server.')
+@click.option('--port', default=6666, type=int, help='Port for the KV Store server.')
+def import_stores(input_file, file_format, chunk_size, replace, host, port):
+    """Writes the records of an export back, creating the stores they belong to."""
+    with _connect(host, port) as proxy:
+        try:
+            counts = bulk.import_stores(proxy, input_file, file_format, chunk_size, replace)
+        except ValueError as e:
+            raise click.ClickException(f"Cannot read the input: {e}")
+    for store_name, count in counts.items():
+        click.echo(f"Imported {count} entries into store '{store_name}'.", err=True)
+
+
+@cli.command(name="mget")
+@click.argument('store_name')
+@click.argument('keys', nargs=-1, required=True)
+@click.option('--objects', is_flag=True, help='Print full entries instead of values.')
+@click.option('--as-of', 'as_of', default=None, type=int,
+              help='Read full entries as they were at this commit version (needs --mvcc-versions).')
+@click.option('--snapshot', is_flag=True, help='Read full entries as one consistent snapshot of the latest version.')
+@click.option('--host', default="localhost", help='Host for the KV Store server.')
+@click.option('--port', default=6666, type=int, help='Port for the KV Store server.')
+def mget(store_name, keys, objects, as_of, snapshot, host, port):
+    """Retrieves several keys of a store in one call."""
+    with _connect(host, port) as proxy:
+        if as_of is not None or snapshot:
+            snapshot = proxy.mget_as_of(store_name, list(keys), as_of)
+            if snapshot is None:
+                raise click.ClickException("That version is not kept, or the server keeps no old versions.")
+            click.echo(f"version: {snapshot['version']}")
+            results = snapshot['entries']
+        else:
+            results = proxy.mget_objects(store_name, list(keys)) if objects else proxy.mget(store_name, list(keys))
+        for key, value in results.items():
+            click.echo(f"{key}: {value}")
+
+
+@cli.command(name="mset")
+@click.argument('store_name')
+@click.argument('items')
+@click.option('--host', default="localhost", help='Host for the KV Store server.')
+@click.option('--port', default=6666, type=int, help='Port for the KV Store server.')
+def mset(store_name, items, host, port):
+    """Writes several keys of a store in one call.
+
+    ITEMS is a JSON object mapping each key to its fields, e.g.
+    '{"a": {"value": 1, "ttl": 60}, "b": {"value": 2, "readonly": true}}'.
+    """
+    items = _json_argument(items, "ITEMS")
+    if not isinstance(items, dict):
+        raise click.BadParameter("must be a JSON object", param_hint="ITEMS")
+    with _connect(host, port) as proxy:
+        results = proxy.mset(store_name, items)
+        for key, written in results.items():
+            click.echo(f"{key}: {'written' if written else 'not written'}")
+
+
+@cli.command(name="mdelete")
+@click.argument('store_name')
+@click.argument('keys', nargs=-1, required=True)
+@click.option('--host', default="localhost", help='Host for the KV Store server.')
+@click.option('--port', default=6666, type=int, help='Port for the KV Store server.')
+def mdelete(store_name, keys, host, port):
+    """Deletes several keys of a store in one call."""
+    with _connect(host, port) as proxy:
+        results = proxy.mdelete(store_name, list(keys))
+        for key, deleted in results.items():
+            click.echo(f"{key}: {'deleted' if deleted else 'not found'}")
+
+
+@cli.command(name="incr")
+@click.argument('store_name')
+@click.argument('key')
+@click.argument('amount', default=1, type=float)
+@click.option('--ttl', default=None, type=int, help='Reset the time to live of the key.')
+@click.option('--host', default="localhost", help='Host for the KV Store server.')
+@click.option('--port', default=6666, type=int, help='Port for the KV Store server.')
+def incr(store_name, key, amount, ttl, host, port):
+    """Adds AMOUNT (default 1) to a numeric key."""
+    amount = int(amount) if amount.is_integer() else amount
+    with _connect(host, port) as proxy:
+        value = proxy.incr(store_name, key, amount, ttl)
+        click.echo(value if value is not None else f"Key {key} could not be incremented.")
+
+
+@cli.command(name="compare-and-set")
+@click.argument('store_name')
+@click.argument('key')
+@click.argument('expected_version', type=int)
+@click.argument('value')
+@click.option('--ttl', default=None, type=int, help='Time to live for the key.')
+@click.option('--host', default="localhost", help='Host for the KV Store server.')
+@click.option('--port', default=6666, type=int, help='Port for the KV Store server.')
+def compare_and_set(store_name, key, expected_version, value, ttl, host, port):
+    """Writes VALUE (JSON) only if KEY is still at EXPECTED_VERSION, 0 for a new key."""
+    value = _json_argument(value, "VALUE")
+    with _connect(host, port) as proxy:
+        result = proxy.compare_and_set(store_name, key, expected_version, value, ttl)
+        if result["ok"]:
+            click.echo(f"Written, now at version {result['version']}.")
+        else:
+            click.echo(f"Conflict: key is at version {result['version']}.")
+
+
+@cli.command(name="set-in")
+@click.argument('store_name')
+@click.argument('key')
+@click.argument('path')
+@click.argument('value')
+@click.option('--merge', is_flag=True, help='Deep-merge VALUE into the item instead of replacing it.')
+@click.option('--host', default="localhost", help='Host for the KV Store server.')
+@click.option('--port', default=6666, type=int, help='Port for the KV Store server.')
+def set_in(store_name, key, path, value, merge, host, port):
+    """Sets the item at PATH (dot separated) inside KEY's value to VALUE (JSON)."""
+    path = path.split(".") if path else []
+    value = _json_argument(value, "VALUE")
+    with _connect(host, port) as proxy:
+        update = proxy.merge_in if merge else proxy.set_in
+        click.echo("Update successful." if update(store_name, key, path, value) else f"Key {key} could not be updated.")
+
+
+@cli.command(name="list-append")
+@click.argument('store_name')
+@click.argument('key')
+@click.argument('item')
+@click.option('--max-len', default=None, type=int, help='Keep only the last MAX_LEN items.')
+@click.option('--host', default="localhost", help='Host for the KV Store server.')
+@click.option('--port', default=6666, type=int, help='Port for the KV Store server.')
+def list_append(store_name, key, item, max_len, host, port):
+    """Appends ITEM (JSON) to the list stored at KEY."""
+    item = _json_argument(item, "ITEM")
+    with _connect(host, port) as proxy:
+        length = proxy.list_append(store_name, key, item, max_len)
+        click.echo(f"{length} items." if length is not None else f"Could not append to key {key}.")
+
+
+@cli.command(name="transaction")
+@click.argument('operations')
+@click.option('--watch', default=None, help='JSON list of {"store_name", "key", "version"} that must be unchanged.')
+@click.option('--host', default="localhost", help='Host for the KV Store server.')
+@click.option('--port', default=6666, type=int, help='Port for the KV Store server.')
+def transaction(operations, watch, host, port):
+    """Runs OPERATIONS, a JSON list of operations, as one unit.
+
+    e.g. '[{"op": "set", "store_name": "s", "key": "a", "value": 1},
+    {"op": "incr", "store_name": "s", "key": "n"}]'.
+    """
+    operations = _json_argument(operations, "OPERATIONS")
+    watch = _json_argument(watch, "--watch") if watch else None
+    with _connect(host, port) as proxy:
+        result = proxy.transaction(operations, watch)
+        if result["ok"]:
+            for operation, op_result in zip(operations, result["results"]):
+                click.echo(f"{operation['op']} {operation['key']}: {op_result}")
+        elif "error" in result:
+            click.echo(f"Rejected: {result['error']}")
+        else:
+            for conflict in result["conflicts"]:
+                click.echo(f"Conflict: {conflict['store_name']}/{conflict['key']} is at version {conflict['version']}")
+
+
+@cli.command(name="watch")
+@click.option('--store', 'store_name', default=None, help='Only changes of this store.')
+@click.option('--prefix', default="", help='Only changes of keys starting with this prefix.')
+@click.option('--after', default=None, type=int, help='Resume after this sequence number instead of starting now.')
+@click.option('--host', default="localhost", help='Host for the KV Store server.')
+@click.option('--port', default=6666, type=int, help='Port for the KV Store server.')
+def watch(store_name, prefix, after, host, port):
+    """Prints changes as they happen, until interrupted."""
+    with _connect(host, port) as proxy:
+        while True:
+            changes = proxy.get_changes(store_name, prefix, after, 100, 30)
+            if changes is None:
+                raise click.ClickException("The change feed is disabled on the server.")
+            if changes["missed"]:
+                click.echo(f"Missed changes before sequence {changes['cursor']}, reread the store to catch up.")
+            for event in changes["events"]:
+                target = f"{event['store']}/{event['key']}" if 'key' in event else event['store']
+                value = event['entry']['value'] if 'entry' in event else ''
+                click.echo(f"{event['seq']} {event['op']} {target} {value}".rstrip())
+            after = changes["cursor"]
+
+
+@cli.command(name="create-index")
+@click.argument('store_name')
+@click.argument('field')
+@click.option('--host', default="localhost", help='Host for the KV Store server.')
+@click.option('--port', default=6666, type=int, help='Port for the KV Store server.')
+def create_index(store_name, field, host, port):
+    """Indexes STORE_NAME on FIELD, a dotted entry field such as status or metadata.team."""
+    with _connect(host, port) as proxy:
+        if proxy.create_index(store_name, field):
+            click.echo(f"Indexed {store_name}.{field}.")
+        else:
+            click.echo(f"Store {store_name} does not exist, it will be indexed once created.")
+
+
+@cli.command(name="drop-index")
+@click.argument('store_name')
+@click.argument('field')
+@click.option('--host', default="localhost", help='Host for the KV Store server.')
+@click.option('--port', default=6666, type=int, help='Port for the KV Store server.')
+def drop_index(store_name, field, host, port):
+    """Drops the index of STORE_NAME on FIELD."""
+    with _connect(host, port) as proxy:
+        if proxy.drop_index(store_name, field):
+            click.echo(f"Dropped index {store_name}.{field}.")
+        else:
+            click.echo(f"Store {store_name} has no index on {field}.")
+
+
+@cli.command(name="list-indexes")
+@click.option('--store', 'store_name', default=None, help='Only this store.')
+@click.option('--host', default="localhost", help='Host for the KV Store server.')
+@click.option('--port', default=6666, type=int, help='Port for the KV Store server.')
+def list_indexes(store_name, host, port):
+    """Lists the secondary indexes and the number of keys each covers."""
+    with _connect(host, port) as proxy:
+        for name, fields in proxy.list_indexes(store_name).items():
+            for field, count in fields.items():
+                click.echo(f"{name}.{field}: {count} keys")
+
+
+@cli.command(name="query")
+@click.argument('store_name')
+@click.argument('field')
+@click.argument('value', required=False)
+@click.option('--low', default=None, help='Lowest value of a range (JSON or plain text).')
+@click.option('--high', default=None, help='Highest value of a range (JSON or plain text).')
+@click.option('--limit', default=None, type=int, help='Return at most this many keys.')
+@click.option('--objects', is_flag=True, help='Print full entries instead of keys.')
+@click.option('--host', default="localhost", help='Host for the KV Store server.')
+@click.option('--port', default=6666, type=int, help='Port for the KV Store server.')
+def query(store_name, field, value, low, high, limit, objects, host, port):
+    """Finds the keys whose indexed FIELD equals VALUE, or lies between --low and --high."""
+    def parse(text):
+        try:
+            return json.loads(text) if text is not None else None
+        except ValueError:
+            return text
+
+    with _connect(host, port) as proxy:
+        result = proxy.query(store_name, field, parse(value), parse(low), parse(high), limit, objects)
+        if result is None:
+            raise click.ClickException(f"Cannot query {store_name}.{field}; is it indexed?")
+        for item in (result.items() if objects else result):
+            click.echo(f"{item[0]}: {item[1]}" if objects else item)
+
+
 @cli.command(name="add-internal-key")
 @click.argument('key')
 @click.argument('value')
@@ -172,7 +690,7 @@ def list_stores(host, port):
 @click.option('--port', default=6666, type=int, help='Port for the KV Store server.')
 def add_internal_key(key, value, ttl, readonly, host, port):
     """Adds a key to the internal store."""
-    with Pyro4.Proxy(f"PYRO:key_value_store@{host}:{port}") as proxy:
+    with _connect(host, port) as proxy:
         proxy.add_internal_key(key, value, ttl, readonly)
         click.echo(f"Key '{key}' added to the internal store.")
 
@@ -183,7 +701,7 @@ def add_internal_key(key, value, ttl, readonly, host, port):
 @click.option('--port', default=6666, type=int, help='Port for the KV Store server.')
 def delete_internal_key(key, host, port):
     """Deletes a key from the internal store."""
-    with Pyro4.Proxy(f"PYRO:key_value_store@{host}:{port}") as proxy:
+    with _connect(host, port) as proxy:
         proxy.delete_internal_key(key)
         click.echo(f"Key '{key}' deleted from the internal store.")
 
@@ -197,7 +715,7 @@ def delete_internal_key(key, host, port):
 @click.option('--port', default=6666, type=int, help='Port for the KV Store server.')
 def edit_internal_key(key, value, ttl, readonly, host, port):
     """Edits an existing key within the internal store."""
-    with Pyro4.Proxy(f"PYRO:key_value_store@{host}:{port}") as proxy:
+    with _connect(host, port) as proxy:
         proxy.edit_internal_key(key, value, ttl, readonly)
         click.echo(f"Key '{key}' has been updated in the internal store.")
 
@@ -208,7 +726,7 @@ def edit_internal_key(key, value, ttl, readonly, host, port):
 @click.option('--port', default=6666, type=int, help='Port for the KV Store server.')
 def get_internal_key(key, host, port):
     """Retrieves the value of a key from the internal store."""
-    with Pyro4.Proxy(f"PYRO:key_value_store@{host}:{port}") as proxy:
+    with _connect(host, port) as proxy:
         value = proxy.get_internal_key(key)
         click.echo(f"Value of '{key}': {value}")
 
@@ -216,24 +734,26 @@ def get_internal_key(key, host, port):
 @cli.command(name="get-all-internal-keys")
 @click.option('--host', default="localhost", help='Host for the KV Store server.')
 @click.option('--port', default=6666, type=int, help='Port for the KV Store server.')
-def get_all_internal_keys(host, port):
+@click.option('--match', default=None, help='Key prefix or glob.')
+@click.option('--page-size', default=100, type=int, help='Keys fetched per call.')
+def get_all_internal_keys(host, port, match, page_size):
     """Retrieves all keys and their values from the internal store."""
-    with Pyro4.Proxy(f"PYRO:key_value_store@{host}:{port}") as proxy:
-        keys_values = proxy.get_all_internal_keys()
+    with _connect(host, port) as proxy:
         click.echo("Internal keys and their values:")
-        for key, value in keys_values.items():
+        for key, value in _scan_pages(proxy.scan_internal_keys, match, page_size):
             click.echo(f"{key}: {value}")
 
 
 @cli.command(name="list-pipelines")
 @click.option('--host', default="localhost", help='Host for the KV Store server.')
 @click.option('--port', default=6666, type=int, help='Port for the KV Store server.')
-def list_pipelines(host, port):
+@click.option('--match', default=None, help='Pipeline id prefix or glob.')
+@click.option('--page-size', default=100, type=int, help='Pipelines fetched per call.')
+def list_pipelines(host, port, match, page_size):
     """Lists all pipelines."""
-    with Pyro4.Proxy(f"PYRO:key_value_store@{host}:{port}") as proxy:
-        pipelines = proxy.list_pipelines()
+    with _connect(host, port) as proxy:
         click.echo("Pipelines:")
-        for pipeline in pipelines:
+        for pipeline, _ in _scan_pages(proxy.scan_pipelines, match, page_size):
             click.echo(f"- {pipeline}")
 
 
@@ -243,7 +763,7 @@ def list_pipelines(host, port):
 @click.option('--port', default=6666, type=int, help='Port for the KV Store server.')
 def get_pipeline(pipeline_id, host, port):
     """Retrieves a specific pipeline by its ID."""
-    with Pyro4.Proxy(f"PYRO:key_value_store@{host}:{port}") as proxy:
+    with _connect(host, port) as proxy:
         pipeline = proxy.get_pipeline(pipeline_id)
         if pipeline:
             click.echo(f"Pipeline '{pipeline_id}': {pipeline}")
@@ -260,7 +780,7 @@ def get_pipeline(pipeline_id, host, port):
 @click.option('--port', default=6666, type=int, help='Port for the KV Store server.')
 def add_update_path(host, port, label, env, system, path):
     """Adds or updates a path for a given label, environment, and system."""
-    with Pyro4.Proxy(f"PYRO:key_value_store@{host}:{port}") as proxy:
+    with _connect(host, port) as proxy:
         proxy.add_or_update_path(label, env, system, path)
         click.echo(f"Path for '{label}' in {env}/{system} updated to: {path}")
 
@@ -273,7 +793,7 @@ def add_update_path(host, port, label, env, system, path):
 @click.option('--port', default=6666, type=int, help='Port for the KV Store server.')
 def get_path(host, port, label, env, system):
     """Retrieves a specific path for a given label, environment, and system."""
-    with Pyro4.Proxy(f"PYRO:key_value_store@{host}:{port}") as proxy:
+    with _connect(host, port) as proxy:
         path = proxy.get_path(label, env, system)
         if path:
             click.echo(f"Path for '{label}' in {env}/{system}: {path}")
@@ -289,7 +809,7 @@ def get_path(host, port, label, env, system):
 def update_paths_object(host, port, label, new_paths):
     """Updates the entire paths object for a given label."""
     paths = click.format_filename(new_paths)
-    with Pyro4.Proxy(f"PYRO:key_value_store@{host}:{port}") as proxy:
+    with _connect(host, port) as proxy:
         proxy.update_paths_object(label, paths)
         click.echo(f"Paths object for '{label}' updated.")
 
@@ -297,14 +817,15 @@ def update_paths_object(host, port, label, new_paths):
 @cli.command(name="get-all-paths")
 @click.option('--host', default="localhost", help='Host for the KV Store server.')
 @click.option('--port', default=6666, type=int, help='Port for the KV Store server.')
-def get_all_paths(host, port):
+@click.option('--match', default=None, help='Label prefix or glob.')
+@click.option('--page-size', default=100, type=int, help='Labels fetched per call.')
+def get_all_paths(host, port, match, page_size):
     """Retrieves all paths."""
-    with Pyro4.Proxy(f"PYRO:key_value_store@{host}:{port}") as proxy:
-        paths = proxy.get_all_paths()
+    with _connect(host, port) as proxy:
         click.echo("All paths:")
-        for label, env_paths in paths.items():
+        for label, entry in _scan_pages(proxy.scan_paths, match, page_size):
             click.echo(f"{label}:")
-            for env, system_paths in env_paths.items():
+            for env, system_paths in entry['value'].items():
                 for system, path in system_paths.items():
                     click.echo(f"  {env}/{system}: {path}")
 
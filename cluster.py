@@ -0,0 +1,345 @@
+import bisect
+import functools
+import hashlib
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import Pyro4
+
+import bulk
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger('remote_proxies')
+
+VIRTUAL_NODES = 128
+MOVE_BATCH_SIZE = 1000
+# Longest wait on any one server while other servers may already have changes to return
+CHANGES_POLL_SLICE = 0.25
+
+# Calls about one key, routed to the server owning it: method -> (position, name) of the key argument
+KEYED = {name: (1, "key") for name in ("incr", "decr", "compare_and_set", "set_in", "merge_in", "list_append")}
+KEYED.update({name: (0, "key") for name in ("add_internal_key", "delete_internal_key", "edit_internal_key",
+                                            "get_internal_key", "add_confidential_key", "get_confidential_key")})
+KEYED.update({name: (0, "label") for name in ("add_or_update_path", "get_path", "update_paths_object",
+                                              "edit_specific_path")})
+KEYED.update({name: (0, "pipeline_id") for name in ("get_pipeline", "add_pipeline", "edit_pipeline",
+                                                    "delete_pipeline", "add_stage_to_pipeline",
+                                                    "edit_stage_in_pipeline", "delete_stage_from_pipeline",
+                                                    "log_pipeline_error", "log_stage_error")})
+# Batch calls, split by owner and sent in parallel: method -> position of the keys (a list or a dict)
+BATCHED = {"mget": 1, "mget_objects": 1, "mset": 1, "mdelete": 1, "put_entries": 1}
+# Paged scans, merged in key order: method -> position of the cursor, followed by match and count
+SCANS = {"scan": 1, "scan_pipelines": 0, "scan_paths": 0, "scan_internal_keys": 0}
+# Queries, merged in key order: method -> position of the limit
+QUERIES = {"query": 5, "query_pipelines": 4}
+# Calls whose results are one mapping per server, merged into one
+MERGED = ("list_pipelines", "get_all_paths", "get_all_internal_keys")
+# Calls every server must run, e.g. creating a store or starting tasks
+BROADCAST = ("create_store", "delete_store", "create_index", "drop_index", "set_memory_limit",
+             "update_configuration", "start_tasks", "shutdown", "start_task_by_name", "shutdown_task_by_name",
+             "cleanup", "compact_oplog", "restore_store", "load_from_backup", "wait_for_backups")
+# Calls describing one server, answered as {node: result}
+PER_NODE = ("get_configuration", "get_backup_stats", "get_memory_stats", "get_operation_stats",
+            "get_storage_stats", "replication_status", "current_version", "display")
+
+
+def node_address(node):
+    """Returns ``host:port`` for a node given as ``host:port`` or as a Pyro URI of the store."""
+    return node.rsplit("@", 1)[-1].strip()
+
+
+def node_uri(node):
+    return f"PYRO:key_value_store@{node_address(node)}"
+
+
+def _hash(text):
+    return int.from_bytes(hashlib.md5(text.encode()).digest()[:8], "big")
+
+
+class HashRing:
+    """Consistent hashing of keys onto nodes, each node placed at many points of the ring.
+
+    Adding a node only takes keys over from the others, about an equal share
+    from each, and never moves keys between the nodes that were already there.
+    """
+
+    def __init__(self, nodes=(), vnodes=VIRTUAL_NODES):
+        self.vnodes = vnodes
+        self.nodes = []
+        self._points = []
+        self._owners = []
+        for node in nodes:
+            self.add_node(node)
+
+    def add_node(self, node):
+        if node in self.nodes:
+            raise ValueError(f"Node {node} is already in the ring")
+        self.nodes.append(node)
+        for i in range(self.vnodes):
+            point = _hash(f"{node}#{i}")
+            position = bisect.bisect(self._points, point)
+            self._points.insert(position, point)
+            self._owners.insert(position, node)
+
+    def node_for(self, key):
+        if not self._points:
+            raise ValueError("The ring has no nodes")
+        position = bisect.bisect(self._points, _hash(str(key)))
+        return self._owners[position % len(self._points)]
+
+
+class ClusterProxy:
+    """Stands in for a ``Pyro4.Proxy`` of one store, spreading keys over several store servers.
+
+    Every server is a plain ``start-server`` process; which one owns a key is
+    decided here, on the client, by a ``HashRing`` over the node addresses.
+    Calls about one key go to its owner, batch calls are split by owner and
+    scans, queries and listings ask every server in parallel and merge what
+    they return. Transactions must keep to the keys of one server. All
+    clients of a cluster must be given the same nodes, in any order.
+    """
+
+    def __init__(self, nodes, vnodes=VIRTUAL_NODES):
+        addresses = [node_address(node) for node in nodes]
+        if not addresses:
+            raise ValueError("A cluster needs at least one node")
+        self.ring = HashRing(sorted(addresses), vnodes)
+        self._proxies = {address: Pyro4.Proxy(node_uri(address)) for address in addresses}
+        self._executor = ThreadPoolExecutor(max_workers=len(addresses))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        for proxy in self._proxies.values():
+            proxy._pyroRelease()
+        self._executor.shutdown()
+
+    @property
+    def nodes(self):
+        return list(self.ring.nodes)
+
+    def each(self, method, *args, **kwargs):
+        """Calls ``method`` on every server in parallel, returning ``{node: result}``."""
+        return self._fan_out({node: functools.partial(getattr(self._proxies[node], method), *args, **kwargs)
+                              for node in self.ring.nodes})
+
+    def _fan_out(self, calls):
+        # Runs {node: function} in parallel, one call per server at a time
+        if len(calls) == 1:
+            (node, call), = calls.items()
+            return {node: call()}
+        futures = {node: self._executor.submit(call) for node, call in calls.items()}
+        return {node: future.result() for node, future in futures.items()}
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        if name in KEYED:
+            position, argument = KEYED[name]
+            return lambda *args, **kwargs: self._keyed(name, _argument(args, kwargs, position, argument),
+                                                       args, kwargs)
+        if name in BATCHED:
+            return lambda *args, **kwargs: self._batched(name, BATCHED[name], args, kwargs)
+        if name in SCANS:
+            return lambda *args, **kwargs: self._scan(name, SCANS[name], args, kwargs)
+        if name in QUERIES:
+            return lambda *args, **kwargs: self._query(name, QUERIES[name], args, kwargs)
+        if name in MERGED:
+            return lambda *args, **kwargs: _merge_mappings(self.each(name, *args, **kwargs).values())
+        if name in BROADCAST:
+            return lambda *args, **kwargs: _agreed(list(self.each(name, *args, **kwargs).values()))
+        if name in PER_NODE:
+            return lambda *args, **kwargs: self.each(name, *args, **kwargs)
+        raise AttributeError(f"{name} cannot be called through the cluster router")
+
+    def _keyed(self, method, key, args, kwargs):
+        return getattr(self._proxies[self.ring.node_for(key)], method)(*args, **kwargs)
+
+    def _batched(self, method, position, args, kwargs):
+        keys = args[position]
+        groups = {}
+        for key in keys:
+            groups.setdefault(self.ring.node_for(key), []).append(key)
+        calls = {}
+        for node, node_keys in groups.items():
+            part = {key: keys[key] for key in node_keys} if isinstance(keys, dict) else node_keys
+            calls[node] = functools.partial(getattr(self._proxies[node], method),
+                                            *args[:position], part, *args[position + 1:], **kwargs)
+        results = list(self._fan_out(calls).values())
+        if method == "put_entries":
+            return sum(results)
+        merged = {}
+        for result in results:
+            merged.update(result)
+        return {key: merged[key] for key in keys}
+
+    def _scan(self, method, position, args, kwargs):
+        cursor = _argument(args, kwargs, position, "cursor", None)
+        match = _argument(args, kwargs, position + 1, "match", None)
+        count = max(1, int(_argument(args, kwargs, position + 2, "count", 100)))
+        # Keys are hashed evenly, so each server holds about its share of any key range; the
+        # margin only makes short pages rarer, pages stay correct whatever each server returns
+        share = -(-count // len(self.ring.nodes))
+        if len(self.ring.nodes) > 1:
+            share += share // 4 + 1
+        args = (*args[:position], cursor, match, share)
+        pages = list(self.each(method, *args).values())
+        # A server that is not done has only looked up to its cursor, so nothing past the lowest one is certain
+        cursors = [page["cursor"] for page in pages if page["cursor"] is not None]
+        end = min(cursors) if cursors else None
+        keys = sorted(key for page in pages for key in page["entries"] if end is None or key <= end)
+        if len(keys) > count:
+            keys, end = keys[:count], keys[count - 1]
+        entries = {}
+        for page in pages:
+            entries.update(page["entries"])
+        return {"cursor": end, "entries": {key: entries[key] for key in keys}}
+
+    def _query(self, method, position, args, kwargs):
+        limit = _argument(args, kwargs, position, "limit", None)
+        results = list(self.each(method, *args, **kwargs).values())
+        if any(result is None for result in results):
+            return None
+        if isinstance(results[0], dict):
+            merged = _merge_mappings(results)
+            return {key: merged[key] for key in sorted(merged)[:limit]}
+        return sorted(key for result in results for key in result)[:limit]
+
+    def list_stores(self):
+        names = {}
+        for stores in self.each("list_stores").values():
+            names.update(dict.fromkeys(stores))
+        return list(names)
+
+    def list_indexes(self, store_name=None):
+        merged = {}
+        for indexes in self.each("list_indexes", store_name).values():
+            for name, fields in indexes.items():
+                for field, count in fields.items():
+                    merged.setdefault(name, {})[field] = merged.get(name, {}).get(field, 0) + count
+        return merged
+
+    def export_entries(self, store_name, cursor=None, count=bulk.CHUNK_SIZE):
+        """Pages through the servers one after the other; the cursor is ``[node, cursor of that node]``.
+
+        Entries come in key order within each server only.
+        """
+        nodes = self.ring.nodes
+        node, node_cursor = cursor or (nodes[0], None)
+        page = self._proxies[node].export_entries(store_name, node_cursor, count)
+        if page is None:
+            return None
+        if page["cursor"] is not None:
+            return {"cursor": [node, page["cursor"]], "data": page["data"]}
+        position = nodes.index(node) + 1
+        return {"cursor": [nodes[position], None] if position < len(nodes) else None, "data": page["data"]}
+
+    def import_entries(self, store_name, data, replace=True):
+        groups = {}
+        for key, entry in bulk.unpack_entries(data):
+            groups.setdefault(self.ring.node_for(key), []).append((key, entry))
+        written = self._fan_out({node: functools.partial(self._proxies[node].import_entries, store_name,
+                                                         bulk.pack_entries(pairs), replace)
+                                 for node, pairs in groups.items()})
+        return sum(written.values())
+
+    def transaction(self, operations, watch=None):
+        nodes = {self.ring.node_for(item["key"]) for item in [*operations, *(watch or [])] if "key" in item}
+        if len(nodes) > 1:
+            return {"ok": False, "error": "A transaction cannot span keys of several cluster nodes"}
+        node = nodes.pop() if nodes else self.ring.nodes[0]
+        return self._proxies[node].transaction(operations, watch)
+
+    def get_changes(self, store_name=None, prefix="", after=None, limit=100, timeout=0):
+        """Merges the change feeds of every server; the cursor is ``{node: sequence}``.
+
+        Events are ordered by time, and each keeps the sequence number of its
+        own server. At most ``limit`` events are returned per server. Any
+        ``after`` other than an earlier cursor starts from now.
+        """
+        after = after if isinstance(after, dict) else {}
+        deadline = time.time() + timeout
+        while True:
+            wait = min(CHANGES_POLL_SLICE, max(0.0, deadline - time.time()))
+            feeds = self._fan_out({node: functools.partial(self._proxies[node].get_changes, store_name, prefix,
+                                                           after.get(node), limit, wait)
+                                   for node in self.ring.nodes})
+            if any(feed is None for feed in feeds.values()):
+                return None
+            after = {node: feed["cursor"] for node, feed in feeds.items()}
+            events = sorted((event for feed in feeds.values() for event in feed["events"]),
+                            key=lambda event: event["time"])
+            missed = any(feed["missed"] for feed in feeds.values())
+            if events or missed or time.time() >= deadline:
+                return {"events": events, "cursor": after, "missed": missed}
+
+    def add_node(self, node, batch_size=MOVE_BATCH_SIZE):
+        """Adds a server to the ring and moves to it the keys it now owns, returning how many moved.
+
+        The new server is routed to as soon as it is added. A key written to it
+        before its old copy arrives keeps the new value. Other clients must be
+        given the new node list once this returns.
+        """
+        node = node_address(node)
+        store_names = self.list_stores()
+        sources = list(self.ring.nodes)
+        self._proxies[node] = Pyro4.Proxy(node_uri(node))
+        self.ring.add_node(node)
+        self._executor.shutdown()
+        self._executor = ThreadPoolExecutor(max_workers=len(self.ring.nodes))
+        for store_name in store_names:
+            self._proxies[node].create_store(store_name)
+        moved = self._fan_out({source: functools.partial(self._move_keys, source, node, store_names, batch_size)
+                               for source in sources})
+        total = sum(moved.values())
+        logger.info(f"Added node {node} to the cluster, moving {total} keys to it.")
+        return total
+
+    def _move_keys(self, source, target, store_names, batch_size):
+        moved = 0
+        for store_name in store_names:
+            cursor = None
+            while True:
+                # Packed pages, so bytes values move intact
+                page = self._proxies[source].export_entries(store_name, cursor, batch_size)
+                if page is None:
+                    break
+                leaving = [(key, entry) for key, entry in bulk.unpack_entries(page["data"])
+                           if self.ring.node_for(key) == target]
+                if leaving:
+                    self._proxies[target].import_entries(store_name, bulk.pack_entries(leaving), False)
+                    self._proxies[source].mdelete(store_name, [key for key, _ in leaving])
+                    moved += len(leaving)
+                cursor = page["cursor"]
+                if cursor is None:
+                    break
+        return moved
+
+
+def _argument(args, kwargs, position, name, default=...):
+    if len(args) > position:
+        return args[position]
+    if name in kwargs or default is ...:
+        return kwargs[name]
+    return default
+
+
+def _merge_mappings(results):
+    results = [result for result in results if result is not None]
+    if not results:
+        return None
+    merged = {}
+    for result in results:
+        merged.update(result)
+    return merged
+
+
+def _agreed(results):
+    if all(isinstance(result, bool) for result in results):
+        return all(results)
+    return results[0]
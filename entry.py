@@ -0,0 +1,76 @@
+class Entry:
+    """One stored key: the core fields in slots, anything else in ``extras``.
+
+    A slotted record takes a fraction of the memory of the per-key dict it
+    replaces and reads its fields without hashing. Entries are published
+    copy-on-write, so never assign to the fields of one held by a store;
+    ``replace`` builds the edited copy. ``to_dict`` and ``from_dict`` convert
+    to and from the dict shape used on the wire and in backups, where
+    ``readonly``, ``last_refresh`` and ``version`` are left out while unset.
+    ``version`` counts the writes to a key, starting at 1, for
+    compare-and-set.
+    """
+
+    __slots__ = ('value', 'exp_time', 'readonly', 'last_refresh', 'version', 'extras')
+
+    def __init__(self, value=None, exp_time=None, readonly=False, last_refresh=None, extras=None, version=0):
+        self.value = value
+        self.exp_time = exp_time
+        self.readonly = readonly
+        self.last_refresh = last_refresh
+        self.version = version
+        self.extras = extras or None
+
+    @classmethod
+    def from_dict(cls, data):
+        extras = {name: field for name, field in data.items() if name not in _CORE_FIELDS}
+        return cls(data.get('value'), data.get('exp_time'), data.get('readonly', False),
+                   data.get('last_refresh'), extras, data.get('version', 0))
+
+    def to_dict(self):
+        data = {'value': self.value, 'exp_time': self.exp_time}
+        if self.readonly is not False:
+            data['readonly'] = self.readonly
+        if self.last_refresh is not None:
+            data['last_refresh'] = self.last_refresh
+        if self.version:
+            data['version'] = self.version
+        if self.extras:
+            data.update(self.extras)
+        return data
+
+    def replace(self, **changes):
+        """Returns a copy with ``changes`` applied, unknown names going to ``extras``."""
+        extras = self.extras
+        unknown = {name: field for name, field in changes.items() if name not in _CORE_FIELDS}
+        if unknown:
+            extras = {**(extras or {}), **unknown}
+        return Entry(changes.get('value', self.value), changes.get('exp_time', self.exp_time),
+                     changes.get('readonly', self.readonly), changes.get('last_refresh', self.last_refresh),
+                     extras, changes.get('version', self.version))
+
+    def is_expired(self, now):
+        return self.exp_time is not None and now > self.exp_time
+
+    def get(self, name, default=None):
+        if name in _CORE_FIELDS:
+            return getattr(self, name)
+        return self.extras.get(name, default) if self.extras else default
+
+    def __getitem__(self, name):
+        if name in _CORE_FIELDS:
+            return getattr(self, name)
+        if self.extras and name in self.extras:
+            return self.extras[name]
+        raise KeyError(name)
+
+    def __eq__(self, other):
+        if not isinstance(other, Entry):
+            return NotImplemented
+        return self.to_dict() == other.to_dict()
+
+    def __repr__(self):
+        return f"Entry({self.to_dict()!r})"
+
+
+_CORE_FIELDS = frozenset(Entry.__slots__) - {'extras'}
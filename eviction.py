@@ -0,0 +1,192 @@
+import heapq
+import sys
+import threading
+from collections import OrderedDict
+
+NOEVICTION = "noeviction"
+LRU = "lru"
+LFU = "lfu"
+VOLATILE_TTL = "volatile-ttl"
+EVICTION_POLICIES = (NOEVICTION, LRU, LFU, VOLATILE_TTL)
+
+# Store slot, Entry record and its float deadline
+_ENTRY_OVERHEAD = 160
+_LFU_MAX = 255
+
+
+_SCALARS = frozenset((str, bytes, int, float, bool, type(None)))
+
+
+def value_size(value):
+    """Approximate bytes held by a stored value, containers included."""
+    size = sys.getsizeof(value)
+    if type(value) in _SCALARS:
+        return size
+    if isinstance(value, dict):
+        size += sum(value_size(k) + value_size(v) for k, v in value.items())
+    elif isinstance(value, (list, tuple, set, frozenset)):
+        size += sum(value_size(item) for item in value)
+    return size
+
+
+def entry_size(key, entry):
+    size = _ENTRY_OVERHEAD + sys.getsizeof(key) + value_size(entry.value)
+    return size + value_size(entry.extras) if entry.extras else size
+
+
+class _Tracker:
+    """Orders the evictable keys of one store; readonly keys are never tracked.
+
+    ``pop_victim`` removes and returns the next key to evict, or None when
+    nothing is left; a victim that could not be evicted is handed back with
+    ``add``.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+
+    def set(self, key, entry):
+        if entry.readonly:
+            self.discard(key)
+        else:
+            self.add(key, entry)
+
+    def touch(self, key):
+        pass
+
+
+class LRUTracker(_Tracker):
+    def __init__(self):
+        super().__init__()
+        self._order = OrderedDict()
+
+    def __len__(self):
+        return len(self._order)
+
+    def add(self, key, entry):
+        with self._lock:
+            self._order[key] = None
+            self._order.move_to_end(key)
+
+    def touch(self, key):
+        with self._lock:
+            if key in self._order:
+                self._order.move_to_end(key)
+
+    def discard(self, key):
+        with self._lock:
+            self._order.pop(key, None)
+
+    def pop_victim(self):
+        with self._lock:
+            return self._order.popitem(last=False)[0] if self._order else None
+
+
+class LFUTracker(_Tracker):
+    """Least frequently used first, least recently used among equal counts.
+
+    Counts saturate at 255, so the lowest non-empty bucket is always found
+    within a bounded number of steps.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._counts = {}
+        self._buckets = [OrderedDict() for _ in range(_LFU_MAX + 1)]
+        self._min_count = 1
+
+    def __len__(self):
+        return len(self._counts)
+
+    def add(self, key, entry):
+        with self._lock:
+            if key in self._counts:
+                self._bump(key)
+            else:
+                self._counts[key] = 1
+                self._buckets[1][key] = None
+                self._min_count = 1
+
+    def touch(self, key):
+        with self._lock:
+            if key in self._counts:
+                self._bump(key)
+
+    def _bump(self, key):
+        count = self._counts[key]
+        if count == _LFU_MAX:
+            self._buckets[count].move_to_end(key)
+            return
+        del self._buckets[count][key]
+        self._counts[key] = count + 1
+        self._buckets[count + 1][key] = None
+
+    def discard(self, key):
+        with self._lock:
+            count = self._counts.pop(key, None)
+            if count is not None:
+                del self._buckets[count][key]
+
+    def pop_victim(self):
+        with self._lock:
+            if not self._counts:
+                return None
+            # Counts only grow between adds, so _min_count never overshoots
+            count = self._min_count
+            while not self._buckets[count]:
+                count += 1
+            self._min_count = count
+            key = self._buckets[count].popitem(last=False)[0]
+            del self._counts[key]
+            return key
+
+
+class TTLTracker(_Tracker):
+    """Soonest deadline first; replaced deadlines are skipped lazily when they surface."""
+
+    def __init__(self):
+        super().__init__()
+        self._heap = []
+        self._deadlines = {}
+
+    def __len__(self):
+        return len(self._deadlines)
+
+    def add(self, key, entry):
+        exp_time = entry.exp_time if entry.exp_time is not None else float('inf')
+        with self._lock:
+            if self._deadlines.get(key) == exp_time:
+                return
+            self._deadlines[key] = exp_time
+            heapq.heappush(self._heap, (exp_time, key))
+            if len(self._heap) > 2 * len(self._deadlines) + 1024:
+                self._heap = [(exp_time, key) for key, exp_time in self._deadlines.items()]
+                heapq.heapify(self._heap)
+
+    def discard(self, key):
+        with self._lock:
+            self._deadlines.pop(key, None)
+
+    def pop_victim(self):
+        with self._lock:
+            while self._heap:
+                exp_time, key = heapq.heappop(self._heap)
+                if self._deadlines.get(key) == exp_time:
+                    del self._deadlines[key]
+                    return key
+            return None
+
+
+TRACKERS = {LRU: LRUTracker, LFU: LFUTracker, VOLATILE_TTL: TTLTracker}
+
+
+def new_tracker(policy, entries=None):
+    """Returns a tracker for ``policy`` filled with ``entries``, or None for noeviction."""
+    if policy not in EVICTION_POLICIES:
+        raise ValueError(f"eviction_policy must be one of {', '.join(EVICTION_POLICIES)}")
+    if policy == NOEVICTION:
+        return None
+    tracker = TRACKERS[policy]()
+    for key, entry in (entries or {}).items():
+        tracker.set(key, entry)
+    return tracker
@@ -0,0 +1,103 @@
+import heapq
+import itertools
+import random
+import threading
+
+
+class ExpirationIndex:
+    """Min-heap of key deadlines so cleanup only visits keys that are due.
+
+    Deadlines are tracked per ``(store_name, key)``. Replacing or discarding a
+    deadline leaves a stale node in the heap; stale nodes are skipped when they
+    surface and the heap is rebuilt once they outnumber the live ones.
+    """
+
+    def __init__(self):
+        self._heap = []
+        self._deadlines = {}
+        self._live = 0
+        self._counter = itertools.count()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return self._live
+
+    def set(self, store_name, key, exp_time):
+        with self._lock:
+            deadlines = self._deadlines.setdefault(store_name, {})
+            if key not in deadlines:
+                self._live += 1
+            deadlines[key] = exp_time
+            heapq.heappush(self._heap, (exp_time, next(self._counter), store_name, key))
+            self._maybe_compact()
+
+    def load(self, store_name, deadlines):
+        """Replaces the deadlines of a store in bulk, heapifying once instead of pushing each key."""
+        with self._lock:
+            previous = self._deadlines.get(store_name)
+            if previous:
+                self._live -= len(previous)
+            self._deadlines[store_name] = dict(deadlines)
+            self._live += len(deadlines)
+            self._heap.extend((exp_time, next(self._counter), store_name, key)
+                              for key, exp_time in deadlines.items())
+            heapq.heapify(self._heap)
+
+    def discard(self, store_name, key):
+        with self._lock:
+            deadlines = self._deadlines.get(store_name)
+            if deadlines is not None and deadlines.pop(key, None) is not None:
+                self._live -= 1
+                self._maybe_compact()
+
+    def drop_store(self, store_name):
+        with self._lock:
+            deadlines = self._deadlines.pop(store_name, None)
+            if deadlines:
+                self._live -= len(deadlines)
+                self._maybe_compact()
+
+    def next_deadline(self):
+        """Returns the earliest live deadline, or None if nothing is tracked."""
+        with self._lock:
+            while self._heap:
+                exp_time, _, store_name, key = self._heap[0]
+                if self._deadlines.get(store_name, {}).get(key) == exp_time:
+                    return exp_time
+                heapq.heappop(self._heap)
+            return None
+
+    def pop_due(self, now, limit=None):
+        """Removes and returns ``(store_name, key, exp_time)`` for every deadline before ``now``."""
+        due = []
+        with self._lock:
+            while self._heap and self._heap[0][0] < now:
+                if limit is not None and len(due) >= limit:
+                    break
+                exp_time, _, store_name, key = heapq.heappop(self._heap)
+                deadlines = self._deadlines.get(store_name)
+                if deadlines is None or deadlines.get(key) != exp_time:
+                    continue  # Stale node left behind by a replace or discard
+                del deadlines[key]
+                self._live -= 1
+                due.append((store_name, key, exp_time))
+        return due
+
+    def sample(self, count):
+        """Returns up to ``count`` random live ``(store_name, key, exp_time)`` deadlines, leaving them indexed."""
+        picked = {}
+        with self._lock:
+            if not self._heap:
+                return []
+            for _ in range(count):
+                exp_time, _, store_name, key = random.choice(self._heap)
+                if self._deadlines.get(store_name, {}).get(key) == exp_time:
+                    picked[(store_name, key)] = exp_time
+        return [(store_name, key, exp_time) for (store_name, key), exp_time in picked.items()]
+
+    def _maybe_compact(self):
+        if len(self._heap) > 2 * self._live + 1024:
+            self._heap = [(exp_time, next(self._counter), store_name, key)
+                          for store_name, deadlines in self._deadlines.items()
+                          for key, exp_time in deadlines.items()]
+            heapq.heapify(self._heap)
@@ -0,0 +1,109 @@
+import threading
+
+from keyindex import SortedKeyIndex, key_order
+
+_NUMBER = 0
+_STRING = 1
+
+
+def field_value(entry, field):
+    """Returns the item at a dotted ``field`` path of an entry, e.g. ``status``, ``metadata.team`` or ``value.owner``.
+
+    The first step names an entry field (``value`` or any extra field), the
+    rest walk into nested dicts. Returns None where the path leads nowhere.
+    """
+    return _follow(entry, field.split('.'))
+
+
+def _follow(entry, steps):
+    item = entry.get(steps[0])
+    for step in steps[1:]:
+        if not isinstance(item, dict):
+            return None
+        item = item.get(step)
+    return item
+
+
+def index_key(item):
+    """Orders numbers before strings so one index can hold both; other items are not indexed."""
+    if isinstance(item, (int, float)):
+        return _NUMBER, item
+    if isinstance(item, str):
+        return _STRING, item
+    return None
+
+
+class FieldIndex:
+    """Keys of one store by the value of one field, for equality and range lookups.
+
+    Each distinct value maps to the set of keys holding it, and the distinct
+    values are kept sorted, so a lookup costs the size of its result rather
+    than the size of the store. Only numbers and strings are indexed.
+    """
+
+    def __init__(self, field, entries=None):
+        self.field = field
+        self._steps = field.split('.')
+        self._lock = threading.Lock()
+        self._keys_by_value = {}
+        self._values = SortedKeyIndex()
+        self._value_by_key = {}
+        for key, entry in (entries or {}).items():
+            self.set(key, entry)
+
+    def __len__(self):
+        return len(self._value_by_key)
+
+    def set(self, key, entry):
+        indexed = index_key(_follow(entry, self._steps))
+        with self._lock:
+            previous = self._value_by_key.get(key)
+            if previous == indexed:
+                return
+            if previous is not None:
+                self._remove(key, previous)
+            if indexed is not None:
+                self._value_by_key[key] = indexed
+                keys = self._keys_by_value.get(indexed)
+                if keys is None:
+                    self._keys_by_value[indexed] = keys = set()
+                    self._values.add(indexed)
+                keys.add(key)
+
+    def discard(self, key):
+        with self._lock:
+            previous = self._value_by_key.get(key)
+            if previous is not None:
+                self._remove(key, previous)
+
+    def _remove(self, key, indexed):
+        del self._value_by_key[key]
+        keys = self._keys_by_value[indexed]
+        keys.discard(key)
+        if not keys:
+            del self._keys_by_value[indexed]
+            self._values.discard(indexed)
+
+    def lookup(self, value):
+        indexed = index_key(value)
+        if indexed is None:
+            raise ValueError(f"Only numbers and strings are indexed, not {value!r}")
+        with self._lock:
+            return sorted(self._keys_by_value.get(indexed, ()), key=key_order)
+
+    def range(self, low=None, high=None, limit=None):
+        """Returns the keys whose value is between ``low`` and ``high`` (both included), in value order."""
+        bounds = [index_key(bound) for bound in (low, high) if bound is not None]
+        if not bounds or None in bounds or len({rank for rank, _ in bounds}) > 1:
+            raise ValueError("Range bounds must be numbers or strings, and of the same kind")
+        rank = bounds[0][0]
+        keys = []
+        with self._lock:
+            for indexed in self._values.irange((rank, low) if low is not None else (rank,),
+                                               (rank, high) if high is not None else (rank + 1,)):
+                if indexed[0] != rank:
+                    break
+                keys.extend(sorted(self._keys_by_value[indexed], key=key_order))
+                if limit is not None and len(keys) >= limit:
+                    return keys[:limit]
+        return keys
@@ -0,0 +1,182 @@
+import bisect
+import threading
+
+
+class SortedKeyIndex:
+    """The keys of one store in sorted order, for cursor and prefix scans.
+
+    Keys are kept in sorted blocks of at most ``2 * block_size`` keys, with
+    the last key of every block in ``_maxes``. Finding a key takes two binary
+    searches and an insert or delete only shifts the keys of one block.
+    """
+
+    def __init__(self, keys=(), block_size=512):
+        self._block_size = block_size
+        self._lock = threading.Lock()
+        keys = sorted(keys)
+        self._blocks = [keys[i:i + block_size] for i in range(0, len(keys), block_size)]
+        self._maxes = [block[-1] for block in self._blocks]
+        self._len = len(keys)
+
+    def __len__(self):
+        return self._len
+
+    def add(self, key):
+        with self._lock:
+            if not self._blocks:
+                self._blocks.append([key])
+                self._maxes.append(key)
+                self._len = 1
+                return True
+            i = min(bisect.bisect_left(self._maxes, key), len(self._blocks) - 1)
+            block = self._blocks[i]
+            j = bisect.bisect_left(block, key)
+            if j < len(block) and block[j] == key:
+                return False
+            block.insert(j, key)
+            self._maxes[i] = block[-1]
+            self._len += 1
+            if len(block) > 2 * self._block_size:
+                half = len(block) // 2
+                self._blocks[i:i + 1] = [block[:half], block[half:]]
+                self._maxes[i:i + 1] = [block[half - 1], block[-1]]
+            return True
+
+    def discard(self, key):
+        with self._lock:
+            i = bisect.bisect_left(self._maxes, key)
+            if i == len(self._blocks):
+                return False
+            block = self._blocks[i]
+            j = bisect.bisect_left(block, key)
+            if j == len(block) or block[j] != key:
+                return False
+            del block[j]
+            self._len -= 1
+            if block:
+                self._maxes[i] = block[-1]
+            else:
+                del self._blocks[i]
+                del self._maxes[i]
+            return True
+
+    def page(self, after=None, prefix="", limit=100):
+        """Returns up to ``limit`` keys sorting after ``after`` and starting with ``prefix``."""
+        if after is None or after < prefix:
+            find, start = bisect.bisect_left, prefix
+        else:
+            find, start = bisect.bisect_right, after
+        keys = []
+        with self._lock:
+            i = find(self._maxes, start)
+            if i == len(self._blocks):
+                return keys
+            j = find(self._blocks[i], start)
+            for block in self._blocks[i:]:
+                for key in block[j:]:
+                    if len(keys) >= limit or not key.startswith(prefix):
+                        return keys
+                    keys.append(key)
+                j = 0
+        return keys
+
+    def irange(self, minimum=None, maximum=None, limit=None):
+        """Returns up to ``limit`` keys between ``minimum`` and ``maximum``, both included when given."""
+        keys = []
+        with self._lock:
+            i, j = 0, 0
+            if minimum is not None:
+                i = bisect.bisect_left(self._maxes, minimum)
+                if i == len(self._blocks):
+                    return keys
+                j = bisect.bisect_left(self._blocks[i], minimum)
+            for block in self._blocks[i:]:
+                for key in block[j:]:
+                    if (limit is not None and len(keys) >= limit) or (maximum is not None and key > maximum):
+                        return keys
+                    keys.append(key)
+                j = 0
+        return keys
+
+
+class StoreKeyIndex(SortedKeyIndex):
+    """The keys of one store: strings in sorted order, then keys of any other type in ``key_order``.
+
+    Stores take any hashable key, but only strings can all be compared with
+    each other. They are kept as they are; other keys go to a second index,
+    wrapped in their ``key_order``, and are scanned after every string.
+    Only strings match a non-empty prefix.
+    """
+
+    def __init__(self, keys=(), block_size=512):
+        keys = list(keys)
+        super().__init__([key for key in keys if type(key) is str], block_size)
+        self._others = SortedKeyIndex([_other_order(key) for key in keys if type(key) is not str], block_size)
+
+    def __len__(self):
+        return self._len + len(self._others)
+
+    def add(self, key):
+        if type(key) is str:
+            return super().add(key)
+        return self._others.add(_other_order(key))
+
+    def discard(self, key):
+        if type(key) is str:
+            return super().discard(key)
+        return self._others.discard(_other_order(key))
+
+    def page(self, after=None, prefix="", limit=100):
+        if after is None or type(after) is str:
+            keys = super().page(after, prefix, limit)
+            if prefix or len(keys) >= limit:
+                return keys
+            start = None
+        elif prefix:
+            return []
+        else:
+            keys, start = [], _other_order(after)
+        # irange includes its minimum, the key the page resumes after
+        for order in self._others.irange(start, None, limit - len(keys) + 1):
+            if order != start and len(keys) < limit:
+                keys.append(order[-1])
+        return keys
+
+
+# Numbers that are equal are the same key of a dict, so they are ordered together
+_NUMBER_TYPES = frozenset((int, float, bool))
+
+
+def _other_order(key):
+    if type(key) in _NUMBER_TYPES:
+        return "number", key
+    if type(key) is bytes:
+        return "bytes", key
+    return type(key).__name__, repr(key), key
+
+
+def key_order(key):
+    """Sort key ordering keys of any type as ``StoreKeyIndex`` does.
+
+    Strings come first, then other keys by type name (any number counting
+    as one type); numbers and bytes order by value and other types by ``repr``.
+    """
+    if type(key) is str:
+        return "", key
+    return _other_order(key)
+
+
+GLOB_CHARS = "*?["
+
+
+def split_match(match):
+    """Splits a scan pattern into its literal prefix and the glob left to check, if any.
+
+    A pattern without ``*``, ``?`` or ``[`` is a plain prefix.
+    """
+    if not match:
+        return "", None
+    for i, char in enumerate(match):
+        if char in GLOB_CHARS:
+            return match[:i], match
+    return match, None
@@ -0,0 +1,81 @@
+import threading
+from contextlib import contextmanager
+
+
+class StripedLock:
+    """A fixed set of re-entrant locks guarding one store.
+
+    Single-key operations take the stripe their key hashes to, so writers on
+    different keys of the same store do not queue behind each other.
+    Operations spanning several keys acquire the stripes they need in index
+    order, which keeps every multi-stripe acquisition deadlock free.
+    """
+
+    def __init__(self, stripes=16):
+        if stripes < 1:
+            raise ValueError("stripes must be a positive integer")
+        self._stripes = tuple(threading.RLock() for _ in range(stripes))
+
+    def __len__(self):
+        return len(self._stripes)
+
+    def for_key(self, key):
+        return self._stripes[hash(key) % len(self._stripes)]
+
+    @contextmanager
+    def for_keys(self, keys):
+        indexes = sorted({hash(key) % len(self._stripes) for key in keys})
+        with self._acquired([self._stripes[i] for i in indexes]):
+            yield
+
+    @contextmanager
+    def all(self):
+        with self._acquired(self._stripes):
+            yield
+
+    @staticmethod
+    @contextmanager
+    def _acquired(locks):
+        acquired = []
+        try:
+            for lock in locks:
+                lock.acquire()
+                acquired.append(lock)
+            yield
+        finally:
+            for lock in reversed(acquired):
+                lock.release()
+
+
+class CurrentStoreLock:
+    """Takes ``take(store_lock)`` on the lock a store has once it is held, not on one the store lost meanwhile.
+
+    Deleting a store drops its StripedLock and creating it again makes a new
+    one. A writer that looked up the old lock and waited on it while that
+    happened lets go and takes the new lock instead, so the store it then
+    finds is the one it holds stripes of. Without a lock, nothing is held.
+    """
+
+    __slots__ = ('_store_locks', '_store_name', '_take', '_held')
+
+    def __init__(self, store_locks, store_name, take):
+        self._store_locks = store_locks
+        self._store_name = store_name
+        self._take = take
+        self._held = None
+
+    def __enter__(self):
+        while True:
+            store_lock = self._store_locks.get(self._store_name)
+            if store_lock is None:
+                return
+            held = self._take(store_lock)
+            held.__enter__()
+            if self._store_locks.get(self._store_name) is store_lock:
+                self._held = held
+                return
+            held.__exit__(None, None, None)
+
+    def __exit__(self, *exc_info):
+        if self._held is not None:
+            self._held.__exit__(*exc_info)
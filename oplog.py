@@ -0,0 +1,197 @@
+import glob
+import json
+import logging
+import os
+import threading
+
+from backups import json_default, json_object_hook
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger('remote_proxies')
+
+FSYNC_ALWAYS = "always"
+FSYNC_INTERVAL = "interval"
+FSYNC_OS = "os"
+FSYNC_MODES = (FSYNC_ALWAYS, FSYNC_INTERVAL, FSYNC_OS)
+
+SNAPSHOT_NAME = "oplog.snapshot.json"
+
+
+def encode_record(record):
+    return json.dumps(record, ensure_ascii=False, default=json_default).encode('utf-8') + b"\n"
+
+
+def decode_record(line):
+    return json.loads(line, object_hook=json_object_hook)
+
+
+def record_key(key):
+    """Turns a key read back from JSON into the key it was: tuple keys come back as lists."""
+    return tuple(map(record_key, key)) if isinstance(key, list) else key
+
+
+class OperationLog:
+    """Append-only log of store mutations, split into numbered segments.
+
+    Appends go to an in-memory buffer. With ``fsync="always"`` the appending
+    thread makes its record durable before returning, and whoever flushes
+    first commits every buffered record in one write and one fsync (group
+    commit). ``"interval"`` leaves flushing to a background thread running
+    every ``fsync_interval`` seconds and ``"os"`` hands each record to the OS
+    page cache without fsync. ``write_snapshot`` folds everything up to a
+    segment boundary into a snapshot file and drops the folded segments.
+    """
+
+    def __init__(self, directory, fsync=FSYNC_INTERVAL, fsync_interval=0.05):
+        if fsync not in FSYNC_MODES:
+            raise ValueError(f"fsync must be one of {', '.join(FSYNC_MODES)}")
+        self.directory = directory
+        self.fsync = fsync
+        self.fsync_interval = fsync_interval
+        os.makedirs(self.directory, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._flush_lock = threading.RLock()
+        self._buffer = []
+        self._appended = 0
+        self._durable = 0
+        existing = self._segments()
+        self._segment = (existing[-1] if existing else 0) + 1
+        self._file = open(self._segment_path(self._segment), 'ab')
+
+        self._closed = threading.Event()
+        self._flusher = None
+        if self.fsync == FSYNC_INTERVAL:
+            self._flusher = threading.Thread(target=self._flush_periodically, daemon=True)
+            self._flusher.start()
+
+    def _segment_path(self, segment):
+        return os.path.join(self.directory, f"oplog.{segment:08d}.log")
+
+    def _segments(self):
+        paths = glob.glob(os.path.join(self.directory, "oplog.*.log"))
+        return sorted(int(os.path.basename(path).split('.')[1]) for path in paths)
+
+    @property
+    def size(self):
+        """Bytes of log not yet folded into a snapshot."""
+        return sum(os.path.getsize(self._segment_path(segment)) for segment in self._segments())
+
+    def append(self, record):
+        line = encode_record(record)
+        with self._lock:
+            self._buffer.append(line)
+            self._appended += 1
+            sequence = self._appended
+        if self.fsync == FSYNC_ALWAYS:
+            self._commit(sequence)
+        elif self.fsync == FSYNC_OS:
+            self.flush(sync=False)
+        return sequence
+
+    def _commit(self, sequence):
+        with self._flush_lock:
+            if self._durable >= sequence:
+                return  # Made durable by another thread's group commit
+            self.flush(sync=True)
+
+    def flush(self, sync=True):
+        with self._flush_lock:
+            with self._lock:
+                lines, self._buffer = self._buffer, []
+                sequence = self._appended
+            if lines:
+                self._file.write(b"".join(lines))
+                self._file.flush()
+            if sync:
+                os.fsync(self._file.fileno())
+                self._durable = sequence
+
+    def _flush_periodically(self):
+        while not self._closed.wait(self.fsync_interval):
+            try:
+                self.flush(sync=True)
+            except Exception as e:
+                logger.error(f"Failed to flush operation log: {e}")
+
+    def rotate(self):
+        """Closes the current segment and starts a new one, returning its number."""
+        with self._flush_lock:
+            self.flush(sync=True)
+            self._file.close()
+            self._segment += 1
+            self._file = open(self._segment_path(self._segment), 'ab')
+            return self._segment
+
+    def write_snapshot(self, segment, stores):
+        """Persists ``stores`` as the state preceding ``segment`` and drops older segments.
+
+        The snapshot is a ``{"segment"}`` line followed by a ``{"store"}``
+        line per store and a ``{"store", "key", "entry"}`` line per entry, so
+        it is written and read one entry at a time and keys keep their type.
+        """
+        path = os.path.join(self.directory, SNAPSHOT_NAME)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(encode_record({"segment": segment}))
+            for store_name, entries in stores.items():
+                f.write(encode_record({"store": store_name}))
+                for key, entry in entries.items():
+                    f.write(encode_record({"store": store_name, "key": key, "entry": entry}))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+        for old_segment in self._segments():
+            if old_segment < segment:
+                os.remove(self._segment_path(old_segment))
+
+    def close(self):
+        if self._closed.is_set():
+            return
+        self._closed.set()
+        if self._flusher is not None:
+            self._flusher.join()
+        with self._flush_lock:
+            self.flush(sync=self.fsync != FSYNC_OS)
+            self._file.close()
+
+    @staticmethod
+    def exists(directory):
+        """Whether ``directory`` holds a snapshot or log segment to recover from."""
+        return (os.path.exists(os.path.join(directory, SNAPSHOT_NAME))
+                or bool(glob.glob(os.path.join(directory, "oplog.*.log"))))
+
+    @staticmethod
+    def recover(directory):
+        """Returns the snapshotted stores and an iterator over the records logged after it."""
+        stores, first_segment = {}, 0
+        snapshot_path = os.path.join(directory, SNAPSHOT_NAME)
+        if os.path.exists(snapshot_path):
+            with open(snapshot_path, 'rb') as f:
+                header = decode_record(f.readline())
+                # Snapshots used to be a single {"segment", "stores"} object
+                stores, first_segment = header.get("stores", {}), header["segment"]
+                for line in f:
+                    record = decode_record(line)
+                    entries = stores.setdefault(record["store"], {})
+                    if "key" in record:
+                        entries[record_key(record["key"])] = record["entry"]
+
+        def records():
+            paths = sorted(glob.glob(os.path.join(directory, "oplog.*.log")))
+            for path in paths:
+                if int(os.path.basename(path).split('.')[1]) < first_segment:
+                    continue
+                with open(path, 'rb') as f:
+                    for line in f:
+                        try:
+                            record = decode_record(line)
+                        except ValueError:
+                            # A torn write can only be the tail of a segment
+                            logger.error(f"Skipping truncated record at the end of {path}")
+                            break
+                        if "key" in record:
+                            record["key"] = record_key(record["key"])
+                        yield record
+
+        return stores, records()
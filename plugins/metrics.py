@@ -53,10 +53,14 @@ class MetricsPlugin(TaskDefinitionMixin):
 
     def get_all_internal_keys(self):
         """Retrieves all keys and their values from the internal store."""
-        with self._lock:
-            store = self._stores.get(STORE_NAME, {})
-            # We return a copy to avoid direct modification
-            return {key: self._get_object(STORE_NAME, key) for key in store.keys()}
+        store = self._snapshot(STORE_NAME) or {}
+        # Built from a point-in-time copy, writers are never held up by this
+        current_time = time.time()
+        return {key: None if entry.is_expired(current_time) else entry.to_dict() for key, entry in store.items()}
+
+    def scan_internal_keys(self, cursor=None, match=None, count=100):
+        """Retrieves one page of the internal store, see ``scan``."""
+        return self.scan(STORE_NAME, cursor, match, count)
 
     def _collect_and_schedule_metrics(self):
         # Collect metrics
@@ -80,3 +84,6 @@ class MetricsPlugin(TaskDefinitionMixin):
 
         # Store the tasks' running states
         self.add_internal_key("tasks_running_states", tasks_running_states)
+
+        # Store memory usage and eviction counters
+        self.add_internal_key("store_memory", self.get_memory_stats())
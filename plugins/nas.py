@@ -12,21 +12,12 @@ STORE_NAME = "paths"
 class PathManagementMixin(StoreDefinitionMixin):
     def __init__(self, *args, **kwargs):
         self.create_store(STORE_NAME)
+        for method in (self.add_or_update_path, self.get_path, self.update_paths_object):
+            self._register_transaction_operation(method.__name__, method, STORE_NAME)
 
     def add_or_update_path(self, label, env, system, path):
-        # Fetch existing paths data or initialize it if it doesn't exist
-        paths_data = self._get_key(STORE_NAME, label) or {}
-
-        # Update or add the new path within the nested dictionary structure
-        if env not in paths_data:
-            paths_data[env] = {}
-        paths_data[env][system] = path
-
-        # If the label does not exist, use _add_key; otherwise, use _edit_key
-        if not paths_data:
-            self._add_key(STORE_NAME, label, value=paths_data)
-        else:
-            self._edit_key(STORE_NAME, label, value=paths_data)
+        # One locked update, so concurrent edits of other paths under the same label are kept
+        return self.set_in(STORE_NAME, label, [env, system], path)
 
     def get_path(self, label, env, system):
         paths_data = self._get_key(STORE_NAME, label)
@@ -35,7 +26,7 @@ class PathManagementMixin(StoreDefinitionMixin):
         return None
 
     def update_paths_object(self, label, new_paths):
-        self._edit_key(STORE_NAME, label, value=new_paths)
+        return self._edit_key(STORE_NAME, label, value=new_paths)
 
     def edit_specific_path(self, label, env, system, new_path):
         self.add_or_update_path(label, env, system, new_path)
@@ -43,3 +34,6 @@ class PathManagementMixin(StoreDefinitionMixin):
     def get_all_paths(self):
         store_data = self._get_all_keys(STORE_NAME)
         return store_data if store_data else {}
+
+    def scan_paths(self, cursor=None, match=None, count=100):
+        return self.scan(STORE_NAME, cursor, match, count)
@@ -8,10 +8,17 @@ logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger('remote_proxies')
 
 STORE_NAME = "pipelines"
+INDEXED_FIELDS = ("status", "creator")
 @Pyro4.expose
 class WorkflowsPlugin:
     def __init__(self, *args, **kwargs):
         self.create_store(STORE_NAME)
+        for field in INDEXED_FIELDS:
+            self.create_index(STORE_NAME, field)
+        for method in (self.get_pipeline, self.add_pipeline, self.edit_pipeline, self.delete_pipeline,
+                       self.add_stage_to_pipeline, self.edit_stage_in_pipeline, self.delete_stage_from_pipeline,
+                       self.log_pipeline_error, self.log_stage_error):
+            self._register_transaction_operation(method.__name__, method, STORE_NAME)
 
     @property
     def _store_name(self):
@@ -20,8 +27,19 @@ class WorkflowsPlugin:
     def list_pipelines(self):
         return self._get_all_keys(STORE_NAME)
 
+    def scan_pipelines(self, cursor=None, match=None, count=100):
+        return self.scan(STORE_NAME, cursor, match, count)
+
+    def query_pipelines(self, field, value=None, low=None, high=None, limit=None):
+        """Returns the pipelines matching an indexed field, e.g. ``query_pipelines("status", "Failed")``."""
+        return self.query(STORE_NAME, field, value, low, high, limit, objects=True)
+
     def get_pipeline(self, pipeline_id):
-        return self._get_all_keys(STORE_NAME).get(pipeline_id, None)
+        return self._get_object(STORE_NAME, pipeline_id)
+
+    def _update_pipeline(self, pipeline_id, update, force=False):
+        # Runs under the pipeline key's lock on a private copy, so concurrent edits cannot lose each other
+        return self._update_object(STORE_NAME, pipeline_id, update, force)
 
     def add_pipeline(self, pipeline_id, creator, description="", metadata=None, cfg=None, **kwargs):
         pipeline_data = {
@@ -35,27 +53,29 @@ class WorkflowsPlugin:
             "status": "Not Started",
             "errors": []
         }
-        self._add_key(STORE_NAME, pipeline_id, **pipeline_data, **kwargs)
+        return self._add_key(STORE_NAME, pipeline_id, **pipeline_data, **kwargs)
 
     def edit_pipeline(self, pipeline_id, new_description=None, new_metadata=None, new_cfg=None, **kwargs):
         """Edit the description, metadata, or configuration of an existing pipeline with partial updates."""
-        pipeline_data = self._get_object(STORE_NAME, pipeline_id)
-        if pipeline_data:
+        if 'ttl' in kwargs:
+            kwargs['exp_time'] = self._deadline(kwargs.pop('ttl'))
+
+        def update(pipeline_data):
             if new_description is not None:
                 pipeline_data["description"] = new_description
             if new_metadata is not None:
                 pipeline_data["metadata"].update(new_metadata)
             if new_cfg is not None:
                 pipeline_data["cfg"].update(new_cfg)  # Partially update cfg
+            pipeline_data.update(kwargs)
             pipeline_data["last_modified"] = datetime.utcnow().isoformat()
-            self._edit_key(STORE_NAME, pipeline_id, **pipeline_data, **kwargs)
+        return self._update_pipeline(pipeline_id, update, kwargs.get('force', False))
 
     def delete_pipeline(self, pipeline_id):
-        self._delete_key(STORE_NAME, pipeline_id)
+        return self._delete_key(STORE_NAME, pipeline_id)
 
     def add_stage_to_pipeline(self, pipeline_id, stage_name, depends_on=None, cfg=None, **stage_attrs):
-        pipeline_data = self._get_object(STORE_NAME, pipeline_id)
-        if pipeline_data:
+        def update(pipeline_data):
             new_stage = {
                 "name": stage_name,
                 "status": "Not Started",
@@ -67,13 +87,12 @@ class WorkflowsPlugin:
             }
             pipeline_data["stages"].append(new_stage)
             pipeline_data["last_modified"] = datetime.utcnow().isoformat()
-            self._edit_key(STORE_NAME, pipeline_id, **pipeline_data)
+        return self._update_pipeline(pipeline_id, update)
 
     def edit_stage_in_pipeline(self, pipeline_id, stage_name, new_status=None, new_cfg=None, new_metadata=None,
                                **new_stage_attrs):
         """Edit an existing stage within a pipeline with partial updates."""
-        pipeline_data = self._get_object(STORE_NAME, pipeline_id)
-        if pipeline_data:
+        def update(pipeline_data):
             for stage in pipeline_data["stages"]:
                 if stage["name"] == stage_name:
                     if new_status is not None:
@@ -86,41 +105,32 @@ class WorkflowsPlugin:
                     stage["last_modified"] = datetime.utcnow().isoformat()
                     break
             pipeline_data["last_modified"] = datetime.utcnow().isoformat()
-            self._edit_key(STORE_NAME, pipeline_id, **pipeline_data)
+        return self._update_pipeline(pipeline_id, update)
 
     def delete_stage_from_pipeline(self, pipeline_id, stage_name):
-        pipeline_data = self._get_object(STORE_NAME, pipeline_id)
-        if pipeline_data:
+        def update(pipeline_data):
             pipeline_data["stages"] = [stage for stage in pipeline_data["stages"] if stage["name"] != stage_name]
             pipeline_data["last_modified"] = datetime.utcnow().isoformat()
-            self._edit_key(STORE_NAME, pipeline_id, **pipeline_data)
+        return self._update_pipeline(pipeline_id, update)
 
     def log_pipeline_error(self, pipeline_id, error_message):
         """Logs an error message to the specified pipeline."""
-        pipeline_data = self._get_object(STORE_NAME, pipeline_id)
-        if pipeline_data:
-            if "errors" not in pipeline_data:
-                pipeline_data["errors"] = []
-            pipeline_data["errors"].append({"message": error_message, "timestamp": datetime.utcnow().isoformat()})
-            self._edit_key(STORE_NAME, pipeline_id, **pipeline_data)
-        else:
+        def update(pipeline_data):
+            pipeline_data.setdefault("errors", []).append(
+                {"message": error_message, "timestamp": datetime.utcnow().isoformat()})
+        if not self._update_pipeline(pipeline_id, update):
             logger.error(f"Pipeline {pipeline_id} does not exist for error logging.")
+            return False
+        return True
 
     def log_stage_error(self, pipeline_id, stage_name, error_message):
         """Logs an error message to a specific stage within a pipeline."""
-        pipeline_data = self._get_object(STORE_NAME, pipeline_id)
-        if pipeline_data:
-            stage_found = False
+        def update(pipeline_data):
             for stage in pipeline_data["stages"]:
                 if stage["name"] == stage_name:
-                    if "errors" not in stage:
-                        stage["errors"] = []
-                    stage["errors"].append({"message": error_message, "timestamp": datetime.utcnow().isoformat()})
-                    stage_found = True
-                    break
-            if stage_found:
-                self._edit_key(STORE_NAME, pipeline_id, **pipeline_data)
-            else:
-                logger.error(f"Stage {stage_name} not found in pipeline {pipeline_id} for error logging.")
-        else:
-            logger.error(f"Pipeline {pipeline_id} does not exist for error logging.")
\ No newline at end of file
+                    stage.setdefault("errors", []).append(
+                        {"message": error_message, "timestamp": datetime.utcnow().isoformat()})
+                    return True
+            logger.error(f"Stage {stage_name} not found in pipeline {pipeline_id} for error logging.")
+            return False
+        return self._update_pipeline(pipeline_id, update)
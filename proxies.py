@@ -30,7 +30,7 @@ def start_server(host="localhost", port=6666, use_backup=False):
 
     def signal_handler(sig, frame):
         logger.info('Signal received, shutting down...')
-        storage.shutdown()
+        storage.close()
         daemon.shutdown()
         logger.info("Server has been shut down.")
 
@@ -0,0 +1,144 @@
+import logging
+import threading
+import time
+
+import Pyro4
+import Pyro4.errors
+
+import bulk
+from entry import Entry
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger('remote_proxies')
+
+BOOTSTRAPPING = "bootstrapping"
+STREAMING = "streaming"
+DISCONNECTED = "disconnected"
+STOPPED = "stopped"
+
+
+class Replicator:
+    """Keeps a local store a read replica of a primary reached over Pyro4.
+
+    The replica first notes the primary's change feed cursor, then copies
+    every store page by page with ``export_entries`` and installs it, and
+    from then on tails ``export_changes`` from that cursor, applying each
+    change as the
+    operation log replay does. A change may already be in the copied pages;
+    every change carries the key's whole new entry, so applying it again is
+    harmless. A store the primary replaced as a whole, e.g. restored from a
+    backup, is copied again. When the primary reports changes were missed
+    (the feed wrapped around, or the primary restarted) the replica
+    bootstraps again.
+    """
+
+    def __init__(self, store, primary_uri, batch_size=1000, poll_timeout=1, retry_interval=1):
+        self.store = store
+        self.primary_uri = primary_uri
+        self.batch_size = batch_size
+        self.poll_timeout = poll_timeout
+        self.retry_interval = retry_interval
+        self.state = STOPPED
+        self.cursor = None
+        self.applied = 0
+        self.bootstraps = 0
+        self.last_contact = None
+        self.last_change_time = None
+        self.lag = None
+        self.last_error = None
+        self._stopping = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.state = STOPPED
+
+    def status(self):
+        return {"primary": self.primary_uri, "state": self.state, "cursor": self.cursor, "applied": self.applied,
+                "bootstraps": self.bootstraps, "lag_seconds": self.lag, "last_contact": self.last_contact,
+                "last_change_time": self.last_change_time, "last_error": self.last_error}
+
+    def _run(self):
+        while not self._stopping.is_set():
+            try:
+                with Pyro4.Proxy(self.primary_uri) as primary:
+                    # A long poll must not be mistaken for a dead primary
+                    primary._pyroTimeout = self.poll_timeout + 10
+                    self._replicate(primary)
+            except Exception as e:
+                # Pyro raises server-side errors as their own class, and applying a change can fail here too
+                self.state = DISCONNECTED
+                self.last_error = str(e)
+                logger.error(f"Replication from {self.primary_uri} interrupted: {e}")
+                self._stopping.wait(self.retry_interval)
+
+    def _replicate(self, primary):
+        if self.cursor is None:
+            self._bootstrap(primary)
+        self.state = STREAMING
+        while not self._stopping.is_set():
+            changes = primary.export_changes(self.cursor, self.batch_size, self.poll_timeout)
+            self.last_contact = time.time()
+            if changes["missed"]:
+                logger.error(f"Replica missed changes after sequence {self.cursor}, bootstrapping again.")
+                self._bootstrap(primary)
+                self.state = STREAMING
+                continue
+            events = bulk.unpack(changes["data"])
+            for event in events:
+                self._apply(primary, event)
+            self.cursor = changes["cursor"]
+            if len(events) < self.batch_size:
+                self.lag = 0.0  # Caught up; the feed had nothing more
+            elif self.last_change_time is not None:
+                self.lag = max(0.0, self.last_contact - self.last_change_time)
+
+    def _bootstrap(self, primary):
+        self.state = BOOTSTRAPPING
+        # The cursor is taken first so no change made while copying is skipped
+        changes = primary.export_changes(None, 1, 0)
+        if changes is None:
+            raise Pyro4.errors.PyroError("The primary has its change feed disabled.")
+        cursor = changes["cursor"]
+        primary_stores = primary.list_stores()
+        for store_name in primary_stores:
+            self._copy_store(primary, store_name)
+        for store_name in set(self.store.list_stores()) - set(primary_stores):
+            self.store.delete_store(store_name)
+        self.cursor = cursor
+        self.bootstraps += 1
+        self.lag = None
+        logger.info(f"Replica bootstrapped {len(primary_stores)} stores from {self.primary_uri} "
+                    f"at sequence {cursor}.")
+
+    def _copy_store(self, primary, store_name):
+        entries = {}
+        page_cursor = None
+        while True:
+            page = primary.export_entries(store_name, page_cursor, self.batch_size)
+            if page is None:
+                return  # Deleted while being copied; its delete_store event follows
+            for key, entry in bulk.unpack_entries(page["data"]):
+                entries[key] = Entry.from_dict(entry)
+            page_cursor = page["cursor"]
+            if page_cursor is None:
+                break
+        self.store._install_store(store_name, entries)
+
+    def _apply(self, primary, event):
+        if event["op"] == "replace_store":
+            # Changes after the event may already be in the copy; applying them again is harmless
+            self._copy_store(primary, event["store"])
+        else:
+            self.store._apply_operation(event)
+        self.applied += 1
+        self.last_change_time = event["time"]
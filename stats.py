@@ -0,0 +1,187 @@
+import functools
+import itertools
+import math
+import random
+import threading
+import time
+
+# Values below 2**_SUB_BITS ns get a bucket each; above that every power of two
+# is split into 2**_SUB_BITS buckets, so a bucket is at most 12.5% wide.
+_SUB_BITS = 3
+_SUB_BUCKETS = 1 << _SUB_BITS
+_MAX_BITS = 40  # about 18 minutes
+_BUCKETS = (_MAX_BITS + 1) * _SUB_BUCKETS
+PERCENTILES = (50, 90, 99, 99.9)
+
+
+def bucket_of(ns):
+    bits = ns.bit_length()
+    if bits <= _SUB_BITS:
+        return ns
+    if bits > _MAX_BITS:
+        return _BUCKETS - 1
+    return ((bits - _SUB_BITS) << _SUB_BITS) | ((ns >> (bits - _SUB_BITS - 1)) & (_SUB_BUCKETS - 1))
+
+
+def bucket_floor(bucket):
+    """The smallest value counted in ``bucket``."""
+    if bucket < _SUB_BUCKETS:
+        return bucket
+    shift = (bucket >> _SUB_BITS) - 1
+    return (_SUB_BUCKETS | (bucket & (_SUB_BUCKETS - 1))) << shift
+
+
+class LatencyHistogram:
+    """Counts durations in fixed log-linear buckets, HDR histogram style.
+
+    Recording is a few integer operations and takes no lock; concurrent
+    records of one histogram may rarely lose a count, which is fine for
+    statistics and keeps the hot path cheap. The same goes for the
+    counters below.
+    """
+
+    __slots__ = ('counts', 'count', 'total', 'max')
+
+    def __init__(self):
+        self.counts = [0] * _BUCKETS
+        self.count = 0
+        self.total = 0
+        self.max = 0
+
+    def record(self, ns):
+        self.counts[bucket_of(ns)] += 1
+        self.count += 1
+        self.total += ns
+        if ns > self.max:
+            self.max = ns
+
+    def percentile(self, percent):
+        if not self.count:
+            return 0
+        rank = self.count * percent / 100
+        seen = 0
+        for bucket, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank and count:
+                return min(bucket_floor(bucket + 1), self.max)
+        return self.max
+
+    def summary(self):
+        """Count and latencies in microseconds; percentiles are bucket upper bounds."""
+        summary = {"count": self.count, "mean_us": self.total / self.count / 1000 if self.count else 0.0,
+                   "max_us": self.max / 1000}
+        for percent in PERCENTILES:
+            summary[f"p{percent:g}_us"] = self.percentile(percent) / 1000
+        return summary
+
+
+class OperationCounter:
+    """Estimated calls of one operation on one store, with the latency of the sampled ones.
+
+    ``hits`` and ``misses`` are only counted for reads.
+    """
+
+    __slots__ = ('calls', 'hits', 'misses', 'latency')
+
+    def __init__(self):
+        self.calls = 0
+        self.hits = 0
+        self.misses = 0
+        self.latency = LatencyHistogram()
+
+    def summary(self):
+        summary = {"calls": self.calls, "latency": self.latency.summary()}
+        if self.hits or self.misses:
+            summary.update(hits=self.hits, misses=self.misses, hit_ratio=self.hits / (self.hits + self.misses))
+        return summary
+
+
+class OperationStats:
+    """Operation counters per store, fed by a random sample of the calls.
+
+    A read takes well under a microsecond, about what counting it would
+    cost in Python, and even a random draw per call costs a few percent of
+    it. So calls count down ``skips``, an iterator of the calls left before
+    the next sample, which is one C-level ``next`` and atomic under the GIL,
+    so threads share it without a lock. The sampled call is timed and
+    counted with weight ``sample_every``, then draws the next gap from a
+    geometric distribution. That picks each call independently with
+    probability ``1 / sample_every``, exactly as a draw per call would, so
+    the counts stay unbiased when clients repeat a fixed pattern of
+    operations. ``sample_every=1`` counts exactly.
+    """
+
+    def __init__(self, sample_every=256):
+        if sample_every < 1 or sample_every & (sample_every - 1):
+            raise ValueError("sample_every must be a power of two")
+        self.sample_every = sample_every
+        self._log_skip = math.log(1 - 1 / sample_every) if sample_every > 1 else None
+        # Yields None for each call to skip; the first call is sampled
+        self.skips = iter(())
+        # By (store_name, op); hot paths read it directly and only call counter() for a new pair
+        self.counters = {}
+        self._lock = threading.Lock()
+
+    def skip_ahead(self):
+        """Starts the countdown to the next sampled call; called by the sampled call."""
+        if self._log_skip is None:
+            return
+        # Two threads sampling at once both draw a gap, which only costs one extra sample
+        self.skips = itertools.repeat(None, int(math.log(1.0 - random.random()) / self._log_skip))
+
+    def counter(self, store_name, op):
+        with self._lock:
+            return self.counters.setdefault((store_name, op), OperationCounter())
+
+    def reset(self):
+        with self._lock:
+            self.counters = {}
+
+    def summary(self, store_name=None):
+        stores = {}
+        for (name, op), counter in list(self.counters.items()):
+            if store_name is None or name == store_name:
+                stores.setdefault(name, {})[op] = counter.summary()
+        return stores
+
+
+def timed(op):
+    """Samples the calls of a store method taking ``store_name`` first into the store's ``_op_stats``."""
+    def decorate(method):
+        @functools.wraps(method)
+        def wrapper(self, store_name, *args, **kwargs):
+            stats = self._op_stats
+            if stats is None or next(stats.skips, False) is None:
+                return method(self, store_name, *args, **kwargs)
+            stats.skip_ahead()
+            counter = stats.counters.get((store_name, op)) or stats.counter(store_name, op)
+            counter.calls += stats.sample_every
+            start = time.perf_counter_ns()
+            try:
+                return method(self, store_name, *args, **kwargs)
+            finally:
+                counter.latency.record(time.perf_counter_ns() - start)
+        return wrapper
+    return decorate
+
+
+class TimedLock:
+    """Wraps one lock acquisition to record the time spent waiting for it and holding it."""
+
+    __slots__ = ('_lock', '_wait', '_hold', '_acquired')
+
+    def __init__(self, lock, wait, hold):
+        self._lock = lock
+        self._wait = wait
+        self._hold = hold
+
+    def __enter__(self):
+        start = time.perf_counter_ns()
+        self._lock.__enter__()
+        self._acquired = time.perf_counter_ns()
+        self._wait.record(self._acquired - start)
+        return self
+
+    def __exit__(self, *exc_info):
+        self._hold.record(time.perf_counter_ns() - self._acquired)
+        return self._lock.__exit__(*exc_info)
@@ -0,0 +1,826 @@
+import glob
+import logging
+import lzma
+import os
+import shutil
+import sqlite3
+import threading
+import time
+import uuid
+import zlib
+from collections import OrderedDict
+from collections.abc import MutableMapping
+
+import msgpack
+
+import backups
+from entry import Entry
+from eviction import value_size
+
+logger = logging.getLogger('remote_proxies')
+
+MEMORY = "memory"
+SQLITE = "sqlite"
+TIERED = "tiered"
+COMPRESSED = "compressed"
+STORAGE_ENGINES = (MEMORY, SQLITE, TIERED, COMPRESSED)
+COMPRESSION_CODECS = ("zlib", "lzma")
+SQLITE_EXTENSION = "sqlite3"
+SCAN_BATCH_SIZE = 1000
+# Smaller values are never spilled for being cold, a blob file would cost more than it saves
+COLD_SPILL_MIN_SIZE = 1024
+# zlib looks back at most 32 KB, so a longer preset dictionary is wasted
+ZDICT_SIZE = 32 * 1024
+# A payload kept compressed must shrink by at least this much
+MIN_SAVING = 0.1
+
+
+class MemoryEngine:
+    """Keeps every store in a plain dict, as the store always did; the default."""
+
+    name = MEMORY
+    persistent = False
+
+    def open_store(self, store_name):
+        return {}
+
+    def load_store(self, content, entries):
+        return entries
+
+    def drop_store(self, store_name, content):
+        pass
+
+    def stored_names(self):
+        return []
+
+    def stats(self, content):
+        return {"keys": len(content)}
+
+    def sweep(self, content):
+        return 0
+
+    def snapshot(self, content):
+        """Copies what a backup needs of a store; cheap, it runs with the whole store locked."""
+        return content.copy()
+
+    def materialize(self, content, snapshot):
+        """Returns the entries of ``snapshot`` to write to a backup, once the store lock is released."""
+        return snapshot
+
+    def close(self):
+        pass
+
+
+class SQLiteEngine:
+    """Keeps each store in its own SQLite database in WAL mode under ``directory``.
+
+    Stores outlive the process: a store whose database exists is reopened
+    with its keys when it is created again.
+    """
+
+    name = SQLITE
+    persistent = True
+
+    def __init__(self, directory, cache_size=10_000):
+        self.directory = directory
+        self.cache_size = cache_size
+        os.makedirs(directory, exist_ok=True)
+        self._stores = {}
+        self._lock = threading.Lock()
+
+    def _path(self, store_name):
+        return os.path.join(self.directory, f"{store_name}.{SQLITE_EXTENSION}")
+
+    def open_store(self, store_name):
+        with self._lock:
+            content = SQLiteStore(self._path(store_name), self.cache_size)
+            self._stores[store_name] = content
+            return content
+
+    def load_store(self, content, entries):
+        content.load(entries)
+        return content
+
+    def drop_store(self, store_name, content):
+        with self._lock:
+            self._stores.pop(store_name, None)
+        content.close()
+        path = self._path(store_name)
+        for name in (path, f"{path}-wal", f"{path}-shm"):
+            if os.path.exists(name):
+                os.remove(name)
+
+    def stored_names(self):
+        """Names of the stores that have a database in ``directory``."""
+        return sorted(os.path.basename(path)[:-len(SQLITE_EXTENSION) - 1]
+                      for path in glob.glob(os.path.join(self.directory, f"*.{SQLITE_EXTENSION}")))
+
+    def stats(self, content):
+        return content.stats()
+
+    def sweep(self, content):
+        return 0
+
+    def close(self):
+        with self._lock:
+            stores, self._stores = list(self._stores.values()), {}
+        for content in stores:
+            content.close()
+
+
+class TieredEngine(MemoryEngine):
+    """Keeps stores in memory, spilling large and cold values to blob files under ``directory``.
+
+    Values of ``spill_size`` bytes or more are spilled as they are written;
+    with ``spill_after`` set, ``sweep`` spills the values not read since the
+    previous sweep, so calling it every ``spill_after`` seconds spills what
+    went untouched that long. Blobs only stand in for memory: they are
+    dropped with their store and when the engine closes.
+    """
+
+    name = TIERED
+
+    def __init__(self, directory, spill_size=64 * 1024, spill_after=None, cache_size=256):
+        self.directory = os.path.join(directory, "blobs")
+        self.spill_size = spill_size
+        self.spill_after = spill_after
+        self.cache_size = cache_size
+
+    def _path(self, store_name):
+        return os.path.join(self.directory, store_name)
+
+    def open_store(self, store_name):
+        path = self._path(store_name)
+        shutil.rmtree(path, ignore_errors=True)  # Left over by a process that did not close
+        return TieredStore(path, self.spill_size, self.spill_after is not None, self.cache_size)
+
+    def load_store(self, content, entries):
+        content.load(entries)
+        return content
+
+    def drop_store(self, store_name, content):
+        shutil.rmtree(self._path(store_name), ignore_errors=True)
+
+    def stats(self, content):
+        return content.stats()
+
+    def sweep(self, content):
+        return content.spill_cold() if self.spill_after is not None else 0
+
+    def snapshot(self, content):
+        # Blobs are read back once the store lock is released
+        return content.stubs()
+
+    def materialize(self, content, snapshot):
+        return content.resolve(snapshot)
+
+    def close(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+
+class CompressedEngine(MemoryEngine):
+    """Keeps stores in memory with payloads of ``min_size`` bytes or more compressed."""
+
+    name = COMPRESSED
+
+    def __init__(self, codec="zlib", min_size=1024):
+        if codec not in COMPRESSION_CODECS:
+            raise ValueError(f"compression must be one of {', '.join(COMPRESSION_CODECS)}")
+        self.codec = codec
+        self.min_size = min_size
+
+    def open_store(self, store_name):
+        return CompressedStore(self.codec, self.min_size)
+
+    def load_store(self, content, entries):
+        content.load(entries)
+        return content
+
+    def stats(self, content):
+        return content.stats()
+
+    def snapshot(self, content):
+        # Payloads are decompressed once the store lock is released
+        return content.stubs()
+
+    def materialize(self, content, snapshot):
+        return content.resolve(snapshot)
+
+
+def new_engine(name, directory=None, cache_size=10_000, spill_size=64 * 1024, spill_after=None,
+               compression="zlib", compression_min_size=1024):
+    if name == MEMORY:
+        return MemoryEngine()
+    if name == SQLITE:
+        return SQLiteEngine(directory, cache_size)
+    if name == TIERED:
+        return TieredEngine(directory, spill_size, spill_after)
+    if name == COMPRESSED:
+        return CompressedEngine(compression, compression_min_size)
+    raise ValueError(f"storage engine must be one of {', '.join(STORAGE_ENGINES)}")
+
+
+def encode_entry(entry):
+    return msgpack.packb(entry.to_dict(), use_bin_type=True, default=backups.msgpack_default)
+
+
+def decode_entry(data):
+    return Entry.from_dict(msgpack.unpackb(data, raw=False, strict_map_key=False))
+
+
+class SQLiteStore(MutableMapping):
+    """The entries of one store in a SQLite table, behind an LRU cache of the hottest ones.
+
+    It is a mapping like the dict it stands in for. Writes go
+    through to the table, each one committed on its own; with WAL and
+    ``synchronous=NORMAL`` a commit appends to the log without an fsync, so
+    a crashed process loses nothing and a crashed machine at most the last
+    writes. The keys stay in memory, so lookups of missing keys and ``len``
+    never read the disk; values are only kept for the ``cache_size`` most
+    recently used keys. Entries are immutable once stored, so a cached entry
+    is handed out as is.
+
+    ``items`` reads on a connection of its own inside one read transaction,
+    which WAL keeps at a single point in time while writers carry on.
+    """
+
+    persistent = True
+
+    def __init__(self, path, cache_size=10_000):
+        self.path = path
+        self.cache_size = cache_size
+        self._lock = threading.Lock()
+        self._connection = self._connect()
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS entries (key PRIMARY KEY, entry BLOB NOT NULL) WITHOUT ROWID")
+        self._keys = {row[0] for row in self._connection.execute("SELECT key FROM entries")}
+        self._cache = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def _connect(self):
+        # Autocommit; every connection use is serialized by the caller
+        connection = sqlite3.connect(self.path, isolation_level=None, check_same_thread=False)
+        connection.execute("PRAGMA synchronous=NORMAL")
+        return connection
+
+    def __len__(self):
+        return len(self._keys)
+
+    def __contains__(self, key):
+        return key in self._keys
+
+    def __iter__(self):
+        with self._lock:
+            return iter(list(self._keys))
+
+    def get(self, key, default=None):
+        entry = self._cache.get(key)
+        if entry is not None:
+            self.hits += 1
+            try:
+                self._cache.move_to_end(key)
+            except KeyError:
+                pass  # Evicted from the cache since
+            return entry
+        if key not in self._keys:
+            return default
+        with self._lock:
+            entry = self._cache.get(key)
+            if entry is None:
+                row = self._connection.execute("SELECT entry FROM entries WHERE key = ?", (key,)).fetchone()
+                if row is None:
+                    return default
+                entry = decode_entry(row[0])
+                self.misses += 1
+                self._cache_entry(key, entry)
+            return entry
+
+    def __getitem__(self, key):
+        entry = self.get(key)
+        if entry is None:
+            raise KeyError(key)
+        return entry
+
+    def __setitem__(self, key, entry):
+        data = encode_entry(entry)
+        with self._lock:
+            self._connection.execute("INSERT OR REPLACE INTO entries (key, entry) VALUES (?, ?)", (key, data))
+            self._keys.add(key)
+            self._cache_entry(key, entry)
+
+    def pop(self, key, *default):
+        entry = self.get(key)
+        if entry is None:
+            if default:
+                return default[0]
+            raise KeyError(key)
+        with self._lock:
+            self._connection.execute("DELETE FROM entries WHERE key = ?", (key,))
+            self._keys.discard(key)
+            self._cache.pop(key, None)
+        return entry
+
+    def __delitem__(self, key):
+        self.pop(key)
+
+    def _cache_entry(self, key, entry):
+        # Caller holds the lock
+        self._cache[key] = entry
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    def items(self):
+        """Yields every ``(key, entry)`` as of the first one read, in batches, without blocking writers."""
+        connection = self._connect()
+        try:
+            connection.execute("BEGIN")
+            cursor = connection.execute("SELECT key, entry FROM entries")
+            while True:
+                rows = cursor.fetchmany(SCAN_BATCH_SIZE)
+                if not rows:
+                    break
+                for key, data in rows:
+                    yield key, decode_entry(data)
+            connection.execute("COMMIT")
+        finally:
+            connection.close()
+
+    def copy(self):
+        return dict(self.items())
+
+    def stubs(self):
+        """Returns the entries as held, stubs included, for ``resolve`` to load later.
+
+        The payloads of these stubs stay readable until ``resolve`` returns,
+        even if their keys are written or deleted meanwhile.
+        """
+        with self._lock:
+            self._pins += 1
+            return dict(self._entries)
+
+    def resolve(self, stubs):
+        """Returns a copy of what ``stubs`` returned with every payload loaded, leaving out missing ones."""
+        try:
+            entries = {}
+            for key, entry in stubs.items():
+                if type(entry.value) is self.ref_type:
+                    try:
+                        entry = self._load(entry)
+                    except FileNotFoundError:
+                        logger.error(f"The payload of key {key} is missing.")
+                        continue
+                entries[key] = entry
+            return entries
+        finally:
+            with self._lock:
+                self._pins -= 1
+                if not self._pins:
+                    self._unpinned()
+
+    def load(self, entries):
+        """Replaces the whole content with ``entries`` in one transaction."""
+        rows = ((key, encode_entry(entry)) for key, entry in entries.items())
+        with self._lock:
+            self._connection.execute("BEGIN")
+            try:
+                self._connection.execute("DELETE FROM entries")
+                self._connection.executemany("INSERT INTO entries (key, entry) VALUES (?, ?)", rows)
+                self._connection.execute("COMMIT")
+            except BaseException:
+                self._connection.execute("ROLLBACK")
+                raise
+            self._keys = set(entries)
+            self._cache = OrderedDict()
+
+    def disk_size(self):
+        return sum(os.path.getsize(name) for name in (self.path, f"{self.path}-wal") if os.path.exists(name))
+
+    def stats(self):
+        return {"keys": len(self._keys), "cached": len(self._cache), "cache_hits": self.hits,
+                "cache_misses": self.misses, "disk_bytes": self.disk_size()}
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
+
+
+def pack_payload(entry):
+    """Encodes what an entry holds beyond its core fields: the value and the extra fields."""
+    return msgpack.packb({"value": entry.value, "extras": entry.extras}, use_bin_type=True,
+                         default=backups.msgpack_default)
+
+
+def unpack_payload(stub, data):
+    payload = msgpack.unpackb(data, raw=False, strict_map_key=False)
+    return stub.replace(value=payload['value'], **(payload['extras'] or {}))
+
+
+def stub_of(entry, ref):
+    return Entry(ref, entry.exp_time, entry.readonly, entry.last_refresh, version=entry.version)
+
+
+class PayloadStore(MutableMapping):
+    """A dict of entries, some of which only hold a reference to their payload.
+
+    Such a stub is an Entry with the deadline, version and flags of the
+    real one, whose value is a ``ref_type`` instance. Reading a stub loads
+    the payload back; recently loaded entries are kept in a small LRU cache,
+    valid for as long as their stub is current. Reads take no lock, writers
+    swap entries under one lock. Subclasses decide what to hold by
+    reference (``_hold``), how to load it (``_load``) and what to free when
+    a stub is replaced or deleted (``_release``).
+    """
+
+    ref_type = None
+
+    def __init__(self, cache_size=256):
+        self.cache_size = cache_size
+        self._lock = threading.Lock()
+        self._entries = {}
+        # Recently loaded entries by key: (stub, entry)
+        self._cache = OrderedDict()
+        # Copies taken by ``stubs`` and not resolved yet
+        self._pins = 0
+        self.loads = 0
+        self.cache_hits = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def __iter__(self):
+        return iter(list(self._entries))
+
+    def get(self, key, default=None):
+        while True:
+            entry = self._entries.get(key)
+            if entry is None:
+                return default
+            if type(entry.value) is not self.ref_type:
+                return entry
+            try:
+                return self._fault(key, entry)
+            except FileNotFoundError:
+                if self._entries.get(key) is entry:
+                    logger.error(f"The payload of key {key} is missing.")
+                    raise
+                # Replaced while it was being read
+
+    def __getitem__(self, key):
+        entry = self.get(key)
+        if entry is None:
+            raise KeyError(key)
+        return entry
+
+    def _fault(self, key, stub):
+        cached = self._cache.get(key)
+        if cached is not None and cached[0] is stub:
+            self.cache_hits += 1
+            return cached[1]
+        entry = self._load(stub)
+        self.loads += 1
+        with self._lock:
+            if self._entries.get(key) is stub:
+                self._loaded(key, stub, entry)
+        return entry
+
+    def _loaded(self, key, stub, entry):
+        # Caller holds the lock
+        self._cache[key] = (stub, entry)
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    def __setitem__(self, key, entry):
+        stub = self._hold(entry)
+        with self._lock:
+            previous = self._entries.get(key)
+            self._entries[key] = stub
+            self._cache.pop(key, None)
+            if previous is not None and type(previous.value) is self.ref_type:
+                self._release(previous.value)
+
+    def pop(self, key, *default):
+        entry = self.get(key)
+        with self._lock:
+            stub = self._entries.pop(key, None)
+            if stub is None:
+                if default:
+                    return default[0]
+                raise KeyError(key)
+            self._cache.pop(key, None)
+            if type(stub.value) is self.ref_type:
+                self._release(stub.value)
+        return entry
+
+    def __delitem__(self, key):
+        self.pop(key)
+
+    def items(self):
+        """Yields every ``(key, entry)``, loading payloads without caching them.
+
+        A key whose payload is missing is logged and left out.
+        """
+        for key in list(self._entries):
+            entry = self._entries.get(key)
+            while entry is not None and type(entry.value) is self.ref_type:
+                try:
+                    entry = self._load(entry)
+                except FileNotFoundError:
+                    current = self._entries.get(key)
+                    if current is entry:
+                        logger.error(f"The payload of key {key} is missing.")
+                        current = None
+                    entry = current
+            if entry is not None:
+                yield key, entry
+
+    def copy(self):
+        return dict(self.items())
+
+    def stubs(self):
+        """Returns the entries as held, stubs included, for ``resolve`` to load later.
+
+        The payloads of these stubs stay readable until ``resolve`` returns,
+        even if their keys are written or deleted meanwhile.
+        """
+        with self._lock:
+            self._pins += 1
+            return dict(self._entries)
+
+    def resolve(self, stubs):
+        """Returns a copy of what ``stubs`` returned with every payload loaded, leaving out missing ones."""
+        try:
+            entries = {}
+            for key, entry in stubs.items():
+                if type(entry.value) is self.ref_type:
+                    try:
+                        entry = self._load(entry)
+                    except FileNotFoundError:
+                        logger.error(f"The payload of key {key} is missing.")
+                        continue
+                entries[key] = entry
+            return entries
+        finally:
+            with self._lock:
+                self._pins -= 1
+                if not self._pins:
+                    self._unpinned()
+
+    def load(self, entries):
+        for key in list(self._entries):
+            self.pop(key)
+        for key, entry in entries.items():
+            self[key] = entry
+
+    def _hold(self, entry):
+        return entry
+
+    def _load(self, stub):
+        raise NotImplementedError
+
+    def _release(self, ref):
+        pass
+
+    def _unpinned(self):
+        # Caller holds the lock
+        pass
+
+
+class BlobRef:
+    """The blob file holding the payload of a spilled entry, and its length."""
+
+    __slots__ = ('path', 'size', 'cold')
+
+    def __init__(self, path, size, cold):
+        self.path = path
+        self.size = size
+        self.cold = cold
+
+
+class TieredStore(PayloadStore):
+    """A dict of entries whose large or cold payloads live in blob files.
+
+    A value spilled for being cold is promoted, put back in memory for good,
+    when it is read; one spilled for its size only visits the cache. The
+    blob of a replaced or deleted entry is removed; a lock-free reader that
+    loses that race simply reads again.
+    """
+
+    ref_type = BlobRef
+
+    def __init__(self, directory, spill_size=64 * 1024, track_reads=False, cache_size=256):
+        super().__init__(cache_size)
+        self.directory = directory
+        self.spill_size = spill_size
+        os.makedirs(directory, exist_ok=True)
+        # Keys read since the last cold sweep, or None when nothing is spilled for being cold
+        self._read = set() if track_reads else None
+        self.spilled = 0
+        self.spilled_cold = 0
+        self.promoted = 0
+        self._blobs = 0
+        self._blob_bytes = 0
+        # Blobs of replaced entries kept until the copies that refer to them are resolved
+        self._unreferenced = []
+
+    def get(self, key, default=None):
+        if self._read is not None:
+            self._read.add(key)
+        return super().get(key, default)
+
+    def _loaded(self, key, stub, entry):
+        if not stub.value.cold:
+            return super()._loaded(key, stub, entry)
+        self._entries[key] = entry
+        self._release(stub.value)
+        self.promoted += 1
+
+    def _load(self, stub):
+        with open(stub.value.path, 'rb') as f:
+            return unpack_payload(stub, f.read())
+
+    def _hold(self, entry):
+        size = value_size(entry.value) + (value_size(entry.extras) if entry.extras else 0)
+        if size < self.spill_size:
+            return entry
+        self.spilled += 1
+        return self._write_blob(entry, cold=False)
+
+    def _write_blob(self, entry, cold):
+        path = os.path.join(self.directory, f"{uuid.uuid4().hex}.blob")
+        data = pack_payload(entry)
+        with open(path, 'wb') as f:
+            f.write(data)
+        with self._lock:
+            self._blobs += 1
+            self._blob_bytes += len(data)
+        return stub_of(entry, BlobRef(path, len(data), cold))
+
+    def _release(self, ref):
+        # Caller holds the lock
+        self._blobs -= 1
+        self._blob_bytes -= ref.size
+        if self._pins:
+            self._unreferenced.append(ref.path)  # Still in a copy taken by ``stubs``
+        else:
+            os.remove(ref.path)
+
+    def _unpinned(self):
+        for path in self._unreferenced:
+            os.remove(path)
+        self._unreferenced = []
+
+    def spill_cold(self):
+        """Spills the values of at least ``COLD_SPILL_MIN_SIZE`` bytes not read since the last call."""
+        with self._lock:
+            read, self._read = self._read, set()
+        spilled = 0
+        for key, entry in list(self._entries.items()):
+            if key in read or type(entry.value) is BlobRef:
+                continue
+            size = value_size(entry.value) + (value_size(entry.extras) if entry.extras else 0)
+            if size < COLD_SPILL_MIN_SIZE:
+                continue
+            stub = self._write_blob(entry, cold=True)
+            with self._lock:
+                if self._entries.get(key) is entry:
+                    self._entries[key] = stub
+                    spilled += 1
+                else:
+                    self._release(stub.value)
+        self.spilled_cold += spilled
+        return spilled
+
+    def stats(self):
+        return {"keys": len(self._entries), "spilled_keys": self._blobs, "blob_bytes": self._blob_bytes,
+                "spilled": self.spilled, "spilled_cold": self.spilled_cold, "promoted": self.promoted,
+                "blob_reads": self.loads, "cache_hits": self.cache_hits}
+
+
+class CompressedValue:
+    """The compressed payload of an entry, with the preset dictionary it needs and its raw length."""
+
+    __slots__ = ('data', 'dictionary', 'size')
+
+    def __init__(self, data, dictionary, size):
+        self.data = data
+        self.dictionary = dictionary
+        self.size = size
+
+
+def train_dictionary(samples, size=ZDICT_SIZE):
+    """Builds a zlib preset dictionary from sample payloads of a store.
+
+    Payloads of one store repeat the same field names and much of the same
+    content, which is exactly what a dictionary gives a small payload that
+    has no history of its own to refer to. zlib matches the end of the
+    dictionary most cheaply, so the newest samples go last.
+    """
+    return b"".join(samples)[-size:]
+
+
+class CompressedStore(PayloadStore):
+    """A dict of entries whose payloads of ``min_size`` bytes or more are kept compressed.
+
+    With zlib the first ``train_samples`` payloads are compressed on their
+    own and then train a preset dictionary for all later ones; lzma offers
+    no preset dictionary. A payload that does not shrink by ``MIN_SAVING``
+    is kept as it is. ``stats`` reports the ratio and the time spent
+    encoding and decoding.
+    """
+
+    ref_type = CompressedValue
+
+    def __init__(self, codec="zlib", min_size=1024, train_samples=32, cache_size=256):
+        super().__init__(cache_size)
+        self.codec = codec
+        self.min_size = min_size
+        self.train_samples = train_samples
+        self._samples = [] if codec == "zlib" else None
+        self._dictionary = None
+        self.compressed = 0
+        self.incompressible = 0
+        self.compress_ns = 0
+        self.decompressions = 0
+        self.decompress_ns = 0
+        self._raw_bytes = 0
+        self._stored_bytes = 0
+        self._compressed_keys = 0
+
+    def _hold(self, entry):
+        start = time.perf_counter_ns()
+        data = pack_payload(entry)
+        if len(data) < self.min_size:
+            return entry
+        dictionary = self._dictionary
+        compressed = self._compress(data, dictionary)
+        self._train(data)
+        with self._lock:
+            self.compress_ns += time.perf_counter_ns() - start
+            self.compressed += 1
+            if len(compressed) > len(data) * (1 - MIN_SAVING):
+                self.incompressible += 1
+                return entry
+            self._compressed_keys += 1
+            self._raw_bytes += len(data)
+            self._stored_bytes += len(compressed)
+        return stub_of(entry, CompressedValue(compressed, dictionary, len(data)))
+
+    def _compress(self, data, dictionary):
+        if self.codec == "lzma":
+            return lzma.compress(data)
+        if dictionary is None:
+            return zlib.compress(data)
+        compressor = zlib.compressobj(zdict=dictionary)
+        return compressor.compress(data) + compressor.flush()
+
+    def _train(self, data):
+        if self._samples is None:
+            return
+        with self._lock:
+            samples = self._samples
+            if samples is None:
+                return
+            samples.append(data)
+            if len(samples) < self.train_samples:
+                return
+            # The writer that fills the samples trains on them, the next ones find none left
+            self._samples = None
+        self._dictionary = train_dictionary(samples)
+
+    def _load(self, stub):
+        start = time.perf_counter_ns()
+        ref = stub.value
+        if self.codec == "lzma":
+            data = lzma.decompress(ref.data)
+        elif ref.dictionary is None:
+            data = zlib.decompress(ref.data)
+        else:
+            decompressor = zlib.decompressobj(zdict=ref.dictionary)
+            data = decompressor.decompress(ref.data) + decompressor.flush()
+        entry = unpack_payload(stub, data)
+        self.decompressions += 1
+        self.decompress_ns += time.perf_counter_ns() - start
+        return entry
+
+    def _release(self, ref):
+        # Caller holds the lock
+        self._compressed_keys -= 1
+        self._raw_bytes -= ref.size
+        self._stored_bytes -= len(ref.data)
+
+    def stats(self):
+        return {"keys": len(self._entries), "codec": self.codec, "compressed_keys": self._compressed_keys,
+                "raw_bytes": self._raw_bytes, "stored_bytes": self._stored_bytes,
+                "ratio": self._raw_bytes / self._stored_bytes if self._stored_bytes else None,
+                "dictionary_bytes": len(self._dictionary) if self._dictionary is not None else 0,
+                "incompressible": self.incompressible,
+                "compress_us": self.compress_ns / self.compressed / 1000 if self.compressed else 0.0,
+                "decompress_us": self.decompress_ns / self.decompressions / 1000 if self.decompressions else 0.0,
+                "decompressions": self.decompressions, "cache_hits": self.cache_hits}
@@ -1,33 +1,190 @@
+import copy
+import functools
 import json
 import os
 import time
 import logging
 import threading
+from fnmatch import fnmatchcase
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import ExitStack, nullcontext
 
 import Pyro4
 from cryptography.fernet import Fernet
 
+import backups
+import bulk
+from changefeed import ChangeFeed
+from entry import Entry
+from eviction import EVICTION_POLICIES, NOEVICTION, entry_size, new_tracker
+from expiration import ExpirationIndex
+from fieldindex import FieldIndex
+from keyindex import StoreKeyIndex, split_match
+from locks import CurrentStoreLock, StripedLock
+from oplog import OperationLog
+from replication import Replicator
+from stats import LatencyHistogram, OperationStats, TimedLock, timed
+from storage import MEMORY, STORAGE_ENGINES, TIERED, new_engine
+from valuepaths import add_number, append_item, deep_merge, update_in
+from versions import VersionHistory
+
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger('remote_proxies')
 
+EXPIRE_INDEXED = "indexed"
+EXPIRE_SAMPLED = "sampled"
+EXPIRATION_MODES = (EXPIRE_INDEXED, EXPIRE_SAMPLED)
+EXPIRE_BATCH_SIZE = 100
+EXPIRE_SAMPLE_SIZE = 20
+EXPIRE_REPEAT_RATIO = 0.25
+DEFAULT_TTL = 10 * 365 * 24 * 60 * 60  # 10 years in seconds
+MAX_CHANGES_TIMEOUT = 60
+
 @Pyro4.expose
 class AbstractKVStore:
-    def __init__(self, status_ttl=3600 * 10, cleanup_frequency=60, backup_dir=None, max_backups=10, use_backup=False, *args, **kwargs):
+    def __init__(self, status_ttl=3600 * 10, cleanup_frequency=60, backup_dir=None, max_backups=10, use_backup=False,
+                 lock_stripes=16, oplog_fsync=None, oplog_fsync_interval=0.05,
+                 oplog_compaction_size=64 * 1024 * 1024, restore_workers=None,
+                 backup_format="msgpack", backup_compression=None, backup_mode="inline", max_memory=None,
+                 store_max_memory=None, eviction_policy=NOEVICTION, expiration_mode=EXPIRE_INDEXED,
+                 expire_cycle_ms=25, expire_interval=0.1, change_feed_size=100_000, indexes=None, operation_stats=True, stats_sample_every=256,
+                 lock_stats=False, storage_engine=MEMORY, store_engines=None, storage_dir=None,
+                 storage_cache_size=10_000, spill_size=64 * 1024, spill_after=None, compression="zlib",
+                 compression_min_size=1024, replica_of=None, mvcc_versions=0, mvcc_window=100_000,
+                 *args, **kwargs):
         self.status_ttl = status_ttl
         self.cleanup_frequency = cleanup_frequency
         self.max_backups = max_backups
         self.backup_dir = backup_dir
+        self.lock_stripes = lock_stripes
+        self.oplog_fsync = oplog_fsync
+        self.oplog_compaction_size = oplog_compaction_size
+        self.restore_workers = restore_workers
+        if backup_format not in backups.BACKUP_FORMATS:
+            raise ValueError(f"backup_format must be one of {', '.join(backups.BACKUP_FORMATS)}")
+        if backup_compression not in backups.COMPRESSORS:
+            raise ValueError(f"Unknown backup compression {backup_compression}")
+        self.backup_format = backup_format
+        self.backup_compression = backup_compression
+        if backup_mode not in ("inline", "background"):
+            raise ValueError("backup_mode must be 'inline' or 'background'")
+        self.backup_mode = backup_mode
+        if eviction_policy not in EVICTION_POLICIES:
+            raise ValueError(f"eviction_policy must be one of {', '.join(EVICTION_POLICIES)}")
+        self.max_memory = max_memory
+        self.eviction_policy = eviction_policy
+        if expiration_mode not in EXPIRATION_MODES:
+            raise ValueError(f"expiration_mode must be one of {', '.join(EXPIRATION_MODES)}")
+        self.expiration_mode = expiration_mode
+        self.expire_cycle_ms = expire_cycle_ms
+        self.expire_interval = expire_interval
+        self.change_feed_size = change_feed_size
+        # Old versions kept per key for reads as of a commit version, 0 to keep none
+        self.mvcc_versions = mvcc_versions
+        self.mvcc_window = mvcc_window
+        self.lock_stats = lock_stats
+        for engine_name in (storage_engine, *(store_engines or {}).values()):
+            if engine_name not in STORAGE_ENGINES:
+                raise ValueError(f"storage_engine must be one of {', '.join(STORAGE_ENGINES)}")
+        self.storage_engine = storage_engine
+        # Engines overriding storage_engine for single stores, by store name
+        self._store_engine_names = dict(store_engines or {})
+        self.spill_size = spill_size
+        self.spill_after = spill_after
+        self.compression = compression
+        self.compression_min_size = compression_min_size
+        # Replicas follow the primary at this Pyro URI and refuse client writes
+        self.replica_of = replica_of
+        self._replicator = Replicator(self, replica_of) if replica_of else None
+        # Latency histograms per store and operation, read hit/miss counters
+        # and, when lock_stats is on, wait and hold times of the key locks.
+        self._op_stats = OperationStats(stats_sample_every) if operation_stats else None
+        self._lock_stats = {}
         self._stores = {}
+        self._expirations = ExpirationIndex()
+
+        # Structural lock, only taken to create or delete stores. Keys are
+        # guarded by the striped lock of the store they live in.
+        self._lock = threading.RLock()
+        self._store_locks = {}
+        self._key_indexes = {}
+
+        # Secondary indexes: the indexed fields of each store, kept across
+        # deleting and recreating it, and the built FieldIndex of each field.
+        self._index_fields = {store_name: list(fields) for store_name, fields in (indexes or {}).items()}
+        self._field_indexes = {}
+
+        # Per-store mutation counters, compared against the counter captured
+        # at the last backup so unchanged stores are not rewritten. Bumped
+        # under a key stripe and read under the whole-store lock.
+        self._mutations = {}
+        self._backup_stats = {}
+        self._scheduled_backups = {}
+
+        # Approximate bytes held by each store, the per-store limits and
+        # policies overriding the global ones, and for every store with an
+        # eviction policy a tracker ordering its evictable keys.
+        self._memory = {}
+        self._memory_lock = threading.Lock()
+        self._store_max_memory = dict(store_max_memory or {})
+        self._store_policies = {}
+        self._trackers = {}
+        self._eviction_stats = {}
+
+        # Background backup mode: point-in-time copies waiting for the writer
+        # thread, at most one per store (a newer copy replaces an older one).
+        self._pending_backups = OrderedDict()
+        self._backup_writer_cond = threading.Condition()
+        self._backup_writer_stopping = False
+        self._backup_writer_busy = False
+        self._backup_writer = None
+
+        # Write-ahead operation log, change feed and version history, opened once
+        # any recovery is done so the replay itself is not logged or published again.
+        self._oplog = None
+        self._changes = None
+        self._versions = None
+
+        # Operations a transaction may run, by name: the method and, for
+        # plugin operations bound to one store, that store's name.
+        self._transaction_operations = {}
+        for name, method in (("set", self._add_key), ("edit", self._edit_key), ("delete", self._delete_key),
+                             ("get", self._get_key), ("get_object", self._get_object), ("incr", self.incr),
+                             ("decr", self.decr), ("compare_and_set", self.compare_and_set),
+                             ("set_in", self.set_in), ("merge_in", self.merge_in), ("list_append", self.list_append)):
+            self._register_transaction_operation(name, method)
 
         try:
             os.makedirs(self.backup_dir, exist_ok=True)
         except Exception as e:
             raise Exception(f"Failed to create/access backup directory {self.backup_dir}: {e}")
 
+        storage_dir = storage_dir or os.path.join(self.backup_dir, "storage")
+        self._engines = {name: new_engine(name, storage_dir, storage_cache_size, spill_size, spill_after,
+                                          compression, compression_min_size)
+                         for name in {storage_engine, *self._store_engine_names.values()}}
+        # Stores kept on disk by their engine are back before any backup is considered
+        self._open_stored_stores()
+
         if use_backup:
-            self.load_from_backup()
+            # Until the log has been written once, as when it is first turned on, the backups hold the data
+            if self.oplog_fsync is not None and OperationLog.exists(self._oplog_dir):
+                self._recover_from_oplog()
+            else:
+                self.load_from_backup()
 
-        self._lock = threading.RLock()
+        if self.oplog_fsync is not None:
+            self._oplog = OperationLog(self._oplog_dir, fsync=self.oplog_fsync,
+                                       fsync_interval=oplog_fsync_interval)
+            # Fold whatever was recovered (or nothing) into a fresh snapshot
+            self.compact_oplog()
+        if self.change_feed_size:
+            self._changes = ChangeFeed(self.change_feed_size)
+        if self.mvcc_versions:
+            self._versions = VersionHistory(self.mvcc_versions, self.mvcc_window)
+
+        self._enforce_memory_limits()
         self._shutdown_requested = threading.Event()
 
         self._tasks = {}
@@ -35,6 +192,13 @@ class AbstractKVStore:
         self.is_running = {}
         # Register and start tasks
         self.register_task("cleanup", self._start_cleanup_thread, self._stop_cleanup_thread)
+        self.register_task("expiration", self._start_expiration_thread, self._stop_expiration_thread)
+        if self._oplog is not None:
+            self.register_task("oplog_compaction", self._start_compaction_thread, self._stop_compaction_thread)
+        if self._replicator is not None:
+            self.register_task("replication", self._replicator.start, self._replicator.stop)
+        if self.spill_after is not None and TIERED in self._engines:
+            self.register_task("tiering", self._start_tiering_thread, self._stop_tiering_thread)
 
     def start_task_by_name(self, task_name):
         if task_name in self._tasks and not self.is_running.get(task_name, False):
@@ -76,6 +240,18 @@ class AbstractKVStore:
             for name in self._shutdown_tasks.keys():
                 self.shutdown_task_by_name(name)
 
+    def close(self):
+        """Stops every task and closes the operation log and storage engines, once the process is done serving.
+
+        ``shutdown`` only stops tasks: the server keeps serving after a client
+        calls it, and can start them again. Nothing is logged after this.
+        """
+        self.shutdown()
+        if self._oplog is not None:
+            self._oplog.close()
+        for engine in self._engines.values():
+            engine.close()
+
     def update_configuration(self, backup_dir=None, metrics_interval=None, status_ttl=None, cleanup_frequency=None):
         if backup_dir is not None:
             self.backup_dir = backup_dir
@@ -99,6 +275,27 @@ class AbstractKVStore:
             "cleanup_frequency": self.cleanup_frequency,
             "max_backups": self.max_backups,
             "backup_dir": self.backup_dir,
+            "backup_format": self.backup_format,
+            "backup_compression": self.backup_compression,
+            "backup_mode": self.backup_mode,
+            "oplog_fsync": self.oplog_fsync,
+            "max_memory": self.max_memory,
+            "eviction_policy": self.eviction_policy,
+            "expiration_mode": self.expiration_mode,
+            "expire_cycle_ms": self.expire_cycle_ms,
+            "expire_interval": self.expire_interval,
+            "change_feed_size": self.change_feed_size,
+            "mvcc_versions": self.mvcc_versions,
+            "mvcc_window": self.mvcc_window,
+            "operation_stats": self._op_stats is not None,
+            "lock_stats": self.lock_stats,
+            "storage_engine": self.storage_engine,
+            "store_engines": dict(self._store_engine_names),
+            "spill_size": self.spill_size,
+            "spill_after": self.spill_after,
+            "compression": self.compression,
+            "compression_min_size": self.compression_min_size,
+            "replica_of": self.replica_of,
             "metrics_interval": getattr(self, 'metrics_interval', None)
         }
 
@@ -112,42 +309,664 @@ class AbstractKVStore:
         if hasattr(self, '_cleanup_thread') and self._cleanup_thread is not None:
             self._cleanup_thread.join()
             logger.info("Cleanup thread has been shut down gracefully.")
+        if self._backup_writer is not None:
+            with self._backup_writer_cond:
+                self._backup_writer_stopping = True
+                self._backup_writer_cond.notify()
+            self._backup_writer.join()
+            self._backup_writer = None
+            logger.info("Backup writer thread has been shut down gracefully.")
 
     def _start_cleanup_thread(self):
+        if self.backup_mode == "background":
+            self._backup_writer_stopping = False
+            self._backup_writer = threading.Thread(target=self._run_backup_writer)
+            self._backup_writer.daemon = True
+            self._backup_writer.start()
         self._cleanup_thread = threading.Thread(target=self.cleanup)
         self._cleanup_thread.daemon = True
         self._cleanup_thread.start()
 
+    def _run_backup_writer(self):
+        """Writes queued backups with no store lock held, draining the queue before stopping."""
+        while True:
+            with self._backup_writer_cond:
+                while not self._pending_backups and not self._backup_writer_stopping:
+                    self._backup_writer_cond.wait()
+                if not self._pending_backups:
+                    return
+                store_name, (content, mutations) = self._pending_backups.popitem(last=False)
+                self._backup_writer_busy = True
+            try:
+                self._write_backup(store_name, content, mutations)
+            except Exception as e:
+                logger.error(f"Background backup of store {store_name} failed: {e}")
+            with self._backup_writer_cond:
+                self._backup_writer_busy = False
+                self._backup_writer_cond.notify_all()
+
+    def wait_for_backups(self, timeout=None):
+        """Blocks until the background writer has written every queued backup."""
+        with self._backup_writer_cond:
+            return self._backup_writer_cond.wait_for(
+                lambda: not self._pending_backups and not self._backup_writer_busy, timeout)
+
     def cleanup(self):
         while not self._shutdown_requested.is_set():
             with self._lock:
-                for k, v in self._stores.items():
-                    current_time = time.time()
-                    expired_keys = [key for key, value_details in v.items() if
-                                    current_time > value_details['exp_time']]
-                    for key in expired_keys:
-                        del v[key]
-                        logger.info(f"Expired value for key {key} removed")
-                    self.rotate_and_backup(k, v)
+                stores = list(self._stores.items())
+            for k, v in stores:
+                try:
+                    self._backup_if_dirty(k)
+                except Exception as e:
+                    # Left dirty, so the next pass tries again
+                    logger.error(f"Backup of store {k} failed: {e}")
             self._shutdown_requested.wait(self.cleanup_frequency)
 
+    def _start_expiration_thread(self):
+        self._expiration_stopping = threading.Event()
+        self._expiration_thread = threading.Thread(target=self._expire_periodically)
+        self._expiration_thread.daemon = True
+        self._expiration_thread.start()
+
+    def _stop_expiration_thread(self):
+        self._expiration_stopping.set()
+        self._expiration_thread.join()
+        logger.info("Expiration thread has been shut down gracefully.")
+
+    def _expire_periodically(self):
+        while not self._expiration_stopping.wait(self.expire_interval):
+            try:
+                self._expire_due_keys()
+            except Exception as e:
+                logger.error(f"Expiration cycle failed: {e}")
+
+    def _start_tiering_thread(self):
+        self._tiering_stopping = threading.Event()
+        self._tiering_thread = threading.Thread(target=self._sweep_periodically)
+        self._tiering_thread.daemon = True
+        self._tiering_thread.start()
+
+    def _stop_tiering_thread(self):
+        self._tiering_stopping.set()
+        self._tiering_thread.join()
+        logger.info("Tiering thread has been shut down gracefully.")
+
+    def _sweep_periodically(self):
+        while not self._tiering_stopping.wait(self.spill_after):
+            try:
+                self._sweep_storage()
+            except Exception as e:
+                logger.error(f"Storage sweep failed: {e}")
+
+    def _sweep_storage(self):
+        """Lets each engine move what went cold out of memory, returning how many values moved."""
+        with self._lock:
+            stores = list(self._stores.items())
+        moved = sum(self._engine(store_name).sweep(content) for store_name, content in stores)
+        if moved:
+            logger.info(f"Spilled {moved} cold values to disk.")
+        return moved
+
+    def _start_compaction_thread(self):
+        self._compaction_requested = threading.Event()
+        self._compaction_thread = threading.Thread(target=self._compact_when_needed)
+        self._compaction_thread.daemon = True
+        self._compaction_thread.start()
+
+    def _stop_compaction_thread(self):
+        self._compaction_requested.set()
+        self._compaction_thread.join()
+        self._oplog.flush()
+        logger.info("Compaction thread has been shut down gracefully.")
+
+    def _compact_when_needed(self):
+        while not self._compaction_requested.wait(1):
+            if self._oplog.size >= self.oplog_compaction_size:
+                self.compact_oplog()
+
+    @property
+    def _oplog_dir(self):
+        return os.path.join(self.backup_dir, "oplog")
+
+    def compact_oplog(self):
+        """Folds the operation log into a snapshot of every store and drops the folded segments."""
+        if self._oplog is None:
+            return False
+        segment = self._oplog.rotate()
+        # Records land in the log after their mutation is applied, so anything
+        # in the older segments is part of these snapshots. Records in the new
+        # segment may be too; replaying them is idempotent.
+        with self._lock:
+            store_names = list(self._stores.keys())
+        stores = {store_name: self._snapshot(store_name) for store_name in store_names}
+        self._oplog.write_snapshot(segment, {k: v for k, v in stores.items() if v is not None})
+        logger.info(f"Operation log compacted up to segment {segment}.")
+        return True
+
+    def _recover_from_oplog(self):
+        stores, records = OperationLog.recover(self._oplog_dir)
+        for store_name, entries in stores.items():
+            self.create_store(store_name)
+            store = self._stores[store_name]
+            for key, entry in entries.items():
+                self._set_entry(store_name, store, key, Entry.from_dict(entry))
+        replayed = 0
+        for record in records:
+            self._apply_operation(record)
+            replayed += 1
+        logger.info(f"Recovered {len(stores)} stores and replayed {replayed} logged operations.")
+
+    def _apply_operation(self, record):
+        """Applies a logged mutation; applying the same record twice is harmless."""
+        op, store_name = record['op'], record['store']
+        if op == 'create_store':
+            self.create_store(store_name)
+        elif op == 'delete_store':
+            self.delete_store(store_name)
+        else:
+            key = record['key']
+            with self._key_lock(store_name, key):
+                store = self._stores.get(store_name)
+                if store is None:
+                    return
+                if op == 'set':
+                    self._set_entry(store_name, store, key, Entry.from_dict(record['entry']))
+                elif op == 'delete' and key in store:
+                    self._remove_entry(store_name, store, key)
+
+    def _log_operation(self, op, store_name, key=None, entry=None):
+        # Called under the key's stripe, so the feed orders the changes of a key as they were made
+        if self._changes is not None:
+            self._changes.publish(op, store_name, key, entry)
+        if self._oplog is None:
+            return
+        record = {"op": op, "store": store_name}
+        if key is not None:
+            record["key"] = key
+        if entry is not None:
+            record["entry"] = entry
+        self._oplog.append(record)
+
+    def get_changes(self, store_name=None, prefix="", after=None, limit=100, timeout=0):
+        """Returns the changes made after sequence number ``after``, waiting up to ``timeout`` seconds for one.
+
+        Filters on ``store_name`` (every store when None) and key ``prefix``.
+        ``after=None`` starts from now. Returns ``{"events": [...], "cursor":
+        ..., "missed": ...}``; pass ``cursor`` back as ``after`` to resume.
+        ``missed`` means changes after ``after`` already left the feed and the
+        caller should reread the store before resuming. Each event holds
+        ``seq``, ``time``, ``op`` ("set", "delete", "create_store",
+        "delete_store" or "replace_store", after which the whole store should
+        be read again), ``store`` and, for key changes, ``key`` and the new
+        ``entry``. Returns None when the feed is disabled.
+        """
+        if self._changes is None:
+            logger.error("The change feed is disabled.")
+            return None
+        if after is None:
+            after = self._changes.last_seq
+        timeout = min(max(timeout or 0, 0), MAX_CHANGES_TIMEOUT)
+        records, cursor, missed = self._changes.read(after, store_name, prefix or "", limit, timeout)
+        return {"events": [self._change_event(record) for record in records], "cursor": cursor, "missed": missed}
+
+    def export_changes(self, after=None, limit=100, timeout=0):
+        """``get_changes`` of every store with the events packed into ``data`` (see ``bulk.pack``).
+
+        What replicas tail, so entries holding bytes reach them intact.
+        """
+        changes = self.get_changes(None, "", after, limit, timeout)
+        if changes is None:
+            return None
+        return {"data": bulk.pack(changes.pop("events")), **changes}
+
+    @staticmethod
+    def _change_event(record):
+        seq, published, op, store_name, key, entry = record
+        event = {"seq": seq, "time": published, "op": op, "store": store_name}
+        if key is not None:
+            event["key"] = key
+        if entry is not None:
+            event["entry"] = entry.to_dict()
+        return event
+
+    def _expire_due_keys(self, budget_ms=None):
+        """Runs one expiration cycle, spending at most ``budget_ms`` (``expire_cycle_ms`` by default).
+
+        In ``indexed`` mode due keys are popped from the deadline heap in
+        batches. In ``sampled`` mode random deadlines are checked instead and
+        the cycle repeats while more than a quarter of a sample had expired,
+        as Redis does. Either way each key's stripe is held only to remove
+        that key and the store-wide lock is never taken; what a cycle leaves
+        behind is picked up by the next one or deleted when read.
+        """
+        budget = (self.expire_cycle_ms if budget_ms is None else budget_ms) / 1000
+        deadline = time.perf_counter() + budget
+        expired = 0
+        while True:
+            now = time.time()
+            if self.expiration_mode == EXPIRE_SAMPLED:
+                sample = self._expirations.sample(EXPIRE_SAMPLE_SIZE)
+                due = [(store_name, key, exp_time) for store_name, key, exp_time in sample if exp_time < now]
+                more = len(due) > len(sample) * EXPIRE_REPEAT_RATIO
+            else:
+                due = self._expirations.pop_due(now, limit=EXPIRE_BATCH_SIZE)
+                more = len(due) == EXPIRE_BATCH_SIZE
+            for store_name, key, exp_time in due:
+                expired += self._expire_key(store_name, key, exp_time)
+            if not more or time.perf_counter() >= deadline:
+                return expired
+
+    def _expire_key(self, store_name, key, exp_time):
+        with self._key_lock(store_name, key):
+            store = self._stores.get(store_name)
+            entry = store.get(key) if store is not None else None
+            if entry is None or entry.exp_time != exp_time:
+                return 0
+            self._remove_entry(store_name, store, key)
+        logger.info(f"Expired value for key {key} removed")
+        return 1
+
+    def _new_store_lock(self):
+        return StripedLock(self.lock_stripes)
+
+    def _key_lock(self, store_name, key):
+        return CurrentStoreLock(self._store_locks, store_name,
+                                lambda store_lock: self._stripes(store_name, store_lock.for_key(key)))
+
+    def _keys_lock(self, store_name, keys):
+        return CurrentStoreLock(self._store_locks, store_name,
+                                lambda store_lock: self._stripes(store_name, store_lock.for_keys(keys)))
+
+    def _stripes(self, store_name, lock):
+        return self._timed_lock(store_name, lock) if self.lock_stats else lock
+
+    def _version_batch(self):
+        # Writes under one lock acquisition become visible to versioned reads together
+        return self._versions.batch() if self._versions is not None else nullcontext()
+
+    def _whole_store_lock(self, store_name):
+        return CurrentStoreLock(self._store_locks, store_name,
+                                lambda store_lock: self._stripes(store_name, store_lock.all()))
+
+    def _timed_lock(self, store_name, lock):
+        histograms = self._lock_stats.get(store_name)
+        if histograms is None:
+            histograms = self._lock_stats.setdefault(store_name, (LatencyHistogram(), LatencyHistogram()))
+        return TimedLock(lock, *histograms)
+
+    def get_operation_stats(self, store_name=None, reset=False):
+        """Returns the calls and latency percentiles of each operation per store, and lock wait/hold times.
+
+        Calls, and the hits and misses of ``get`` and ``get_object``, are
+        estimated from a random one in ``sample_every`` calls; latencies are
+        in microseconds, measured inside the server on those calls. Lock
+        times are only collected with ``lock_stats`` on. ``reset`` starts the
+        counts over once they are read.
+        """
+        stats = {"sample_every": self._op_stats.sample_every if self._op_stats is not None else None,
+                 "operations": self._op_stats.summary(store_name) if self._op_stats is not None else {},
+                 "locks": {name: {"wait": wait.summary(), "hold": hold.summary()}
+                           for name, (wait, hold) in list(self._lock_stats.items())
+                           if store_name is None or name == store_name}}
+        if reset:
+            if self._op_stats is not None:
+                self._op_stats.reset()
+            self._lock_stats = {}
+        return stats
+
+    def _backup_if_dirty(self, store_name):
+        """Backs up a store only if it changed since the last generation.
+
+        The store lock is held just long enough to copy the store; entries are
+        never mutated in place, so the shallow copy stays a consistent view
+        while it is serialized, inline or on the background writer thread.
+        Payloads kept on disk or compressed are only loaded after the lock is
+        released.
+        """
+        engine = self._engine(store_name)
+        with self._whole_store_lock(store_name):
+            store = self._stores.get(store_name)
+            if store is None or engine.persistent:
+                return False
+            stats = self._backup_stats.setdefault(store_name, self._new_backup_stats())
+            mutations = self._mutations.get(store_name, 0)
+            if mutations in (stats['backed_up_mutations'], self._scheduled_backups.get(store_name)):
+                stats['generations_skipped'] += 1
+                return False
+            snapshot = engine.snapshot(store)
+            self._scheduled_backups[store_name] = mutations
+        try:
+            content = engine.materialize(store, snapshot)
+        except Exception:
+            self._unschedule_backup(store_name, mutations)
+            raise
+
+        if self.backup_mode == "background":
+            with self._backup_writer_cond:
+                self._pending_backups[store_name] = (content, mutations)
+                self._backup_writer_cond.notify()
+        else:
+            self._write_backup(store_name, content, mutations)
+        return True
+
+    def _write_backup(self, store_name, content, mutations):
+        start = time.perf_counter()
+        try:
+            self.rotate_and_backup(store_name, content)
+        except Exception:
+            self._unschedule_backup(store_name, mutations)
+            raise
+        stats = self._backup_stats.get(store_name)
+        if stats is None:
+            return  # Store deleted while its backup was queued
+        stats['last_backup_duration'] = time.perf_counter() - start
+        stats['last_backup_time'] = time.time()
+        stats['last_backup_size'] = os.path.getsize(
+            backups.backup_path(self.backup_dir, store_name, 1, self.backup_format))
+        stats['backed_up_mutations'] = mutations
+        stats['generations_written'] += 1
+
+    def _unschedule_backup(self, store_name, mutations):
+        # A generation that failed is written again by the next pass
+        with self._whole_store_lock(store_name):
+            if self._scheduled_backups.get(store_name) == mutations:
+                del self._scheduled_backups[store_name]
+
+    @staticmethod
+    def _new_backup_stats():
+        return {
+            "backed_up_mutations": None,
+            "last_backup_time": None,
+            "last_backup_duration": None,
+            "last_backup_size": None,
+            "generations_written": 0,
+            "generations_skipped": 0
+        }
+
+    def get_backup_stats(self):
+        """Returns per-store backup statistics and the mutations not yet backed up."""
+        stats = {}
+        for store_name in list(self._stores.keys()):
+            store_stats = dict(self._backup_stats.get(store_name) or self._new_backup_stats())
+            store_stats['mutations'] = self._mutations.get(store_name, 0)
+            store_stats['pending_mutations'] = store_stats['mutations'] - (store_stats['backed_up_mutations'] or 0)
+            stats[store_name] = store_stats
+        return stats
+
     def load_from_backup(self):
-        raise NotImplementedError("load_from_backup method not implemented")
+        """Restores every backed-up store from its newest readable generation.
+
+        Stores are loaded by a pool of threads, each streaming its file and
+        dropping entries that expired while the server was down. Threads
+        rather than processes: shipping parsed stores back from a worker
+        process costs about as much as parsing them.
+        """
+        start = time.perf_counter()
+        now = time.time()
+        # Stores already reopened from disk are newer than any backup of them
+        store_names = [name for name in backups.list_backed_up_stores(self.backup_dir) if name not in self._stores]
+        if not store_names:
+            logger.info(f"No backups found in {self.backup_dir}.")
+            return {}
+
+        restored = {}
+        with ThreadPoolExecutor(max_workers=self.restore_workers) as executor:
+            futures = {executor.submit(self.restore_store, store_name, now): store_name
+                       for store_name in store_names}
+            for future in as_completed(futures):
+                count = future.result()
+                if count is not None:
+                    restored[futures[future]] = count
+
+        logger.info(f"Restored {len(restored)} stores in {time.perf_counter() - start:.2f}s.")
+        return restored
+
+    def restore_store(self, store_name, now=None):
+        """Restores a single store from its newest readable generation, returning its key count."""
+        entries, generation, dropped = backups.load_store_backup(self.backup_dir, store_name, self.max_backups,
+                                                                 now or time.time())
+        if entries is None:
+            logger.error(f"No readable backup generation for store {store_name}.")
+            return None
+        for key, entry in entries.items():
+            entries[key] = Entry.from_dict(entry)
+        self._install_store(store_name, entries, clean=generation == 1 and not dropped)
+        logger.info(f"Store {store_name} restored from generation {generation} "
+                    f"with {len(entries)} keys ({dropped} expired keys dropped).")
+        return len(entries)
+
+    def _install_store(self, store_name, entries, clean=False):
+        """Replaces the content of a store in bulk, creating it if needed.
+
+        The change feed gets a ``replace_store`` event telling readers to read
+        the store again, and the operation log is compacted so recovery starts
+        from the new content rather than replaying the old one.
+        """
+        self.create_store(store_name)
+        with self._whole_store_lock(store_name):
+            self._stores[store_name] = self._engine(store_name).load_store(self._stores[store_name], entries)
+            self._index_entries(store_name, entries)
+            if self._versions is not None:
+                self._versions.reset_store(store_name)
+            mutations = self._mutations.get(store_name, 0) + 1
+            self._mutations[store_name] = mutations
+            if clean:
+                stats = self._backup_stats.setdefault(store_name, self._new_backup_stats())
+                stats['backed_up_mutations'] = mutations
+            if self._changes is not None:
+                self._changes.publish('replace_store', store_name)
+        self.compact_oplog()
+
+    def _index_entries(self, store_name, entries):
+        """Rebuilds every index, the tracker and the memory total of a store in one pass over ``entries``."""
+        field_indexes = {field: FieldIndex(field) for field in self._index_fields.get(store_name, ())}
+        tracker = new_tracker(self._policy(store_name))
+        keys = []
+        deadlines = {}
+        used = 0
+        for key, entry in entries.items():
+            keys.append(key)
+            used += entry_size(key, entry)
+            if entry.exp_time is not None:
+                deadlines[key] = entry.exp_time
+            if tracker is not None:
+                tracker.set(key, entry)
+            for field_index in field_indexes.values():
+                field_index.set(key, entry)
+        self._key_indexes[store_name] = StoreKeyIndex(keys)
+        self._field_indexes[store_name] = field_indexes
+        self._trackers[store_name] = tracker
+        with self._memory_lock:
+            self._memory[store_name] = used
+        self._expirations.load(store_name, deadlines)
+
+    def _engine(self, store_name):
+        return self._engines[self._store_engine_names.get(store_name, self.storage_engine)]
+
+    def _open_stored_stores(self):
+        for engine in self._engines.values():
+            for store_name in engine.stored_names():
+                if self._engine(store_name) is engine:
+                    self.create_store(store_name)
+
+    def get_storage_stats(self, store_name=None):
+        """Returns the engine of each store with its key count and the engine's own cache, disk or spill counters."""
+        with self._lock:
+            stores = [(name, content) for name, content in self._stores.items()
+                      if store_name is None or name == store_name]
+        return {name: {"engine": self._engine(name).name, **self._engine(name).stats(content)}
+                for name, content in stores}
 
     def rotate_and_backup(self, store_name, store_content):
         if not isinstance(store_name, str) or not store_name:
             raise ValueError("store_name must be a non-empty string")
-        for i in range(self.max_backups, 0, -1):
-            src = os.path.join(self.backup_dir, f"{store_name}.backup.{i}.json")
-            dst = os.path.join(self.backup_dir, f"{store_name}.backup.{i + 1}.json")
-            if os.path.exists(src):
-                if i == self.max_backups:
-                    os.remove(src)
-                else:
-                    os.rename(src, dst)
-        current_backup = os.path.join(self.backup_dir, f"{store_name}.backup.1.json")
-        with open(current_backup, 'w') as f:
-            json.dump(store_content, f, ensure_ascii=False, indent=4)
+        backups.rotate_generations(self.backup_dir, store_name, self.max_backups)
+        current_backup = backups.backup_path(self.backup_dir, store_name, 1, self.backup_format)
+        if self.backup_format == "msgpack":
+            backups.write_snapshot(current_backup, store_name, store_content, compression=self.backup_compression)
+        else:
+            backups.write_json_backup(current_backup, store_content)
+
+    def _policy(self, store_name):
+        return self._store_policies.get(store_name, self.eviction_policy)
+
+    def _account(self, store_name, delta):
+        with self._memory_lock:
+            if store_name in self._memory:
+                self._memory[store_name] += delta
+
+    def _used_memory(self, store_name=None):
+        with self._memory_lock:
+            if store_name is None:
+                return sum(self._memory.values())
+            return self._memory.get(store_name, 0)
+
+    def _make_room(self, store_name, key, entry):
+        """Evicts keys until ``entry`` fits under the store and global limits, returning whether it does.
+
+        Called with the stripe of ``key`` held. Victims whose stripe is busy
+        are skipped rather than waited for, so eviction never blocks on (or
+        deadlocks with) another writer.
+        """
+        store_limit = self._store_max_memory.get(store_name)
+        if store_limit is None and self.max_memory is None:
+            return True
+        previous = self._stores[store_name].get(key)
+        delta = entry_size(key, entry) - (entry_size(key, previous) if previous else 0)
+        if delta <= 0:
+            return True
+
+        # An entry larger than a limit would empty the store and still not fit
+        fits = all(limit is None or delta <= limit for limit in (store_limit, self.max_memory))
+        if fits and store_limit is not None:
+            fits = self._evict_until(store_name, lambda: self._used_memory(store_name) + delta <= store_limit, key)
+        if fits and self.max_memory is not None:
+            fits_globally = lambda: self._used_memory() + delta <= self.max_memory
+            for victim_store in self._eviction_order(store_name):
+                fits = self._evict_until(victim_store, fits_globally, key if victim_store == store_name else None)
+                if fits:
+                    break
+            fits = fits_globally()
+        if not fits:
+            stats = self._eviction_stats.get(store_name)
+            if stats is not None:
+                stats['rejected_writes'] += 1
+            logger.error(f"Not enough memory to write key {key} to store {store_name}.")
+        return fits
+
+    def _eviction_order(self, store_name):
+        # The store being written first, then the others from the largest down
+        with self._memory_lock:
+            others = sorted((name for name in self._memory if name != store_name),
+                            key=self._memory.get, reverse=True)
+        return [store_name] + others
+
+    def _evict_until(self, store_name, fits, protected_key=None):
+        tracker = self._trackers.get(store_name)
+        store_lock = self._store_locks.get(store_name)
+        if tracker is None or store_lock is None:
+            return fits()
+        skipped = []
+        while not fits():
+            victim = tracker.pop_victim()
+            if victim is None:
+                break
+            if victim == protected_key:
+                skipped.append(victim)
+                continue
+            lock = store_lock.for_key(victim)
+            if not lock.acquire(blocking=False):
+                skipped.append(victim)
+                continue
+            try:
+                if self._store_locks.get(store_name) is not store_lock:
+                    break  # Deleted, maybe created again, since the lock was looked up
+                store = self._stores.get(store_name)
+                entry = store.get(victim) if store is not None else None
+                if entry is None or entry.readonly:
+                    continue
+                size = entry_size(victim, entry)
+                self._remove_entry(store_name, store, victim)
+                stats = self._eviction_stats[store_name]
+                stats['evictions'] += 1
+                stats['evicted_bytes'] += size
+                logger.info(f"Evicted key {victim} from store {store_name}.")
+            finally:
+                lock.release()
+        store = self._stores.get(store_name) or {}
+        for key in skipped:
+            entry = store.get(key)
+            if entry is not None:
+                tracker.set(key, entry)
+        return fits()
+
+    def _enforce_memory_limits(self):
+        for store_name, limit in list(self._store_max_memory.items()):
+            if store_name in self._stores:
+                self._evict_until(store_name, lambda: self._used_memory(store_name) <= limit)
+        if self.max_memory is not None:
+            with self._memory_lock:
+                store_names = sorted(self._memory, key=self._memory.get, reverse=True)
+            for store_name in store_names:
+                if self._evict_until(store_name, lambda: self._used_memory() <= self.max_memory):
+                    break
+
+    def set_memory_limit(self, max_memory, eviction_policy=None, store_name=None):
+        """Sets the memory limit (None for unlimited) and optionally the eviction policy.
+
+        Without ``store_name`` the global limit and the default policy are
+        changed. Keys are evicted right away if usage is over the new limit.
+        """
+        if eviction_policy is not None and eviction_policy not in EVICTION_POLICIES:
+            raise ValueError(f"eviction_policy must be one of {', '.join(EVICTION_POLICIES)}")
+        with self._lock:
+            policies = {name: self._policy(name) for name in self._stores}
+        if store_name is None:
+            self.max_memory = max_memory
+            if eviction_policy is not None:
+                self.eviction_policy = eviction_policy
+        else:
+            if store_name not in self._stores:
+                logger.error(f"Store {store_name} does not exist.")
+                return False
+            if max_memory is None:
+                self._store_max_memory.pop(store_name, None)
+            else:
+                self._store_max_memory[store_name] = max_memory
+            if eviction_policy is not None:
+                self._store_policies[store_name] = eviction_policy
+        for name, policy in policies.items():
+            if self._policy(name) != policy:
+                with self._whole_store_lock(name):
+                    store = self._stores.get(name)
+                    if store is not None:
+                        self._trackers[name] = new_tracker(self._policy(name), store)
+        self._enforce_memory_limits()
+        logger.info(f"Memory limit of {store_name or 'all stores'} set to {max_memory}.")
+        return True
+
+    @staticmethod
+    def _new_eviction_stats():
+        return {"evictions": 0, "evicted_bytes": 0, "rejected_writes": 0}
+
+    def get_memory_stats(self):
+        """Returns approximate memory usage, limits and eviction counters, overall and per store."""
+        with self._memory_lock:
+            memory = dict(self._memory)
+        stores = {}
+        for store_name, used in memory.items():
+            stats = dict(self._eviction_stats.get(store_name) or self._new_eviction_stats())
+            stats['used_memory'] = used
+            stats['max_memory'] = self._store_max_memory.get(store_name)
+            stats['eviction_policy'] = self._policy(store_name)
+            stores[store_name] = stats
+        return {
+            "used_memory": sum(memory.values()),
+            "max_memory": self.max_memory,
+            "eviction_policy": self.eviction_policy,
+            "stores": stores
+        }
 
     def create_store(self, store_name):
         if not isinstance(store_name, str) or not store_name:
@@ -158,7 +977,20 @@ class AbstractKVStore:
                 logger.info(f"Store {store_name} already exists.")
                 return False
             else:
-                self._stores[store_name] = {}
+                self._store_locks[store_name] = self._new_store_lock()
+                self._key_indexes[store_name] = StoreKeyIndex()
+                self._field_indexes[store_name] = {field: FieldIndex(field)
+                                                   for field in self._index_fields.get(store_name, ())}
+                self._trackers[store_name] = new_tracker(self._policy(store_name))
+                self._eviction_stats[store_name] = self._new_eviction_stats()
+                with self._memory_lock:
+                    self._memory[store_name] = 0
+                self._mutations[store_name] = 0
+                content = self._engine(store_name).open_store(store_name)
+                if content:
+                    self._index_entries(store_name, content)
+                self._stores[store_name] = content
+                self._log_operation('create_store', store_name)
                 logger.info(f"Store {store_name} created successfully.")
                 return True
 
@@ -166,9 +998,25 @@ class AbstractKVStore:
         if not isinstance(store_name, str) or not store_name:
             raise ValueError("store_name must be a non-empty string")
 
-        with self._lock:
+        # Writers already holding a stripe finish first, those still waiting then find the store gone
+        with self._lock, self._whole_store_lock(store_name):
             if store_name in self._stores:
-                del self._stores[store_name]
+                content = self._stores.pop(store_name)
+                self._engine(store_name).drop_store(store_name, content)
+                del self._store_locks[store_name]
+                self._key_indexes.pop(store_name, None)
+                self._field_indexes.pop(store_name, None)
+                self._trackers.pop(store_name, None)
+                self._eviction_stats.pop(store_name, None)
+                with self._memory_lock:
+                    self._memory.pop(store_name, None)
+                self._mutations.pop(store_name, None)
+                self._backup_stats.pop(store_name, None)
+                self._scheduled_backups.pop(store_name, None)
+                self._expirations.drop_store(store_name)
+                if self._versions is not None:
+                    self._versions.reset_store(store_name)
+                self._log_operation('delete_store', store_name)
                 logger.info(f"Store {store_name} deleted successfully.")
                 return True
             else:
@@ -179,118 +1027,679 @@ class AbstractKVStore:
         return list(self._stores.keys())
 
     def _get_all_keys(self, store_name):
-        return self._stores.get(store_name, None)
+        store = self._snapshot(store_name)
+        if store is None:
+            return None
+        return {key: entry.to_dict() for key, entry in store.items()}
+
+    def _snapshot(self, store_name):
+        """Returns a point-in-time shallow copy of a store without taking its lock.
+
+        Writers never mutate a published entry, they swap in a new one, so a
+        shallow copy is a consistent view for as long as the caller needs it.
+        """
+        store = self._stores.get(store_name)
+        if store is None:
+            return None
+        return store.copy()
+
+    @timed("scan")
+    def scan(self, store_name, cursor=None, match=None, count=100):
+        """Returns one page of a store's live entries in key order.
+
+        ``match`` is a key prefix, or a glob if it contains ``*``, ``?`` or
+        ``[``; only the keys under its literal prefix are visited. A page holds
+        at most ``count`` entries and looks at no more than ten times as many
+        keys, so a sparse glob can return short pages. Pass the returned
+        ``cursor`` back for the next page; it is None once the scan is done.
+        """
+        page = self._scan_page(store_name, cursor, match, count)
+        if page is None:
+            logger.error(f"Store {store_name} does not exist.")
+            return {"cursor": None, "entries": {}}
+        return page
+
+    @timed("export_entries")
+    def export_entries(self, store_name, cursor=None, count=bulk.CHUNK_SIZE):
+        """Returns one page of a store's entries like ``scan``, with the entries packed into ``data``.
+
+        The page travels as one binary blob (see ``bulk.pack_entries``),
+        far cheaper for Pyro to serialize than the entries themselves; this
+        is what ``export`` streams a store with. Returns None if the store
+        does not exist.
+        """
+        page = self._scan_page(store_name, cursor, None, count)
+        if page is None:
+            logger.error(f"Store {store_name} does not exist.")
+            return None
+        return {"cursor": page["cursor"], "data": bulk.pack_entries(page["entries"].items())}
+
+    def _scan_page(self, store_name, cursor, match, count):
+        index = self._key_indexes.get(store_name)
+        store = self._stores.get(store_name)
+        if index is None or store is None:
+            return None
+        count = max(1, int(count))
+        prefix, pattern = split_match(match)
+        entries = {}
+        budget = count * 10
+        now = time.time()
+        while len(entries) < count and budget > 0:
+            keys = index.page(cursor, prefix, min(count - len(entries), budget))
+            if not keys:
+                return {"cursor": None, "entries": entries}
+            budget -= len(keys)
+            for key in keys:
+                if pattern is not None and (type(key) is not str or not fnmatchcase(key, pattern)):
+                    continue
+                entry = store.get(key)
+                if entry is not None and not entry.is_expired(now):
+                    entries[key] = entry.to_dict()
+            cursor = keys[-1]
+        return {"cursor": cursor, "entries": entries}
+
+    def create_index(self, store_name, field):
+        """Indexes a store on a dotted entry field (see ``fieldindex.field_value``) for ``query``.
+
+        The index is built from the current keys and kept for the store from
+        then on, also when it is deleted and created again.
+        """
+        if not isinstance(field, str) or not field:
+            raise ValueError("field must be a non-empty string")
+        fields = self._index_fields.setdefault(store_name, [])
+        if field not in fields:
+            fields.append(field)
+        if store_name not in self._stores:
+            return False
+        with self._whole_store_lock(store_name):
+            field_indexes = self._field_indexes[store_name]
+            if field not in field_indexes:
+                field_indexes[field] = FieldIndex(field, self._stores[store_name])
+                logger.info(f"Indexed field {field} of store {store_name}.")
+        return True
+
+    def drop_index(self, store_name, field):
+        fields = self._index_fields.get(store_name, [])
+        if field not in fields:
+            logger.error(f"Store {store_name} has no index on {field}.")
+            return False
+        fields.remove(field)
+        with self._whole_store_lock(store_name):
+            self._field_indexes.get(store_name, {}).pop(field, None)
+        return True
+
+    def list_indexes(self, store_name=None):
+        """Returns the indexed fields of each store, or of one store, with the number of keys each covers."""
+        names = [store_name] if store_name is not None else list(self._field_indexes)
+        return {name: {field: len(field_index) for field, field_index in self._field_indexes.get(name, {}).items()}
+                for name in names}
+
+    @timed("query")
+    def query(self, store_name, field, value=None, low=None, high=None, limit=None, objects=False):
+        """Returns the live keys whose indexed ``field`` equals ``value``, or lies between ``low`` and ``high``.
+
+        Either bound of a range may be left out. Equality results are in key
+        order, range results in value order. With ``objects`` the full entry
+        of each key is returned, keyed by key. Returns None when the field is
+        not indexed or the lookup is invalid.
+        """
+        field_index = self._field_indexes.get(store_name, {}).get(field)
+        if field_index is None:
+            logger.error(f"Store {store_name} has no index on {field}.")
+            return None
+        fetch = limit
+        while True:
+            try:
+                keys = field_index.lookup(value) if value is not None else field_index.range(low, high, fetch)
+            except ValueError as e:
+                logger.error(f"Invalid query on {store_name}.{field}: {e}")
+                return None
+            entries = {key: entry for key, entry in self._get_live_entries(store_name, keys).items()
+                       if entry is not None}
+            # Expired keys leave the index as they are found; fetch again if they cut a range short
+            if value is not None or limit is None or len(entries) >= limit or len(keys) < fetch:
+                break
+            fetch *= 2
+        keys = [key for key in keys if key in entries][:limit]
+        if objects:
+            return {key: entries[key].to_dict() for key in keys}
+        return keys
 
     def display(self):
-        print(json.dumps(self._stores, indent=5))
+        stores = {store_name: store.copy() for store_name, store in self._stores.items()}
+        print(json.dumps(stores, indent=5, default=backups.json_default))
 
+    @timed("set")
     def _add_key(self, store_name, key, **kwargs):
-        with self._lock:
+        with self._key_lock(store_name, key):
             store = self._stores.get(store_name)
             if store is None:
                 logger.error(f"Store {store_name} does not exist.")
                 return False
+            return self._put_key(store_name, store, key, kwargs)
 
-            if key in store and store[key].get('readonly', False):
-                logger.error(f"Attempt to modify readonly key: {key}")
-                return False
+    def _put_key(self, store_name, store, key, kwargs):
+        # Caller holds the key's stripe
+        if self._rejects_writes():
+            return False
+        if key in store and store[key].readonly:
+            logger.error(f"Attempt to modify readonly key: {key}")
+            return False
 
-            if kwargs.get('ttl') is None:
-                kwargs['ttl'] = 10 * 365 * 24 * 60 * 60  # 10 years in seconds
-            kwargs['exp_time'] = time.time() + kwargs['ttl']
-            del kwargs['ttl']
+        kwargs['exp_time'] = self._deadline(kwargs.pop('ttl', None))
+        entry = Entry.from_dict(kwargs)
+        entry.version = self._next_version(store.get(key))
+        if not self._make_room(store_name, key, entry):
+            return False
+        self._set_entry(store_name, store, key, entry)
+        logger.info(f"Key {key} added to store {store_name} successfully.")
+        return True
 
-            store[key] = kwargs
-            logger.info(f"Key {key} added to store {store_name} successfully.")
-            return True
+    def _set_entry(self, store_name, store, key, entry):
+        previous = store.get(key)
+        if self._versions is not None:
+            self._versions.record(store_name, key, previous, entry)
+        store[key] = entry
+        if previous is None:
+            self._key_indexes[store_name].add(key)
+        self._account(store_name, entry_size(key, entry) - (entry_size(key, previous) if previous else 0))
+        tracker = self._trackers.get(store_name)
+        if tracker is not None:
+            tracker.set(key, entry)
+        field_indexes = self._field_indexes.get(store_name)
+        if field_indexes:
+            for field_index in field_indexes.values():
+                field_index.set(key, entry)
+        self._mutations[store_name] = self._mutations.get(store_name, 0) + 1
+        self._log_operation('set', store_name, key, entry)
+        if previous is None or previous.exp_time != entry.exp_time:
+            if entry.exp_time is None:
+                self._expirations.discard(store_name, key)
+            else:
+                self._expirations.set(store_name, key, entry.exp_time)
+
+    def _remove_entry(self, store_name, store, key):
+        if self._versions is not None:
+            self._versions.record(store_name, key, store.get(key), None)
+        previous = store.pop(key)
+        self._key_indexes[store_name].discard(key)
+        self._account(store_name, -entry_size(key, previous))
+        tracker = self._trackers.get(store_name)
+        if tracker is not None:
+            tracker.discard(key)
+        field_indexes = self._field_indexes.get(store_name)
+        if field_indexes:
+            for field_index in field_indexes.values():
+                field_index.discard(key)
+        self._mutations[store_name] = self._mutations.get(store_name, 0) + 1
+        self._log_operation('delete', store_name, key)
+        self._expirations.discard(store_name, key)
 
+    @timed("delete")
     def _delete_key(self, store_name, key):
-        with self._lock:
+        if self._rejects_writes():
+            return False
+        with self._key_lock(store_name, key):
             store = self._stores.get(store_name)
             if store is None or key not in store:
                 logger.error(f"Key {key} or store {store_name} does not exist.")
                 return False
 
-            del store[key]
+            self._remove_entry(store_name, store, key)
             logger.info(f"Key {key} deleted from store {store_name} successfully.")
             return True
 
+    @timed("mget")
+    def mget(self, store_name, keys):
+        """Returns the value of each key, None for keys that are missing or expired."""
+        entries = self._get_live_entries(store_name, keys)
+        return {key: None if entry is None else entry.value for key, entry in entries.items()}
+
+    @timed("mget_objects")
+    def mget_objects(self, store_name, keys):
+        """Returns the full entry of each key, None for keys that are missing or expired."""
+        entries = self._get_live_entries(store_name, keys)
+        return {key: None if entry is None else entry.to_dict() for key, entry in entries.items()}
+
+    def current_version(self):
+        """Returns the commit version of the latest write, to read at with ``mget_as_of``; None without MVCC."""
+        if self._versions is None:
+            logger.error("Versioned reads are off, set mvcc_versions to keep old versions.")
+            return None
+        return self._versions.latest()
+
+    @timed("mget_as_of")
+    def mget_as_of(self, store_name, keys, version=None):
+        """Returns the full entry each key had at commit ``version``, the latest one when None, without locking.
+
+        Reads at one version, in one call or across several calls and stores,
+        form a consistent snapshot: a write is either seen everywhere or
+        nowhere. Each entry keeps its own ``version``, the one
+        ``compare_and_set`` and transaction ``watch`` expect. Returns
+        ``{"version": ..., "entries": {key: entry or None}}``, or None when
+        versioned reads are off or that version is no longer kept.
+        """
+        if self._versions is None:
+            logger.error("Versioned reads are off, set mvcc_versions to keep old versions.")
+            return None
+        store = self._stores.get(store_name)
+        if store is None:
+            logger.error(f"Store {store_name} does not exist.")
+            return None
+        latest = self._versions.latest()
+        if version is None:
+            version = latest
+        if not self._versions.oldest() <= version <= latest:
+            logger.error(f"Version {version} is not kept, versions {self._versions.oldest()} to {latest} can be read.")
+            return None
+        now = time.time()
+        entries = {}
+        try:
+            for key in keys:
+                entry = self._versions.read(store_name, store, key, version)
+                entries[key] = None if entry is None or entry.is_expired(now) else entry.to_dict()
+        except ValueError as e:
+            logger.error(f"Cannot read store {store_name} as of version {version}: {e}")
+            return None
+        # Deletes leaving the window while reading take their history along
+        if version < self._versions.oldest():
+            logger.error(f"Version {version} left the window while being read.")
+            return None
+        return {"version": version, "entries": entries}
+
+    @timed("mset")
+    def mset(self, store_name, items):
+        """Adds or replaces several keys under one lock acquisition.
+
+        ``items`` maps each key to its fields, e.g. ``{"value": 1, "ttl": 60,
+        "readonly": True}``. Returns whether each key was written.
+        """
+        with self._keys_lock(store_name, items), self._version_batch():
+            store = self._stores.get(store_name)
+            if store is None:
+                logger.error(f"Store {store_name} does not exist.")
+                return {key: False for key in items}
+            results = {}
+            for key, fields in items.items():
+                if not isinstance(fields, dict):
+                    logger.error(f"Fields for key {key} must be a dict.")
+                    results[key] = False
+                    continue
+                results[key] = self._put_key(store_name, store, key, dict(fields))
+            return results
+
+    @timed("mdelete")
+    def mdelete(self, store_name, keys):
+        """Deletes several keys under one lock acquisition, returning whether each existed."""
+        if self._rejects_writes():
+            return {key: False for key in keys}
+        with self._keys_lock(store_name, keys), self._version_batch():
+            store = self._stores.get(store_name)
+            if store is None:
+                logger.error(f"Store {store_name} does not exist.")
+                return {key: False for key in keys}
+            results = {}
+            for key in keys:
+                results[key] = key in store
+                if results[key]:
+                    self._remove_entry(store_name, store, key)
+            logger.info(f"Deleted {sum(results.values())} of {len(results)} keys from store {store_name}.")
+            return results
+
+    @timed("put_entries")
+    def put_entries(self, store_name, entries, replace=True):
+        """Writes whole entries as ``scan`` returns them, keeping their expiry time and version.
+
+        An entry without an ``exp_time`` gets the default TTL, like ``_add_key``.
+
+        This moves keys between servers as they are. With ``replace`` False,
+        the values of keys the store already holds are left alone. Versions
+        never go back, so a compare-and-set cannot match an older write
+        again: a replaced key gets at least its next version, and a kept one
+        is moved past the version it was offered. Returns the number of
+        entries written.
+        """
+        if self._rejects_writes():
+            return 0
+        with self._keys_lock(store_name, entries), self._version_batch():
+            store = self._stores.get(store_name)
+            if store is None:
+                logger.error(f"Store {store_name} does not exist.")
+                return 0
+            written = 0
+            for key, fields in entries.items():
+                entry = Entry.from_dict(fields)
+                if 'exp_time' not in fields:
+                    entry.exp_time = self._deadline(None)
+                previous = store.get(key)
+                if previous is not None and not replace:
+                    if previous.version <= entry.version:
+                        self._set_entry(store_name, store, key, previous.replace(version=entry.version + 1))
+                    continue
+                if previous is not None:
+                    entry.version = max(entry.version, previous.version + 1)
+                if not self._make_room(store_name, key, entry):
+                    continue
+                self._set_entry(store_name, store, key, entry)
+                written += 1
+            logger.info(f"Wrote {written} of {len(entries)} entries to store {store_name}.")
+            return written
+
+    def import_entries(self, store_name, data, replace=True):
+        """``put_entries`` for entries packed by ``bulk.pack_entries``, as ``import`` sends them."""
+        return self.put_entries(store_name, dict(bulk.unpack_entries(data)), replace)
+
+    @timed("edit")
     def _edit_key(self, store_name, key, **kwargs):
-        with self._lock:
+        if self._rejects_writes():
+            return False
+        with self._key_lock(store_name, key):
             store = self._stores.get(store_name)
             if store is None:
                 logger.error(f"Store {store_name} does not exist.")
                 return False
             if key not in store:
                 logger.error(f"key {key} does not exist.")
-                store = self._stores.get(store_name)
-                if store is None:
-                    logger.error(f"Store {store_name} does not exist.")
-                    return False
-
-                if key in store and store[key].get('readonly', False):
-                    logger.error(f"Attempt to modify readonly key: {key}")
-                    return False
-
-                if kwargs.get('ttl') is None:
-                    kwargs['ttl'] = 10 * 365 * 24 * 60 * 60  # 10 years in seconds
-                kwargs['exp_time'] = time.time() + kwargs['ttl']
-                del kwargs['ttl']
-
-                store[key] = kwargs
-                logger.info(f"Key {key} added to store {store_name} successfully.")
-                return True
+                return self._put_key(store_name, store, key, kwargs)
 
             if 'ttl' in kwargs:
-                if kwargs.get('ttl') is None:
-                    kwargs['ttl'] = 10 * 365 * 24 * 60 * 60  # 10 years in seconds
-                kwargs['exp_time'] = time.time() + kwargs['ttl']
-                del kwargs['ttl']  # Convert 'ttl' to 'exp_time'
+                kwargs['exp_time'] = self._deadline(kwargs.pop('ttl'))
 
-            if store[key].get('readonly', False) and not kwargs.get('force', False):
+            if store[key].readonly and not kwargs.get('force', False):
                 logger.error(f"Attempt to modify readonly key: {key}")
                 return False
 
-            store[key].update(kwargs)
+            entry = store[key].replace(**kwargs)
+            entry.version = self._next_version(store[key])
+            if not self._make_room(store_name, key, entry):
+                return False
+            self._set_entry(store_name, store, key, entry)
             logger.info(f"Key {key} in store {store_name} updated successfully.")
             return True
 
-    def _get_key(self, store_name, key):
-        with self._lock:
+    def _rejects_writes(self):
+        if self._replicator is None:
+            return False
+        logger.error(f"Read-only replica of {self.replica_of}, write to the primary instead.")
+        return True
+
+    def replication_status(self):
+        """Returns the state of a replica: its primary, cursor, applied changes and lag in seconds."""
+        if self._replicator is None:
+            logger.error("This store is not a replica.")
+            return None
+        return self._replicator.status()
+
+    @staticmethod
+    def _deadline(ttl):
+        return time.time() + (DEFAULT_TTL if ttl is None else ttl)
+
+    @staticmethod
+    def _next_version(previous):
+        return previous.version + 1 if previous is not None else 1
+
+    def _update_entry(self, store_name, key, update, force=False):
+        """Replaces a key with ``update(entry)`` under its stripe and returns what was published.
+
+        ``update`` gets the live entry, or None for a missing or expired key,
+        and returns the new Entry, or None to leave the key alone. It must not
+        mutate the entry it is given. Readonly keys are only updated with
+        ``force``. Returns None when nothing was written.
+        """
+        if self._rejects_writes():
+            return None
+        with self._key_lock(store_name, key):
             store = self._stores.get(store_name)
             if store is None:
                 logger.error(f"Store {store_name} does not exist.")
                 return None
+            stored = store.get(key)
+            live = None if stored is None or stored.is_expired(time.time()) else stored
+            if live is not None and live.readonly and not force:
+                logger.error(f"Attempt to modify readonly key: {key}")
+                return None
+            try:
+                entry = update(live)
+            except (TypeError, ValueError, IndexError, KeyError) as e:
+                logger.error(f"Cannot update key {key} in store {store_name}: {e}")
+                return None
+            if entry is None:
+                return None
+            entry.version = self._next_version(stored)
+            if not self._make_room(store_name, key, entry):
+                return None
+            self._set_entry(store_name, store, key, entry)
+            return entry
+
+    def _update_value(self, store_name, key, update, ttl=None):
+        """Replaces a key's value with ``update(value)``; a missing key starts from None."""
+        def apply(entry):
+            if entry is None:
+                return Entry(update(None), self._deadline(ttl))
+            changes = {'value': update(entry.value)}
+            if ttl is not None:
+                changes['exp_time'] = self._deadline(ttl)
+            return entry.replace(**changes)
+        return self._update_entry(store_name, key, apply)
+
+    def _update_object(self, store_name, key, update, force=False):
+        """Calls ``update`` on a private copy of an existing key's fields and publishes the result.
 
-            key_data = store.get(key)
-            if key_data is None:
-                logger.info(f"Key {key} does not exist in store {store_name}.")
+        ``update`` edits the dict in place and returns False to leave the key
+        alone; ``force`` lets it edit a readonly key. Returns whether the key
+        was written.
+        """
+        def apply(entry):
+            if entry is None:
+                logger.error(f"Key {key} does not exist in store {store_name}.")
                 return None
+            fields = copy.deepcopy(entry.to_dict())
+            if update(fields) is False:
+                return None
+            return Entry.from_dict(fields)
+        return self._update_entry(store_name, key, apply, force) is not None
+
+    @timed("compare_and_set")
+    def compare_and_set(self, store_name, key, expected_version, value, ttl=None):
+        """Writes ``value`` only if the key is still at ``expected_version``.
+
+        Version 0 (or None) expects the key to be missing. Returns ``{"ok": ...,
+        "version": ...}`` with the new version on success and the current one,
+        0 for a missing key, on a conflict.
+        """
+        current = {}
 
-            # Check if the key has expired
-            current_time = time.time()
-            if 'exp_time' in key_data and current_time > key_data['exp_time']:
-                logger.info(f"Key {key} in store {store_name} has expired.")
+        def apply(entry):
+            current['version'] = entry.version if entry is not None else 0
+            if current['version'] != (expected_version or 0):
                 return None
+            exp_time = self._deadline(ttl) if entry is None or ttl is not None else entry.exp_time
+            return Entry(value, exp_time, extras=entry.extras if entry is not None else None)
+
+        entry = self._update_entry(store_name, key, apply)
+        if entry is None:
+            return {"ok": False, "version": current.get('version', 0)}
+        return {"ok": True, "version": entry.version}
+
+    @timed("incr")
+    def incr(self, store_name, key, amount=1, ttl=None):
+        """Adds ``amount`` to a numeric value, a missing key counting as 0; returns the new value or None."""
+        entry = self._update_value(store_name, key, lambda value: add_number(value, amount), ttl)
+        return None if entry is None else entry.value
+
+    def decr(self, store_name, key, amount=1, ttl=None):
+        return self.incr(store_name, key, -amount, ttl)
 
-            return key_data.get('value')
+    @timed("set_in")
+    def set_in(self, store_name, key, path, value, ttl=None):
+        """Sets the item at ``path`` inside a key's value, creating missing dicts on the way."""
+        return self._update_value(store_name, key, lambda old: update_in(old, path, lambda _: value), ttl) is not None
+
+    @timed("merge_in")
+    def merge_in(self, store_name, key, path, mapping, ttl=None):
+        """Deep-merges ``mapping`` into the dict at ``path`` inside a key's value."""
+        merge = lambda old: update_in(old, path, lambda item: deep_merge(item, mapping))
+        return self._update_value(store_name, key, merge, ttl) is not None
+
+    @timed("list_append")
+    def list_append(self, store_name, key, item, max_len=None, path=None, ttl=None):
+        """Appends ``item`` to the list at ``path`` (the value itself by default), keeping at most ``max_len``.
+
+        Returns the new length of the list, or None when nothing was written.
+        """
+        path = path or []
+        append = lambda old: update_in(old, path, lambda items: append_item(items, item, max_len))
+        entry = self._update_value(store_name, key, append, ttl)
+        if entry is None:
+            return None
+        items = entry.value
+        for step in path:
+            items = items[step]
+        return len(items)
+
+    def _register_transaction_operation(self, name, method, store_name=None):
+        """Lets transactions run ``method``, as ``method(store_name, key, **params)``.
+
+        A plugin operation bound to one store passes ``store_name`` and is
+        called as ``method(key, **params)``.
+        """
+        self._transaction_operations[name] = (method, store_name)
+
+    def _transaction_target(self, operation):
+        if not isinstance(operation, dict):
+            raise ValueError("Each operation must be a dict")
+        if operation.get("op") not in self._transaction_operations:
+            raise ValueError(f"Unknown transaction operation {operation.get('op')!r}")
+        method, bound_store = self._transaction_operations[operation["op"]]
+        store_name = bound_store or operation.get("store_name")
+        if store_name not in self._stores:
+            raise ValueError(f"Store {store_name} does not exist.")
+        if "key" not in operation:
+            raise ValueError(f"Operation {operation['op']} needs a key")
+        if bound_store is None:
+            method = functools.partial(method, store_name)
+        return method, store_name, operation["key"]
+
+    def _live_version(self, store_name, key):
+        entry = self._stores.get(store_name, {}).get(key)
+        return 0 if entry is None or entry.is_expired(time.time()) else entry.version
+
+    def transaction(self, operations, watch=None):
+        """Runs ``operations`` in order while holding the locks of every key they touch.
+
+        Each operation is a dict with its ``op``, ``store_name`` and ``key`` plus
+        the arguments of that operation, e.g. ``{"op": "incr", "store_name":
+        "counters", "key": "hits", "amount": 2}``. ``watch`` lists
+        ``{"store_name", "key", "version"}`` dicts; if any watched key is no
+        longer at its version (0 when missing), nothing runs. Other writers
+        never see a transaction half done, but a failing operation does not
+        undo the ones before it.
+
+        Returns ``{"ok": True, "results": [...]}`` with what each operation
+        returned, or ``{"ok": False, "conflicts": [...]}`` naming the changed
+        watched keys, or ``{"ok": False, "error": ...}`` for an invalid request.
+        """
+        watch = watch or []
+        try:
+            targets = [self._transaction_target(operation) for operation in operations]
+            watched = [(item["store_name"], item["key"], item.get("version") or 0) for item in watch]
+        except (KeyError, TypeError, ValueError) as e:
+            logger.error(f"Rejected transaction: {e}")
+            return {"ok": False, "error": str(e)}
+        keys_by_store = {}
+        for _, store_name, key in targets:
+            keys_by_store.setdefault(store_name, set()).add(key)
+        for store_name, key, _ in watched:
+            keys_by_store.setdefault(store_name, set()).add(key)
+
+        with ExitStack() as locks:
+            # Stores in name order and stripes in index order, so transactions never deadlock each other
+            for store_name in sorted(keys_by_store):
+                locks.enter_context(self._keys_lock(store_name, keys_by_store[store_name]))
+            locks.enter_context(self._version_batch())
+            conflicts = [{"store_name": store_name, "key": key, "version": self._live_version(store_name, key)}
+                         for store_name, key, version in watched
+                         if self._live_version(store_name, key) != version]
+            if conflicts:
+                logger.info(f"Transaction aborted, {len(conflicts)} watched keys changed.")
+                return {"ok": False, "conflicts": conflicts}
+            results = []
+            for operation, (method, _, key) in zip(operations, targets):
+                params = {name: arg for name, arg in operation.items() if name not in ("op", "store_name", "key")}
+                try:
+                    results.append(method(key, **params))
+                except TypeError as e:
+                    logger.error(f"Bad arguments for transaction operation {operation['op']}: {e}")
+                    results.append(None)
+            return {"ok": True, "results": results}
+
+    def _get_key(self, store_name, key):
+        key_data = self._read_entry(store_name, key, "get")
+        if key_data is None:
+            return None
+        return key_data.value
 
     def _get_object(self, store_name, key):
-        with self._lock:
-            store = self._stores.get(store_name)
-            if store is None:
-                logger.error(f"Store {store_name} does not exist.")
-                return None
+        key_data = self._read_entry(store_name, key, "get_object")
+        if key_data is None:
+            return None
+        return key_data.to_dict()
 
-            key_data = store.get(key)
-            if key_data is None:
-                logger.info(f"Key {key} does not exist in store {store_name}.")
-                return None
+    def _read_entry(self, store_name, key, op):
+        # Sampled inline rather than with @timed, a wrapper call would cost as much as the read itself
+        stats = self._op_stats
+        if stats is None or next(stats.skips, False) is None:
+            return self._get_live_entry(store_name, key)
+        stats.skip_ahead()
+        counter = stats.counters.get((store_name, op)) or stats.counter(store_name, op)
+        counter.calls += stats.sample_every
+        start = time.perf_counter_ns()
+        key_data = self._get_live_entry(store_name, key)
+        counter.latency.record(time.perf_counter_ns() - start)
+        if key_data is None:
+            counter.misses += stats.sample_every
+        else:
+            counter.hits += stats.sample_every
+        return key_data
 
-            # Check if the key has expired
-            current_time = time.time()
-            if 'exp_time' in key_data and current_time > key_data['exp_time']:
-                logger.info(f"Key {key} in store {store_name} has expired.")
-                return None
+    def _get_live_entries(self, store_name, keys):
+        store = self._stores.get(store_name)
+        if store is None:
+            logger.error(f"Store {store_name} does not exist.")
+            return {key: None for key in keys}
+        now = time.time()
+        tracker = self._trackers.get(store_name)
+        entries = {}
+        for key in keys:
+            entry = store.get(key)
+            if entry is not None and entry.is_expired(now):
+                self._expire_key(store_name, key, entry.exp_time)
+                entry = None
+            entries[key] = entry
+            if tracker is not None and entry is not None:
+                tracker.touch(key)
+        return entries
+
+    def _get_live_entry(self, store_name, key):
+        # Reads take no lock: entries are replaced, never mutated, once published
+        store = self._stores.get(store_name)
+        if store is None:
+            logger.error(f"Store {store_name} does not exist.")
+            return None
+
+        key_data = store.get(key)
+        if key_data is None:
+            logger.info(f"Key {key} does not exist in store {store_name}.")
+            return None
+
+        # Check if the key has expired
+        if key_data.is_expired(time.time()):
+            logger.info(f"Key {key} in store {store_name} has expired.")
+            # Deleted on access so it does not linger until the expiration cycle reaches it
+            self._expire_key(store_name, key, key_data.exp_time)
+            return None
 
-            return key_data
\ No newline at end of file
+        tracker = self._trackers.get(store_name)
+        if tracker is not None:
+            tracker.touch(key)
+        return key_data
@@ -1,8 +1,8 @@
-import json
 import os
 import time
 import unittest
 
+import backups
 from store import AbstractKVStore
 
 
@@ -57,11 +57,10 @@ class TestAbstractKVStoreKeyManagement(unittest.TestCase):
     def test_rotate_and_backup(self):
         self.kv_store._add_key(self.store_name, self.key, value=self.value)
         self.kv_store.rotate_and_backup(self.store_name, self.kv_store._stores[self.store_name])
-        backup_path = os.path.join(self.kv_store.backup_dir, f"{self.store_name}.backup.1.json")
+        backup_path = os.path.join(self.kv_store.backup_dir, f"{self.store_name}.backup.1.kvs")
         self.assertTrue(os.path.exists(backup_path))
-        with open(backup_path, 'r') as backup_file:
-            backup_content = json.load(backup_file)
-            self.assertEqual(backup_content[self.key]['value'], self.value)
+        backup_content = dict(backups.iter_snapshot(backup_path))
+        self.assertEqual(backup_content[self.key]['value'], self.value)
 
     def tearDown(self):
         # Clean up any resources used in tests
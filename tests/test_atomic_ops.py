@@ -0,0 +1,149 @@
+import shutil
+import threading
+import time
+import unittest
+
+from plugins.workflows import WorkflowsPlugin
+from store import AbstractKVStore
+
+
+class PipelineKVStore(AbstractKVStore, WorkflowsPlugin):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        WorkflowsPlugin.__init__(self)
+
+
+class TestAtomicOperations(unittest.TestCase):
+    def setUp(self):
+        self.store_name = "test_store"
+        self.kv_store = AbstractKVStore(backup_dir="test_backups", use_backup=False)
+        self.kv_store.create_store(self.store_name)
+
+    def tearDown(self):
+        self.kv_store.shutdown()
+        shutil.rmtree("test_backups", ignore_errors=True)
+
+    def test_versions_count_writes(self):
+        self.kv_store._add_key(self.store_name, "key", value=1)
+        self.assertEqual(self.kv_store._get_object(self.store_name, "key")["version"], 1)
+        self.kv_store._edit_key(self.store_name, "key", value=2)
+        self.assertEqual(self.kv_store._get_object(self.store_name, "key")["version"], 2)
+
+    def test_compare_and_set(self):
+        self.assertEqual(self.kv_store.compare_and_set(self.store_name, "key", 0, "a"), {"ok": True, "version": 1})
+        self.assertEqual(self.kv_store.compare_and_set(self.store_name, "key", 0, "b"), {"ok": False, "version": 1})
+        self.assertEqual(self.kv_store.compare_and_set(self.store_name, "key", 1, "c"), {"ok": True, "version": 2})
+        self.assertEqual(self.kv_store._get_key(self.store_name, "key"), "c")
+
+    def test_compare_and_set_keeps_ttl(self):
+        self.kv_store._add_key(self.store_name, "key", value=1, ttl=60)
+        exp_time = self.kv_store._get_object(self.store_name, "key")["exp_time"]
+        self.kv_store.compare_and_set(self.store_name, "key", 1, 2)
+        self.assertEqual(self.kv_store._get_object(self.store_name, "key")["exp_time"], exp_time)
+
+    def test_incr_and_decr(self):
+        self.assertEqual(self.kv_store.incr(self.store_name, "counter"), 1)
+        self.assertEqual(self.kv_store.incr(self.store_name, "counter", 5), 6)
+        self.assertEqual(self.kv_store.decr(self.store_name, "counter", 2), 4)
+        self.kv_store._add_key(self.store_name, "text", value="abc")
+        self.assertIsNone(self.kv_store.incr(self.store_name, "text"))
+        self.assertEqual(self.kv_store._get_key(self.store_name, "text"), "abc")
+
+    def test_incr_treats_expired_key_as_missing(self):
+        self.kv_store._add_key(self.store_name, "counter", value=10, ttl=-1)
+        self.assertEqual(self.kv_store.incr(self.store_name, "counter"), 1)
+
+    def test_readonly_key_is_not_updated(self):
+        self.kv_store._add_key(self.store_name, "locked", value=1, readonly=True)
+        self.assertIsNone(self.kv_store.incr(self.store_name, "locked"))
+        self.assertFalse(self.kv_store.set_in(self.store_name, "locked", ["a"], 1))
+        self.assertEqual(self.kv_store._get_key(self.store_name, "locked"), 1)
+
+    def test_concurrent_incr_loses_no_updates(self):
+        def worker():
+            for _ in range(500):
+                self.kv_store.incr(self.store_name, "counter")
+
+        threads = [threading.Thread(target=worker) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(self.kv_store._get_key(self.store_name, "counter"), 4000)
+
+    def test_set_in_copies_only_the_path(self):
+        shared = {"kept": [1, 2]}
+        self.kv_store._add_key(self.store_name, "doc", value={"prod": {"posix": "/a"}, "other": shared})
+        before = self.kv_store._get_key(self.store_name, "doc")
+        self.assertTrue(self.kv_store.set_in(self.store_name, "doc", ["prod", "nt"], "C:\\a"))
+        after = self.kv_store._get_key(self.store_name, "doc")
+        self.assertEqual(after["prod"], {"posix": "/a", "nt": "C:\\a"})
+        self.assertEqual(before["prod"], {"posix": "/a"})
+        self.assertIs(after["other"], before["other"])
+
+    def test_set_in_through_a_scalar_fails(self):
+        self.kv_store._add_key(self.store_name, "doc", value={"a": 1})
+        self.assertFalse(self.kv_store.set_in(self.store_name, "doc", ["a", "b"], 2))
+
+    def test_set_in_past_the_end_of_a_list_fails(self):
+        self.kv_store._add_key(self.store_name, "doc", value={"items": [1]})
+        self.assertFalse(self.kv_store.set_in(self.store_name, "doc", ["items", 5], 2))
+        self.assertEqual(self.kv_store._get_key(self.store_name, "doc"), {"items": [1]})
+
+    def test_merge_in(self):
+        self.kv_store._add_key(self.store_name, "doc", value={"cfg": {"a": 1, "nested": {"x": 1}}})
+        self.kv_store.merge_in(self.store_name, "doc", ["cfg"], {"b": 2, "nested": {"y": 2}})
+        self.assertEqual(self.kv_store._get_key(self.store_name, "doc"),
+                         {"cfg": {"a": 1, "b": 2, "nested": {"x": 1, "y": 2}}})
+
+    def test_list_append_with_max_len(self):
+        for i in range(5):
+            length = self.kv_store.list_append(self.store_name, "log", i, max_len=3)
+        self.assertEqual(length, 3)
+        self.assertEqual(self.kv_store._get_key(self.store_name, "log"), [2, 3, 4])
+
+    def test_list_append_at_path(self):
+        self.kv_store._add_key(self.store_name, "doc", value={"events": []})
+        self.assertEqual(self.kv_store.list_append(self.store_name, "doc", "a", path=["events"]), 1)
+        self.assertEqual(self.kv_store._get_key(self.store_name, "doc"), {"events": ["a"]})
+
+
+class TestAtomicPipelineUpdates(unittest.TestCase):
+    def setUp(self):
+        self.kv_store = PipelineKVStore(backup_dir="test_backups", use_backup=False)
+        self.kv_store.add_pipeline("p1", "tester")
+
+    def tearDown(self):
+        self.kv_store.shutdown()
+        shutil.rmtree("test_backups", ignore_errors=True)
+
+    def test_concurrent_stage_adds_are_all_kept(self):
+        def worker(n):
+            for i in range(50):
+                self.kv_store.add_stage_to_pipeline("p1", f"stage{n}-{i}")
+
+        threads = [threading.Thread(target=worker, args=(n,)) for n in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(self.kv_store.get_pipeline("p1")["stages"]), 200)
+
+    def test_missing_pipeline_is_not_created(self):
+        self.assertFalse(self.kv_store.edit_pipeline("missing", new_description="x"))
+        self.assertIsNone(self.kv_store.get_pipeline("missing"))
+
+    def test_edit_pipeline_ttl(self):
+        self.kv_store.edit_pipeline("p1", ttl=60)
+        exp_time = self.kv_store.get_pipeline("p1")["exp_time"]
+        self.assertAlmostEqual(exp_time, time.time() + 60, delta=5)
+
+    def test_edit_readonly_pipeline_needs_force(self):
+        self.kv_store.add_pipeline("locked", "tester", readonly=True)
+        self.assertFalse(self.kv_store.edit_pipeline("locked", new_description="x"))
+        self.assertTrue(self.kv_store.edit_pipeline("locked", new_description="x", force=True))
+        self.assertEqual(self.kv_store.get_pipeline("locked")["description"], "x")
+
+
+if __name__ == '__main__':
+    unittest.main()
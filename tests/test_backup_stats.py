@@ -0,0 +1,156 @@
+import os
+import threading
+import time
+import unittest
+
+from store import AbstractKVStore
+
+
+class TestDirtyTrackingBackups(unittest.TestCase):
+    def setUp(self):
+        self.store_name = "test_store"
+        self.kv_store = AbstractKVStore(backup_dir="test_backups", use_backup=False, max_backups=3)
+        self.kv_store.create_store(self.store_name)
+
+    def tearDown(self):
+        import shutil
+        self.kv_store.shutdown()
+        shutil.rmtree("test_backups", ignore_errors=True)
+
+    def _generations(self):
+        return sorted(name for name in os.listdir(self.kv_store.backup_dir) if name.startswith(self.store_name))
+
+    def test_unchanged_store_is_skipped(self):
+        self.kv_store._add_key(self.store_name, "key", value="value")
+        self.assertTrue(self.kv_store._backup_if_dirty(self.store_name))
+        self.assertFalse(self.kv_store._backup_if_dirty(self.store_name))
+        self.assertEqual(self._generations(), [f"{self.store_name}.backup.1.kvs"])
+
+        stats = self.kv_store.get_backup_stats()[self.store_name]
+        self.assertEqual(stats['generations_written'], 1)
+        self.assertEqual(stats['generations_skipped'], 1)
+        self.assertEqual(stats['pending_mutations'], 0)
+        self.assertIsNotNone(stats['last_backup_time'])
+        self.assertGreater(stats['last_backup_size'], 0)
+
+    def test_mutation_triggers_new_generation(self):
+        self.kv_store._add_key(self.store_name, "key", value="value")
+        self.kv_store._backup_if_dirty(self.store_name)
+        self.kv_store._edit_key(self.store_name, "key", value="new_value")
+        self.kv_store._delete_key(self.store_name, "key")
+        self.assertEqual(self.kv_store.get_backup_stats()[self.store_name]['pending_mutations'], 2)
+        self.assertTrue(self.kv_store._backup_if_dirty(self.store_name))
+        self.assertEqual(len(self._generations()), 2)
+
+    def test_expiry_marks_store_dirty(self):
+        self.kv_store._add_key(self.store_name, "key", value="value", ttl=-1)
+        self.kv_store._backup_if_dirty(self.store_name)
+        self.kv_store._expire_due_keys()
+        self.assertTrue(self.kv_store._backup_if_dirty(self.store_name))
+
+    def test_deleted_store_has_no_stats(self):
+        self.kv_store._backup_if_dirty(self.store_name)
+        self.kv_store.delete_store(self.store_name)
+        self.assertNotIn(self.store_name, self.kv_store.get_backup_stats())
+        self.assertFalse(self.kv_store._backup_if_dirty(self.store_name))
+
+
+class TestBackupOutsideLock(unittest.TestCase):
+    def setUp(self):
+        self.store_name = "test_store"
+
+    def tearDown(self):
+        import shutil
+        self.kv_store.shutdown()
+        shutil.rmtree("test_backups", ignore_errors=True)
+
+    def test_store_lock_released_while_writing(self):
+        self.kv_store = AbstractKVStore(backup_dir="test_backups", use_backup=False)
+        self.kv_store.create_store(self.store_name)
+        self.kv_store._add_key(self.store_name, "key", value="value")
+        observed = []
+        rotate_and_backup = self.kv_store.rotate_and_backup
+
+        def checking_rotate_and_backup(store_name, store_content):
+            # Another thread must be able to take every stripe while the backup is written
+            writer = threading.Thread(target=lambda: observed.append(
+                self.kv_store._add_key(store_name, "other", value=1)))
+            writer.start()
+            writer.join(timeout=5)
+            self.assertNotIn("other", store_content)
+            rotate_and_backup(store_name, store_content)
+
+        self.kv_store.rotate_and_backup = checking_rotate_and_backup
+        self.assertTrue(self.kv_store._backup_if_dirty(self.store_name))
+        self.assertEqual(observed, [True])
+        self.assertEqual(self.kv_store.get_backup_stats()[self.store_name]['pending_mutations'], 1)
+
+    def test_background_writer_coalesces_jobs(self):
+        self.kv_store = AbstractKVStore(backup_dir="test_backups", use_backup=False, backup_mode="background",
+                                        cleanup_frequency=3600)
+        self.kv_store.create_store(self.store_name)
+        # The writer only runs with the cleanup task, so both jobs queue up first
+        self.kv_store._add_key(self.store_name, "key", value="value")
+        self.assertTrue(self.kv_store._backup_if_dirty(self.store_name))
+        self.assertFalse(self.kv_store._backup_if_dirty(self.store_name))
+        self.kv_store._edit_key(self.store_name, "key", value="new_value")
+        self.assertTrue(self.kv_store._backup_if_dirty(self.store_name))
+        self.assertEqual(len(self.kv_store._pending_backups), 1)
+        self.kv_store.start_tasks("cleanup")
+        self.assertTrue(self.kv_store.wait_for_backups(timeout=5))
+        self.kv_store.shutdown()
+
+        stats = self.kv_store.get_backup_stats()[self.store_name]
+        self.assertEqual(stats['generations_written'], 1)
+        self.assertEqual(stats['pending_mutations'], 0)
+
+    def test_failed_background_backup_is_retried(self):
+        self.kv_store = AbstractKVStore(backup_dir="test_backups", use_backup=False, backup_mode="background",
+                                        cleanup_frequency=3600)
+        self.kv_store.create_store(self.store_name)
+        self.kv_store.start_tasks("cleanup")
+        self.kv_store._add_key(self.store_name, "key", value="value")
+        rotate_and_backup = self.kv_store.rotate_and_backup
+
+        def failing_rotate_and_backup(store_name, store_content):
+            raise OSError("disk full")
+
+        self.kv_store.rotate_and_backup = failing_rotate_and_backup
+        self.assertTrue(self.kv_store._backup_if_dirty(self.store_name))
+        self.assertTrue(self.kv_store.wait_for_backups(timeout=5))
+        self.kv_store.rotate_and_backup = rotate_and_backup
+        self.assertTrue(self.kv_store._backup_if_dirty(self.store_name))
+        self.assertTrue(self.kv_store.wait_for_backups(timeout=5))
+
+        stats = self.kv_store.get_backup_stats()[self.store_name]
+        self.assertEqual(stats['generations_written'], 1)
+        self.assertEqual(stats['pending_mutations'], 0)
+
+    def test_failed_inline_backup_is_retried_by_cleanup(self):
+        self.kv_store = AbstractKVStore(backup_dir="test_backups", use_backup=False, cleanup_frequency=0.05)
+        self.kv_store.create_store(self.store_name)
+        self.kv_store._add_key(self.store_name, "key", value="value")
+        rotate_and_backup, attempts = self.kv_store.rotate_and_backup, []
+
+        def fail_once(store_name, store_content):
+            attempts.append(store_name)
+            if len(attempts) == 1:
+                raise OSError("disk full")
+            rotate_and_backup(store_name, store_content)
+
+        self.kv_store.rotate_and_backup = fail_once
+        self.kv_store.start_tasks("cleanup")
+        deadline = time.monotonic() + 5
+        while self.kv_store.get_backup_stats()[self.store_name]['generations_written'] == 0:
+            self.assertLess(time.monotonic(), deadline)
+            time.sleep(0.01)
+        self.assertGreaterEqual(len(attempts), 2)
+
+    def test_rejects_unknown_backup_mode(self):
+        self.kv_store = AbstractKVStore(backup_dir="test_backups", use_backup=False)
+        with self.assertRaises(ValueError):
+            AbstractKVStore(backup_dir="test_backups", backup_mode="forked")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,73 @@
+import time
+import unittest
+
+from store import AbstractKVStore
+
+
+class TestBatchOperations(unittest.TestCase):
+    def setUp(self):
+        self.store_name = "test_store"
+        self.kv_store = AbstractKVStore(backup_dir="test_backups", use_backup=False)
+        self.kv_store.create_store(self.store_name)
+
+    def tearDown(self):
+        import shutil
+        self.kv_store.shutdown()
+        shutil.rmtree("test_backups", ignore_errors=True)
+
+    def test_mset_then_mget(self):
+        results = self.kv_store.mset(self.store_name, {"a": {"value": 1}, "b": {"value": [2], "ttl": 60}})
+        self.assertEqual(results, {"a": True, "b": True})
+        self.assertEqual(self.kv_store.mget(self.store_name, ["a", "b", "missing"]),
+                         {"a": 1, "b": [2], "missing": None})
+
+    def test_mset_per_key_ttl_and_readonly(self):
+        self.kv_store.mset(self.store_name, {"short": {"value": 1, "ttl": -1},
+                                             "locked": {"value": 2, "readonly": True}})
+        self.assertIsNone(self.kv_store.mget(self.store_name, ["short"])["short"])
+        results = self.kv_store.mset(self.store_name, {"locked": {"value": 3}, "other": "not a dict"})
+        self.assertEqual(results, {"locked": False, "other": False})
+        self.assertEqual(self.kv_store._get_key(self.store_name, "locked"), 2)
+
+    def test_mget_objects_returns_copies(self):
+        self.kv_store.mset(self.store_name, {"a": {"value": 1, "readonly": True}})
+        objects = self.kv_store.mget_objects(self.store_name, ["a", "missing"])
+        self.assertIsNone(objects["missing"])
+        self.assertTrue(objects["a"]["readonly"])
+        self.assertGreater(objects["a"]["exp_time"], time.time())
+        objects["a"]["value"] = "mutated"
+        self.assertEqual(self.kv_store._get_key(self.store_name, "a"), 1)
+
+    def test_mdelete_reports_per_key(self):
+        self.kv_store.mset(self.store_name, {"a": {"value": 1}, "b": {"value": 2}})
+        self.assertEqual(self.kv_store.mdelete(self.store_name, ["a", "missing"]), {"a": True, "missing": False})
+        self.assertEqual(self.kv_store.list_stores(), [self.store_name])
+        self.assertEqual(self.kv_store.mget(self.store_name, ["a", "b"]), {"a": None, "b": 2})
+
+    def test_missing_store(self):
+        self.assertEqual(self.kv_store.mget("nope", ["a"]), {"a": None})
+        self.assertEqual(self.kv_store.mset("nope", {"a": {"value": 1}}), {"a": False})
+        self.assertEqual(self.kv_store.mdelete("nope", ["a"]), {"a": False})
+
+    def test_put_entries_never_moves_versions_back(self):
+        self.kv_store.mset(self.store_name, {"local": {"value": "new"}, "replaced": {"value": 1}})
+        self.kv_store.incr(self.store_name, "replaced")
+        written = self.kv_store.put_entries(self.store_name, {"local": {"value": "old", "version": 5},
+                                                              "replaced": {"value": 9, "version": 1},
+                                                              "copied": {"value": 3, "version": 4}}, False)
+        self.assertEqual(written, 1)
+        objects = self.kv_store.mget_objects(self.store_name, ["local", "replaced", "copied"])
+        self.assertEqual((objects["local"]["value"], objects["local"]["version"]), ("new", 6))
+        self.assertEqual((objects["replaced"]["value"], objects["replaced"]["version"]), (2, 2))
+        self.assertEqual(objects["copied"]["version"], 4)
+        self.kv_store.put_entries(self.store_name, {"replaced": {"value": 9, "version": 1}})
+        self.assertEqual(self.kv_store.mget_objects(self.store_name, ["replaced"])["replaced"]["version"], 3)
+
+    def test_batch_counts_every_mutation(self):
+        self.kv_store.mset(self.store_name, {f"key{i}": {"value": i} for i in range(10)})
+        self.kv_store.mdelete(self.store_name, [f"key{i}" for i in range(5)])
+        self.assertEqual(self.kv_store.get_backup_stats()[self.store_name]['mutations'], 15)
+
+
+if __name__ == "__main__":
+    unittest.main()
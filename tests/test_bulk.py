@@ -0,0 +1,71 @@
+import io
+import shutil
+import unittest
+
+import Pyro4
+
+import bulk
+from store import AbstractKVStore
+
+
+class TestBulkTransfer(unittest.TestCase):
+    def setUp(self):
+        self.source = AbstractKVStore(backup_dir="test_backups/source")
+        self.target = AbstractKVStore(backup_dir="test_backups/target")
+        self.source.create_store("jobs")
+        self.source.create_store("blobs")
+        self.source.mset("jobs", {f"job{i}": {"value": {"status": "queued", "n": i}} for i in range(250)})
+        self.source.mset("jobs", {"job0": {"value": "done", "ttl": 3600, "readonly": True}})
+        self.source.mset("blobs", {"b": {"value": b"\x00\xffraw"}})
+
+    def tearDown(self):
+        self.source.shutdown()
+        self.target.shutdown()
+        shutil.rmtree("test_backups", ignore_errors=True)
+
+    def entries(self, kv_store, store_name):
+        return kv_store.scan(store_name, None, None, 1000)["entries"]
+
+    def test_round_trip(self):
+        for file_format in bulk.FORMATS:
+            with self.subTest(file_format=file_format):
+                f = io.BytesIO()
+                counts = bulk.export_stores(self.source, ["jobs", "blobs"], f, file_format, chunk_size=40)
+                self.assertEqual(counts, {"jobs": 250, "blobs": 1})
+                f.seek(0)
+                counts = bulk.import_stores(self.target, f, file_format, chunk_size=40)
+                self.assertEqual(counts, {"jobs": 250, "blobs": 1})
+                for store_name in ("jobs", "blobs"):
+                    # Expiry times and versions come along with the values
+                    self.assertEqual(self.entries(self.target, store_name), self.entries(self.source, store_name))
+                self.target.delete_store("jobs")
+                self.target.delete_store("blobs")
+
+    def test_no_replace_keeps_existing_keys(self):
+        f = io.BytesIO()
+        bulk.export_stores(self.source, ["jobs"], f)
+        f.seek(0)
+        self.target.create_store("jobs")
+        self.target.mset("jobs", {"job1": {"value": "mine"}})
+        counts = bulk.import_stores(self.target, f, replace=False)
+        self.assertEqual(counts, {"jobs": 249})
+        self.assertEqual(self.target.mget("jobs", ["job1"]), {"job1": "mine"})
+        self.assertEqual(self.target.mget("jobs", ["job2"]), {"job2": {"status": "queued", "n": 2}})
+
+    def test_rejects_records_that_are_not_entries(self):
+        f = io.BytesIO(b'{"store": "jobs", "key": "a", "entry": {"value": 1}}\n["not", "a", "record"]\n')
+        with self.assertRaises(ValueError):
+            bulk.import_stores(self.target, f)
+
+    def test_pages_survive_pyro_serialization(self):
+        serializer = Pyro4.util.get_serializer("serpent")
+        page = serializer.loads(serializer.dumps(self.source.export_entries("blobs")))
+        self.assertIsNone(page["cursor"])
+        self.target.create_store("blobs")
+        self.assertEqual(self.target.import_entries("blobs", serializer.loads(serializer.dumps(page["data"]))), 1)
+        self.assertEqual(self.target.mget("blobs", ["b"]), {"b": b"\x00\xffraw"})
+        self.assertIsNone(self.source.export_entries("missing"))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,120 @@
+import shutil
+import threading
+import time
+import unittest
+
+from changefeed import ChangeFeed
+from entry import Entry
+from store import AbstractKVStore
+
+
+class TestChangeFeed(unittest.TestCase):
+    def test_read_resumes_from_cursor(self):
+        feed = ChangeFeed(capacity=10)
+        for key in ("a", "b", "c"):
+            feed.publish("set", "s", key)
+        records, cursor, missed = feed.read(after=1)
+        self.assertEqual([record[4] for record in records], ["b", "c"])
+        self.assertEqual((cursor, missed), (3, False))
+        self.assertEqual(feed.read(after=cursor), ([], 3, False))
+
+    def test_overwritten_records_are_reported_missed(self):
+        feed = ChangeFeed(capacity=4)
+        for i in range(10):
+            feed.publish("set", "s", str(i))
+        records, cursor, missed = feed.read(after=2)
+        self.assertTrue(missed)
+        self.assertEqual([record[0] for record in records], [7, 8, 9, 10])
+        self.assertEqual(feed.read(after=50), ([], 10, True))
+
+    def test_filters_by_store_and_prefix(self):
+        feed = ChangeFeed()
+        feed.publish("set", "s", "job:1")
+        feed.publish("set", "s", "user:1")
+        feed.publish("set", "other", "job:2")
+        feed.publish("delete_store", "s")
+        records, cursor, _ = feed.read(store_name="s", prefix="job:")
+        self.assertEqual([record[4] for record in records], ["job:1", None])
+        self.assertEqual(cursor, 4)
+
+    def test_keys_that_are_not_strings(self):
+        feed = ChangeFeed()
+        feed.publish("set", "s", 5)
+        feed.publish("set", "s", "job:1")
+        self.assertEqual([record[4] for record in feed.read()[0]], [5, "job:1"])
+        self.assertEqual([record[4] for record in feed.read(prefix="job:")[0]], ["job:1"])
+
+    def test_examines_a_bounded_number_of_records(self):
+        feed = ChangeFeed()
+        for i in range(100):
+            feed.publish("set", "s", f"other{i}")
+        records, cursor, _ = feed.read(prefix="job", limit=2, timeout=5)
+        self.assertEqual((records, cursor), ([], 20))
+
+    def test_long_poll_wakes_on_publish(self):
+        feed = ChangeFeed()
+        threading.Timer(0.1, feed.publish, args=("set", "s", "a")).start()
+        start = time.monotonic()
+        records, _, _ = feed.read(timeout=5)
+        self.assertEqual(len(records), 1)
+        self.assertLess(time.monotonic() - start, 2)
+
+
+class TestStoreChanges(unittest.TestCase):
+    def setUp(self):
+        self.store_name = "test_store"
+        self.kv_store = AbstractKVStore(backup_dir="test_backups", use_backup=False)
+        self.kv_store.create_store(self.store_name)
+
+    def tearDown(self):
+        self.kv_store.shutdown()
+        shutil.rmtree("test_backups", ignore_errors=True)
+
+    def test_mutations_are_published(self):
+        start = self.kv_store.get_changes()["cursor"]
+        self.kv_store._add_key(self.store_name, "a", value=1)
+        self.kv_store.incr(self.store_name, "n")
+        self.kv_store._delete_key(self.store_name, "a")
+        changes = self.kv_store.get_changes(self.store_name, after=start)
+        self.assertEqual([(event["op"], event["key"]) for event in changes["events"]],
+                         [("set", "a"), ("set", "n"), ("delete", "a")])
+        self.assertEqual(changes["events"][0]["entry"]["value"], 1)
+        self.assertFalse(changes["missed"])
+
+    def test_int_keys_are_published(self):
+        start = self.kv_store.get_changes()["cursor"]
+        self.kv_store._add_key(self.store_name, 5, value=1)
+        self.kv_store._add_key(self.store_name, "job:1", value=2)
+        self.assertEqual([event["key"] for event in self.kv_store.get_changes(self.store_name, after=start)["events"]],
+                         [5, "job:1"])
+        self.assertEqual([event["key"] for event in self.kv_store.get_changes(self.store_name, "job:", start)["events"]],
+                         ["job:1"])
+
+    def test_expired_keys_are_published_as_deletes(self):
+        self.kv_store._add_key(self.store_name, "short", value=1, ttl=-1)
+        start = self.kv_store.get_changes()["cursor"]
+        self.assertIsNone(self.kv_store._get_key(self.store_name, "short"))
+        events = self.kv_store.get_changes(self.store_name, after=start)["events"]
+        self.assertEqual([(event["op"], event["key"]) for event in events], [("delete", "short")])
+
+    def test_restored_stores_are_published_as_replaced(self):
+        self.kv_store.rotate_and_backup(self.store_name, {"a": Entry(1, time.time() + 60, version=1)})
+        start = self.kv_store.get_changes()["cursor"]
+        self.kv_store.restore_store(self.store_name)
+        events = self.kv_store.get_changes(self.store_name, after=start)["events"]
+        self.assertEqual([(event["op"], event["store"]) for event in events], [("replace_store", self.store_name)])
+
+    def test_get_changes_long_polls_from_now(self):
+        self.kv_store._add_key(self.store_name, "before", value=1)
+        threading.Timer(0.1, self.kv_store._add_key, args=(self.store_name, "job:1"), kwargs={"value": 2}).start()
+        changes = self.kv_store.get_changes(self.store_name, "job:", timeout=5)
+        self.assertEqual([event["key"] for event in changes["events"]], ["job:1"])
+
+    def test_disabled_feed(self):
+        kv_store = AbstractKVStore(backup_dir="test_backups", use_backup=False, change_feed_size=0)
+        self.assertIsNone(kv_store.get_changes())
+        kv_store.shutdown()
+
+
+if __name__ == '__main__':
+    unittest.main()
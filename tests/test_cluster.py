@@ -0,0 +1,176 @@
+import io
+import multiprocessing
+import os
+import shutil
+import socket
+import time
+import unittest
+
+import Pyro4
+
+import bulk
+from cluster import ClusterProxy, HashRing
+from plugins.nas import PathManagementMixin
+from plugins.sensitive import SecretsPlugin
+from plugins.workflows import WorkflowsPlugin
+from store import AbstractKVStore
+
+
+class ClusterNodeKVStore(AbstractKVStore, WorkflowsPlugin, PathManagementMixin, SecretsPlugin):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        SecretsPlugin.__init__(self)
+        WorkflowsPlugin.__init__(self)
+        PathManagementMixin.__init__(self)
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("localhost", 0))
+        return sock.getsockname()[1]
+
+
+def serve(port, backup_dir):
+    kv_store = ClusterNodeKVStore(backup_dir=backup_dir)
+    daemon = Pyro4.Daemon(host="localhost", port=port)
+    daemon.register(kv_store, objectId="key_value_store")
+    daemon.requestLoop()
+
+
+class TestHashRing(unittest.TestCase):
+    def test_keys_are_spread_evenly(self):
+        ring = HashRing(["a:1", "b:1", "c:1"])
+        owners = [ring.node_for(f"key{i}") for i in range(30_000)]
+        for node in ring.nodes:
+            self.assertAlmostEqual(owners.count(node) / len(owners), 1 / 3, delta=0.05)
+
+    def test_adding_a_node_only_moves_keys_to_it(self):
+        ring = HashRing(["a:1", "b:1", "c:1"])
+        keys = [f"key{i}" for i in range(30_000)]
+        before = {key: ring.node_for(key) for key in keys}
+        ring.add_node("d:1")
+        moved = [key for key in keys if ring.node_for(key) != before[key]]
+        self.assertTrue(all(ring.node_for(key) == "d:1" for key in moved))
+        self.assertAlmostEqual(len(moved) / len(keys), 1 / 4, delta=0.05)
+
+
+class TestClusterProxy(unittest.TestCase):
+    def setUp(self):
+        self.processes = []
+        self.nodes = [self.start_server() for _ in range(3)]
+        self.cluster = ClusterProxy(self.nodes)
+        self.cluster.create_store("jobs")
+
+    def tearDown(self):
+        self.cluster.close()
+        for process in self.processes:
+            process.terminate()
+            process.join()
+        shutil.rmtree("test_backups", ignore_errors=True)
+
+    def start_server(self):
+        port = free_port()
+        process = multiprocessing.Process(target=serve, daemon=True,
+                                          args=(port, os.path.join("test_backups", str(port))))
+        process.start()
+        self.processes.append(process)
+        deadline = time.time() + 10
+        with Pyro4.Proxy(f"PYRO:key_value_store@localhost:{port}") as proxy:
+            while True:
+                try:
+                    proxy._pyroBind()
+                    break
+                except Pyro4.errors.CommunicationError:
+                    self.assertLess(time.time(), deadline)
+                    time.sleep(0.05)
+        return f"localhost:{port}"
+
+    def keys_per_node(self, store_name):
+        return {node: stats[store_name]["keys"]
+                for node, stats in self.cluster.get_storage_stats(store_name).items()}
+
+    def test_batches_are_split_over_the_nodes(self):
+        keys = [f"job{i:03}" for i in range(300)]
+        self.assertTrue(all(self.cluster.mset("jobs", {key: {"value": key} for key in keys}).values()))
+        self.assertEqual(sum(self.keys_per_node("jobs").values()), 300)
+        self.assertTrue(all(count > 50 for count in self.keys_per_node("jobs").values()))
+        self.assertEqual(list(self.cluster.mget("jobs", keys[::-1])), keys[::-1])
+        self.assertEqual(self.cluster.mget("jobs", ["job007", "missing"]), {"job007": "job007", "missing": None})
+        self.assertEqual(self.cluster.incr("jobs", "counter", 5), 5)
+        self.assertEqual(self.cluster.mdelete("jobs", keys[:10]), {key: True for key in keys[:10]})
+        self.assertEqual(sum(self.keys_per_node("jobs").values()), 291)
+        self.assertEqual(self.cluster.list_stores()[-1], "jobs")
+
+    def test_scan_pages_through_every_node_in_key_order(self):
+        keys = [f"job{i:03}" for i in range(250)]
+        self.cluster.mset("jobs", {key: {"value": 1} for key in keys})
+        seen, cursor = [], None
+        while True:
+            page = self.cluster.scan("jobs", cursor, None, 40)
+            self.assertLessEqual(len(page["entries"]), 40)
+            seen.extend(page["entries"])
+            cursor = page["cursor"]
+            if cursor is None:
+                break
+        self.assertEqual(seen, keys)
+        self.assertEqual(list(self.cluster.scan("jobs", None, "job1*", 1000)["entries"]), keys[100:200])
+
+    def test_plugin_calls_are_routed_by_key(self):
+        for i in range(20):
+            self.cluster.add_pipeline(f"p{i}", "tester")
+            self.cluster.add_or_update_path(f"app{i}", "prod", "posix", f"/srv/app{i}")
+        self.assertEqual(sorted(self.cluster.list_pipelines()), sorted(f"p{i}" for i in range(20)))
+        self.assertEqual(self.cluster.get_pipeline("p7")["creator"], "tester")
+        self.assertEqual(self.cluster.get_path("app7", "prod", "posix"), "/srv/app7")
+        self.assertEqual(len(self.cluster.scan_pipelines(count=100)["entries"]), 20)
+
+    def test_transactions_stay_on_one_node(self):
+        node = self.cluster.ring.node_for("a")
+        other = next(key for key in map(str, range(100)) if self.cluster.ring.node_for(key) != node)
+        result = self.cluster.transaction([{"op": "incr", "store_name": "jobs", "key": "a"}])
+        self.assertEqual(result, {"ok": True, "results": [1]})
+        result = self.cluster.transaction([{"op": "incr", "store_name": "jobs", "key": "a"},
+                                           {"op": "incr", "store_name": "jobs", "key": other}])
+        self.assertFalse(result["ok"])
+
+    def test_change_feeds_are_merged(self):
+        cursor = self.cluster.get_changes("jobs")["cursor"]
+        self.cluster.mset("jobs", {f"job{i}": {"value": i} for i in range(30)})
+        changes = self.cluster.get_changes("jobs", after=cursor, timeout=1)
+        self.assertEqual(sorted(event["key"] for event in changes["events"]), sorted(f"job{i}" for i in range(30)))
+        self.assertEqual(set(changes["cursor"]), set(self.nodes))
+
+    def test_export_and_import_go_through_every_node(self):
+        keys = [f"job{i:03}" for i in range(300)]
+        self.cluster.mset("jobs", {key: {"value": key} for key in keys})
+        f = io.BytesIO()
+        self.assertEqual(bulk.export_stores(self.cluster, ["jobs"], f, "msgpack", chunk_size=70), {"jobs": 300})
+        self.cluster.delete_store("jobs")
+        f.seek(0)
+        self.assertEqual(bulk.import_stores(self.cluster, f, "msgpack", chunk_size=70), {"jobs": 300})
+        self.assertEqual(self.cluster.mget("jobs", keys), {key: key for key in keys})
+        self.assertTrue(all(self.keys_per_node("jobs").values()))
+
+    def test_adding_a_node_moves_its_keys(self):
+        keys = [f"job{i:03}" for i in range(300)]
+        self.cluster.mset("jobs", {key: {"value": key, "ttl": 600} for key in keys})
+        node = self.start_server()
+        ring = HashRing(self.cluster.nodes)
+        ring.add_node(node)
+        leaving = next(key for key in keys if ring.node_for(key) == node)
+        self.cluster.set_in("jobs", leaving, [], "edited")
+        for i in range(30):
+            self.cluster.add_confidential_key(f"token{i}", f"secret{i}")
+        moved = self.cluster.add_node(node)
+        counts = self.keys_per_node("jobs")
+        self.assertEqual(counts[node] + self.keys_per_node("secrets")[node], moved)
+        self.assertGreater(moved, 30)
+        self.assertEqual(sum(counts.values()), 300)
+        # Bytes values move intact
+        self.assertEqual([self.cluster.get_confidential_key(f"token{i}") for i in range(30)],
+                         [f"secret{i}" for i in range(30)])
+        self.assertEqual(self.cluster.mget("jobs", keys), {key: key for key in keys} | {leaving: "edited"})
+        # Moved as it was, version included
+        self.assertEqual(self.cluster.mget_objects("jobs", [leaving])[leaving]["version"], 2)
+        with ClusterProxy([node]) as new_node:
+            self.assertIn("pipelines", new_node.list_stores())
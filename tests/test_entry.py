@@ -0,0 +1,40 @@
+import unittest
+
+from entry import Entry
+
+
+class TestEntry(unittest.TestCase):
+    def test_dict_round_trip_keeps_extra_fields(self):
+        data = {"value": {"a": 1}, "exp_time": 12.5, "readonly": True, "last_refresh": 3.0, "owner": "ops"}
+        entry = Entry.from_dict(data)
+        self.assertEqual(entry.extras, {"owner": "ops"})
+        self.assertEqual(entry.to_dict(), data)
+
+    def test_unset_optional_fields_are_left_out(self):
+        self.assertEqual(Entry.from_dict({"value": 1, "exp_time": 2.0}).to_dict(), {"value": 1, "exp_time": 2.0})
+
+    def test_replace_returns_a_new_entry(self):
+        entry = Entry(1, 10.0)
+        edited = entry.replace(value=2, force=True)
+        self.assertEqual((entry.value, entry.extras), (1, None))
+        self.assertEqual((edited.value, edited.exp_time, edited["force"]), (2, 10.0, True))
+
+    def test_mapping_style_reads(self):
+        entry = Entry("v", 5.0, extras={"note": "x"})
+        self.assertEqual(entry["value"], "v")
+        self.assertEqual(entry.get("note"), "x")
+        self.assertIsNone(entry.get("missing"))
+        with self.assertRaises(KeyError):
+            entry["missing"]
+
+    def test_expiry(self):
+        self.assertTrue(Entry(1, 5.0).is_expired(6.0))
+        self.assertFalse(Entry(1, 5.0).is_expired(5.0))
+        self.assertFalse(Entry(1).is_expired(6.0))
+
+    def test_has_no_instance_dict(self):
+        self.assertFalse(hasattr(Entry(1, 2.0), "__dict__"))
+
+
+if __name__ == "__main__":
+    unittest.main()
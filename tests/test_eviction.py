@@ -0,0 +1,123 @@
+import unittest
+
+from entry import Entry
+from eviction import LFUTracker, LRUTracker, TTLTracker, entry_size
+from store import AbstractKVStore
+
+ENTRY_SIZE = entry_size("k1", Entry(1, 0.0))
+
+
+class TestTrackers(unittest.TestCase):
+    def test_lru_order(self):
+        tracker = LRUTracker()
+        for key in ("a", "b", "c"):
+            tracker.add(key, Entry(1))
+        tracker.touch("a")
+        self.assertEqual([tracker.pop_victim() for _ in range(4)], ["b", "c", "a", None])
+
+    def test_lfu_order(self):
+        tracker = LFUTracker()
+        for key in ("a", "b", "c"):
+            tracker.add(key, Entry(1))
+        tracker.touch("a")
+        tracker.touch("a")
+        tracker.touch("b")
+        self.assertEqual(tracker.pop_victim(), "c")
+        tracker.add("d", Entry(1))
+        self.assertEqual([tracker.pop_victim() for _ in range(4)], ["d", "b", "a", None])
+
+    def test_ttl_order_and_readonly(self):
+        tracker = TTLTracker()
+        tracker.set("late", Entry(1, 30.0))
+        tracker.set("early", Entry(1, 10.0))
+        tracker.set("locked", Entry(1, 5.0, readonly=True))
+        tracker.set("late", Entry(1, 1.0))
+        self.assertEqual([tracker.pop_victim() for _ in range(3)], ["late", "early", None])
+
+
+class TestEviction(unittest.TestCase):
+    def tearDown(self):
+        import shutil
+        self.kv_store.shutdown()
+        shutil.rmtree("test_backups", ignore_errors=True)
+
+    def _store(self, policy, limit=3 * ENTRY_SIZE, **kwargs):
+        self.kv_store = AbstractKVStore(backup_dir="test_backups", eviction_policy=policy,
+                                        store_max_memory={"s": limit}, **kwargs)
+        self.kv_store.create_store("s")
+        return self.kv_store
+
+    def test_noeviction_rejects_writes(self):
+        kv_store = self._store("noeviction")
+        self.assertTrue(all(kv_store._add_key("s", f"k{i}", value=1) for i in range(3)))
+        self.assertFalse(kv_store._add_key("s", "k3", value=1))
+        self.assertTrue(kv_store._add_key("s", "k0", value=2))
+        stats = kv_store.get_memory_stats()["stores"]["s"]
+        self.assertEqual((stats["rejected_writes"], stats["evictions"]), (1, 0))
+        self.assertEqual(stats["used_memory"], 3 * ENTRY_SIZE)
+
+    def test_lru_evicts_least_recently_read(self):
+        kv_store = self._store("lru")
+        for i in range(3):
+            kv_store._add_key("s", f"k{i}", value=1)
+        kv_store._get_key("s", "k0")
+        self.assertTrue(kv_store._add_key("s", "k3", value=1))
+        self.assertEqual(sorted(kv_store._stores["s"]), ["k0", "k2", "k3"])
+        self.assertEqual(kv_store.get_memory_stats()["stores"]["s"]["evictions"], 1)
+
+    def test_lfu_evicts_least_frequently_read(self):
+        kv_store = self._store("lfu")
+        for i in range(3):
+            kv_store._add_key("s", f"k{i}", value=1)
+        kv_store.mget("s", ["k0", "k2"])
+        self.assertTrue(kv_store._add_key("s", "k3", value=1))
+        self.assertNotIn("k1", kv_store._stores["s"])
+
+    def test_volatile_ttl_evicts_soonest_deadline(self):
+        kv_store = self._store("volatile-ttl")
+        kv_store._add_key("s", "k0", value=1, ttl=1000)
+        kv_store._add_key("s", "k1", value=1, ttl=10)
+        kv_store._add_key("s", "k2", value=1)
+        kv_store._add_key("s", "k3", value=1, ttl=100)
+        self.assertEqual(sorted(kv_store._stores["s"]), ["k0", "k2", "k3"])
+
+    def test_readonly_keys_are_never_evicted(self):
+        kv_store = self._store("lru")
+        for i in range(3):
+            kv_store._add_key("s", f"k{i}", value=1, readonly=True)
+        self.assertFalse(kv_store._add_key("s", "k3", value=1))
+        self.assertEqual(len(kv_store._stores["s"]), 3)
+
+    def test_oversized_entry_evicts_nothing(self):
+        kv_store = self._store("lru")
+        kv_store._add_key("s", "k0", value=1)
+        self.assertFalse(kv_store._add_key("s", "k1", value="x" * 4 * ENTRY_SIZE))
+        self.assertIn("k0", kv_store._stores["s"])
+
+    def test_global_limit_evicts_from_other_stores(self):
+        kv_store = self._store("lru", limit=None, max_memory=4 * ENTRY_SIZE)
+        kv_store.create_store("t")
+        for i in range(4):
+            kv_store._add_key("t", f"k{i}", value=1)
+        self.assertTrue(kv_store._add_key("s", "k0", value=1))
+        self.assertEqual(len(kv_store._stores["t"]), 3)
+        self.assertLessEqual(kv_store.get_memory_stats()["used_memory"], 4 * ENTRY_SIZE)
+
+    def test_lowering_limit_evicts_right_away(self):
+        kv_store = self._store("noeviction")
+        for i in range(3):
+            kv_store._add_key("s", f"k{i}", value=1)
+        kv_store.set_memory_limit(ENTRY_SIZE, "lru", store_name="s")
+        self.assertEqual(len(kv_store._stores["s"]), 1)
+        self.assertEqual(kv_store.get_memory_stats()["stores"]["s"]["eviction_policy"], "lru")
+
+    def test_accounting_returns_to_zero(self):
+        kv_store = self._store("lru")
+        kv_store.mset("s", {"k0": {"value": {"nested": [1, 2, 3]}}, "k1": {"value": "text"}})
+        kv_store._edit_key("s", "k0", value="smaller")
+        kv_store.mdelete("s", ["k0", "k1"])
+        self.assertEqual(kv_store.get_memory_stats()["stores"]["s"]["used_memory"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,120 @@
+import time
+import unittest
+
+from entry import Entry
+from expiration import ExpirationIndex
+from store import AbstractKVStore
+
+
+class TestExpirationIndex(unittest.TestCase):
+    def setUp(self):
+        self.index = ExpirationIndex()
+
+    def test_pop_due_returns_only_expired_keys(self):
+        self.index.set("store", "old", 10)
+        self.index.set("store", "new", 30)
+        self.assertEqual(self.index.pop_due(20), [("store", "old", 10)])
+        self.assertEqual(len(self.index), 1)
+
+    def test_replaced_deadline_is_not_reported(self):
+        self.index.set("store", "key", 10)
+        self.index.set("store", "key", 50)
+        self.assertEqual(self.index.pop_due(20), [])
+        self.assertEqual(self.index.next_deadline(), 50)
+
+    def test_discard_and_drop_store(self):
+        self.index.set("a", "key", 10)
+        self.index.set("b", "key", 10)
+        self.index.discard("a", "key")
+        self.index.drop_store("b")
+        self.assertEqual(self.index.pop_due(20), [])
+        self.assertEqual(len(self.index), 0)
+
+    def test_sample_returns_live_deadlines_only(self):
+        self.index.set("store", "key", 10)
+        self.index.set("store", "key", 50)
+        self.index.set("store", "other", 20)
+        self.assertEqual(sorted(self.index.sample(50)), [("store", "key", 50), ("store", "other", 20)])
+        self.assertEqual(len(self.index), 2)
+
+
+class TestStoreExpiration(unittest.TestCase):
+    def setUp(self):
+        self.kv_store = AbstractKVStore(backup_dir="test_backups", use_backup=False)
+        self.kv_store.create_store("test_store")
+
+    def tearDown(self):
+        import shutil
+        self.kv_store.shutdown()
+        shutil.rmtree("test_backups", ignore_errors=True)
+
+    def test_expire_due_keys_removes_expired_only(self):
+        self.kv_store._add_key("test_store", "short", value=1, ttl=-1)
+        self.kv_store._add_key("test_store", "long", value=2)
+        self.assertEqual(self.kv_store._expire_due_keys(), 1)
+        self.assertNotIn("short", self.kv_store._stores["test_store"])
+        self.assertIn("long", self.kv_store._stores["test_store"])
+
+    def test_edit_extends_deadline(self):
+        self.kv_store._add_key("test_store", "key", value=1, ttl=-1)
+        self.kv_store._edit_key("test_store", "key", ttl=60)
+        self.assertEqual(self.kv_store._expire_due_keys(), 0)
+        self.assertIn("key", self.kv_store._stores["test_store"])
+
+    def test_deleted_key_leaves_no_deadline(self):
+        self.kv_store._add_key("test_store", "key", value=1, ttl=-1)
+        self.kv_store._delete_key("test_store", "key")
+        self.kv_store._stores["test_store"]["key"] = Entry(2, time.time() + 60)
+        self.assertEqual(self.kv_store._expire_due_keys(), 0)
+        self.assertIn("key", self.kv_store._stores["test_store"])
+
+    def test_expired_key_is_deleted_on_access(self):
+        self.kv_store._add_key("test_store", "key", value=1, ttl=-1)
+        self.kv_store._add_key("test_store", "batch", value=1, ttl=-1)
+        self.assertIsNone(self.kv_store._get_key("test_store", "key"))
+        self.assertEqual(self.kv_store.mget("test_store", ["batch"]), {"batch": None})
+        self.assertEqual(self.kv_store._stores["test_store"], {})
+        self.assertEqual(len(self.kv_store._expirations), 0)
+
+    def test_cycle_stops_at_its_budget(self):
+        for i in range(250):
+            self.kv_store._add_key("test_store", f"key{i}", value=i, ttl=-1)
+        # A zero budget still lets one batch through
+        self.assertEqual(self.kv_store._expire_due_keys(budget_ms=0), 100)
+        self.assertEqual(self.kv_store._expire_due_keys(), 150)
+
+
+class TestSampledExpiration(unittest.TestCase):
+    def setUp(self):
+        self.kv_store = AbstractKVStore(backup_dir="test_backups", expiration_mode="sampled", expire_interval=0.01)
+        self.kv_store.create_store("test_store")
+
+    def tearDown(self):
+        import shutil
+        self.kv_store.shutdown()
+        shutil.rmtree("test_backups", ignore_errors=True)
+
+    def test_repeats_while_most_samples_are_expired(self):
+        for i in range(200):
+            self.kv_store._add_key("test_store", f"expired{i}", value=i, ttl=-1)
+        self.kv_store._add_key("test_store", "live", value=1)
+        expired = self.kv_store._expire_due_keys(budget_ms=1000)
+        # Stops once a sample is mostly live, so a few expired keys may remain
+        self.assertGreater(expired, 150)
+        self.assertIn("live", self.kv_store._stores["test_store"])
+
+    def test_background_task_expires_keys(self):
+        self.kv_store._add_key("test_store", "key", value=1, ttl=-1)
+        self.kv_store.start_tasks("expiration")
+        deadline = time.time() + 5
+        while "key" in self.kv_store._stores["test_store"] and time.time() < deadline:
+            time.sleep(0.01)
+        self.assertNotIn("key", self.kv_store._stores["test_store"])
+
+    def test_rejects_unknown_mode(self):
+        with self.assertRaises(ValueError):
+            AbstractKVStore(backup_dir="test_backups", expiration_mode="eager")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,100 @@
+import shutil
+import unittest
+
+from entry import Entry
+from fieldindex import FieldIndex, field_value
+from plugins.workflows import WorkflowsPlugin
+from store import AbstractKVStore
+
+
+class PipelineKVStore(AbstractKVStore, WorkflowsPlugin):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        WorkflowsPlugin.__init__(self)
+
+
+class TestFieldIndex(unittest.TestCase):
+    def test_field_value_follows_dotted_paths(self):
+        entry = Entry({"owner": "ann"}, extras={"metadata": {"team": "infra"}, "status": "Failed"})
+        self.assertEqual(field_value(entry, "status"), "Failed")
+        self.assertEqual(field_value(entry, "metadata.team"), "infra")
+        self.assertEqual(field_value(entry, "value.owner"), "ann")
+        self.assertIsNone(field_value(entry, "status.code"))
+
+    def test_set_moves_key_between_values(self):
+        index = FieldIndex("value", {"a": Entry(1), "b": Entry(1), "c": Entry("x"), "d": Entry([1])})
+        self.assertEqual(index.lookup(1), ["a", "b"])
+        index.set("a", Entry(2))
+        index.discard("b")
+        self.assertEqual(index.lookup(1), [])
+        self.assertEqual(index.lookup(2), ["a"])
+        self.assertEqual(len(index), 2)
+
+    def test_range_keeps_numbers_and_strings_apart(self):
+        index = FieldIndex("value", {f"n{i}": Entry(i) for i in range(10)})
+        index.set("s", Entry("5"))
+        self.assertEqual(index.range(3, 5), ["n3", "n4", "n5"])
+        self.assertEqual(index.range(low=8), ["n8", "n9"])
+        self.assertEqual(index.range(high=1), ["n0", "n1"])
+        self.assertEqual(index.range(low="0"), ["s"])
+        self.assertEqual(index.range(low=0, limit=2), ["n0", "n1"])
+        with self.assertRaises(ValueError):
+            index.range(1, "9")
+
+
+class TestStoreQueries(unittest.TestCase):
+    def setUp(self):
+        self.kv_store = PipelineKVStore(backup_dir="test_backups", use_backup=False,
+                                        indexes={"jobs": ["value.priority"]})
+        self.kv_store.create_store("jobs")
+
+    def tearDown(self):
+        self.kv_store.shutdown()
+        shutil.rmtree("test_backups", ignore_errors=True)
+
+    def test_pipelines_are_indexed_by_status_and_creator(self):
+        for i in range(6):
+            self.kv_store.add_pipeline(f"p{i}", "ann" if i % 2 else "bob")
+        self.kv_store.edit_pipeline("p3", status="Failed")
+        self.kv_store.edit_pipeline("p4", status="Failed")
+        self.kv_store.delete_pipeline("p4")
+        failed = self.kv_store.query_pipelines("status", "Failed")
+        self.assertEqual(list(failed), ["p3"])
+        self.assertEqual(failed["p3"]["creator"], "ann")
+        self.assertEqual(self.kv_store.query("pipelines", "creator", "bob"), ["p0", "p2"])
+
+    def test_declared_index_and_range_query(self):
+        for i in range(5):
+            self.kv_store._add_key("jobs", f"job{i}", value={"priority": i})
+        self.assertEqual(self.kv_store.query("jobs", "value.priority", low=2, high=3), ["job2", "job3"])
+        self.kv_store.set_in("jobs", "job0", ["priority"], 9)
+        self.assertEqual(self.kv_store.query("jobs", "value.priority", low=4), ["job4", "job0"])
+
+    def test_expired_keys_are_not_returned(self):
+        self.kv_store._add_key("jobs", "old", value={"priority": 1}, ttl=-1)
+        self.kv_store._add_key("jobs", "new", value={"priority": 1})
+        self.assertEqual(self.kv_store.query("jobs", "value.priority", 1), ["new"])
+        self.assertEqual(self.kv_store.list_indexes("jobs"), {"jobs": {"value.priority": 1}})
+
+    def test_create_index_on_existing_keys_and_drop(self):
+        self.kv_store._add_key("jobs", "a", value={"owner": "ann"})
+        self.assertTrue(self.kv_store.create_index("jobs", "value.owner"))
+        self.assertEqual(self.kv_store.query("jobs", "value.owner", "ann"), ["a"])
+        self.assertTrue(self.kv_store.drop_index("jobs", "value.owner"))
+        self.assertIsNone(self.kv_store.query("jobs", "value.owner", "ann"))
+
+    def test_index_survives_store_recreation(self):
+        self.kv_store._add_key("jobs", "a", value={"priority": 1})
+        self.kv_store.delete_store("jobs")
+        self.kv_store.create_store("jobs")
+        self.assertEqual(self.kv_store.query("jobs", "value.priority", 1), [])
+        self.kv_store._add_key("jobs", "b", value={"priority": 1})
+        self.assertEqual(self.kv_store.query("jobs", "value.priority", 1), ["b"])
+
+    def test_unindexed_field_or_bad_value(self):
+        self.assertIsNone(self.kv_store.query("jobs", "value.missing", 1))
+        self.assertIsNone(self.kv_store.query("jobs", "value.priority", [1]))
+
+
+if __name__ == '__main__':
+    unittest.main()
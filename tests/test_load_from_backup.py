@@ -0,0 +1,89 @@
+import json
+import os
+import time
+import unittest
+
+import backups
+from store import DEFAULT_TTL, AbstractKVStore
+
+
+class TestStreamingBackupReader(unittest.TestCase):
+    def setUp(self):
+        os.makedirs("test_backups", exist_ok=True)
+        self.path = os.path.join("test_backups", "sample.backup.1.json")
+
+    def tearDown(self):
+        import shutil
+        shutil.rmtree("test_backups", ignore_errors=True)
+
+    def _write(self, text):
+        with open(self.path, 'w') as f:
+            f.write(text)
+
+    def test_small_chunks_match_json_load(self):
+        content = {f"key{i}": {"value": {"n": i, "text": "é" * i}, "exp_time": 12.5 + i} for i in range(50)}
+        self._write(json.dumps(content, indent=4, ensure_ascii=False))
+        parsed = dict(backups.iter_json_backup(self.path, chunk_size=7))
+        self.assertEqual(parsed, content)
+
+    def test_empty_backup(self):
+        self._write("{\n}")
+        self.assertEqual(list(backups.iter_json_backup(self.path)), [])
+
+    def test_truncated_backup_raises(self):
+        self._write('{"a": {"value": 1, "exp_time": 1}, "b": {"value": ')
+        with self.assertRaises(ValueError):
+            list(backups.iter_json_backup(self.path, chunk_size=4))
+
+
+class TestLoadFromBackup(unittest.TestCase):
+    def tearDown(self):
+        import shutil
+        shutil.rmtree("test_backups", ignore_errors=True)
+
+    def test_restart_restores_stores(self):
+        kv_store = AbstractKVStore(backup_dir="test_backups")
+        kv_store.create_store("first")
+        kv_store.create_store("second")
+        kv_store._add_key("first", "key", value="value")
+        kv_store._add_key("second", "short", value="gone", ttl=1)
+        kv_store._add_key("second", "long", value="kept")
+        for store_name in kv_store.list_stores():
+            kv_store._backup_if_dirty(store_name)
+        time.sleep(1.1)
+
+        restored = AbstractKVStore(backup_dir="test_backups", use_backup=True)
+        self.assertEqual(sorted(restored.list_stores()), ["first", "second"])
+        self.assertEqual(restored._get_key("first", "key"), "value")
+        self.assertNotIn("short", restored._stores["second"])
+        self.assertEqual(restored._get_key("second", "long"), "kept")
+        # An untouched restored generation is not written again, a trimmed one is
+        self.assertFalse(restored._backup_if_dirty("first"))
+        self.assertTrue(restored._backup_if_dirty("second"))
+
+    def test_entries_without_expiry_time_survive_restart(self):
+        kv_store = AbstractKVStore(backup_dir="test_backups")
+        kv_store.create_store("first")
+        kv_store.put_entries("first", {"forever": {"value": 1, "exp_time": None}, "default": {"value": 2}})
+        kv_store._backup_if_dirty("first")
+
+        restored = AbstractKVStore(backup_dir="test_backups", use_backup=True)
+        entries = restored.mget_objects("first", ["forever", "default"])
+        self.assertIsNone(entries["forever"]["exp_time"])
+        self.assertAlmostEqual(entries["default"]["exp_time"], time.time() + DEFAULT_TTL, delta=60)
+
+    def test_falls_back_to_older_generation(self):
+        os.makedirs("test_backups", exist_ok=True)
+        with open(backups.backup_path("test_backups", "paths", 2), 'w') as f:
+            json.dump({"label": {"value": {"prod": "/srv"}, "exp_time": time.time() + 60}}, f)
+        with open(backups.backup_path("test_backups", "paths", 1), 'w') as f:
+            f.write('{"label": {"value": ')
+
+        restored = AbstractKVStore(backup_dir="test_backups", use_backup=True)
+        self.assertEqual(restored._get_key("paths", "label"), {"prod": "/srv"})
+        restored._add_key("paths", "other", value=1, ttl=-1)
+        self.assertEqual(restored._expire_due_keys(), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,100 @@
+import sys
+import threading
+import time
+import unittest
+
+from eviction import entry_size
+from locks import StripedLock
+from store import AbstractKVStore
+
+
+class TestStripedLock(unittest.TestCase):
+    def test_same_key_maps_to_same_stripe(self):
+        lock = StripedLock(8)
+        self.assertIs(lock.for_key("key"), lock.for_key("key"))
+
+    def test_invalid_stripe_count(self):
+        with self.assertRaises(ValueError):
+            StripedLock(0)
+
+    def test_all_is_reentrant(self):
+        lock = StripedLock(4)
+        with lock.all():
+            with lock.for_keys(["a", "b"]):
+                with lock.for_key("a"):
+                    pass
+
+
+class TestPerStoreLocking(unittest.TestCase):
+    def setUp(self):
+        self.kv_store = AbstractKVStore(backup_dir="test_backups", use_backup=False)
+        self.kv_store.create_store("busy")
+        self.kv_store.create_store("idle")
+
+    def tearDown(self):
+        import shutil
+        self.kv_store.shutdown()
+        shutil.rmtree("test_backups", ignore_errors=True)
+
+    def _run_in_thread(self, target):
+        done = threading.Event()
+        thread = threading.Thread(target=lambda: (target(), done.set()))
+        thread.start()
+        finished = done.wait(2)
+        thread.join(2)
+        return finished
+
+    def test_other_store_is_not_blocked(self):
+        with self.kv_store._whole_store_lock("busy"):
+            self.assertTrue(self._run_in_thread(lambda: self.kv_store._add_key("idle", "key", value=1)))
+        self.assertEqual(self.kv_store._get_key("idle", "key"), 1)
+
+    def test_same_store_waits_for_whole_store_lock(self):
+        with self.kv_store._whole_store_lock("busy"):
+            thread = threading.Thread(target=self.kv_store._add_key, args=("busy", "key"), kwargs={"value": 1})
+            thread.start()
+            thread.join(0.2)
+            self.assertTrue(thread.is_alive())
+        thread.join(2)
+        self.assertEqual(self.kv_store._get_key("busy", "key"), 1)
+
+    def test_delete_store_drops_its_lock(self):
+        self.kv_store.delete_store("busy")
+        self.assertNotIn("busy", self.kv_store._store_locks)
+        self.assertFalse(self.kv_store._add_key("busy", "key", value=1))
+
+    def test_writes_racing_delete_and_create_keep_the_store_consistent(self):
+        errors, stop = [], threading.Event()
+
+        def writer(n):
+            i = 0
+            while not stop.is_set():
+                try:
+                    self.kv_store._add_key("busy", f"key{n}-{i % 50}", value=i)
+                    self.kv_store._delete_key("busy", f"key{n}-{(i + 25) % 50}")
+                except Exception as e:
+                    errors.append(e)
+                i += 1
+
+        threads = [threading.Thread(target=writer, args=(n,)) for n in range(4)]
+        # Switch threads often so writers get caught halfway through a write
+        interval = sys.getswitchinterval()
+        sys.setswitchinterval(1e-6)
+        self.addCleanup(sys.setswitchinterval, interval)
+        for thread in threads:
+            thread.start()
+        deadline = time.monotonic() + 1
+        while time.monotonic() < deadline:
+            self.kv_store.delete_store("busy")
+            self.kv_store.create_store("busy")
+        stop.set()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+        store = self.kv_store._stores["busy"]
+        self.assertEqual(sorted(self.kv_store._key_indexes["busy"].page(limit=1000)), sorted(store))
+        self.assertEqual(self.kv_store._used_memory("busy"), sum(entry_size(key, entry) for key, entry in store.items()))
+
+
+if __name__ == "__main__":
+    unittest.main()
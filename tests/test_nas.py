@@ -15,12 +15,13 @@ class TestPathManagementMixin(unittest.TestCase):
         # Mocking the AbstractKVStore to focus on PathManagementMixin functionality.
         self.kv_store = EnhancedKVStore(backup_dir="test_backups", use_backup=False)
         self.kv_store._edit_key = MagicMock()
+        self.kv_store.set_in = MagicMock()
         self.kv_store._get_object = MagicMock()
         self.kv_store.create_store = MagicMock()
 
     def test_add_or_update_path(self):
         self.kv_store.add_or_update_path("myApp", "prod", "posix", "/var/app/prod")
-        self.kv_store._edit_key.assert_called()
+        self.kv_store.set_in.assert_called_with("paths", "myApp", ["prod", "posix"], "/var/app/prod")
 
     def test_get_path(self):
         self.kv_store._get_object.return_value = {"prod": {"posix": "/var/app/prod"}}
@@ -34,7 +35,7 @@ class TestPathManagementMixin(unittest.TestCase):
 
     def test_edit_specific_path(self):
         self.kv_store.edit_specific_path("myApp", "prod", "posix", "/new/path")
-        self.kv_store._edit_key.assert_called()
+        self.kv_store.set_in.assert_called_with("paths", "myApp", ["prod", "posix"], "/new/path")
 
     def test_get_all_paths(self):
         self.kv_store._get_object.return_value = {"myApp": {"prod": {"posix": "/var/app/prod"}}}
@@ -0,0 +1,78 @@
+import shutil
+import unittest
+
+from stats import LatencyHistogram, bucket_floor, bucket_of
+from store import AbstractKVStore
+
+
+class TestLatencyHistogram(unittest.TestCase):
+    def test_buckets_are_at_most_an_eighth_wide(self):
+        for ns in (0, 7, 8, 15, 16, 1000, 123_456, 10 ** 9):
+            bucket = bucket_of(ns)
+            self.assertLessEqual(bucket_floor(bucket), ns)
+            self.assertLess(ns, bucket_floor(bucket + 1))
+            self.assertLessEqual(bucket_floor(bucket + 1) - bucket_floor(bucket), max(1, ns / 8))
+
+    def test_percentiles(self):
+        histogram = LatencyHistogram()
+        for ns in range(1, 1001):
+            histogram.record(ns * 1000)
+        summary = histogram.summary()
+        self.assertEqual(summary["count"], 1000)
+        self.assertAlmostEqual(summary["mean_us"], 500.5)
+        self.assertAlmostEqual(summary["p50_us"], 500, delta=500 / 8)
+        self.assertAlmostEqual(summary["p99_us"], 990, delta=990 / 8)
+        self.assertEqual(summary["max_us"], 1000)
+
+
+class TestOperationStats(unittest.TestCase):
+    def setUp(self):
+        self.store_name = "test_store"
+        self.kv_store = AbstractKVStore(backup_dir="test_backups", use_backup=False, operation_stats=True,
+                                        stats_sample_every=1, lock_stats=True)
+        self.kv_store.create_store(self.store_name)
+
+    def tearDown(self):
+        self.kv_store.shutdown()
+        shutil.rmtree("test_backups", ignore_errors=True)
+
+    def test_counts_operations_and_hits(self):
+        self.kv_store._add_key(self.store_name, "a", value=1)
+        for key in ("a", "a", "a", "missing"):
+            self.kv_store._get_key(self.store_name, key)
+        self.kv_store.mget(self.store_name, ["a"])
+        operations = self.kv_store.get_operation_stats()["operations"][self.store_name]
+        self.assertEqual(operations["set"]["calls"], 1)
+        self.assertEqual(operations["mget"]["calls"], 1)
+        self.assertEqual((operations["get"]["hits"], operations["get"]["misses"]), (3, 1))
+        self.assertEqual(operations["get"]["hit_ratio"], 0.75)
+        self.assertEqual(operations["get"]["latency"]["count"], 4)
+
+    def test_lock_times_and_reset(self):
+        self.kv_store._add_key(self.store_name, "a", value=1)
+        stats = self.kv_store.get_operation_stats(self.store_name, reset=True)
+        self.assertEqual(stats["locks"][self.store_name]["hold"]["count"], 1)
+        self.assertEqual(self.kv_store.get_operation_stats(), {"sample_every": 1, "operations": {}, "locks": {}})
+
+    def test_sampled_counts_are_estimates(self):
+        kv_store = AbstractKVStore(backup_dir="test_backups", use_backup=False, operation_stats=True,
+                                   stats_sample_every=4)
+        kv_store.create_store("s")
+        for _ in range(4000):
+            kv_store._get_key("s", "missing")
+        get = kv_store.get_operation_stats()["operations"]["s"]["get"]
+        self.assertEqual(get["calls"] % 4, 0)
+        self.assertAlmostEqual(get["calls"], 4000, delta=400)
+        self.assertEqual(get["misses"], get["calls"])
+        with self.assertRaises(ValueError):
+            AbstractKVStore(backup_dir="test_backups", operation_stats=True, stats_sample_every=3)
+
+    def test_disabled(self):
+        kv_store = AbstractKVStore(backup_dir="test_backups", use_backup=False, operation_stats=False)
+        kv_store.create_store("s")
+        kv_store._get_key("s", "a")
+        self.assertEqual(kv_store.get_operation_stats()["operations"], {})
+
+
+if __name__ == '__main__':
+    unittest.main()
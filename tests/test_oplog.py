@@ -0,0 +1,166 @@
+import os
+import threading
+import time
+import unittest
+
+from entry import Entry
+from oplog import OperationLog
+from store import AbstractKVStore
+
+
+class TestOperationLog(unittest.TestCase):
+    def setUp(self):
+        self.directory = os.path.join("test_backups", "oplog")
+
+    def tearDown(self):
+        import shutil
+        shutil.rmtree("test_backups", ignore_errors=True)
+
+    def test_invalid_fsync_mode(self):
+        with self.assertRaises(ValueError):
+            OperationLog(self.directory, fsync="sometimes")
+
+    def test_group_commit_makes_every_append_durable(self):
+        oplog = OperationLog(self.directory, fsync="always")
+        threads = [threading.Thread(target=lambda n=n: [oplog.append({"op": "set", "n": n, "i": i})
+                                                        for i in range(50)]) for n in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(oplog._durable, 200)
+        oplog.close()
+        _, records = OperationLog.recover(self.directory)
+        self.assertEqual(len(list(records)), 200)
+
+    def test_interval_mode_flushes_in_background(self):
+        oplog = OperationLog(self.directory, fsync="interval", fsync_interval=0.01)
+        oplog.append({"op": "create_store", "store": "s"})
+        time.sleep(0.2)
+        _, records = OperationLog.recover(self.directory)
+        self.assertEqual(list(records), [{"op": "create_store", "store": "s"}])
+        oplog.close()
+
+    def test_truncated_tail_is_skipped(self):
+        oplog = OperationLog(self.directory, fsync="os")
+        oplog.append({"op": "create_store", "store": "s"})
+        oplog.close()
+        with open(oplog._segment_path(oplog._segment), 'ab') as f:
+            f.write(b'{"op": "se')
+        _, records = OperationLog.recover(self.directory)
+        self.assertEqual(len(list(records)), 1)
+
+
+class TestStoreRecovery(unittest.TestCase):
+    def _open(self, use_backup):
+        return AbstractKVStore(backup_dir="test_backups", use_backup=use_backup, oplog_fsync="always")
+
+    def tearDown(self):
+        import shutil
+        shutil.rmtree("test_backups", ignore_errors=True)
+
+    def test_writes_survive_restart(self):
+        kv_store = self._open(use_backup=False)
+        kv_store.create_store("test_store")
+        kv_store.create_store("dropped")
+        kv_store._add_key("test_store", "kept", value="v1")
+        kv_store._edit_key("test_store", "kept", value="v2")
+        kv_store._add_key("test_store", "secret", value=b"\x00cipher")
+        kv_store._add_key("test_store", "removed", value="v")
+        kv_store._delete_key("test_store", "removed")
+        kv_store.delete_store("dropped")
+        kv_store.close()
+
+        restored = self._open(use_backup=True)
+        self.assertEqual(restored.list_stores(), ["test_store"])
+        self.assertEqual(restored._get_key("test_store", "kept"), "v2")
+        self.assertEqual(restored._get_key("test_store", "secret"), b"\x00cipher")
+        self.assertIsNone(restored._get_key("test_store", "removed"))
+        restored.close()
+
+    def test_tasks_can_be_stopped_and_started_again(self):
+        kv_store = self._open(use_backup=False)
+        kv_store.create_store("test_store")
+        kv_store.start_tasks()
+        kv_store.shutdown()
+        kv_store.start_tasks()
+        self.assertTrue(kv_store._add_key("test_store", "after_shutdown", value=1))
+        kv_store.close()
+
+        restored = self._open(use_backup=True)
+        self.assertEqual(restored._get_key("test_store", "after_shutdown"), 1)
+        restored.close()
+
+    def test_restores_survive_restart(self):
+        kv_store = self._open(use_backup=False)
+        kv_store.create_store("test_store")
+        kv_store._add_key("test_store", "key", value="before restore")
+        kv_store.rotate_and_backup("test_store", {"key": Entry("restored", time.time() + 60, version=1)})
+        kv_store.restore_store("test_store")
+        kv_store.close()
+
+        restored = self._open(use_backup=True)
+        self.assertEqual(restored._get_key("test_store", "key"), "restored")
+        restored.close()
+
+    def test_first_start_with_log_loads_backups(self):
+        kv_store = AbstractKVStore(backup_dir="test_backups", use_backup=False)
+        kv_store.create_store("test_store")
+        kv_store._add_key("test_store", "key", value="backed up")
+        kv_store._backup_if_dirty("test_store")
+        kv_store.close()
+
+        restored = self._open(use_backup=True)
+        self.assertEqual(restored._get_key("test_store", "key"), "backed up")
+        restored.close()
+        # The loaded stores went into the log's first snapshot
+        restored = self._open(use_backup=True)
+        self.assertEqual(restored._get_key("test_store", "key"), "backed up")
+        restored.close()
+
+    def test_compaction_folds_log_into_snapshot(self):
+        kv_store = self._open(use_backup=False)
+        kv_store.create_store("test_store")
+        for i in range(10):
+            kv_store._add_key("test_store", f"key{i}", value=i)
+        kv_store.compact_oplog()
+        kv_store._add_key("test_store", "after", value="compaction")
+        self.assertEqual(len(kv_store._oplog._segments()), 1)
+        kv_store.close()
+
+        restored = self._open(use_backup=True)
+        self.assertEqual(len(restored._stores["test_store"]), 11)
+        self.assertEqual(restored._get_key("test_store", "after"), "compaction")
+        restored.close()
+
+    def test_keys_keep_their_type_through_compaction(self):
+        kv_store = self._open(use_backup=False)
+        kv_store.create_store("test_store")
+        kv_store.create_store("empty")
+        kv_store._add_key("test_store", 5, value="int")
+        kv_store._add_key("test_store", ("job", 1), value="tuple")
+        kv_store.compact_oplog()
+        kv_store._add_key("test_store", ("job", 2), value="logged")
+        kv_store.close()
+
+        restored = self._open(use_backup=True)
+        self.assertEqual(sorted(restored._stores["test_store"], key=repr), [("job", 1), ("job", 2), 5])
+        self.assertEqual(restored._get_key("test_store", 5), "int")
+        self.assertEqual(restored._get_key("test_store", ("job", 1)), "tuple")
+        self.assertIn("empty", restored.list_stores())
+        restored.close()
+
+    def test_fresh_start_discards_previous_log(self):
+        kv_store = self._open(use_backup=False)
+        kv_store.create_store("test_store")
+        kv_store.close()
+
+        fresh = self._open(use_backup=False)
+        fresh.close()
+        restored = self._open(use_backup=True)
+        self.assertEqual(restored.list_stores(), [])
+        restored.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,185 @@
+import multiprocessing
+import os
+import shutil
+import socket
+import threading
+import time
+import unittest
+
+import Pyro4
+
+from entry import Entry
+from plugins.nas import PathManagementMixin
+from plugins.sensitive import SecretsPlugin
+from plugins.workflows import WorkflowsPlugin
+from store import AbstractKVStore
+
+
+class ReplicatedKVStore(AbstractKVStore, WorkflowsPlugin, PathManagementMixin, SecretsPlugin):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        SecretsPlugin.__init__(self)
+        WorkflowsPlugin.__init__(self)
+        PathManagementMixin.__init__(self)
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("localhost", 0))
+        return sock.getsockname()[1]
+
+
+def serve(port, backup_dir, replica_of=None):
+    kv_store = ReplicatedKVStore(backup_dir=backup_dir, replica_of=replica_of)
+    kv_store.start_tasks()
+    daemon = Pyro4.Daemon(host="localhost", port=port)
+    daemon.register(kv_store, objectId="key_value_store")
+    daemon.requestLoop()
+
+
+def uri(port):
+    return f"PYRO:key_value_store@localhost:{port}"
+
+
+class TestReplication(unittest.TestCase):
+    def setUp(self):
+        self.processes = []
+        self.primary_port = self.start_server("primary")
+        self.primary = self.proxy(self.primary_port)
+        self.primary.add_pipeline("before", "tester", description="written before the replica started")
+        self.primary.add_confidential_key("token_before", "s3cret")
+        self.replica_port = self.start_server("replica", replica_of=uri(self.primary_port))
+        self.replica = self.proxy(self.replica_port)
+
+    def tearDown(self):
+        self.primary._pyroRelease()
+        self.replica._pyroRelease()
+        for process in self.processes:
+            process.terminate()
+            process.join()
+        shutil.rmtree("test_backups", ignore_errors=True)
+
+    def start_server(self, name, replica_of=None):
+        port = free_port()
+        process = multiprocessing.Process(target=serve, daemon=True,
+                                          args=(port, os.path.join("test_backups", name), replica_of))
+        process.start()
+        self.processes.append(process)
+        return port
+
+    def proxy(self, port):
+        proxy = Pyro4.Proxy(uri(port))
+        deadline = time.time() + 10
+        while True:
+            try:
+                proxy._pyroBind()
+                return proxy
+            except Pyro4.errors.CommunicationError:
+                if time.time() > deadline:
+                    raise
+                time.sleep(0.05)
+
+    def wait_for(self, condition):
+        deadline = time.time() + 10
+        while not condition():
+            self.assertLess(time.time(), deadline, "The replica did not catch up")
+            time.sleep(0.05)
+
+    def test_replica_bootstraps_and_streams(self):
+        self.wait_for(lambda: self.replica.replication_status()["state"] == "streaming")
+        self.assertIn("before", self.replica.list_pipelines())
+
+        self.primary.add_or_update_path("app", "prod", "posix", "/var/app")
+        self.primary.add_pipeline("after", "tester")
+        self.primary.mdelete("pipelines", ["before"])
+        self.wait_for(lambda: self.replica.get_path("app", "prod", "posix") == "/var/app")
+        self.wait_for(lambda: sorted(self.replica.list_pipelines()) == ["after"])
+        self.assertEqual(self.replica.mget("pipelines", ["after"]), self.primary.mget("pipelines", ["after"]))
+
+        status = self.replica.replication_status()
+        self.assertEqual((status["primary"], status["bootstraps"]), (uri(self.primary_port), 1))
+        self.assertGreaterEqual(status["applied"], 3)
+        self.assertEqual(status["lag_seconds"], 0.0)
+        self.assertIsNone(self.primary.replication_status())
+
+    def test_bytes_values_are_replicated_intact(self):
+        self.wait_for(lambda: self.replica.replication_status()["state"] == "streaming")
+        self.primary.add_confidential_key("token_after", "hunter2")
+        self.wait_for(lambda: self.replica.mget("secrets", ["token_after"])["token_after"] is not None)
+        self.assertEqual(self.replica.get_confidential_key("token_before"), "s3cret")
+        self.assertEqual(self.replica.get_confidential_key("token_after"), "hunter2")
+
+    def test_replica_rejects_writes(self):
+        self.wait_for(lambda: self.replica.replication_status()["state"] == "streaming")
+        self.assertFalse(self.replica.add_pipeline("local", "tester"))
+        self.assertEqual(self.replica.mdelete("pipelines", ["before"]), {"before": False})
+        self.assertIsNone(self.replica.incr("pipelines", "counter"))
+        self.assertNotIn("local", self.primary.list_pipelines())
+        self.assertIn("before", self.replica.list_pipelines())
+
+    def test_replica_follows_restored_stores(self):
+        self.wait_for(lambda: self.replica.replication_status()["state"] == "streaming")
+        self.primary.create_store("cache")
+        self.primary.mset("cache", {"c1": {"value": "live"}})
+        self.wait_for(lambda: self.replica.mget("cache", ["c1"]) == {"c1": "live"})
+        writer = AbstractKVStore(backup_dir=os.path.join("test_backups", "primary"))
+        writer.rotate_and_backup("cache", {"c2": Entry("backed up", time.time() + 60, version=1)})
+        writer.shutdown()
+        self.assertEqual(self.primary.restore_store("cache"), 1)
+        self.wait_for(lambda: self.replica.mget("cache", ["c1", "c2"]) == {"c1": None, "c2": "backed up"})
+
+    def test_replica_follows_store_changes(self):
+        self.wait_for(lambda: self.replica.replication_status()["state"] == "streaming")
+        self.primary.create_store("cache")
+        self.primary.mset("cache", {"c1": {"value": 1}})
+        self.wait_for(lambda: self.replica.mget("cache", ["c1"]) == {"c1": 1})
+        self.primary.delete_store("cache")
+        self.wait_for(lambda: "cache" not in self.replica.list_stores())
+
+
+@Pyro4.expose
+class FlakyPrimary(AbstractKVStore):
+    """Raises a plain KeyError, as a server-side bug would, on its first change feed read after bootstrap."""
+
+    failures = 1
+
+    def export_changes(self, after=None, limit=100, timeout=0):
+        if after is not None and self.failures:
+            self.failures -= 1
+            raise KeyError("broken")
+        return super().export_changes(after, limit, timeout)
+
+
+class TestReplicationErrors(unittest.TestCase):
+    def setUp(self):
+        self.primary = FlakyPrimary(backup_dir=os.path.join("test_backups", "primary"))
+        self.primary.create_store("cache")
+        self.daemon = Pyro4.Daemon(host="localhost")
+        primary_uri = self.daemon.register(self.primary)
+        threading.Thread(target=self.daemon.requestLoop, daemon=True).start()
+        self.replica = AbstractKVStore(backup_dir=os.path.join("test_backups", "replica"), replica_of=str(primary_uri))
+        self.replica._replicator.retry_interval = 0.05
+
+    def tearDown(self):
+        self.replica.shutdown()
+        self.daemon.shutdown()
+        self.primary.shutdown()
+        shutil.rmtree("test_backups", ignore_errors=True)
+
+    def wait_for(self, condition):
+        deadline = time.time() + 10
+        while not condition():
+            self.assertLess(time.time(), deadline, "The replica did not catch up")
+            time.sleep(0.02)
+
+    def test_server_side_errors_are_reported_and_retried(self):
+        self.replica.start_tasks("replication")
+        self.wait_for(lambda: self.replica.replication_status()["last_error"] is not None)
+        self.assertIn("broken", self.replica.replication_status()["last_error"])
+        self.primary.mset("cache", {"c1": {"value": 1}})
+        self.wait_for(lambda: self.replica.mget("cache", ["c1"]) == {"c1": 1})
+        self.assertEqual(self.replica.replication_status()["state"], "streaming")
+
+
+if __name__ == '__main__':
+    unittest.main()
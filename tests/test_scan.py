@@ -0,0 +1,115 @@
+import random
+import unittest
+
+from keyindex import SortedKeyIndex, StoreKeyIndex, split_match
+from store import AbstractKVStore
+
+
+class TestSortedKeyIndex(unittest.TestCase):
+    def test_matches_sorted_set_under_random_edits(self):
+        index = SortedKeyIndex(block_size=4)
+        expected = set()
+        rng = random.Random(7)
+        for _ in range(2000):
+            key = f"k{rng.randrange(300):03d}"
+            if rng.random() < 0.6:
+                self.assertEqual(index.add(key), key not in expected)
+                expected.add(key)
+            else:
+                self.assertEqual(index.discard(key), key in expected)
+                expected.discard(key)
+        self.assertEqual(len(index), len(expected))
+        self.assertEqual(index.page(limit=1000), sorted(expected))
+
+    def test_page_after_and_prefix(self):
+        index = SortedKeyIndex(["a1", "b1", "b2", "b3", "c1"], block_size=2)
+        self.assertEqual(index.page(prefix="b", limit=2), ["b1", "b2"])
+        self.assertEqual(index.page(after="b2", prefix="b"), ["b3"])
+        self.assertEqual(index.page(after="a", prefix="b"), ["b1", "b2", "b3"])
+        self.assertEqual(index.page(after="c1"), [])
+
+    def test_keys_of_any_type(self):
+        index = StoreKeyIndex(["b", 2, (1, "x")])
+        for key in ("a", 1.5, True, b"raw", None):
+            self.assertTrue(index.add(key))
+        self.assertFalse(index.add(1))
+        self.assertEqual(index.page(), ["a", "b", None, b"raw", True, 1.5, 2, (1, "x")])
+        self.assertEqual(index.page(after="b", limit=2), [None, b"raw"])
+        self.assertEqual(index.page(after=True), [1.5, 2, (1, "x")])
+        self.assertEqual(index.page(prefix="a"), ["a"])
+        self.assertTrue(index.discard(1.0))
+        self.assertEqual(len(index), 7)
+
+    def test_split_match(self):
+        self.assertEqual(split_match(None), ("", None))
+        self.assertEqual(split_match("job-"), ("job-", None))
+        self.assertEqual(split_match("job-*-done"), ("job-", "job-*-done"))
+
+
+class TestScan(unittest.TestCase):
+    def setUp(self):
+        self.store_name = "test_store"
+        self.kv_store = AbstractKVStore(backup_dir="test_backups", use_backup=False)
+        self.kv_store.create_store(self.store_name)
+        self.kv_store.mset(self.store_name, {f"job-{i:03d}-{'done' if i % 2 else 'new'}": {"value": i}
+                                             for i in range(50)})
+        self.kv_store._add_key(self.store_name, "other", value="x")
+
+    def tearDown(self):
+        import shutil
+        self.kv_store.shutdown()
+        shutil.rmtree("test_backups", ignore_errors=True)
+
+    def _scan_all(self, match=None, count=7):
+        keys, cursor = [], None
+        while True:
+            page = self.kv_store.scan(self.store_name, cursor, match, count)
+            self.assertLessEqual(len(page["entries"]), count)
+            keys.extend(page["entries"])
+            cursor = page["cursor"]
+            if cursor is None:
+                return keys
+
+    def test_keys_that_are_not_strings(self):
+        self.assertTrue(self.kv_store._add_key(self.store_name, 1, value="one"))
+        self.assertTrue(self.kv_store._add_key(self.store_name, "zz", value="last string"))
+        self.assertTrue(self.kv_store._add_key(self.store_name, (2, "b"), value="tuple"))
+        keys = self._scan_all()
+        self.assertEqual(keys[-3:], ["zz", 1, (2, "b")])
+        self.assertEqual(self._scan_all("job-00*"), [f"job-00{i}-{'done' if i % 2 else 'new'}" for i in range(10)])
+        self.assertTrue(self.kv_store._delete_key(self.store_name, 1))
+        self.assertEqual(self._scan_all()[-2:], ["zz", (2, "b")])
+
+    def test_pages_cover_store_in_order(self):
+        keys = self._scan_all()
+        self.assertEqual(keys, sorted(self.kv_store._stores[self.store_name]))
+
+    def test_prefix_and_glob(self):
+        self.assertEqual(len(self._scan_all("job-")), 50)
+        self.assertEqual(self._scan_all("job-*-done"), [f"job-{i:03d}-done" for i in range(1, 50, 2)])
+        self.assertEqual(self._scan_all("nope"), [])
+
+    def test_entries_and_expiry(self):
+        self.kv_store._add_key(self.store_name, "job-expired", value=1, ttl=-1)
+        page = self.kv_store.scan(self.store_name, match="job-0", count=1)
+        self.assertEqual(page["entries"], {"job-000-new": self.kv_store._get_object(self.store_name, "job-000-new")})
+        self.assertNotIn("job-expired", self._scan_all("job-"))
+
+    def test_deletes_between_pages(self):
+        page = self.kv_store.scan(self.store_name, match="job-", count=10)
+        self.kv_store.mdelete(self.store_name, ["job-010-new", "job-011-done"])
+        rest = self.kv_store.scan(self.store_name, page["cursor"], "job-", 10)
+        self.assertEqual(list(rest["entries"])[0], "job-012-new")
+
+    def test_restored_store_is_indexed(self):
+        self.kv_store._backup_if_dirty(self.store_name)
+        restored = AbstractKVStore(backup_dir="test_backups", use_backup=True)
+        self.assertEqual(list(restored.scan(self.store_name, match="oth")["entries"]), ["other"])
+        restored.shutdown()
+
+    def test_missing_store(self):
+        self.assertEqual(self.kv_store.scan("nope"), {"cursor": None, "entries": {}})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,62 @@
+import threading
+import unittest
+
+from plugins.metrics import MetricsPlugin
+from store import AbstractKVStore
+
+
+class EnhancedKVStore(AbstractKVStore, MetricsPlugin):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        MetricsPlugin.__init__(self, *args, **kwargs)
+
+
+class TestSnapshotReads(unittest.TestCase):
+    def setUp(self):
+        self.kv_store = EnhancedKVStore(backup_dir="test_backups", use_backup=False)
+        self.kv_store.create_store("test_store")
+        self.kv_store._add_key("test_store", "key", value={"nested": [1]})
+
+    def tearDown(self):
+        import shutil
+        self.kv_store.shutdown()
+        shutil.rmtree("test_backups", ignore_errors=True)
+
+    def _read_in_thread(self, read):
+        result = {}
+        thread = threading.Thread(target=lambda: result.setdefault("value", read()))
+        thread.start()
+        thread.join(2)
+        self.assertFalse(thread.is_alive(), "Read blocked behind a writer")
+        return result["value"]
+
+    def test_reads_do_not_wait_for_writers(self):
+        self.kv_store.add_internal_key("cpu_usage", 10)
+        with self.kv_store._whole_store_lock("test_store"), self.kv_store._whole_store_lock("metrics"):
+            self.assertEqual(self._read_in_thread(lambda: self.kv_store._get_key("test_store", "key")),
+                             {"nested": [1]})
+            self.assertIn("key", self._read_in_thread(lambda: self.kv_store._get_all_keys("test_store")))
+            internal = self._read_in_thread(self.kv_store.get_all_internal_keys)
+            self.assertEqual(internal["cpu_usage"]["value"], 10)
+
+    def test_snapshot_is_point_in_time(self):
+        snapshot = self.kv_store._snapshot("test_store")
+        self.kv_store._edit_key("test_store", "key", value="changed")
+        self.kv_store._add_key("test_store", "other", value=2)
+        self.assertEqual(snapshot["key"]["value"], {"nested": [1]})
+        self.assertNotIn("other", snapshot)
+
+    def test_edit_publishes_a_new_entry(self):
+        before = self.kv_store._stores["test_store"]["key"]
+        self.kv_store._edit_key("test_store", "key", value="changed")
+        self.assertIsNot(before, self.kv_store._stores["test_store"]["key"])
+        self.assertEqual(before["value"], {"nested": [1]})
+
+    def test_get_object_returns_a_copy(self):
+        obj = self.kv_store._get_object("test_store", "key")
+        obj["value"] = "mutated"
+        self.assertEqual(self.kv_store._get_key("test_store", "key"), {"nested": [1]})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,87 @@
+import os
+import time
+import unittest
+
+import backups
+from plugins.sensitive import SecretsPlugin
+from store import AbstractKVStore
+
+
+class ConfidentialKVStore(AbstractKVStore, SecretsPlugin):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        SecretsPlugin.__init__(self, *args, **kwargs)
+
+
+class TestSnapshotFormat(unittest.TestCase):
+    def setUp(self):
+        os.makedirs("test_backups", exist_ok=True)
+        self.path = os.path.join("test_backups", "sample.backup.1.kvs")
+        self.entries = {f"key{i}": {"value": {"n": i, "raw": bytes([i % 256]) * 3}, "exp_time": 100.0 + i}
+                        for i in range(100)}
+
+    def tearDown(self):
+        import shutil
+        shutil.rmtree("test_backups", ignore_errors=True)
+
+    def test_round_trip_with_each_compression(self):
+        for compression in backups.COMPRESSORS:
+            backups.write_snapshot(self.path, "sample", self.entries, compression=compression, block_entries=7)
+            self.assertEqual(dict(backups.iter_snapshot(self.path)), self.entries)
+
+    def test_header_and_index(self):
+        backups.write_snapshot(self.path, "sample", self.entries, compression="zlib", block_entries=30)
+        with open(self.path, 'rb') as f:
+            header = backups.read_snapshot_header(f)
+        self.assertEqual(header["store"], "sample")
+        self.assertEqual(header["count"], 100)
+        self.assertEqual([block[2] for block in header["blocks"]], [30, 30, 30, 10])
+
+    def test_truncated_snapshot_is_rejected(self):
+        backups.write_snapshot(self.path, "sample", self.entries)
+        with open(self.path, 'r+b') as f:
+            f.truncate(os.path.getsize(self.path) // 2)
+        with self.assertRaises(ValueError):
+            list(backups.iter_snapshot(self.path))
+
+    def test_corrupt_block_is_rejected(self):
+        backups.write_snapshot(self.path, "sample", self.entries)
+        with open(self.path, 'r+b') as f:
+            f.seek(40)
+            f.write(b"\xff\xff")
+        with self.assertRaises(ValueError):
+            list(backups.iter_snapshot(self.path))
+
+
+class TestBinaryBackups(unittest.TestCase):
+    def tearDown(self):
+        import shutil
+        shutil.rmtree("test_backups", ignore_errors=True)
+
+    def test_ciphertext_survives_backup_and_restore(self):
+        kv_store = ConfidentialKVStore(backup_dir="test_backups", backup_compression="zlib")
+        kv_store.add_confidential_key("password", "hunter2")
+        self.assertTrue(kv_store._backup_if_dirty("secrets"))
+
+        restored = ConfidentialKVStore(backup_dir="test_backups", use_backup=True)
+        self.assertEqual(restored.get_confidential_key("password"), "hunter2")
+
+    def test_json_generations_still_restore_and_rotate(self):
+        os.makedirs("test_backups", exist_ok=True)
+        backups.write_json_backup(backups.backup_path("test_backups", "paths", 1),
+                                  {"label": {"value": "/srv", "exp_time": time.time() + 60}})
+        kv_store = AbstractKVStore(backup_dir="test_backups", use_backup=True)
+        self.assertEqual(kv_store._get_key("paths", "label"), "/srv")
+
+        kv_store._add_key("paths", "other", value="/opt")
+        kv_store._backup_if_dirty("paths")
+        self.assertTrue(os.path.exists(backups.backup_path("test_backups", "paths", 1, "msgpack")))
+        self.assertTrue(os.path.exists(backups.backup_path("test_backups", "paths", 2, "json")))
+
+    def test_invalid_format(self):
+        with self.assertRaises(ValueError):
+            AbstractKVStore(backup_dir="test_backups", backup_format="xml")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,301 @@
+import os
+import shutil
+import threading
+import time
+import unittest
+
+import backups
+from entry import Entry
+from storage import CompressedStore, SQLiteStore
+from store import AbstractKVStore
+
+
+class TestSQLiteStore(unittest.TestCase):
+    def setUp(self):
+        os.makedirs("test_backups", exist_ok=True)
+        self.path = os.path.join("test_backups", "entries.sqlite3")
+        self.content = SQLiteStore(self.path, cache_size=2)
+
+    def tearDown(self):
+        self.content.close()
+        shutil.rmtree("test_backups", ignore_errors=True)
+
+    def test_mapping_round_trip(self):
+        self.content["a"] = Entry({"nested": [1, b"raw"]}, 10.0, version=3)
+        self.content[7] = Entry("int key")
+        self.assertEqual(self.content["a"], Entry({"nested": [1, b"raw"]}, 10.0, version=3))
+        self.assertIn(7, self.content)
+        self.assertEqual(len(self.content), 2)
+        self.assertEqual(self.content.pop("a").version, 3)
+        self.assertIsNone(self.content.get("a"))
+        self.assertEqual(self.content.pop("a", None), None)
+        self.assertEqual(self.content, {7: Entry("int key")})
+
+    def test_cache_keeps_only_the_hottest_entries(self):
+        for i in range(5):
+            self.content[f"key{i}"] = Entry(i)
+        self.assertEqual(self.content.stats()["cached"], 2)
+        # Read back from disk, then served from the cache
+        self.assertEqual(self.content["key0"].value, 0)
+        self.assertIs(self.content["key0"], self.content["key0"])
+        stats = self.content.stats()
+        self.assertEqual((stats["cache_misses"], stats["cache_hits"]), (1, 2))
+
+    def test_items_is_a_point_in_time_view(self):
+        for i in range(3):
+            self.content[f"key{i}"] = Entry(i)
+        items = self.content.items()
+        first = next(items)
+        self.content["key9"] = Entry(9)
+        del self.content["key1"]
+        self.assertEqual(sorted(key for key, _ in [first, *items]), ["key0", "key1", "key2"])
+
+    def test_load_replaces_everything(self):
+        self.content["old"] = Entry(1)
+        self.content.load({"new": Entry(2)})
+        self.assertNotIn("old", self.content)
+        self.assertEqual(self.content.copy(), {"new": Entry(2)})
+
+
+class TestDiskBackedStores(unittest.TestCase):
+    def setUp(self):
+        self.kv_store = self.new_store()
+        self.kv_store.create_store("pipelines")
+        self.kv_store.create_store("cache")
+
+    def new_store(self):
+        return AbstractKVStore(backup_dir="test_backups", store_engines={"pipelines": "sqlite"},
+                               indexes={"pipelines": ["status"]}, storage_cache_size=10)
+
+    def tearDown(self):
+        self.kv_store.close()
+        shutil.rmtree("test_backups", ignore_errors=True)
+
+    def test_engine_per_store(self):
+        stats = self.kv_store.get_storage_stats()
+        self.assertEqual(stats["pipelines"]["engine"], "sqlite")
+        self.assertEqual(stats["cache"], {"engine": "memory", "keys": 0})
+
+    def test_store_is_reopened_with_its_indexes(self):
+        for i in range(50):
+            self.kv_store._add_key("pipelines", f"p{i}", value=i, status="done" if i % 2 else "running")
+        self.kv_store._add_key("pipelines", "short", value=1, ttl=-1)
+        self.kv_store._delete_key("pipelines", "p0")
+        self.kv_store.incr("pipelines", "p1")
+        self.kv_store._add_key("cache", "gone", value=1)
+        used = self.kv_store.get_memory_stats()["stores"]["pipelines"]["used_memory"]
+        self.kv_store.close()
+
+        self.kv_store = self.new_store()
+        self.assertEqual(self.kv_store.list_stores(), ["pipelines"])
+        self.assertEqual(self.kv_store._get_object("pipelines", "p1"), self.kv_store._get_object("pipelines", "p1"))
+        self.assertEqual(self.kv_store._get_object("pipelines", "p1")["version"], 2)
+        self.assertEqual(self.kv_store._get_key("pipelines", "p1"), 2)
+        self.assertIsNone(self.kv_store._get_key("pipelines", "p0"))
+        self.assertEqual(len(self.kv_store.query("pipelines", "status", "done")), 25)
+        self.assertEqual(self.kv_store.get_memory_stats()["stores"]["pipelines"]["used_memory"], used)
+        self.assertEqual(self.kv_store._expire_due_keys(), 1)
+        self.assertEqual(len(self.kv_store.scan("pipelines", count=100)["entries"]), 49)
+
+    def test_stores_stay_open_when_tasks_are_stopped(self):
+        self.kv_store._add_key("pipelines", "p1", value=1)
+        self.kv_store.shutdown()
+        self.kv_store.start_tasks()
+        self.assertTrue(self.kv_store._add_key("pipelines", "p2", value=2))
+        self.assertEqual(self.kv_store._get_key("pipelines", "p1"), 1)
+
+    def test_delete_store_removes_its_database(self):
+        self.kv_store._add_key("pipelines", "p1", value=1)
+        self.kv_store.delete_store("pipelines")
+        self.assertEqual(os.listdir(os.path.join("test_backups", "storage")), [])
+        self.kv_store.create_store("pipelines")
+        self.assertIsNone(self.kv_store._get_key("pipelines", "p1"))
+
+    def test_disk_stores_are_not_backed_up(self):
+        self.kv_store._add_key("pipelines", "p1", value=1)
+        self.kv_store._add_key("cache", "c1", value=1)
+        self.assertFalse(self.kv_store._backup_if_dirty("pipelines"))
+        self.assertTrue(self.kv_store._backup_if_dirty("cache"))
+
+    def test_backup_restores_into_the_engine(self):
+        self.kv_store.rotate_and_backup("pipelines", {"p1": Entry(1, time.time() + 60, version=1)})
+        self.kv_store.delete_store("pipelines")
+        self.kv_store.restore_store("pipelines")
+        self.assertEqual(self.kv_store._get_key("pipelines", "p1"), 1)
+        self.assertEqual(self.kv_store.get_storage_stats("pipelines")["pipelines"]["keys"], 1)
+
+
+class TestTieredStores(unittest.TestCase):
+    def setUp(self):
+        self.kv_store = AbstractKVStore(backup_dir="test_backups", storage_engine="tiered", spill_size=4096,
+                                        spill_after=3600, indexes={"pipelines": ["status"]})
+        self.kv_store.create_store("pipelines")
+        self.blobs = os.path.join("test_backups", "storage", "blobs", "pipelines")
+
+    def tearDown(self):
+        self.kv_store.close()
+        shutil.rmtree("test_backups", ignore_errors=True)
+
+    def stats(self):
+        return self.kv_store.get_storage_stats("pipelines")["pipelines"]
+
+    def test_large_values_are_spilled_on_write(self):
+        cfg = {f"option{i}": "x" * 100 for i in range(50)}
+        self.kv_store._add_key("pipelines", "p1", value=None, cfg=cfg, status="running")
+        self.kv_store._add_key("pipelines", "p2", value="small")
+        self.assertEqual(self.stats()["spilled_keys"], 1)
+        self.assertEqual(len(os.listdir(self.blobs)), 1)
+        pipeline = self.kv_store._get_object("pipelines", "p1")
+        self.assertEqual((pipeline["cfg"], pipeline["status"], pipeline["version"]), (cfg, "running", 1))
+        self.assertEqual(self.kv_store.query("pipelines", "status", "running"), ["p1"])
+        self.kv_store._get_object("pipelines", "p1")
+        self.assertEqual((self.stats()["blob_reads"], self.stats()["cache_hits"]), (1, 2))
+
+        self.kv_store._edit_key("pipelines", "p1", cfg={})
+        self.assertEqual(self.stats()["spilled_keys"], 0)
+        self.assertEqual(os.listdir(self.blobs), [])
+        self.assertEqual(self.kv_store._get_object("pipelines", "p1")["cfg"], {})
+
+    def test_cold_values_are_spilled_and_promoted_when_read(self):
+        self.kv_store._add_key("pipelines", "cold", value="c" * 2000)
+        self.kv_store._add_key("pipelines", "hot", value="h" * 2000)
+        self.kv_store._sweep_storage()  # Writes count as reads
+        self.kv_store._get_key("pipelines", "hot")
+        self.assertEqual(self.kv_store._sweep_storage(), 1)
+        self.assertEqual(self.stats()["spilled_keys"], 1)
+        # Backups read every value without making it hot again
+        self.assertEqual(self.kv_store._snapshot("pipelines")["cold"].value, "c" * 2000)
+        self.assertEqual(self.stats()["spilled_keys"], 1)
+        self.assertEqual(self.kv_store._get_key("pipelines", "cold"), "c" * 2000)
+        self.assertEqual((self.stats()["spilled_keys"], self.stats()["promoted"]), (0, 1))
+
+    def test_blobs_stay_when_tasks_are_stopped(self):
+        cfg = {f"option{i}": "x" * 100 for i in range(50)}
+        self.kv_store._add_key("pipelines", "p1", value=None, cfg=cfg)
+        self.kv_store.shutdown()
+        self.assertEqual(self.kv_store._get_object("pipelines", "p1")["cfg"], cfg)
+
+    def test_missing_blobs_are_reported(self):
+        self.kv_store._add_key("pipelines", "lost", value="x" * 5000)
+        self.kv_store._add_key("pipelines", "kept", value="small")
+        for name in os.listdir(self.blobs):
+            os.remove(os.path.join(self.blobs, name))
+        with self.assertRaises(FileNotFoundError):
+            self.kv_store._get_key("pipelines", "lost")
+        self.assertEqual(list(self.kv_store._snapshot("pipelines")), ["kept"])
+
+    def test_backups_read_blobs_outside_the_store_lock(self):
+        self.kv_store._add_key("pipelines", "p1", value="old" * 2000)
+        content = self.kv_store._stores["pipelines"]
+        load, finished = content._load, []
+
+        def load_while_writing(stub):
+            # The write replaces the blob being read; that blob stays until the backup has it
+            content._load = load
+            writer = threading.Thread(target=self.kv_store._edit_key, args=("pipelines", "p1"),
+                                      kwargs={"value": "new" * 2000})
+            writer.start()
+            writer.join(timeout=2)
+            finished.append(not writer.is_alive())
+            return load(stub)
+
+        content._load = load_while_writing
+        self.assertTrue(self.kv_store._backup_if_dirty("pipelines"))
+        self.assertEqual(finished, [True])
+        entries, _, _ = backups.load_store_backup("test_backups", "pipelines", 10, time.time())
+        self.assertEqual(entries["p1"]["value"], "old" * 2000)
+        self.assertEqual(len(os.listdir(self.blobs)), 1)
+
+    def test_deleting_removes_blobs(self):
+        self.kv_store._add_key("pipelines", "p1", value="x" * 5000)
+        self.kv_store._delete_key("pipelines", "p1")
+        self.assertEqual(os.listdir(self.blobs), [])
+        self.kv_store._add_key("pipelines", "p2", value="x" * 5000)
+        self.kv_store.delete_store("pipelines")
+        self.assertFalse(os.path.exists(self.blobs))
+
+
+class TestCompressedStores(unittest.TestCase):
+    def setUp(self):
+        self.kv_store = AbstractKVStore(backup_dir="test_backups", store_engines={"pipelines": "compressed"})
+        self.kv_store.create_store("pipelines")
+
+    def tearDown(self):
+        self.kv_store.close()
+        shutil.rmtree("test_backups", ignore_errors=True)
+
+    def stats(self):
+        return self.kv_store.get_storage_stats("pipelines")["pipelines"]
+
+    def test_reads_are_transparent(self):
+        cfg = {f"option{i}": {"enabled": True, "path": f"/opt/pipelines/stage{i}"} for i in range(100)}
+        self.kv_store._add_key("pipelines", "p1", value=None, cfg=cfg, status="running", ttl=60)
+        self.kv_store._add_key("pipelines", "small", value="x")
+        self.assertEqual(self.stats()["compressed_keys"], 1)
+        self.assertGreater(self.stats()["ratio"], 3)
+        pipeline = self.kv_store._get_object("pipelines", "p1")
+        self.assertEqual((pipeline["cfg"], pipeline["status"], pipeline["version"]), (cfg, "running", 1))
+        self.assertEqual(self.kv_store._get_key("pipelines", "small"), "x")
+
+        self.kv_store._delete_key("pipelines", "p1")
+        self.assertEqual((self.stats()["compressed_keys"], self.stats()["stored_bytes"]), (0, 0))
+
+    def test_backups_decompress_outside_the_store_lock(self):
+        self.kv_store._add_key("pipelines", "p1", value="old " * 1000)
+        content = self.kv_store._stores["pipelines"]
+        load, finished = content._load, []
+
+        def load_while_writing(stub):
+            content._load = load
+            writer = threading.Thread(target=self.kv_store._add_key, args=("pipelines", "p2"), kwargs={"value": 1})
+            writer.start()
+            writer.join(timeout=2)
+            finished.append(not writer.is_alive())
+            return load(stub)
+
+        content._load = load_while_writing
+        self.assertTrue(self.kv_store._backup_if_dirty("pipelines"))
+        self.assertEqual(finished, [True])
+        entries, _, _ = backups.load_store_backup("test_backups", "pipelines", 10, time.time())
+        self.assertEqual(list(entries), ["p1"])
+        self.assertEqual(entries["p1"]["value"], "old " * 1000)
+
+    def test_dictionary_is_trained_on_the_first_payloads(self):
+        content = CompressedStore(min_size=0, train_samples=4)
+        for i in range(6):
+            content[f"key{i}"] = Entry({"creator": "tester", "description": f"pipeline number {i}" * 8})
+        self.assertGreater(content.stats()["dictionary_bytes"], 0)
+        self.assertIsNone(content._entries["key0"].value.dictionary)
+        self.assertIsNotNone(content._entries["key5"].value.dictionary)
+        self.assertEqual(content["key5"].value["description"], "pipeline number 5" * 8)
+        self.assertEqual(dict(content.items())["key0"].value["creator"], "tester")
+
+    def test_dictionary_is_trained_under_concurrent_writes(self):
+        content = CompressedStore(min_size=0, train_samples=4)
+
+        def write(n):
+            for i in range(50):
+                content[f"key{n}-{i}"] = Entry({"creator": "tester", "description": f"pipeline {n}-{i}" * 8})
+
+        threads = [threading.Thread(target=write, args=(n,)) for n in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertGreater(content.stats()["dictionary_bytes"], 0)
+        self.assertIsNone(content._samples)
+
+    def test_incompressible_payloads_are_kept_as_they_are(self):
+        content = CompressedStore(min_size=0)
+        content["random"] = Entry(os.urandom(4096))
+        self.assertEqual((content.stats()["compressed_keys"], content.stats()["incompressible"]), (0, 1))
+
+    def test_lzma(self):
+        content = CompressedStore("lzma", min_size=0)
+        content["key"] = Entry("text " * 1000, version=4)
+        self.assertEqual(content["key"], Entry("text " * 1000, version=4))
+        self.assertEqual(content.stats()["dictionary_bytes"], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
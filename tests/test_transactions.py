@@ -0,0 +1,88 @@
+import shutil
+import threading
+import unittest
+
+from plugins.workflows import WorkflowsPlugin
+from store import AbstractKVStore
+
+
+class PipelineKVStore(AbstractKVStore, WorkflowsPlugin):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        WorkflowsPlugin.__init__(self)
+
+
+class TestTransactions(unittest.TestCase):
+    def setUp(self):
+        self.store_name = "test_store"
+        self.kv_store = PipelineKVStore(backup_dir="test_backups", use_backup=False)
+        self.kv_store.create_store(self.store_name)
+
+    def tearDown(self):
+        self.kv_store.shutdown()
+        shutil.rmtree("test_backups", ignore_errors=True)
+
+    def op(self, op, key, **params):
+        return {"op": op, "store_name": self.store_name, "key": key, **params}
+
+    def test_runs_operations_in_order(self):
+        result = self.kv_store.transaction([self.op("set", "a", value=1), self.op("incr", "a", amount=2),
+                                            self.op("get", "a"), self.op("delete", "missing")])
+        self.assertEqual(result, {"ok": True, "results": [True, 3, 3, False]})
+
+    def test_plugin_operations(self):
+        result = self.kv_store.transaction([
+            {"op": "add_pipeline", "key": "p1", "creator": "ci"},
+            {"op": "add_stage_to_pipeline", "key": "p1", "stage_name": "build"},
+            {"op": "edit_stage_in_pipeline", "key": "p1", "stage_name": "build", "new_status": "Running"},
+            self.op("incr", "pipelines"),
+        ])
+        self.assertEqual(result["results"], [True, True, True, 1])
+        self.assertEqual(self.kv_store.get_pipeline("p1")["stages"][0]["status"], "Running")
+
+    def test_watch_conflict_runs_nothing(self):
+        self.kv_store._add_key(self.store_name, "a", value=1)
+        watch = [{"store_name": self.store_name, "key": "a", "version": 1},
+                 {"store_name": self.store_name, "key": "new", "version": 0}]
+        self.assertTrue(self.kv_store.transaction([self.op("incr", "a")], watch)["ok"])
+        result = self.kv_store.transaction([self.op("incr", "a"), self.op("set", "new", value=1)], watch)
+        self.assertEqual(result, {"ok": False, "conflicts": [{"store_name": self.store_name, "key": "a",
+                                                              "version": 2}]})
+        self.assertEqual(self.kv_store._get_key(self.store_name, "a"), 2)
+        self.assertIsNone(self.kv_store._get_key(self.store_name, "new"))
+
+    def test_invalid_operation_runs_nothing(self):
+        result = self.kv_store.transaction([self.op("set", "a", value=1), self.op("flush", "a")])
+        self.assertFalse(result["ok"])
+        self.assertIn("flush", result["error"])
+        self.assertIsNone(self.kv_store._get_key(self.store_name, "a"))
+        self.assertFalse(self.kv_store.transaction([{"op": "get", "store_name": "missing", "key": "a"}])["ok"])
+
+    def test_bad_arguments_fail_only_their_operation(self):
+        result = self.kv_store.transaction([self.op("incr", "a", bogus=1), self.op("incr", "b")])
+        self.assertEqual(result["results"], [None, 1])
+
+    def test_writers_never_see_a_transaction_half_done(self):
+        self.kv_store.mset(self.store_name, {"from": {"value": 1000}, "to": {"value": 0}})
+        totals = []
+
+        def transfer():
+            for _ in range(300):
+                self.kv_store.transaction([self.op("decr", "from"), self.op("incr", "to")])
+
+        def audit():
+            for _ in range(300):
+                result = self.kv_store.transaction([self.op("get", "from"), self.op("get", "to")])
+                totals.append(sum(result["results"]))
+
+        threads = [threading.Thread(target=transfer) for _ in range(2)] + [threading.Thread(target=audit)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(set(totals), {1000})
+        self.assertEqual(self.kv_store._get_key(self.store_name, "to"), 600)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,116 @@
+import shutil
+import threading
+import unittest
+
+from entry import Entry
+from store import AbstractKVStore
+from versions import VersionHistory
+
+
+class TestVersionHistory(unittest.TestCase):
+    def test_reads_the_newest_entry_at_or_before_a_version(self):
+        history = VersionHistory(versions=2)
+        live = {"a": Entry("loaded")}
+        history.record("s", "a", live["a"], Entry("one"))
+        history.record("s", "a", Entry("one"), Entry("two"))
+        history.record("s", "b", None, Entry("new"))
+        self.assertEqual(history.read("s", live, "a", 0).value, "loaded")
+        self.assertEqual(history.read("s", live, "a", 1).value, "one")
+        self.assertEqual(history.read("s", live, "a", 3).value, "two")
+        self.assertIsNone(history.read("s", live, "b", 2))
+        history.record("s", "a", Entry("two"), Entry("three"))
+        with self.assertRaises(ValueError):
+            history.read("s", live, "a", 0)
+
+    def test_deleted_keys_leave_with_the_window(self):
+        history = VersionHistory(versions=1, window=3)
+        history.record("s", "gone", None, Entry(1))
+        history.record("s", "gone", Entry(1), None)
+        self.assertIsNone(history.read("s", {}, "gone", 2))
+        self.assertEqual(history.read("s", {}, "gone", 1).value, 1)
+        for i in range(5):
+            history.record("s", f"other{i}", None, None)
+        self.assertNotIn("gone", history._histories["s"])
+        self.assertEqual(history.oldest(), 4)
+
+    def test_readers_wait_for_batches(self):
+        history = VersionHistory()
+        history.record("s", "a", None, Entry(1))
+        with history.batch():
+            history.record("s", "a", Entry(1), Entry(2))
+            history.record("s", "b", None, Entry(2))
+            self.assertEqual(history.latest(), 1)
+        self.assertEqual(history.latest(), 2)
+        self.assertEqual(history.read("s", {}, "b", 2).value, 2)
+
+
+class TestVersionedReads(unittest.TestCase):
+    def setUp(self):
+        self.kv_store = AbstractKVStore(backup_dir="test_backups", mvcc_versions=4)
+        self.kv_store.create_store("pipelines")
+
+    def tearDown(self):
+        self.kv_store.shutdown()
+        shutil.rmtree("test_backups", ignore_errors=True)
+
+    def values(self, keys, version=None):
+        snapshot = self.kv_store.mget_as_of("pipelines", keys, version)
+        return {key: entry and entry["value"] for key, entry in snapshot["entries"].items()}
+
+    def test_reads_as_of_a_version(self):
+        self.kv_store._add_key("pipelines", "p1", value="queued")
+        before = self.kv_store.current_version()
+        self.kv_store._edit_key("pipelines", "p1", value="running")
+        self.kv_store._add_key("pipelines", "p2", value="queued")
+        self.kv_store._delete_key("pipelines", "p1")
+        self.assertEqual(self.values(["p1", "p2"], before), {"p1": "queued", "p2": None})
+        self.assertEqual(self.values(["p1", "p2"]), {"p1": None, "p2": "queued"})
+        snapshot = self.kv_store.mget_as_of("pipelines", ["p1"], before + 1)
+        self.assertEqual(snapshot["entries"]["p1"]["version"], 2)
+        self.assertIsNone(self.kv_store.mget_as_of("pipelines", ["p1"], self.kv_store.current_version() + 1))
+
+    def test_old_versions_are_bounded(self):
+        self.kv_store._add_key("pipelines", "p1", value=0)
+        first = self.kv_store.current_version()
+        for i in range(1, 5):
+            self.kv_store.incr("pipelines", "p1")
+        self.assertEqual(self.values(["p1"], first), {"p1": 0})
+        self.kv_store.incr("pipelines", "p1")
+        self.assertIsNone(self.kv_store.mget_as_of("pipelines", ["p1"], first))
+
+    def test_snapshots_never_see_half_a_transaction(self):
+        self.kv_store.mset("pipelines", {"a": {"value": 0}, "b": {"value": 0}})
+        stop = threading.Event()
+
+        def write():
+            while not stop.is_set():
+                self.kv_store.transaction([{"op": "incr", "store_name": "pipelines", "key": "a"},
+                                           {"op": "incr", "store_name": "pipelines", "key": "b"}])
+
+        writer = threading.Thread(target=write)
+        writer.start()
+        try:
+            for _ in range(500):
+                values = self.values(["a", "b"])
+                self.assertEqual(values["a"], values["b"])
+        finally:
+            stop.set()
+            writer.join()
+
+    def test_replaced_stores_cannot_be_read_in_the_past(self):
+        self.kv_store._add_key("pipelines", "p1", value=1)
+        before = self.kv_store.current_version()
+        self.kv_store._install_store("pipelines", {"p9": Entry(9)})
+        self.assertIsNone(self.kv_store.mget_as_of("pipelines", ["p1"], before))
+        self.assertEqual(self.values(["p1", "p9"]), {"p1": None, "p9": 9})
+
+    def test_off_by_default(self):
+        kv_store = AbstractKVStore(backup_dir="test_backups")
+        kv_store.create_store("pipelines")
+        self.assertIsNone(kv_store.current_version())
+        self.assertIsNone(kv_store.mget_as_of("pipelines", ["p1"]))
+        kv_store.shutdown()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,60 @@
+def update_in(value, path, update):
+    """Returns ``value`` with ``update`` applied to the item at ``path``, leaving ``value`` untouched.
+
+    Only the dicts and lists along ``path`` are copied; everything else is
+    shared with ``value``, which is why a stored value can be updated without
+    copying it whole. Missing dict keys along the way are created as empty
+    dicts. Raises TypeError when a step of the path is not a container.
+    """
+    if not path:
+        return update(value)
+    step, rest = path[0], path[1:]
+    if value is None:
+        value = {}
+    if isinstance(value, dict):
+        copy = dict(value)
+        copy[step] = update_in(value.get(step), rest, update)
+        return copy
+    if isinstance(value, list) and isinstance(step, int):
+        copy = list(value)
+        copy[step] = update_in(value[step], rest, update)
+        return copy
+    raise TypeError(f"Cannot follow {step!r} into a {type(value).__name__}")
+
+
+def deep_merge(value, mapping):
+    """Returns ``value`` with ``mapping`` merged in, nested dicts merged rather than replaced."""
+    if value is None:
+        value = {}
+    if not isinstance(value, dict) or not isinstance(mapping, dict):
+        raise TypeError("Only dicts can be merged")
+    merged = dict(value)
+    for name, item in mapping.items():
+        if isinstance(item, dict) and isinstance(merged.get(name), dict):
+            merged[name] = deep_merge(merged[name], item)
+        else:
+            merged[name] = item
+    return merged
+
+
+def add_number(value, amount):
+    if value is None:
+        value = 0
+    for number in (value, amount):
+        if isinstance(number, bool) or not isinstance(number, (int, float)):
+            raise TypeError(f"Cannot increment {value!r} by {amount!r}")
+    return value + amount
+
+
+def append_item(value, item, max_len=None):
+    """Returns ``value`` with ``item`` appended, trimmed to its last ``max_len`` items."""
+    if value is None:
+        value = []
+    if not isinstance(value, list):
+        raise TypeError(f"Cannot append to a {type(value).__name__}")
+    if max_len is not None and max_len < 1:
+        raise ValueError("max_len must be at least 1")
+    start = len(value) + 1 - max_len if max_len is not None and len(value) >= max_len else 0
+    appended = value[start:]
+    appended.append(item)
+    return appended
@@ -0,0 +1,120 @@
+import threading
+from collections import deque
+from contextlib import contextmanager
+
+
+class VersionHistory:
+    """Recent versions of every key, numbered by a commit version shared by all stores.
+
+    Each write gets the next commit version, or shares the one of the batch
+    it is part of, and its entry (None for a delete) is appended to the key's
+    history, of which the last ``versions + 1`` are kept: the live entry and
+    up to ``versions`` older ones. A key with no history has not changed
+    since the ``floor`` version. Reading as of a version finds the newest
+    entry committed at or before it, without locks, as long as no more than
+    ``window`` commits happened since; deleted keys drop out of the history
+    once their delete leaves that window.
+    """
+
+    def __init__(self, versions=8, window=100_000):
+        if versions < 1:
+            raise ValueError("versions must be a positive integer")
+        self.versions = versions
+        self.window = window
+        self.version = 0
+        self.floor = 0
+        self._histories = {}
+        self._deletes = deque()
+        self._batches = set()
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def batch(self):
+        """Gives the writes this thread makes inside the block one commit version.
+
+        Readers are held at the version before it until the block ends, so
+        they see all of the batch or none of it.
+        """
+        if getattr(self._local, 'version', None) is not None:
+            yield
+            return
+        with self._lock:
+            # Registered before the version moves, so latest() never gets past it
+            version = self.version + 1
+            self._batches.add(version)
+            self._local.version = self.version = version
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._batches.discard(self._local.version)
+            self._local.version = None
+
+    def latest(self):
+        """Returns the newest version readers may ask for."""
+        version = self.version
+        batches = self._batches.copy()
+        return min(batches) - 1 if batches else version
+
+    def record(self, store_name, key, previous, entry):
+        """Records a write of ``entry`` over ``previous``; call before the store itself changes."""
+        with self._lock:
+            histories = self._histories.setdefault(store_name, {})
+            history = histories.get(key)
+            if history is None:
+                history = deque(maxlen=self.versions + 1)
+                if previous is not None:
+                    history.append((self.floor, previous))
+            version = getattr(self._local, 'version', None) or self.version + 1
+            history.append((version, entry))
+            histories[key] = history
+            if entry is None:
+                self._deletes.append((version, store_name, key))
+                self._forget_deletes(version - self.window)
+            self.version = max(self.version, version)
+            return version
+
+    def _forget_deletes(self, horizon):
+        while self._deletes and self._deletes[0][0] < horizon:
+            version, store_name, key = self._deletes.popleft()
+            histories = self._histories.get(store_name, {})
+            history = histories.get(key)
+            # Still deleted since then; nobody can read a version it would answer for
+            if history is not None and history[-1][0] == version:
+                del histories[key]
+
+    def reset_store(self, store_name):
+        """Forgets a store's history after it was replaced or deleted; older versions can no longer be read."""
+        with self._lock:
+            self._histories.pop(store_name, None)
+            self.version += 1
+            self.floor = self.version
+
+    def oldest(self):
+        return max(self.floor, self.version - self.window)
+
+    def read(self, store_name, live, key, version):
+        """Returns the entry ``key`` had at ``version``, None if it did not exist then.
+
+        ``live`` is the store's content. Raises ValueError when that version
+        is no longer kept.
+        """
+        histories = self._histories.get(store_name, {})
+        history = histories.get(key)
+        if history is None:
+            entry = live.get(key)
+            # A first write records its history before publishing, so this is unchanged since the floor
+            history = histories.get(key)
+            if history is None:
+                return entry
+        record_version, entry = history[-1]
+        if record_version <= version:
+            return entry
+        records = tuple(history)
+        for record_version, entry in reversed(records):
+            if record_version <= version:
+                return entry
+        if len(records) == history.maxlen:
+            raise ValueError(f"version {version} of key {key} is no longer kept")
+        return None
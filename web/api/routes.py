@@ -1,267 +1,1239 @@
+import json
+import os
+
 import Pyro4
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, Response, request, jsonify, stream_with_context
+
+from cluster import ClusterProxy
 
 kv_store_api = Blueprint('kv-api', __name__)
 
 host = "localhost"
 port = 6666
 uri = f"PYRO:key_value_store@{host}:{port}"
+# Comma separated host:port of the servers of a cluster, used instead of uri when set
+cluster = os.environ.get("KVV_CLUSTER")
+
+SCAN_PARAMETERS = ('cursor', 'match', 'count')
+# Long-poll length of each round trip behind the event stream, so idle streams still send keepalives
+STREAM_POLL_SECONDS = 15
+
+
+def _connect():
+    """Returns a proxy of the server, or a router spreading keys over the cluster servers."""
+    if cluster:
+        return ClusterProxy(cluster.split(','))
+    return Pyro4.Proxy(uri)
+
+
+def _scan_args():
+    """Returns ``(cursor, match, count)`` from the query string, or None if no paging was asked for."""
+    if not any(name in request.args for name in SCAN_PARAMETERS):
+        return None
+    return request.args.get('cursor'), request.args.get('match'), request.args.get('count', 100, type=int)
+
+
+@kv_store_api.route('/update-config', methods=['POST'])
+def update_config():
+    """
+        Update configuration
+        ---
+        tags:
+          - Configuration
+        parameters:
+          - in: body
+            name: body
+            description: Configuration parameters
+            required: true
+            schema:
+              type: object
+              properties:
+                backup_dir:
+                  type: string
+                  example: '/new/backup/dir'
+                metrics_interval:
+                  type: integer
+                  example: 10
+                status_ttl:
+                  type: integer
+                  example: 3600
+                cleanup_frequency:
+                  type: integer
+                  example: 60
+        responses:
+          200:
+            description: Configuration update was successful
+            schema:
+              type: object
+              properties:
+                message:
+                  type: string
+                  example: Configuration update sent to server.
+          500:
+            description: Error updating configuration
+        """
+    data = request.json
+    with _connect() as proxy:
+        proxy.update_configuration(**data)
+    return jsonify({"message": "Configuration update sent to server."})
+
+
+@kv_store_api.route('/show-config', methods=['GET'])
+def show_config():
+    """
+        Retrieve server configuration
+        ---
+        tags:
+          - Configuration
+        responses:
+          200:
+            description: Server configuration retrieved successfully
+            schema:
+              type: object
+              properties:
+                backup_dir:
+                  type: string
+                  example: '/path/to/backup'
+                metrics_interval:
+                  type: integer
+                  example: 60
+                status_ttl:
+                  type: integer
+                  example: 3600
+                cleanup_frequency:
+                  type: integer
+                  example: 120
+        """
+    with _connect() as proxy:
+        config = proxy.get_configuration()
+    return jsonify(config)
+
+
+@kv_store_api.route('/backup-stats', methods=['GET'])
+def backup_stats():
+    """
+        Retrieve per-store backup statistics
+        ---
+        tags:
+          - Configuration
+        responses:
+          200:
+            description: Backup statistics retrieved successfully
+            schema:
+              type: object
+              properties:
+                stats:
+                  type: object
+                  example: { "pipelines": { "mutations": 12, "pending_mutations": 0, "generations_written": 3, "generations_skipped": 40, "last_backup_time": 1700000000.0, "last_backup_duration": 0.004, "last_backup_size": 2048 } }
+        """
+    with _connect() as proxy:
+        stats = proxy.get_backup_stats()
+    return jsonify({"stats": stats})
+
+
+@kv_store_api.route('/memory-stats', methods=['GET'])
+def memory_stats():
+    """
+        Retrieve approximate memory usage, limits and eviction counters
+        ---
+        tags:
+          - Configuration
+        responses:
+          200:
+            description: Memory statistics retrieved successfully
+            schema:
+              type: object
+              properties:
+                stats:
+                  type: object
+                  example: { "used_memory": 52000, "max_memory": null, "eviction_policy": "noeviction", "stores": { "pipelines": { "used_memory": 48000, "max_memory": 65536, "eviction_policy": "lru", "evictions": 12, "evicted_bytes": 3100, "rejected_writes": 0 } } }
+        """
+    with _connect() as proxy:
+        stats = proxy.get_memory_stats()
+    return jsonify({"stats": stats})
+
+
+@kv_store_api.route('/storage-stats', methods=['GET'])
+def storage_stats():
+    """
+        Retrieve the storage engine of each store with its key count and its cache, disk, spill or compression counters
+        ---
+        tags:
+          - Configuration
+        parameters:
+          - name: store_name
+            in: query
+            type: string
+            description: Only this store
+        responses:
+          200:
+            description: Storage statistics per store
+            schema:
+              type: object
+              properties:
+                stats:
+                  type: object
+                  example: { "pipelines": { "engine": "sqlite", "keys": 250000, "cached": 10000, "cache_hits": 981234, "cache_misses": 18766, "disk_bytes": 73400320 }, "metrics": { "engine": "tiered", "keys": 5000, "spilled_keys": 1200, "blob_bytes": 52428800, "spilled": 900, "spilled_cold": 400, "promoted": 100, "blob_reads": 3100, "cache_hits": 12000 }, "paths": { "engine": "compressed", "keys": 12, "codec": "zlib", "compressed_keys": 10, "raw_bytes": 204800, "stored_bytes": 25600, "ratio": 8.0, "dictionary_bytes": 32768, "incompressible": 0, "compress_us": 85.2, "decompress_us": 31.7, "decompressions": 40, "cache_hits": 950 } }
+        """
+    store_name = request.args.get('store_name')
+    with _connect() as proxy:
+        stats = proxy.get_storage_stats(store_name)
+    return jsonify({"stats": stats})
+
+
+@kv_store_api.route('/replication-status', methods=['GET'])
+def replication_status():
+    """
+        Get the replication state of a replica
+        ---
+        tags:
+          - Configuration
+        responses:
+          200:
+            description: Replication state, or null when the server is not a replica
+            schema:
+              type: object
+              properties:
+                status:
+                  type: object
+                  example: { "primary": "PYRO:key_value_store@db1:6666", "state": "streaming", "cursor": 48213, "applied": 48100, "bootstraps": 1, "lag_seconds": 0.0, "last_contact": 1718000000.5, "last_change_time": 1718000000.2, "last_error": null }
+        """
+    with _connect() as proxy:
+        status = proxy.replication_status()
+    return jsonify({"status": status})
+
+
+@kv_store_api.route('/operation-stats', methods=['GET'])
+def operation_stats():
+    """
+        Retrieve call counts, latency percentiles and hit ratios per store and operation
+        ---
+        tags:
+          - Configuration
+        parameters:
+          - name: store_name
+            in: query
+            type: string
+            description: Only this store
+          - name: reset
+            in: query
+            type: boolean
+            description: Start the counts over once read
+        responses:
+          200:
+            description: Counts are estimated from a random 1 in sample_every calls, latencies in microseconds; sample_every is null when the server runs without operation stats
+            schema:
+              type: object
+              properties:
+                stats:
+                  type: object
+                  example: { "sample_every": 16, "operations": { "pipelines": { "get": { "calls": 4096, "hits": 3904, "misses": 192, "hit_ratio": 0.95, "latency": { "count": 256, "mean_us": 1.2, "max_us": 40.1, "p50_us": 0.9, "p90_us": 1.5, "p99_us": 7.7, "p99.9_us": 40.1 } } } }, "locks": {} }
+        """
+    store_name = request.args.get('store_name')
+    reset = request.args.get('reset', 'false').lower() == 'true'
+    with _connect() as proxy:
+        stats = proxy.get_operation_stats(store_name, reset)
+    return jsonify({"stats": stats})
+
+
+@kv_store_api.route('/memory-limit', methods=['POST'])
+def memory_limit():
+    """
+        Set the memory limit and eviction policy of a store, or the global ones
+        ---
+        tags:
+          - Configuration
+        parameters:
+          - in: body
+            name: body
+            required: true
+            schema:
+              type: object
+              properties:
+                max_memory:
+                  type: integer
+                  description: Limit in bytes, null for unlimited
+                  example: 67108864
+                eviction_policy:
+                  type: string
+                  enum: [noeviction, lru, lfu, volatile-ttl]
+                  example: 'lru'
+                store_name:
+                  type: string
+                  description: Store to limit; omit for the global limit
+                  example: 'pipelines'
+        responses:
+          200:
+            description: Limit updated
+          404:
+            description: Store not found
+        """
+    max_memory = request.json.get('max_memory')
+    eviction_policy = request.json.get('eviction_policy')
+    store_name = request.json.get('store_name')
+    with _connect() as proxy:
+        if proxy.set_memory_limit(max_memory, eviction_policy, store_name):
+            return jsonify({"message": "Memory limit updated."}), 200
+        return jsonify({"error": f"Store '{store_name}' does not exist."}), 404
+
+
+@kv_store_api.route('/shutdown', methods=['POST'])
+def shutdown_task():
+    """
+        Shutdown a specific task or all tasks
+        ---
+        tags:
+          - Task Management
+        parameters:
+          - name: task_name
+            in: body
+            required: false
+            schema:
+              type: object
+              properties:
+                task_name:
+                  type: string
+                  example: 'cleanup'
+        responses:
+          200:
+            description: Task(s) shutdown successfully
+            schema:
+              type: object
+              properties:
+                message:
+                  type: string
+                  example: 'Shutdown signal sent to task: cleanup.'
+        """
+    task_name = request.json.get('task_name')
+    with _connect() as proxy:
+        if task_name:
+            proxy.shutdown(task_name=task_name)
+        else:
+            proxy.shutdown()
+    return jsonify({"message": f"Shutdown signal sent to task: {task_name if task_name else 'all tasks'}."})
+
+
+@kv_store_api.route('/start-task', methods=['POST'])
+def start_task():
+    """
+        Starts a specific task or all tasks
+        ---
+        tags:
+          - Task Management
+        parameters:
+          - name: task_name
+            in: body
+            required: false
+            schema:
+              type: object
+              properties:
+                task_name:
+                  type: string
+                  example: 'metrics_collection'
+        responses:
+          200:
+            description: Task(s) started successfully
+            schema:
+              type: object
+              properties:
+                message:
+                  type: string
+                  example: 'Start signal sent to task: metrics_collection.'
+        """
+    task_name = request.json.get('task_name')
+    with _connect() as proxy:
+        if task_name:
+            proxy.start_tasks(task_name=task_name)
+        else:
+            proxy.start_tasks()
+    return jsonify({"message": f"Start signal sent to task: {task_name if task_name else 'all tasks'}."})
+
+
+@kv_store_api.route('/create-store', methods=['POST'])
+def create_store():
+    """
+        Creates a new store
+        ---
+        tags:
+          - Store Management
+        parameters:
+          - name: store_name
+            in: body
+            required: true
+            schema:
+              type: object
+              properties:
+                store_name:
+                  type: string
+                  example: 'my_new_store'
+        responses:
+          201:
+            description: Store created successfully
+            schema:
+              type: object
+              properties:
+                message:
+                  type: string
+                  example: 'Store "my_new_store" created successfully.'
+          400:
+            description: Error in creating store
+            schema:
+              type: object
+              properties:
+                error:
+                  type: string
+                  example: 'Store "my_new_store" already exists or could not be created.'
+        """
+    store_name = request.json.get('store_name')
+    with _connect() as proxy:
+        result = proxy.create_store(store_name)
+        if result:
+            return jsonify({"message": f"Store '{store_name}' created successfully."}), 201
+        else:
+            return jsonify({"error": f"Store '{store_name}' already exists or could not be created."}), 400
+
+
+@kv_store_api.route('/delete-store', methods=['DELETE'])
+def delete_store():
+    """
+        Deletes an existing store
+        ---
+        tags:
+          - Store Management
+        parameters:
+          - name: store_name
+            in: query
+            type: string
+            required: true
+            description: Name of the store to delete
+        responses:
+          200:
+            description: Store deleted successfully
+            schema:
+              type: object
+              properties:
+                message:
+                  type: string
+                  example: 'Store "my_store" deleted successfully.'
+          404:
+            description: Store not found
+            schema:
+              type: object
+              properties:
+                error:
+                  type: string
+                  example: 'Store "my_store" does not exist.'
+        """
+    store_name = request.args.get('store_name')
+    with _connect() as proxy:
+        result = proxy.delete_store(store_name)
+        if result:
+            return jsonify({"message": f"Store '{store_name}' deleted successfully."}), 200
+        else:
+            return jsonify({"error": f"Store '{store_name}' does not exist."}), 404
+
+
+@kv_store_api.route('/list-stores', methods=['GET'])
+def list_stores():
+    """
+        Lists all the stores
+        ---
+        tags:
+          - Store Management
+        responses:
+          200:
+            description: A list of all stores
+            schema:
+              type: object
+              properties:
+                stores:
+                  type: array
+                  items:
+                    type: string
+                  example: ["store1", "store2", "store3"]
+        """
+    with _connect() as proxy:
+        stores = proxy.list_stores()
+        return jsonify({"stores": stores}), 200
+
+
+@kv_store_api.route('/scan', methods=['GET'])
+def scan():
+    """
+        Retrieves one page of a store's entries in key order
+        ---
+        tags:
+          - Batch Operations
+        parameters:
+          - name: store_name
+            in: query
+            type: string
+            required: true
+          - name: cursor
+            in: query
+            type: string
+            required: false
+            description: Cursor returned by the previous page; omit for the first page
+          - name: match
+            in: query
+            type: string
+            required: false
+            description: Key prefix, or a glob such as 'job-*-done'
+          - name: count
+            in: query
+            type: integer
+            required: false
+            default: 100
+            description: Maximum number of entries in the page
+        responses:
+          200:
+            description: A page of entries and the cursor of the next page, null once the scan is done
+            schema:
+              type: object
+              properties:
+                cursor:
+                  type: string
+                  example: 'key100'
+                entries:
+                  type: object
+                  example: {"key1": {"value": "value1", "exp_time": 1700000000.0}}
+        """
+    store_name = request.args.get('store_name')
+    cursor = request.args.get('cursor')
+    match = request.args.get('match')
+    count = request.args.get('count', 100, type=int)
+    with _connect() as proxy:
+        return jsonify(proxy.scan(store_name, cursor, match, count)), 200
+
+
+@kv_store_api.route('/mget', methods=['POST'])
+def mget():
+    """
+        Retrieves the values of several keys in one call
+        ---
+        tags:
+          - Batch Operations
+        parameters:
+          - in: body
+            name: body
+            required: true
+            schema:
+              type: object
+              required:
+                - store_name
+                - keys
+              properties:
+                store_name:
+                  type: string
+                  example: 'my_store'
+                keys:
+                  type: array
+                  items:
+                    type: string
+                  example: ["key1", "key2"]
+        responses:
+          200:
+            description: Value of each key, null for missing or expired keys
+            schema:
+              type: object
+              example: {"key1": "value1", "key2": null}
+        """
+    store_name = request.json.get('store_name')
+    keys = request.json.get('keys', [])
+    with _connect() as proxy:
+        return jsonify(proxy.mget(store_name, keys)), 200
+
+
+@kv_store_api.route('/mget-objects', methods=['POST'])
+def mget_objects():
+    """
+        Retrieves the full entries of several keys in one call
+        ---
+        tags:
+          - Batch Operations
+        parameters:
+          - in: body
+            name: body
+            required: true
+            schema:
+              type: object
+              required:
+                - store_name
+                - keys
+              properties:
+                store_name:
+                  type: string
+                  example: 'my_store'
+                keys:
+                  type: array
+                  items:
+                    type: string
+                  example: ["key1", "key2"]
+        responses:
+          200:
+            description: Entry of each key, null for missing or expired keys
+            schema:
+              type: object
+              example: {"key1": {"value": "value1", "exp_time": 1700000000.0}, "key2": null}
+        """
+    store_name = request.json.get('store_name')
+    keys = request.json.get('keys', [])
+    with _connect() as proxy:
+        return jsonify(proxy.mget_objects(store_name, keys)), 200
+
+
+@kv_store_api.route('/mget-as-of', methods=['POST'])
+def mget_as_of():
+    """
+        Retrieves the full entries of several keys as they were at one commit version
+        ---
+        tags:
+          - Batch Operations
+        parameters:
+          - in: body
+            name: body
+            required: true
+            schema:
+              type: object
+              required:
+                - store_name
+                - keys
+              properties:
+                store_name:
+                  type: string
+                  example: 'my_store'
+                keys:
+                  type: array
+                  items:
+                    type: string
+                  example: ["key1", "key2"]
+                version:
+                  type: integer
+                  description: Commit version to read at; the latest one when left out
+                  example: 1042
+        responses:
+          200:
+            description: A consistent snapshot of the keys, null for keys missing at that version
+            schema:
+              type: object
+              example: {"version": 1042, "entries": {"key1": {"value": "value1", "exp_time": 1700000000.0, "version": 3}, "key2": null}}
+          404:
+            description: The version is no longer kept, or the server keeps no old versions
+        """
+    store_name = request.json.get('store_name')
+    keys = request.json.get('keys', [])
+    with _connect() as proxy:
+        snapshot = proxy.mget_as_of(store_name, keys, request.json.get('version'))
+    if snapshot is None:
+        return jsonify({"error": "Version not kept"}), 404
+    return jsonify(snapshot), 200
+
+
+@kv_store_api.route('/mset', methods=['POST'])
+def mset():
+    """
+        Adds or replaces several keys in one call
+        ---
+        tags:
+          - Batch Operations
+        parameters:
+          - in: body
+            name: body
+            required: true
+            schema:
+              type: object
+              required:
+                - store_name
+                - items
+              properties:
+                store_name:
+                  type: string
+                  example: 'my_store'
+                items:
+                  type: object
+                  description: Fields of each key; ttl and readonly are optional
+                  example: {"key1": {"value": "value1", "ttl": 60}, "key2": {"value": 2, "readonly": true}}
+        responses:
+          200:
+            description: Whether each key was written
+            schema:
+              type: object
+              example: {"key1": true, "key2": true}
+        """
+    store_name = request.json.get('store_name')
+    items = request.json.get('items', {})
+    with _connect() as proxy:
+        return jsonify(proxy.mset(store_name, items)), 200
+
+
+@kv_store_api.route('/mdelete', methods=['POST'])
+def mdelete():
+    """
+        Deletes several keys in one call
+        ---
+        tags:
+          - Batch Operations
+        parameters:
+          - in: body
+            name: body
+            required: true
+            schema:
+              type: object
+              required:
+                - store_name
+                - keys
+              properties:
+                store_name:
+                  type: string
+                  example: 'my_store'
+                keys:
+                  type: array
+                  items:
+                    type: string
+                  example: ["key1", "key2"]
+        responses:
+          200:
+            description: Whether each key existed and was deleted
+            schema:
+              type: object
+              example: {"key1": true, "key2": false}
+        """
+    store_name = request.json.get('store_name')
+    keys = request.json.get('keys', [])
+    with _connect() as proxy:
+        return jsonify(proxy.mdelete(store_name, keys)), 200
+
+
+@kv_store_api.route('/incr', methods=['POST'])
+def incr():
+    """
+        Adds an amount to a numeric key in one locked update
+        ---
+        tags:
+          - Atomic Operations
+        parameters:
+          - in: body
+            name: body
+            required: true
+            schema:
+              type: object
+              required:
+                - store_name
+                - key
+              properties:
+                store_name:
+                  type: string
+                  example: 'my_store'
+                key:
+                  type: string
+                  example: 'counter'
+                amount:
+                  type: number
+                  example: 1
+                ttl:
+                  type: integer
+                  description: Resets the time to live of the key
+        responses:
+          200:
+            description: The new value
+            schema:
+              type: object
+              example: {"value": 5}
+          409:
+            description: The key is readonly or not a number
+        """
+    store_name = request.json.get('store_name')
+    key = request.json.get('key')
+    amount = request.json.get('amount', 1)
+    ttl = request.json.get('ttl')
+    with _connect() as proxy:
+        value = proxy.incr(store_name, key, amount, ttl)
+    if value is None:
+        return jsonify({"error": f"Key {key} could not be incremented"}), 409
+    return jsonify({"value": value}), 200
+
+
+@kv_store_api.route('/compare-and-set', methods=['POST'])
+def compare_and_set():
+    """
+        Writes a key only if it is still at the expected version
+        ---
+        tags:
+          - Atomic Operations
+        parameters:
+          - in: body
+            name: body
+            required: true
+            schema:
+              type: object
+              required:
+                - store_name
+                - key
+                - expected_version
+                - value
+              properties:
+                store_name:
+                  type: string
+                  example: 'my_store'
+                key:
+                  type: string
+                  example: 'key1'
+                expected_version:
+                  type: integer
+                  description: Version read before, 0 when the key must not exist
+                  example: 3
+                value:
+                  example: 'value1'
+                ttl:
+                  type: integer
+        responses:
+          200:
+            description: The key was written
+            schema:
+              type: object
+              example: {"ok": true, "version": 4}
+          409:
+            description: The key changed since it was read
+            schema:
+              type: object
+              example: {"ok": false, "version": 5}
+        """
+    store_name = request.json.get('store_name')
+    key = request.json.get('key')
+    expected_version = request.json.get('expected_version')
+    value = request.json.get('value')
+    ttl = request.json.get('ttl')
+    with _connect() as proxy:
+        result = proxy.compare_and_set(store_name, key, expected_version, value, ttl)
+    return jsonify(result), 200 if result["ok"] else 409
+
+
+@kv_store_api.route('/set-in', methods=['POST'])
+def set_in():
+    """
+        Sets or deep-merges an item at a path inside a key's value
+        ---
+        tags:
+          - Atomic Operations
+        parameters:
+          - in: body
+            name: body
+            required: true
+            schema:
+              type: object
+              required:
+                - store_name
+                - key
+                - path
+                - value
+              properties:
+                store_name:
+                  type: string
+                  example: 'paths'
+                key:
+                  type: string
+                  example: 'myApp'
+                path:
+                  type: array
+                  example: ["prod", "posix"]
+                value:
+                  example: '/var/app/prod'
+                merge:
+                  type: boolean
+                  description: Deep-merge a dict value into the item instead of replacing it
+        responses:
+          200:
+            description: Update successful
+          409:
+            description: The key is readonly or the path does not lead through dicts
+        """
+    store_name = request.json.get('store_name')
+    key = request.json.get('key')
+    path = request.json.get('path', [])
+    value = request.json.get('value')
+    with _connect() as proxy:
+        if request.json.get('merge', False):
+            updated = proxy.merge_in(store_name, key, path, value)
+        else:
+            updated = proxy.set_in(store_name, key, path, value)
+    if not updated:
+        return jsonify({"error": f"Key {key} could not be updated"}), 409
+    return jsonify({"message": "Update successful"}), 200
+
+
+@kv_store_api.route('/list-append', methods=['POST'])
+def list_append():
+    """
+        Appends an item to a list inside a key, keeping at most max_len items
+        ---
+        tags:
+          - Atomic Operations
+        parameters:
+          - in: body
+            name: body
+            required: true
+            schema:
+              type: object
+              required:
+                - store_name
+                - key
+                - item
+              properties:
+                store_name:
+                  type: string
+                  example: 'my_store'
+                key:
+                  type: string
+                  example: 'events'
+                item:
+                  example: {"event": "started"}
+                max_len:
+                  type: integer
+                  example: 100
+                path:
+                  type: array
+                  description: Path of the list inside the value, the value itself by default
+        responses:
+          200:
+            description: The new length of the list
+            schema:
+              type: object
+              example: {"length": 42}
+          409:
+            description: The key is readonly or not a list
+        """
+    store_name = request.json.get('store_name')
+    key = request.json.get('key')
+    item = request.json.get('item')
+    max_len = request.json.get('max_len')
+    path = request.json.get('path')
+    with _connect() as proxy:
+        length = proxy.list_append(store_name, key, item, max_len, path)
+    if length is None:
+        return jsonify({"error": f"Could not append to key {key}"}), 409
+    return jsonify({"length": length}), 200
 
 
-@kv_store_api.route('/update-config', methods=['POST'])
-def update_config():
+@kv_store_api.route('/transaction', methods=['POST'])
+def transaction():
     """
-        Update configuration
+        Runs several operations as one unit, optionally guarded by watched key versions
         ---
         tags:
-          - Configuration
+          - Atomic Operations
         parameters:
           - in: body
             name: body
-            description: Configuration parameters
             required: true
             schema:
               type: object
+              required:
+                - operations
               properties:
-                backup_dir:
-                  type: string
-                  example: '/new/backup/dir'
-                metrics_interval:
-                  type: integer
-                  example: 10
-                status_ttl:
-                  type: integer
-                  example: 3600
-                cleanup_frequency:
-                  type: integer
-                  example: 60
+                operations:
+                  type: array
+                  description: Each names its op, store_name and key plus the op's own arguments
+                  example: [{"op": "add_pipeline", "key": "p1", "creator": "ci"},
+                            {"op": "add_stage_to_pipeline", "key": "p1", "stage_name": "build"},
+                            {"op": "incr", "store_name": "counters", "key": "pipelines"}]
+                watch:
+                  type: array
+                  description: Keys that must still be at the given version, 0 when missing
+                  example: [{"store_name": "counters", "key": "pipelines", "version": 7}]
         responses:
           200:
-            description: Configuration update was successful
+            description: What each operation returned
             schema:
               type: object
-              properties:
-                message:
-                  type: string
-                  example: Configuration update sent to server.
-          500:
-            description: Error updating configuration
+              example: {"ok": true, "results": [true, true, 8]}
+          400:
+            description: Unknown operation, store or missing key
+          409:
+            description: A watched key changed, nothing was run
+            schema:
+              type: object
+              example: {"ok": false, "conflicts": [{"store_name": "counters", "key": "pipelines", "version": 8}]}
         """
-    data = request.json
-    with Pyro4.Proxy(uri) as proxy:
-        proxy.update_configuration(**data)
-    return jsonify({"message": "Configuration update sent to server."})
+    operations = request.json.get('operations', [])
+    watch = request.json.get('watch')
+    with _connect() as proxy:
+        result = proxy.transaction(operations, watch)
+    if result["ok"]:
+        return jsonify(result), 200
+    return jsonify(result), 400 if "error" in result else 409
 
 
-@kv_store_api.route('/show-config', methods=['GET'])
-def show_config():
+@kv_store_api.route('/changes', methods=['GET'])
+def get_changes():
     """
-        Retrieve server configuration
+        Long-polls the change feed
         ---
         tags:
-          - Configuration
+          - Change Feed
+        parameters:
+          - name: store_name
+            in: query
+            type: string
+            description: Only changes of this store, every store when left out
+          - name: prefix
+            in: query
+            type: string
+            description: Only changes of keys starting with this prefix
+          - name: after
+            in: query
+            type: string
+            description: Cursor to resume after, from now when left out; a sequence number, or the JSON object
+              of sequence numbers returned in cluster mode
+          - name: limit
+            in: query
+            type: integer
+            default: 100
+          - name: timeout
+            in: query
+            type: number
+            default: 30
+            description: Seconds to wait for a change, at most 60
         responses:
           200:
-            description: Server configuration retrieved successfully
+            description: The changes and the cursor to resume from; missed means the feed moved past after
             schema:
               type: object
-              properties:
-                backup_dir:
-                  type: string
-                  example: '/path/to/backup'
-                metrics_interval:
-                  type: integer
-                  example: 60
-                status_ttl:
-                  type: integer
-                  example: 3600
-                cleanup_frequency:
-                  type: integer
-                  example: 120
+              example: {"events": [{"seq": 42, "time": 1700000000.0, "op": "set", "store": "pipelines",
+                                    "key": "p1", "entry": {"value": null, "exp_time": 1900000000.0}}],
+                        "cursor": 42, "missed": false}
+          503:
+            description: The change feed is disabled
         """
-    with Pyro4.Proxy(uri) as proxy:
-        config = proxy.get_configuration()
-    return jsonify(config)
+    after = _changes_cursor()
+    if after is False:
+        return jsonify({"error": "after must be a sequence number or a JSON object of them"}), 400
+    with _connect() as proxy:
+        changes = proxy.get_changes(request.args.get('store_name'), request.args.get('prefix', ''), after,
+                                    request.args.get('limit', 100, type=int),
+                                    request.args.get('timeout', 30, type=float))
+    if changes is None:
+        return jsonify({"error": "The change feed is disabled"}), 503
+    return jsonify(changes), 200
 
 
-@kv_store_api.route('/shutdown', methods=['POST'])
-def shutdown_task():
+@kv_store_api.route('/changes/stream', methods=['GET'])
+def stream_changes():
     """
-        Shutdown a specific task or all tasks
+        Streams the change feed as server-sent events
         ---
         tags:
-          - Task Management
+          - Change Feed
+        produces:
+          - text/event-stream
         parameters:
-          - name: task_name
-            in: body
-            required: false
-            schema:
-              type: object
-              properties:
-                task_name:
-                  type: string
-                  example: 'cleanup'
+          - name: store_name
+            in: query
+            type: string
+          - name: prefix
+            in: query
+            type: string
+          - name: after
+            in: query
+            type: string
+            description: Cursor to resume after, as for /changes; the Last-Event-ID header is used when left out
         responses:
           200:
-            description: Task(s) shutdown successfully
-            schema:
-              type: object
-              properties:
-                message:
-                  type: string
-                  example: 'Shutdown signal sent to task: cleanup.'
+            description: One "change" event per change with the sequence number as its id, and a "missed"
+              event when the feed moved past the requested position
         """
-    task_name = request.json.get('task_name')
-    with Pyro4.Proxy(uri) as proxy:
-        if task_name:
-            proxy.shutdown(task_name=task_name)
-        else:
-            proxy.shutdown()
-    return jsonify({"message": f"Shutdown signal sent to task: {task_name if task_name else 'all tasks'}."})
+    store_name = request.args.get('store_name')
+    prefix = request.args.get('prefix', '')
+    after = _changes_cursor()
+    if after is False:
+        return jsonify({"error": "after must be a sequence number or a JSON object of them"}), 400
+    if after is None and request.headers.get('Last-Event-ID', '').isdigit():
+        after = int(request.headers['Last-Event-ID'])
 
+    def events(after):
+        with _connect() as proxy:
+            while True:
+                changes = proxy.get_changes(store_name, prefix, after, 100, STREAM_POLL_SECONDS)
+                if changes is None:
+                    yield "event: error\ndata: The change feed is disabled\n\n"
+                    return
+                if changes["missed"]:
+                    yield f"event: missed\ndata: {json.dumps({'cursor': changes['cursor']})}\n\n"
+                for event in changes["events"]:
+                    yield f"id: {event['seq']}\nevent: change\ndata: {json.dumps(event, default=str)}\n\n"
+                if changes["cursor"] == after:
+                    yield ": keepalive\n\n"
+                after = changes["cursor"]
 
-@kv_store_api.route('/start-task', methods=['POST'])
-def start_task():
+    return Response(stream_with_context(events(after)), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
+def _changes_cursor():
+    """Reads the ``after`` cursor of the change feed: a sequence number, or a cluster's ``{node: sequence}``.
+
+    Returns None when it is left out and False when it is neither.
     """
-        Starts a specific task or all tasks
+    after = _query_value('after')
+    if after is None or type(after) is int:
+        return after
+    if isinstance(after, dict) and all(type(seq) is int for seq in after.values()):
+        return after
+    return False
+
+
+def _query_value(name):
+    """Reads a query string value as JSON when it parses, so numbers are looked up as numbers."""
+    text = request.args.get(name)
+    if text is None:
+        return None
+    try:
+        return json.loads(text)
+    except ValueError:
+        return text
+
+
+@kv_store_api.route('/indexes', methods=['GET'])
+def list_indexes():
+    """
+        Lists the secondary indexes
         ---
         tags:
-          - Task Management
+          - Indexes
         parameters:
-          - name: task_name
-            in: body
-            required: false
-            schema:
-              type: object
-              properties:
-                task_name:
-                  type: string
-                  example: 'metrics_collection'
+          - name: store_name
+            in: query
+            type: string
+            description: Only this store's indexes
         responses:
           200:
-            description: Task(s) started successfully
+            description: The indexed fields of each store with the number of keys each covers
             schema:
               type: object
-              properties:
-                message:
-                  type: string
-                  example: 'Start signal sent to task: metrics_collection.'
+              example: {"pipelines": {"status": 120, "creator": 120}}
         """
-    task_name = request.json.get('task_name')
-    with Pyro4.Proxy(uri) as proxy:
-        if task_name:
-            proxy.start_tasks(task_name=task_name)
-        else:
-            proxy.start_tasks()
-    return jsonify({"message": f"Start signal sent to task: {task_name if task_name else 'all tasks'}."})
+    with _connect() as proxy:
+        return jsonify(proxy.list_indexes(request.args.get('store_name'))), 200
 
 
-@kv_store_api.route('/create-store', methods=['POST'])
-def create_store():
+@kv_store_api.route('/indexes', methods=['POST'])
+def create_index():
     """
-        Creates a new store
+        Indexes a store on an entry field
         ---
         tags:
-          - Store Management
+          - Indexes
         parameters:
-          - name: store_name
-            in: body
+          - in: body
+            name: body
             required: true
             schema:
               type: object
+              required:
+                - store_name
+                - field
               properties:
                 store_name:
                   type: string
-                  example: 'my_new_store'
+                  example: 'pipelines'
+                field:
+                  type: string
+                  description: Dotted path of an entry field, e.g. status, metadata.team or value.owner
+                  example: 'metadata.team'
         responses:
           201:
-            description: Store created successfully
-            schema:
-              type: object
-              properties:
-                message:
-                  type: string
-                  example: 'Store "my_new_store" created successfully.'
-          400:
-            description: Error in creating store
-            schema:
-              type: object
-              properties:
-                error:
-                  type: string
-                  example: 'Store "my_new_store" already exists or could not be created.'
+            description: Index created
+          404:
+            description: The store does not exist yet; it is indexed once created
         """
     store_name = request.json.get('store_name')
-    with Pyro4.Proxy(uri) as proxy:
-        result = proxy.create_store(store_name)
-        if result:
-            return jsonify({"message": f"Store '{store_name}' created successfully."}), 201
-        else:
-            return jsonify({"error": f"Store '{store_name}' already exists or could not be created."}), 400
+    field = request.json.get('field')
+    with _connect() as proxy:
+        if proxy.create_index(store_name, field):
+            return jsonify({"message": f"Indexed {store_name}.{field}"}), 201
+    return jsonify({"error": f"Store {store_name} does not exist, it will be indexed once created"}), 404
 
 
-@kv_store_api.route('/delete-store', methods=['DELETE'])
-def delete_store():
+@kv_store_api.route('/indexes/<store_name>/<field>', methods=['DELETE'])
+def drop_index(store_name, field):
     """
-        Deletes an existing store
+        Drops a secondary index
         ---
         tags:
-          - Store Management
+          - Indexes
         parameters:
           - name: store_name
-            in: query
+            in: path
+            type: string
+            required: true
+          - name: field
+            in: path
             type: string
             required: true
-            description: Name of the store to delete
         responses:
           200:
-            description: Store deleted successfully
-            schema:
-              type: object
-              properties:
-                message:
-                  type: string
-                  example: 'Store "my_store" deleted successfully.'
+            description: Index dropped
           404:
-            description: Store not found
-            schema:
-              type: object
-              properties:
-                error:
-                  type: string
-                  example: 'Store "my_store" does not exist.'
+            description: No such index
         """
-    store_name = request.args.get('store_name')
-    with Pyro4.Proxy(uri) as proxy:
-        result = proxy.delete_store(store_name)
-        if result:
-            return jsonify({"message": f"Store '{store_name}' deleted successfully."}), 200
-        else:
-            return jsonify({"error": f"Store '{store_name}' does not exist."}), 404
+    with _connect() as proxy:
+        if proxy.drop_index(store_name, field):
+            return jsonify({"message": f"Dropped index {store_name}.{field}"}), 200
+    return jsonify({"error": f"Store {store_name} has no index on {field}"}), 404
 
 
-@kv_store_api.route('/list-stores', methods=['GET'])
-def list_stores():
+@kv_store_api.route('/query', methods=['GET'])
+def query():
     """
-        Lists all the stores
+        Finds keys by an indexed field, by equality or range
         ---
         tags:
-          - Store Management
+          - Indexes
+        parameters:
+          - name: store_name
+            in: query
+            type: string
+            required: true
+          - name: field
+            in: query
+            type: string
+            required: true
+          - name: value
+            in: query
+            type: string
+            description: Value to match; parsed as JSON when possible, so 5 is a number and "5" a string
+          - name: low
+            in: query
+            type: string
+            description: Lowest value of a range, included
+          - name: high
+            in: query
+            type: string
+            description: Highest value of a range, included
+          - name: limit
+            in: query
+            type: integer
+          - name: objects
+            in: query
+            type: boolean
+            description: Return the full entries instead of the keys
         responses:
           200:
-            description: A list of all stores
+            description: The matching keys, or entries by key
             schema:
-              type: object
-              properties:
-                stores:
-                  type: array
-                  items:
-                    type: string
-                  example: ["store1", "store2", "store3"]
+              type: array
+              example: ["pipeline1", "pipeline7"]
+          400:
+            description: The field is not indexed or the values cannot be compared
         """
-    with Pyro4.Proxy(uri) as proxy:
-        stores = proxy.list_stores()
-        return jsonify({"stores": stores}), 200
+    store_name = request.args.get('store_name')
+    field = request.args.get('field')
+    objects = request.args.get('objects', 'false').lower() == 'true'
+    with _connect() as proxy:
+        result = proxy.query(store_name, field, _query_value('value'), _query_value('low'), _query_value('high'),
+                             request.args.get('limit', type=int), objects)
+    if result is None:
+        return jsonify({"error": f"Cannot query {store_name}.{field}"}), 400
+    return jsonify(result), 200
 
 
 @kv_store_api.route('/add-internal-key', methods=['POST'])
@@ -309,7 +1281,7 @@ def add_internal_key():
     value = request.json.get('value')
     ttl = request.json.get('ttl', None)
     readonly = request.json.get('readonly', False)
-    with Pyro4.Proxy(uri) as proxy:
+    with _connect() as proxy:
         proxy.add_internal_key(key, value, ttl, readonly)
         return jsonify({"message": f"Key '{key}' added to the internal store."}), 201
 
@@ -339,7 +1311,7 @@ def delete_internal_key(key):
           404:
             description: Key not found
         """
-    with Pyro4.Proxy(uri) as proxy:
+    with _connect() as proxy:
         proxy.delete_internal_key(key)
         return jsonify({"message": f"Key '{key}' deleted from the internal store."}), 200
 
@@ -389,7 +1361,7 @@ def edit_internal_key():
     value = request.json.get('value', None)
     ttl = request.json.get('ttl', None)
     readonly = request.json.get('readonly', None)
-    with Pyro4.Proxy(uri) as proxy:
+    with _connect() as proxy:
         proxy.edit_internal_key(key, value, ttl, readonly)
         return jsonify({"message": f"Key '{key}' has been updated in the internal store."}), 200
 
@@ -422,7 +1394,7 @@ def get_internal_key(key):
           404:
             description: Key not found
         """
-    with Pyro4.Proxy(uri) as proxy:
+    with _connect() as proxy:
         value = proxy.get_internal_key(key)
         return jsonify({"key": key, "value": value}), 200
 
@@ -434,6 +1406,22 @@ def get_all_internal_keys():
         ---
         tags:
           - Key Management
+        parameters:
+          - name: cursor
+            in: query
+            type: string
+            required: false
+            description: Cursor returned by the previous page
+          - name: match
+            in: query
+            type: string
+            required: false
+            description: Key prefix or glob
+          - name: count
+            in: query
+            type: integer
+            required: false
+            description: Page size; any of cursor, match or count returns a single page and its cursor
         responses:
           200:
             description: All keys and their values retrieved successfully
@@ -444,7 +1432,11 @@ def get_all_internal_keys():
                   type: object
                   example: { "exampleKey1": "exampleValue1", "exampleKey2": "exampleValue2" }
         """
-    with Pyro4.Proxy(uri) as proxy:
+    scan_args = _scan_args()
+    with _connect() as proxy:
+        if scan_args is not None:
+            page = proxy.scan_internal_keys(*scan_args)
+            return jsonify({"keys": page["entries"], "cursor": page["cursor"]}), 200
         keys_values = proxy.get_all_internal_keys()
         return jsonify({"keys": keys_values}), 200
 
@@ -456,6 +1448,22 @@ def list_pipelines():
         ---
         tags:
           - Pipeline Management
+        parameters:
+          - name: cursor
+            in: query
+            type: string
+            required: false
+            description: Cursor returned by the previous page
+          - name: match
+            in: query
+            type: string
+            required: false
+            description: Key prefix or glob
+          - name: count
+            in: query
+            type: integer
+            required: false
+            description: Page size; any of cursor, match or count returns a single page and its cursor
         responses:
           200:
             description: A list of all pipelines
@@ -468,7 +1476,11 @@ def list_pipelines():
                     type: string
                   example: ["pipeline1", "pipeline2", "pipeline3"]
         """
-    with Pyro4.Proxy(uri) as proxy:
+    scan_args = _scan_args()
+    with _connect() as proxy:
+        if scan_args is not None:
+            page = proxy.scan_pipelines(*scan_args)
+            return jsonify({"pipelines": page["entries"], "cursor": page["cursor"]}), 200
         pipelines = proxy.list_pipelines()
         return jsonify({"pipelines": pipelines}), 200
 
@@ -498,7 +1510,7 @@ def get_pipeline(pipeline_id):
       404:
         description: Pipeline not found
     """
-    with Pyro4.Proxy(uri) as proxy:
+    with _connect() as proxy:
         pipeline = proxy.get_pipeline(pipeline_id)
         return jsonify({"pipeline": pipeline}), 200
 
@@ -544,7 +1556,7 @@ def add_update_path():
     env = request.json.get('env')
     system = request.json.get('system')
     path = request.json.get('path')
-    with Pyro4.Proxy(uri) as proxy:
+    with _connect() as proxy:
         proxy.add_or_update_path(label, env, system, path)
         return jsonify({"message": f"Path for '{label}' in {env}/{system} updated to: {path}"}), 201
 
@@ -584,7 +1596,7 @@ def get_path(label, env, system):
           404:
             description: Path not found.
         """
-    with Pyro4.Proxy(uri) as proxy:
+    with _connect() as proxy:
         path = proxy.get_path(label, env, system)
         if path:
             return jsonify({"path": path}), 200
@@ -623,7 +1635,7 @@ def update_paths_object():
         """
     label = request.json.get('label')
     new_paths = request.json.get('new_paths')
-    with Pyro4.Proxy(uri) as proxy:
+    with _connect() as proxy:
         proxy.update_paths_object(label, new_paths)
         return jsonify({"message": f"Paths object for '{label}' updated."}), 200
 
@@ -635,6 +1647,22 @@ def get_all_paths():
     ---
     tags:
       - Paths Management
+    parameters:
+      - name: cursor
+        in: query
+        type: string
+        required: false
+        description: Cursor returned by the previous page
+      - name: match
+        in: query
+        type: string
+        required: false
+        description: Label prefix or glob
+      - name: count
+        in: query
+        type: integer
+        required: false
+        description: Page size; any of cursor, match or count returns a single page and its cursor
     responses:
       200:
         description: Successfully retrieved all paths.
@@ -645,7 +1673,11 @@ def get_all_paths():
               type: object
               description: An object containing all paths.
     """
-    with Pyro4.Proxy(uri) as proxy:
+    scan_args = _scan_args()
+    with _connect() as proxy:
+        if scan_args is not None:
+            page = proxy.scan_paths(*scan_args)
+            return jsonify({"paths": page["entries"], "cursor": page["cursor"]}), 200
         paths = proxy.get_all_paths()
         return jsonify({"paths": paths}), 200
 